@@ -0,0 +1,23 @@
+from accounts.imports import *
+from fitness.cache import CACHED_ENDPOINTS, get_stats, reset_stats
+
+
+@extend_schema(tags=['Admin'])
+class CatalogCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        responses={200: dict},
+        summary='آمار کش کاتالوگ',
+        description='تعداد hit/miss کش پاسخ endpointهای عمومی کاتالوگ (صفحه‌ی اصلی، لیست باشگاه‌ها و پکیج‌ها)'
+    )
+    def get(self, request):
+        return Response({'endpoints': get_stats(CACHED_ENDPOINTS)}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        responses={204: None},
+        summary='ریست آمار کش کاتالوگ',
+    )
+    def delete(self, request):
+        reset_stats(CACHED_ENDPOINTS)
+        return Response(status=status.HTTP_204_NO_CONTENT)
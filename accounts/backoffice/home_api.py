@@ -3,10 +3,10 @@ from drf_spectacular.utils import extend_schema
 from rest_framework import permissions
 from gyms.models import Gym
 from packages.models import GroupPackage, Package
-from gyms.serializers import GymSerializer
+from gyms.serializers import GymCardSerializer
 from packages.serializers import PackageSerializer
 from collections import defaultdict
-from django.db.models import Subquery, OuterRef, Min
+from django.db.models import Prefetch, Min
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions
@@ -16,6 +16,7 @@ from django.db.models import Q
 import random
 from trainers.models import Trainer
 from trainers.serializers import TrainerSerializer
+from fitness.cache import cache_response
 
 
 class GroupPackageWithPackagesSerializer(serializers.ModelSerializer):
@@ -31,20 +32,16 @@ class GroupPackageWithPackagesSerializer(serializers.ModelSerializer):
 class TopGymsView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @cache_response('home-top-gyms', ('gym', 'package', 'discount'))
     def get(self, request):
-        # ساب‌کوئری برای پیدا کردن کمترین قیمت پکیج هر باشگاه
-        cheapest_package = Package.objects.filter(
-            gym=OuterRef('pk')
-        ).order_by('price').values('price')[:1]
-
         # Sort by order_homepage first (if > 0), then by average_rating
         gyms = (
             Gym.objects
-            .annotate(price=Subquery(cheapest_package))
+            .select_related('owner', 'card')
             .order_by('-order_homepage', '-average_rating')[:10]
         )
 
-        data = GymSerializer(gyms, many=True, context={'request': request}).data
+        data = GymCardSerializer(gyms, many=True, context={'request': request}).data
         return Response(data)
 
 
@@ -58,6 +55,7 @@ class TopGymsView(APIView):
 class SportGroupPackagesView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @cache_response('home-sport-groups', ('gym', 'package', 'discount'))
     def get(self, request):
         sport = request.query_params.get('sport')
         if not sport:
@@ -74,6 +72,7 @@ class SportGroupPackagesView(APIView):
             )
             .distinct()
             .select_related('gym', 'group_package')
+            .with_active_discount()
         )
 
         packages = list(packages_qs)
@@ -99,7 +98,7 @@ class SportGroupPackagesView(APIView):
                 gym_max_order_map[gym_id] = 0
 
         # واکشی همه‌ی Gymها یک‌جا (برای جلوگیری از N+1)
-        gyms = Gym.objects.filter(id__in=gym_ids)
+        gyms = Gym.objects.filter(id__in=gym_ids).select_related('owner', 'card')
 
         gyms_data = []
         gym_by_id = {g.id: g for g in gyms}
@@ -107,14 +106,19 @@ class SportGroupPackagesView(APIView):
             gym_obj = gym_by_id.get(gid)
             if not gym_obj:
                 continue
-            gym_data = GymSerializer(gym_obj, context={'request': request}).data
+            gym_serializer = GymCardSerializer(gym_obj, context={'request': request})
+            gym_data = gym_serializer.data
             packages = gym_packages_map.get(gid, [])
             # Sort packages by order_homepage first (if > 0), then by default
             try:
                 packages.sort(key=lambda p: (-p.order_homepage if p.order_homepage > 0 else 0, p.id))
             except AttributeError:
                 packages.sort(key=lambda p: p.id)
-            gym_data['packages'] = PackageSerializer(packages, many=True).data
+            if hasattr(gym_obj, 'card'):
+                summaries = {item['id']: item for item in gym_serializer.package_summaries(gym_obj)}
+                gym_data['packages'] = [summaries[p.id] for p in packages if p.id in summaries]
+            else:
+                gym_data['packages'] = PackageSerializer(packages, many=True).data
             gyms_data.append(gym_data)
 
         # Sort gyms by highest order_homepage of their packages, then by gym order_homepage, then random for ties
@@ -142,19 +146,21 @@ class HomeSearchView(APIView):
         if not q:
             return Response({'detail': 'q query param is required.'}, status=400)
 
-        gyms = Gym.objects.filter(name__icontains=q)[:5]
+        gyms = Gym.objects.filter(name__icontains=q).select_related('owner', 'card')[:5]
         groups = (
             GroupPackage.objects
-            .filter(title__icontains=q)[:5]
+            .filter(title__icontains=q)
+            .prefetch_related(Prefetch('packages', queryset=Package.objects.select_related('gym').with_active_discount()))[:5]
         )
         packages = (
             Package.objects
             .filter(title__icontains=q)
-            .select_related('gym', 'group_package')[:5]
+            .select_related('gym', 'group_package')
+            .with_active_discount()[:5]
         )
 
         return Response({
-            'gyms': GymSerializer(gyms, many=True).data,
+            'gyms': GymCardSerializer(gyms, many=True).data,
             'group_packages': GroupPackageWithPackagesSerializer(groups, many=True).data,
             'packages': PackageSerializer(packages, many=True).data,
         })
@@ -168,6 +174,7 @@ class HomeSearchView(APIView):
 class TopTrainersView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @cache_response('home-top-trainers', ('trainer', 'gym'))
     def get(self, request):
         # Sort by order_homepage first (if > 0), then by average_rating
         trainers = Trainer.objects.filter(
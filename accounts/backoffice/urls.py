@@ -2,6 +2,7 @@ from django.urls import path
 from .staffuser import UserStaff
 from .users_list import UsersList
 from .home_api import TopGymsView, SportGroupPackagesView, HomeSearchView, TopTrainersView
+from .cache_stats import CatalogCacheStatsView
 
 urlpatterns = [
     path('make-this-user-staff/', UserStaff.as_view(), name='staffuser'),
@@ -10,4 +11,5 @@ urlpatterns = [
     path('home/sport-groups/', SportGroupPackagesView.as_view(), name='home-sport-groups'),
     path('home/search/', HomeSearchView.as_view(), name='home-search'),
     path('home/top-trainers/', TopTrainersView.as_view(), name='home-top-trainers'),
+    path('cache-stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
 ]
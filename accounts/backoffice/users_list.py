@@ -1,18 +1,18 @@
 from accounts.imports import *
 from accounts.serializers import UserDetailSerializer
 from drf_spectacular.utils import extend_schema
+from fitness.pagination import paginated_response
 
 class UsersList(APIView):
     permission_classes = [IsAuthenticated]
     @extend_schema(
         request=dict,
         responses={200: dict},
-        description="لیست کاربران"
+        description="لیست کاربران (صفحه‌بندی cursor؛ ?export=ndjson برای خروجی کامل)"
     )
     
     def get(self, request):
         if not request.user.is_staff:
             return Response({'detail': 'شما مجوز دسترسی ندارید.'}, status=status.HTTP_403_FORBIDDEN)
         users = User.objects.all()
-        serializer = UserDetailSerializer(users, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return paginated_response(request, users, UserDetailSerializer, view=self)
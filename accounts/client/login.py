@@ -1,25 +1,19 @@
 from accounts.imports import *
-import requests
+from notifications.sms import OTP_BODY_ID, enqueue_sms
 from ..throttling import OTPRequestRateThrottle, OTPVerifyRateThrottle
 
 OTP_TTL_SECONDS = 300
+# با backoff پیش‌فرض (30 و 60 ثانیه) همه‌ی تلاش‌ها پیش از انقضای کد انجام می‌شوند
+OTP_SMS_MAX_ATTEMPTS = 3
 
 
-def send_sms_otp(phone, code):
-
-    url = f"https://console.melipayamak.com/api/send/shared/{settings.MELIPAYAMAK_API_KEY}"
-
-    payload = {'bodyId': 487686, 'to': phone, 'args': [code]}
-
-
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
-        return response.json()  # اگر پاسخ JSON باشد
-    except Exception as e:
-        return {"error": str(e)}
-
-
+def send_sms_otp(phone, code, otp_id):
+    # پیامک فقط در صف ثبت می‌شود و runworker آن را ارسال می‌کند؛ کدی که منقضی شده دیگر فرستاده نمی‌شود
+    message = enqueue_sms(
+        phone, OTP_BODY_ID, [code], idempotency_key=f"otp:{otp_id}",
+        max_attempts=OTP_SMS_MAX_ATTEMPTS, max_age=OTP_TTL_SECONDS,
+    )
+    return {"status": message.status}
 
 
 @extend_schema(tags=['Authentication'])
@@ -48,7 +42,7 @@ class RequestOTPView(APIView):
 
         user, created = User.objects.get_or_create(phone=phone)
 
-        rep = send_sms_otp(phone, code)
+        rep = send_sms_otp(phone, code, otp.id)
 
         return Response({
             "response": rep,
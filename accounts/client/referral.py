@@ -4,23 +4,31 @@ from discount.models import DiscountCode
 from rest_framework import serializers
 from decimal import Decimal
 from coolname import generate
+from fitness.codes import create_with_unique_code
 
 class EnterReferralCodeSerializer(serializers.Serializer):
     referral_code = serializers.CharField(max_length=20)
 
 
-def generate_unique_discount_code(name, existing_codes):
-    """ساخت کد تخفیف با coolname + دو رقم رندوم و یکتا."""
+def generate_discount_code():
+    """کد تخفیف با coolname + دو رقم رندوم؛ یکتایی با create_with_unique_code"""
     base = '-'.join(generate())
     suffix = f"{random.randint(0,9)}{random.randint(0,9)}"
-    code = f"{base}{suffix}"
-
-    while code in existing_codes:
-        base = generate().replace('-', '').upper()
-        suffix = f"{random.randint(0,9)}{random.randint(0,9)}"
-        code = f"{base}{suffix}"
-
-    return code
+    return f"{base}{suffix}"
+
+
+def create_referral_discount_code():
+    # ایجاد کد تخفیف 5 درصد؛ بدون خواندن همه‌ی کدهای موجود
+    return create_with_unique_code(
+        DiscountCode,
+        'code',
+        generate_discount_code,
+        discount_type='percent',
+        value=Decimal('5.00'),
+        gym=None,
+        source_type='admin',
+        is_active=True,
+    )
 
 
 # def send_sms_referral(phone, message):
@@ -73,45 +81,13 @@ class EnterReferralCodeView(APIView):
         current_user.referred_by = referral_code
         current_user.save()
 
-        # دریافت لیست کدهای تخفیف موجود برای جلوگیری از تکراری
-        existing_discount_codes = set(
-            DiscountCode.objects.values_list('code', flat=True)
-        )
-
-        # ساخت کد تخفیف برای کاربر جدید (referree)
+        # ساخت کد تخفیف برای کاربر جدید (referree) و معرف (referrer)
         new_user_name = current_user.full_name or current_user.phone
-        new_user_discount_code = generate_unique_discount_code(
-            new_user_name,
-            existing_discount_codes
-        )
-        existing_discount_codes.add(new_user_discount_code)
-
-        # ساخت کد تخفیف برای معرف (referrer)
         referrer_name = referrer.full_name or referrer.phone
-        referrer_discount_code = generate_unique_discount_code(
-            referrer_name,
-            existing_discount_codes
-        )
-
-        # ایجاد کد تخفیف 5 درصد برای کاربر جدید
-        discount_new_user = DiscountCode.objects.create(
-            code=new_user_discount_code,
-            discount_type='percent',
-            value=Decimal('5.00'),
-            gym=None,
-            source_type='admin',
-            is_active=True
-        )
-
-        # ایجاد کد تخفیف 5 درصد برای معرف
-        discount_referrer = DiscountCode.objects.create(
-            code=referrer_discount_code,
-            discount_type='percent',
-            value=Decimal('5.00'),
-            gym=None,
-            source_type='admin',
-            is_active=True
-        )
+        discount_new_user = create_referral_discount_code()
+        discount_referrer = create_referral_discount_code()
+        new_user_discount_code = discount_new_user.code
+        referrer_discount_code = discount_referrer.code
 
         # ارسال SMS به هر دو کاربر (فعلا کامنت شده)
         # message_new_user = f"کد تخفیف 5 درصد شما: {new_user_discount_code}"
@@ -1,29 +1,24 @@
-import secrets
-import string
-
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.utils import timezone
 from django.core.validators import FileExtensionValidator
 from .validators import validate_iranian_phone_number
 from .file_validators import validate_avatar_size
+from fitness.codes import ALPHANUMERIC, random_code, save_with_unique_code
 
 
-REFERRAL_ALPHABET = string.ascii_uppercase + string.digits
+REFERRAL_ALPHABET = ALPHANUMERIC
 
 
 def generate_referral_code(length=8):
-    while True:
-        code = ''.join(secrets.choice(REFERRAL_ALPHABET) for _ in range(length))
-        if not User.objects.filter(referral_code=code).exists():
-            return code
+    # یکتایی با unique constraint و save_with_unique_code تضمین می‌شود، نه با جستجو
+    return random_code(length, REFERRAL_ALPHABET)
 
 
 class UserManager(BaseUserManager):
     def create_user(self, phone, password=None, **extra_fields):
         if not phone:
             raise ValueError("Phone must be set")
-        extra_fields.setdefault('referral_code', generate_referral_code())
         user = self.model(phone=phone, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
@@ -68,9 +63,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = []
 
     def save(self, *args, **kwargs):
-        if not self.referral_code:
-            self.referral_code = generate_referral_code()
-        super().save(*args, **kwargs)
+        save_with_unique_code(
+            self, 'referral_code', generate_referral_code,
+            save=lambda: super(User, self).save(*args, **kwargs),
+        )
 
     def __str__(self):
         return self.phone
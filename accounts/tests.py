@@ -1,13 +1,24 @@
 import io
 import os
 import tempfile
+import time
+
+from decimal import Decimal
+from unittest.mock import patch
 
 from PIL import Image
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 
 from accounts.models import User
+from discount.models import DiscountCode, PackageDiscount
+from gyms.models import Gym
+from packages.models import GroupPackage, Package
 from trainers.models import Trainer
 
 
@@ -129,3 +140,114 @@ class TopTrainersApiTests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['id'], trainer.id)
         self.assertTrue(response.data[0]['image'].startswith('http://testserver/media/'))
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone='09120000031', role='owner')
+        self.gym = Gym.objects.create(owner=self.owner, name='Cached Gym')
+        self.group = GroupPackage.objects.create(title='یوگا')
+        self.package = Package.objects.create(
+            gym=self.gym, group_package=self.group, title='Monthly', gender='female',
+            price=Decimal('200000.00'), duration=30,
+        )
+
+    def test_home_page_is_served_from_cache_until_data_changes(self):
+        url = '/api/admin/accounts/home/top-gyms/'
+        first = self.client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        PackageDiscount.objects.create(
+            package=self.package, discount_type='percent', value=Decimal('10'), source_type='club',
+        )
+        third = self.client.get(url)
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data[0]['max_discount']['value'], 10.0)
+
+    def test_unrelated_entity_does_not_invalidate(self):
+        url = '/api/group-packages/'
+        self.client.get(url)
+        Trainer.objects.create(name='Trainer', is_active=True)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_admin_can_read_hit_miss_counters(self):
+        self.client.get('/api/admin/accounts/home/top-trainers/')
+        self.client.get('/api/admin/accounts/home/top-trainers/')
+
+        admin = User.objects.create_user(phone='09120000032', role='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/admin/accounts/cache-stats/')
+
+        self.assertEqual(response.status_code, 200)
+        stats = response.data['endpoints']['home-top-trainers']
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+
+
+
+class CodeAllocationTests(TestCase):
+    USERS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(phone=f'0935{index:07d}', password=password, referral_code=f'B{index:07d}')
+             for index in range(cls.USERS)),
+            batch_size=5000,
+        )
+        DiscountCode.objects.bulk_create(
+            DiscountCode(code=f'bulk-code-{index}', discount_type='percent', value=Decimal('5.00'), source_type='admin')
+            for index in range(5000)
+        )
+
+    def test_referral_codes_are_inserted_without_lookups(self):
+        self.assertEqual(User.objects.count(), self.USERS)
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            users = [User.objects.create_user(phone=f'0936{index:07d}') for index in range(200)]
+            per_code = (time.perf_counter() - started) / len(users)
+
+        self.assertFalse([query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')])
+        self.assertEqual(len({user.referral_code for user in users}), len(users))
+        self.assertTrue(all(len(user.referral_code) == 8 for user in users))
+        # یک INSERT به ازای هر کاربر، مستقل از ۱۰۰ هزار کاربر موجود
+        self.assertLess(per_code, 0.02, f'{per_code * 1000:.2f}ms per referral code')
+
+    def test_conflicting_code_is_regenerated(self):
+        with patch('accounts.models.generate_referral_code', side_effect=['B0000001', 'FRESH001']):
+            user = User.objects.create_user(phone='09360000001')
+        self.assertEqual(user.referral_code, 'FRESH001')
+
+        # تکراری بودن ستون دیگر با تلاش دوباره پنهان نمی‌شود
+        with patch('accounts.models.generate_referral_code', return_value='FRESH002') as generate_code, \
+                self.assertRaises(IntegrityError):
+            User.objects.create_user(phone='09360000001')
+        self.assertEqual(generate_code.call_count, 1)
+
+    def test_referral_creates_discount_codes_without_scanning(self):
+        referrer = User.objects.get(referral_code='B0000042')
+        user = User.objects.create_user(phone='09360000002')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/auth/enter-referral-code/', {'referral_code': 'b0000042'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        discount_selects = [
+            query['sql'] for query in queries
+            if query['sql'].lstrip().upper().startswith('SELECT') and 'discount_discountcode' in query['sql']
+        ]
+        self.assertEqual(discount_selects, [])
+        self.assertTrue(DiscountCode.objects.filter(code=response.data['your_discount_code']).exists())
+        self.assertEqual(DiscountCode.objects.count(), 5002)
+        user.refresh_from_db()
+        self.assertEqual(user.referred_by, referrer.referral_code)
@@ -7,4 +7,5 @@ class DiscountConfig(AppConfig):
     verbose_name = 'تخفیف‌ها'
     
     def ready(self):
+        import discount.signals
         import discount.admin
@@ -3,13 +3,11 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes, OpenApiExample, OpenApiResponse
 from django.db import models
-from django.db.models import Q
-from django.utils import timezone
 from ..models import DiscountCode, DiscountUsage
 from ..serializers import DiscountCodeSerializer, DiscountUsageSerializer
 from drf_spectacular.utils import extend_schema_view
-from decimal import Decimal
 from packages.models import Package
+from ..pricing import DiscountCodeError, find_discount_code, quote
 
 
 class IsAdminOrOwnerPermission(permissions.BasePermission):
@@ -230,96 +228,22 @@ class CheckDiscountCodeView(APIView):
         except Package.DoesNotExist:
             return Response({'error': 'Package not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        code = code.strip()
-        discount = DiscountCode.objects.filter(code=code).prefetch_related('packages').first()
-        if not discount:
-            return Response({'error': 'کد تخفیف یافت نشد', 'is_valid': False}, status=status.HTTP_200_OK)
-
-        if not discount.is_valid():
-            return Response({'error': 'کد تخفیف معتبر نیست یا ظرفیت آن تمام شده است', 'is_valid': False}, status=status.HTTP_200_OK)
-
-        user = request.user
-        gym = package.gym
-
-        # Check if discount applies to this gym
-        if discount.gym and discount.gym_id != gym.id:
-            return Response({'error': 'این کد برای باشگاه انتخاب‌شده معتبر نیست', 'is_valid': False}, status=status.HTTP_200_OK)
-
-        # Check if discount applies to this package
-        if discount.packages.exists():
-            if package not in discount.packages.all():
-                return Response({'error': 'این کد برای پکیج انتخاب‌شده معتبر نیست', 'is_valid': False}, status=status.HTTP_200_OK)
-
-        if not discount.can_user_use(user):
-            return Response({'error': 'شما مجاز به استفاده از این کد نیستید', 'is_valid': False}, status=status.HTTP_200_OK)
-
-        # Now calculate discounts (package discount first, then code discount)
-        total_amount = package.price
-        commission_rate = Decimal(str(package.commission_rate))
-        admin_commission_before_discount = total_amount * commission_rate
-
-        # Get package discount
-        package_discount_obj = package.discounts.filter(
-            is_active=True,
-        ).filter(
-            Q(start_date__isnull=True) | Q(start_date__lte=timezone.now()),
-            Q(end_date__isnull=True) | Q(end_date__gte=timezone.now()),
-        ).first()
-
-        package_discount_amount = Decimal('0')
-        if package_discount_obj:
-            if package_discount_obj.discount_type == 'percent':
-                requested_percent = Decimal(str(package_discount_obj.value))
-                if requested_percent < Decimal('1'):
-                    requested_percent = requested_percent * Decimal('100')
-                if package_discount_obj.source_type == 'admin':
-                    max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
-                    effective_percent = min(requested_percent, max_admin_percent)
-                else:
-                    effective_percent = requested_percent
-                package_discount_amount = (total_amount * effective_percent) / Decimal('100')
-            else:  # amount
-                requested_amount = Decimal(str(package_discount_obj.value))
-                if package_discount_obj.source_type == 'admin':
-                    effective_amount = min(requested_amount, admin_commission_before_discount)
-                else:
-                    effective_amount = requested_amount
-                package_discount_amount = effective_amount
-
-        # Calculate code discount
-        price_after_package_discount = total_amount - package_discount_amount
-        code_discount_amount = Decimal('0')
-        if discount.discount_type == 'percent':
-            requested_percent = Decimal(str(discount.value))
-            if requested_percent < Decimal('1'):
-                requested_percent = requested_percent * Decimal('100')
-            if discount.source_type == 'admin':
-                max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
-                effective_percent = min(requested_percent, max_admin_percent)
-            else:
-                effective_percent = requested_percent
-            code_discount_amount = (price_after_package_discount * effective_percent) / Decimal('100')
-        else:  # amount
-            requested_amount = Decimal(str(discount.value))
-            if discount.source_type == 'admin':
-                effective_amount = min(requested_amount, admin_commission_before_discount)
-            else:
-                effective_amount = requested_amount
-            code_discount_amount = effective_amount
+        try:
+            discount = find_discount_code(code, package, request.user)
+        except DiscountCodeError as e:
+            return Response({'error': str(e), 'is_valid': False}, status=status.HTTP_200_OK)
 
-        total_discount = package_discount_amount + code_discount_amount
-        final_amount = total_amount - total_discount
-        if final_amount < 0:
-            final_amount = Decimal('0')
+        # package discount first, then code discount (same engine as checkout)
+        price_quote = quote(package, discount_code=discount)
 
         return Response({
             'is_valid': True,
             'discount_code': discount.code,
             'discount_type': discount.discount_type,
             'discount_value': discount.value,
-            'code_discount_amount': code_discount_amount,
-            'package_discount_amount': package_discount_amount,
-            'total_discount': total_discount,
-            'original_price': total_amount,
-            'final_price': final_amount,
+            'code_discount_amount': price_quote.code_discount,
+            'package_discount_amount': price_quote.package_discount,
+            'total_discount': price_quote.total_discount,
+            'original_price': price_quote.original,
+            'final_price': price_quote.final,
         }, status=status.HTTP_200_OK)
@@ -0,0 +1,218 @@
+"""
+محاسبه‌ی قیمت پکیج (باشگاه یا مربی) با تخفیف پکیج و کد تخفیف.
+
+ثبت خرید (PurchaseSerializer)، بررسی کد تخفیف (CheckDiscountCodeView) و لیست پکیج‌ها همه از
+همین ماژول استفاده می‌کنند تا حساب تخفیف‌ها فقط یک جا نوشته شده باشد:
+
+- price: محاسبه‌ی خالص، بدون کوئری
+- find_discount_code: کد تخفیف به همراه همه‌ی بررسی‌های اعتبار در یک کوئری
+- active_package_discounts: جدیدترین تخفیف معتبر چند پکیج در یک کوئری
+- quote / quote_many: قیمت یک پکیج یا یک لیست از پکیج‌ها؛ اگر پکیج‌ها با
+  Package.objects.with_active_discount() خوانده شده باشند هیچ کوئری‌ای اجرا نمی‌شود
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from discount.models import DiscountCode, DiscountUsage, PackageDiscount
+from packages.models import ACTIVE_DISCOUNT_FIELDS, Package
+
+HUNDRED = Decimal('100')
+
+
+class DiscountCodeError(Exception):
+    """کد تخفیف قابل استفاده نیست؛ متن خطا برای نمایش به کاربر است"""
+
+
+@dataclass(frozen=True)
+class PriceQuote:
+    original: Decimal
+    package_discount: Decimal
+    code_discount: Decimal
+    commission: Decimal
+    net: Decimal
+    final: Decimal
+    package_discount_obj: object = None
+    discount_code: object = None
+    # شرح تخفیف‌ها برای admin_notes خرید
+    details: tuple = ()
+
+    @property
+    def total_discount(self):
+        return self.package_discount + self.code_discount
+
+
+def _discount_amount(discount, base, total, commission_rate):
+    """مبلغ یک تخفیف (درصدی از base یا مبلغ ثابت) با سقف کمیسیون برای تخفیف‌های ادمین"""
+    if discount.discount_type == 'percent':
+        percent = Decimal(str(discount.value))
+        # سازگاری با داده‌های قدیمی: مقدار کمتر از 1 کسری از 1 است (0.05 یعنی 5٪)
+        if percent < Decimal('1'):
+            percent = percent * HUNDRED
+        if discount.source_type == 'admin':
+            percent = min(percent, (commission_rate * HUNDRED).quantize(Decimal('1.0000')))
+        return (base * percent) / HUNDRED, f"{percent}% از {discount.source_type}"
+
+    amount = Decimal(str(discount.value))
+    if discount.source_type == 'admin':
+        amount = min(amount, total * commission_rate)
+    return amount, f"{amount} تومان از {discount.source_type}"
+
+
+def price(original, commission_rate, package_discount=None, discount_code=None):
+    """
+    قیمت نهایی و سهم ادمین/باشگاه. اول تخفیف پکیج روی قیمت اصلی و بعد کد تخفیف روی قیمت
+    باقی‌مانده اعمال می‌شود؛ منبع تخفیف (ادمین یا باشگاه) با اولویت کد تعیین می‌کند از سهم
+    چه کسی کم شود.
+    """
+    total = original
+    commission_rate = Decimal(str(commission_rate))
+    admin_commission = total * commission_rate
+    details = []
+
+    package_amount = Decimal('0')
+    if package_discount:
+        package_amount, text = _discount_amount(package_discount, total, total, commission_rate)
+        details.append(f"تخفیف پکیج: ({text})")
+
+    code_amount = Decimal('0')
+    if discount_code:
+        code_amount, text = _discount_amount(discount_code, total - package_amount, total, commission_rate)
+        details.append(f"کد تخفیف: {discount_code.code} ({text})")
+
+    discount_amount = package_amount + code_amount
+    if discount_code:
+        source = discount_code.source_type
+    elif package_discount:
+        source = package_discount.source_type
+    else:
+        source = None
+
+    final = total - discount_amount
+    if final < 0:
+        final = Decimal('0')
+
+    if source == 'admin':
+        # تخفیف از سهم ادمین کم می‌شود و سهم باشگاه/مربی ثابت می‌ماند
+        commission = admin_commission - min(discount_amount, admin_commission)
+        if commission < 0:
+            commission = Decimal('0')
+        net = total - admin_commission
+    else:
+        commission = admin_commission
+        net = final - commission
+        if net < 0:
+            net = Decimal('0')
+
+    return PriceQuote(
+        original=total,
+        package_discount=package_amount,
+        code_discount=code_amount,
+        commission=commission,
+        net=net,
+        final=final,
+        package_discount_obj=package_discount,
+        discount_code=discount_code,
+        details=tuple(details),
+    )
+
+
+def active_package_discounts(package_ids, now=None):
+    """{package_id: جدیدترین تخفیف معتبر} برای پکیج‌های باشگاه، با یک کوئری"""
+    now = now or timezone.now()
+    discounts = {}
+    queryset = PackageDiscount.objects.filter(package_id__in=package_ids, is_active=True).filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=now),
+        Q(end_date__isnull=True) | Q(end_date__gte=now),
+    ).order_by('package_id', '-created_at', '-id')
+    for discount in queryset:
+        discounts.setdefault(discount.package_id, discount)
+    return discounts
+
+
+def find_discount_code(code, pkg=None, user=None, now=None):
+    """
+    کد تخفیف معتبر برای این پکیج و کاربر، یا DiscountCodeError. محدودیت باشگاه و پکیج‌ها
+    (فقط برای پکیج‌های باشگاه) و تعداد استفاده‌ی کاربر در همان کوئری خواندن کد حساب می‌شوند.
+    """
+    codes = DiscountCode.objects.filter(code=code.strip())
+    is_gym_package = isinstance(pkg, Package)
+    if is_gym_package:
+        code_packages = DiscountCode.packages.through.objects.filter(discountcode_id=OuterRef('pk'))
+        codes = codes.annotate(
+            has_packages=Exists(code_packages),
+            includes_package=Exists(code_packages.filter(package_id=pkg.pk)),
+        )
+    if user is not None:
+        usages = DiscountUsage.objects.filter(discount=OuterRef('pk'), user=user).order_by().values('discount')
+        codes = codes.annotate(
+            user_usage_count=Coalesce(Subquery(usages.annotate(total=Count('pk')).values('total')), 0),
+        )
+
+    discount = codes.first()
+    if discount is None:
+        raise DiscountCodeError("کد تخفیف یافت نشد")
+    if not discount.is_valid(now):
+        raise DiscountCodeError("کد تخفیف معتبر نیست یا ظرفیت آن تمام شده است")
+    if is_gym_package:
+        if discount.gym_id and discount.gym_id != pkg.gym_id:
+            raise DiscountCodeError("این کد برای باشگاه انتخاب‌شده معتبر نیست")
+        if discount.has_packages and not discount.includes_package:
+            raise DiscountCodeError("این کد برای پکیج انتخاب‌شده معتبر نیست")
+    if user is not None and discount.per_user_limit is not None and discount.user_usage_count >= discount.per_user_limit:
+        raise DiscountCodeError("شما مجاز به استفاده از این کد نیستید")
+    return discount
+
+
+def annotated_package_discount(pkg):
+    """
+    تخفیف پکیج از annotation های with_active_discount: (True, تخفیف یا None)،
+    یا (False, None) اگر پکیج annotate نشده باشد
+    """
+    if not hasattr(pkg, 'active_discount_id'):
+        return False, None
+    if pkg.active_discount_id is None:
+        return True, None
+    discount = SimpleNamespace(**{
+        field: getattr(pkg, f'active_discount_{field}') for field in ACTIVE_DISCOUNT_FIELDS
+    })
+    # SQLite مقدار annotation را بدون decimal_places فیلد برمی‌گرداند (10 به جای 10.00)
+    discount.value = Decimal(discount.value).quantize(Decimal('0.01'))
+    return True, discount
+
+
+def quote(pkg, discount_code=None, now=None):
+    """قیمت یک پکیج؛ برای پکیج باشگاه annotate نشده یک کوئری (تخفیف پکیج)، در غیر این صورت بدون کوئری"""
+    package_discount = None
+    if isinstance(pkg, Package):
+        annotated, package_discount = annotated_package_discount(pkg)
+        if not annotated:
+            package_discount = active_package_discounts([pkg.pk], now).get(pkg.pk)
+    return price(pkg.price, pkg.commission_rate, package_discount, discount_code)
+
+
+def quote_many(packages, now=None):
+    """قیمت یک لیست از پکیج‌ها (بدون کد تخفیف) به همان ترتیب، با حداکثر یک کوئری"""
+    discounts = {}
+    missing_ids = []
+    for pkg in packages:
+        if isinstance(pkg, Package):
+            annotated, discount = annotated_package_discount(pkg)
+            if not annotated:
+                missing_ids.append(pkg.pk)
+            elif discount is not None:
+                discounts[pkg.pk] = discount
+    if missing_ids:
+        discounts.update(active_package_discounts(missing_ids, now))
+    return [
+        price(
+            pkg.price,
+            pkg.commission_rate,
+            discounts.get(pkg.pk) if isinstance(pkg, Package) else None,
+        )
+        for pkg in packages
+    ]
@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fitness.cache import bump_version
+
+
+@receiver([post_save, post_delete], sender='discount.PackageDiscount', dispatch_uid='discount.catalog_cache_package_discount')
+def invalidate_discount_catalog(sender, **kwargs):
+    bump_version('discount')
@@ -0,0 +1,229 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from discount.models import DiscountCode, DiscountUsage, PackageDiscount
+from discount.pricing import DiscountCodeError, find_discount_code, price, quote, quote_many
+from gyms.models import Gym
+from packages.models import GroupPackage, Package
+
+
+def legacy_price(total_amount, commission_rate, package_discount_obj, discount_code_obj):
+    """محاسبه‌ی قبلی PurchaseSerializer.create (مرجع مقایسه)"""
+    commission_rate = Decimal(str(commission_rate))
+    admin_commission_before_discount = total_amount * commission_rate
+    discount_details = []
+
+    package_discount_amount = Decimal('0')
+    if package_discount_obj:
+        if package_discount_obj.discount_type == 'percent':
+            requested_percent = Decimal(str(package_discount_obj.value))
+            if requested_percent < Decimal('1'):
+                requested_percent = requested_percent * Decimal('100')
+            if package_discount_obj.source_type == 'admin':
+                max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
+                effective_percent = min(requested_percent, max_admin_percent)
+            else:
+                effective_percent = requested_percent
+            package_discount_amount = (total_amount * effective_percent) / Decimal('100')
+            discount_details.append(f"تخفیف پکیج: ({effective_percent}% از {package_discount_obj.source_type})")
+        else:
+            requested_amount = Decimal(str(package_discount_obj.value))
+            if package_discount_obj.source_type == 'admin':
+                effective_amount = min(requested_amount, admin_commission_before_discount)
+            else:
+                effective_amount = requested_amount
+            package_discount_amount = effective_amount
+            discount_details.append(f"تخفیف پکیج: ({effective_amount} تومان از {package_discount_obj.source_type})")
+
+    code_discount_amount = Decimal('0')
+    if discount_code_obj:
+        price_after_package_discount = total_amount - package_discount_amount
+        if discount_code_obj.discount_type == 'percent':
+            requested_percent = Decimal(str(discount_code_obj.value))
+            if requested_percent < Decimal('1'):
+                requested_percent = requested_percent * Decimal('100')
+            if discount_code_obj.source_type == 'admin':
+                max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
+                effective_percent = min(requested_percent, max_admin_percent)
+            else:
+                effective_percent = requested_percent
+            code_discount_amount = (price_after_package_discount * effective_percent) / Decimal('100')
+            discount_details.append(f"کد تخفیف: {discount_code_obj.code} ({effective_percent}% از {discount_code_obj.source_type})")
+        else:
+            requested_amount = Decimal(str(discount_code_obj.value))
+            if discount_code_obj.source_type == 'admin':
+                effective_amount = min(requested_amount, admin_commission_before_discount)
+            else:
+                effective_amount = requested_amount
+            code_discount_amount = effective_amount
+            discount_details.append(f"کد تخفیف: {discount_code_obj.code} ({effective_amount} تومان از {discount_code_obj.source_type})")
+
+    discount_amount = package_discount_amount + code_discount_amount
+    discount_source = None
+    if discount_code_obj:
+        discount_source = discount_code_obj.source_type
+    elif package_discount_obj:
+        discount_source = package_discount_obj.source_type
+
+    final_amount = total_amount - discount_amount
+    if final_amount < 0:
+        final_amount = Decimal('0')
+
+    if discount_source == 'admin':
+        commission_amount = admin_commission_before_discount - min(discount_amount, admin_commission_before_discount)
+        if commission_amount < 0:
+            commission_amount = Decimal('0')
+        net_amount = total_amount - admin_commission_before_discount
+    else:
+        commission_amount = admin_commission_before_discount
+        net_amount = final_amount - commission_amount
+        if net_amount < 0:
+            net_amount = Decimal('0')
+
+    return (
+        package_discount_amount, code_discount_amount, commission_amount, net_amount, final_amount,
+        tuple(discount_details),
+    )
+
+
+def _random_discount(rng, code=None):
+    if rng.random() < 0.5:
+        # درصد کامل، درصد کسری قدیمی (کمتر از 1) یا بیشتر از 100
+        value = rng.choice([
+            Decimal(rng.randint(1, 100)),
+            Decimal(rng.randint(1, 99)) / Decimal('100'),
+            Decimal(rng.randint(101, 150)),
+            Decimal(rng.randint(100, 9999)) / Decimal('100'),
+        ])
+        discount_type = 'percent'
+    else:
+        value = Decimal(rng.randint(0, 300000)).quantize(Decimal('0.01'))
+        discount_type = 'amount'
+    return SimpleNamespace(
+        discount_type=discount_type,
+        value=value,
+        source_type=rng.choice(['admin', 'club']),
+        code=code,
+    )
+
+
+class PricingEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='09120000201')
+        owner = User.objects.create_user(phone='09120000202', role='owner')
+        self.gym = Gym.objects.create(owner=owner, name='Pricing Gym', latitude=35.0, longitude=51.0)
+        self.other_gym = Gym.objects.create(owner=owner, name='Other Gym', latitude=35.0, longitude=51.0)
+        group = GroupPackage.objects.create(title='Monthly')
+        self.package = Package.objects.create(
+            gym=self.gym, group_package=group, title='Gold', gender='male',
+            price=Decimal('100000.00'), duration=30, commission_rate=0.05,
+        )
+        self.other_package = Package.objects.create(
+            gym=self.gym, group_package=group, title='Silver', gender='male',
+            price=Decimal('80000.00'), duration=30, commission_rate=0.1,
+        )
+
+    def test_matches_previous_calculation_for_random_inputs(self):
+        rng = random.Random(20240501)
+        for _ in range(2000):
+            total = Decimal(rng.randint(0, 5000000)).quantize(Decimal('0.01'))
+            commission_rate = rng.choice([0, 0.05, 0.1, 0.15, 0.2, 0.33, rng.random()])
+            package_discount = _random_discount(rng) if rng.random() < 0.6 else None
+            discount_code = _random_discount(rng, code='CODE') if rng.random() < 0.6 else None
+
+            expected = legacy_price(total, commission_rate, package_discount, discount_code)
+            result = price(total, commission_rate, package_discount, discount_code)
+
+            self.assertEqual(
+                (result.package_discount, result.code_discount, result.commission, result.net, result.final,
+                 result.details),
+                expected,
+                msg=f"{total} {commission_rate} {package_discount} {discount_code}",
+            )
+            self.assertGreaterEqual(result.final, 0)
+            self.assertGreaterEqual(result.net, 0)
+
+    def test_quote_with_code_uses_two_queries(self):
+        PackageDiscount.objects.create(package=self.package, discount_type='percent', value=10, source_type='club')
+        code = DiscountCode.objects.create(
+            code='GOLD10', discount_type='amount', value=Decimal('5000'), source_type='admin',
+            gym=self.gym, per_user_limit=2,
+        )
+        code.packages.add(self.package)
+
+        with CaptureQueriesContext(connection) as queries:
+            discount = find_discount_code(' GOLD10 ', self.package, self.user)
+            result = quote(self.package, discount_code=discount)
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(result.package_discount, Decimal('10000.00'))
+        self.assertEqual(result.code_discount, Decimal('5000'))
+        self.assertEqual(result.final, Decimal('85000.00'))
+
+    def test_find_discount_code_rejections(self):
+        DiscountCode.objects.create(code='OTHERGYM', discount_type='percent', value=5, source_type='club', gym=self.other_gym)
+        limited = DiscountCode.objects.create(code='ONCE', discount_type='percent', value=5, source_type='club', per_user_limit=1)
+        DiscountUsage.objects.create(discount=limited, user=self.user)
+        restricted = DiscountCode.objects.create(code='SILVER', discount_type='percent', value=5, source_type='club')
+        restricted.packages.add(self.other_package)
+        DiscountCode.objects.create(
+            code='EXPIRED', discount_type='percent', value=5, source_type='club',
+            end_date=timezone.now() - timedelta(days=1),
+        )
+
+        cases = {
+            'MISSING': "کد تخفیف یافت نشد",
+            'EXPIRED': "کد تخفیف معتبر نیست یا ظرفیت آن تمام شده است",
+            'OTHERGYM': "این کد برای باشگاه انتخاب‌شده معتبر نیست",
+            'SILVER': "این کد برای پکیج انتخاب‌شده معتبر نیست",
+            'ONCE': "شما مجاز به استفاده از این کد نیستید",
+        }
+        for code, message in cases.items():
+            with self.subTest(code=code), self.assertRaisesMessage(DiscountCodeError, message):
+                find_discount_code(code, self.package, self.user)
+
+        self.assertEqual(find_discount_code('SILVER', self.other_package, self.user), restricted)
+
+    def test_quote_many_prices_list_with_one_query(self):
+        PackageDiscount.objects.create(package=self.package, discount_type='percent', value=10, source_type='club')
+        PackageDiscount.objects.create(package=self.other_package, discount_type='amount', value=100000, source_type='admin')
+        packages = list(Package.objects.order_by('id'))
+
+        with self.assertNumQueries(1):
+            results = quote_many(packages)
+
+        self.assertEqual([result.final for result in results], [Decimal('90000.00'), Decimal('72000.00')])
+        self.assertEqual(results, [quote(package) for package in packages])
+
+    def test_package_list_shows_discounted_price(self):
+        PackageDiscount.objects.create(package=self.package, discount_type='percent', value=10, source_type='club')
+
+        response = APIClient().get('/api/packages/')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        prices = {item['id']: item['final_price'] for item in results}
+        self.assertEqual(prices, {self.package.id: '90000.00', self.other_package.id: '80000.00'})
+
+    def test_check_discount_code_view_uses_engine(self):
+        PackageDiscount.objects.create(package=self.package, discount_type='percent', value=10, source_type='club')
+        DiscountCode.objects.create(code='TEN', discount_type='percent', value=10, source_type='club')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/check-discount-code/', {'code': 'TEN', 'package_id': self.package.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_valid'])
+        self.assertEqual(response.data['package_discount_amount'], Decimal('10000.00'))
+        self.assertEqual(response.data['code_discount_amount'], Decimal('9000.00'))
+        self.assertEqual(response.data['final_price'], Decimal('81000.00'))
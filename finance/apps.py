@@ -7,4 +7,5 @@ class FinanceConfig(AppConfig):
     verbose_name = 'مالی'
     
     def ready(self):
+        import finance.signals
         import finance.admin
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import Callable
+
+from django.utils.dateparse import parse_date
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from finance.exports import WRITERS, Column, export_response
+from finance.models import Purchase, Transaction, TrainerWithdrawRequest, WithdrawRequest
+from .wallet import IsStaffPermission, filter_admin_purchases
+from .withdraw_request import filter_admin_withdraw_requests
+
+
+def _filter_transactions(transactions, params):
+    for field in ('status', 'type', 'wallet_id', 'trainer_wallet_id', 'admin_wallet_id', 'purchase_id'):
+        value = params.get(field)
+        if value:
+            transactions = transactions.filter(**{field: value})
+    return transactions
+
+
+def _filter_trainer_withdraw_requests(withdraw_requests, params):
+    status_filter = params.get('status')
+    if status_filter:
+        withdraw_requests = withdraw_requests.filter(status=status_filter)
+    name = params.get('name')
+    if name:
+        withdraw_requests = withdraw_requests.filter(trainer__name__icontains=name)
+    return withdraw_requests
+
+
+@dataclass(frozen=True)
+class ExportReport:
+    model: type
+    date_field: str
+    filter: Callable
+    columns: tuple
+
+    def queryset(self, params):
+        """queryset فیلترشده؛ بازه‌ی تاریخ با from و to (YYYY-MM-DD)، ValueError برای تاریخ نامعتبر"""
+        queryset = self.filter(self.model.objects.all(), params)
+        for param, lookup in (('from', 'gte'), ('to', 'lte')):
+            value = params.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    raise ValueError(f'تاریخ {param} نامعتبر است (YYYY-MM-DD)')
+                queryset = queryset.filter(**{f'{self.date_field}__date__{lookup}': day})
+        return queryset.order_by('id')
+
+
+REPORTS = {
+    'purchases': ExportReport(
+        model=Purchase,
+        date_field='purchase_date',
+        filter=filter_admin_purchases,
+        columns=(
+            Column('شناسه', 'id'),
+            Column('تلفن خریدار', 'user__phone'),
+            Column('نام خریدار', 'user__full_name'),
+            Column('نوع خرید', 'purchase_type'),
+            Column('باشگاه', 'gym__name'),
+            Column('مربی', 'trainer__name'),
+            Column('پکیج', 'package__title'),
+            Column('کد خریدار', 'buyer_code'),
+            Column('وضعیت پرداخت', 'payment_status'),
+            Column('وضعیت تایید', 'verification_status'),
+            Column('مبلغ کل', 'total_amount'),
+            Column('مبلغ نهایی', 'final_amount'),
+            Column('کمیسیون', 'commission_amount'),
+            Column('سهم باشگاه/مربی', 'net_amount'),
+            Column('کد تخفیف', 'discount_code__code'),
+            Column('کد پیگیری پرداخت', 'payment_reference_id'),
+            Column('تاریخ خرید', 'purchase_date', jalali=True),
+            Column('تاریخ انقضا', 'expire_date', jalali=True),
+            Column('تاریخ تایید', 'verified_at', jalali=True),
+        ),
+    ),
+    'transactions': ExportReport(
+        model=Transaction,
+        date_field='created_at',
+        filter=_filter_transactions,
+        columns=(
+            Column('شناسه', 'id'),
+            Column('نوع', 'type'),
+            Column('وضعیت', 'status'),
+            Column('مبلغ', 'amount'),
+            Column('تلفن صاحب کیف پول', 'wallet__owner__phone'),
+            Column('مربی', 'trainer_wallet__trainer__name'),
+            Column('کیف پول ادمین', 'admin_wallet_id'),
+            Column('خرید', 'purchase_id'),
+            Column('شناسه پرداخت', 'payment_id'),
+            Column('توضیحات', 'description'),
+            Column('تاریخ', 'created_at', jalali=True),
+        ),
+    ),
+    'withdraw-requests': ExportReport(
+        model=WithdrawRequest,
+        date_field='processed_at',
+        filter=filter_admin_withdraw_requests,
+        columns=(
+            Column('شناسه', 'id'),
+            Column('تلفن کاربر', 'user__phone'),
+            Column('نام کاربر', 'user__full_name'),
+            Column('مبلغ', 'amount'),
+            Column('وضعیت', 'status'),
+            Column('توضیحات', 'description'),
+            Column('پیام ادمین', 'admin_message'),
+            Column('بررسی توسط', 'processed_by__phone'),
+            Column('تاریخ بررسی', 'processed_at', jalali=True),
+            Column('تاریخ تکمیل', 'completed_at', jalali=True),
+        ),
+    ),
+    'trainer-withdraw-requests': ExportReport(
+        model=TrainerWithdrawRequest,
+        date_field='processed_at',
+        filter=_filter_trainer_withdraw_requests,
+        columns=(
+            Column('شناسه', 'id'),
+            Column('مربی', 'trainer__name'),
+            Column('تلفن مربی', 'trainer__user__phone'),
+            Column('مبلغ', 'amount'),
+            Column('وضعیت', 'status'),
+            Column('توضیحات', 'description'),
+            Column('پیام ادمین', 'admin_message'),
+            Column('بررسی توسط', 'processed_by__phone'),
+            Column('تاریخ بررسی', 'processed_at', jalali=True),
+            Column('تاریخ تکمیل', 'completed_at', jalali=True),
+        ),
+    ),
+}
+
+
+class AdminFinanceExportView(APIView):
+    """خروجی CSV/XLSX خریدها، تراکنش‌ها و درخواست‌های برداشت برای تیم مالی"""
+    permission_classes = [IsStaffPermission]
+
+    @extend_schema(
+        tags=['Admin Export'],
+        summary='خروجی گزارش مالی',
+        description=(
+            'report یکی از purchases، transactions، withdraw-requests و trainer-withdraw-requests و '
+            'file_type یکی از csv و xlsx است. فیلترهای هر گزارش همان فیلترهای لیست ادمین آن هستند؛ '
+            'from و to بازه‌ی تاریخ را مشخص می‌کنند. فایل به صورت stream ارسال می‌شود.'
+        ),
+        parameters=[
+            OpenApiParameter('from', str, description='از تاریخ (YYYY-MM-DD)'),
+            OpenApiParameter('to', str, description='تا تاریخ (YYYY-MM-DD)'),
+        ],
+        responses={200: bytes},
+    )
+    def get(self, request, report, file_type):
+        export = REPORTS.get(report)
+        if export is None:
+            return Response({'error': 'گزارش مورد نظر یافت نشد'}, status=status.HTTP_404_NOT_FOUND)
+        if file_type not in WRITERS:
+            return Response({'error': 'نوع فایل باید csv یا xlsx باشد'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = export.queryset(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(report, export.columns, queryset, file_type)
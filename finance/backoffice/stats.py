@@ -1,75 +1,118 @@
+from datetime import timedelta
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import permissions
+from rest_framework import permissions, status
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
-from finance.models import Purchase
+from django.utils.dateparse import parse_date
+from django.db.models import Sum
+from finance.client.gateway import gateway_metrics
+from finance.rollups import sales_between
+
+
+def _date_range(request, default_start, default_end):
+    """بازه‌ی from/to (YYYY-MM-DD) از query params؛ ValueError برای تاریخ نامعتبر"""
+    dates = []
+    for param, default in (('from', default_start), ('to', default_end)):
+        value = request.query_params.get(param)
+        if not value:
+            dates.append(default)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'تاریخ {param} نامعتبر است (YYYY-MM-DD)')
+        dates.append(day)
+    return dates
 
 
 class MonthlyStatsAPIView(APIView):
-    """API برای نمایش آمار ماهانه - باشگاه و مربی برتر"""
+    """
+    API برای نمایش آمار ماهانه - باشگاه و مربی برتر. پیش‌فرض ماه جاری است و با from/to هر
+    بازه‌ای قابل انتخاب است؛ اعداد از جدول DailySales خوانده می‌شوند (finance/rollups.py).
+    """
     permission_classes = [permissions.IsAdminUser]
-    
+
     def get(self, request):
-        now = timezone.now()
-        current_month = now.month
-        current_year = now.year
-        
-        # محاسبه باشگاه برتر ماه
-        gym_stats = Purchase.objects.filter(
-            payment_status='paid',
-            purchase_date__month=current_month,
-            purchase_date__year=current_year
-        ).values(
-            'package__gym__id',
-            'package__gym__name'
+        today = timezone.localdate()
+        try:
+            start, end = _date_range(request, today.replace(day=1), today)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # محاسبه باشگاه برتر بازه
+        gym_stats = sales_between(start, end, 'gym').values(
+            'gym_id',
+            'gym__name'
         ).annotate(
-            total_sales=Sum('final_amount'),
-            total_count=Count('id')
-        ).order_by('-total_sales')[:10]
-        
-        # محاسبه مربی برتر ماه (فعلاً خالی - بعد از اضافه شدن پکیج مربی به Purchase)
-        trainer_stats = []
-        
+            total_sales=Sum('gross'),
+            total_count=Sum('paid_count')
+        ).filter(total_count__gt=0).order_by('-total_sales')[:10]
+
+        # محاسبه مربی برتر بازه
+        trainer_stats = sales_between(start, end, 'trainer').values(
+            'trainer_id',
+            'trainer__name'
+        ).annotate(
+            total_sales=Sum('gross'),
+            total_count=Sum('paid_count')
+        ).filter(total_count__gt=0).order_by('-total_sales')[:10]
+
         return Response({
-            'current_month': current_month,
-            'current_year': current_year,
-            'gym_stats': list(gym_stats),
-            'trainer_stats': trainer_stats,
+            'current_month': end.month,
+            'current_year': end.year,
+            'from_date': start.isoformat(),
+            'to_date': end.isoformat(),
+            # کلیدهای package__gym__* برای سازگاری با خروجی قبلی حفظ شده‌اند
+            'gym_stats': [
+                {
+                    'package__gym__id': row['gym_id'],
+                    'package__gym__name': row['gym__name'],
+                    'total_sales': row['total_sales'],
+                    'total_count': row['total_count'],
+                }
+                for row in gym_stats
+            ],
+            'trainer_stats': [
+                {
+                    'trainer_id': row['trainer_id'],
+                    'trainer_name': row['trainer__name'],
+                    'total_sales': row['total_sales'],
+                    'total_count': row['total_count'],
+                }
+                for row in trainer_stats
+            ],
         })
 
 
 class GymGenderSalesAPIView(APIView):
-    """API برای نمایش فروش باشگاه‌ها بر اساس gender در یک ماه گذشته"""
+    """API برای نمایش فروش باشگاه‌ها بر اساس gender در یک ماه گذشته (یا بازه‌ی from/to)"""
     permission_classes = [permissions.IsAdminUser]
-    
+
     def get(self, request):
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        now = timezone.now()
-        one_month_ago = now - timedelta(days=30)
-        
+        today = timezone.localdate()
+        one_month_ago = today - timedelta(days=30)
+        try:
+            start, end = _date_range(request, one_month_ago, today)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # محاسبه فروش بر اساس gender برای هر باشگاه
-        gym_gender_stats = Purchase.objects.filter(
-            payment_status='paid',
-            purchase_date__gte=one_month_ago
-        ).values(
-            'package__gym__id',
-            'package__gym__name',
-            'package__gender'
+        gym_gender_stats = sales_between(start, end, 'gym').values(
+            'gym_id',
+            'gym__name',
+            'gender'
         ).annotate(
-            total_sales=Sum('final_amount'),
-            total_count=Count('id')
-        ).order_by('package__gym__id', 'package__gender')
-        
+            total_sales=Sum('gross'),
+            total_count=Sum('paid_count')
+        ).order_by('gym_id', 'gender')
+
         # گروه‌بندی نتایج بر اساس باشگاه
         result = {}
         for stat in gym_gender_stats:
-            gym_id = stat['package__gym__id']
-            gym_name = stat['package__gym__name']
-            gender = stat['package__gender']
-            
+            gym_id = stat['gym_id']
+            gym_name = stat['gym__name']
+            gender = stat['gender']
+
             if gym_id not in result:
                 result[gym_id] = {
                     'gym_id': gym_id,
@@ -79,17 +122,25 @@ class GymGenderSalesAPIView(APIView):
                     'female_sales': 0,
                     'female_count': 0,
                 }
-            
+
             if gender == 'male':
                 result[gym_id]['male_sales'] += float(stat['total_sales'] or 0)
                 result[gym_id]['male_count'] += stat['total_count']
             elif gender == 'female':
                 result[gym_id]['female_sales'] += float(stat['total_sales'] or 0)
                 result[gym_id]['female_count'] += stat['total_count']
-        
+
         return Response({
-            'period': 'last_30_days',
-            'from_date': one_month_ago.isoformat(),
-            'to_date': now.isoformat(),
+            'period': 'last_30_days' if (start, end) == (one_month_ago, today) else 'custom',
+            'from_date': start.isoformat(),
+            'to_date': end.isoformat(),
             'gym_gender_stats': list(result.values()),
         })
+
+
+class PaymentGatewayMetricsAPIView(APIView):
+    """تعداد تماس، خطا، رد شده توسط circuit breaker و زمان پاسخ درگاه پرداخت در همین process"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(gateway_metrics())
@@ -1,7 +1,8 @@
 from django.urls import path
 from .wallet import *
 from .withdraw_request import *
-from .stats import MonthlyStatsAPIView, GymGenderSalesAPIView
+from .stats import MonthlyStatsAPIView, GymGenderSalesAPIView, PaymentGatewayMetricsAPIView
+from .export import AdminFinanceExportView
 
 
 urlpatterns = [
@@ -24,7 +25,7 @@ urlpatterns = [
     path('purchases/<int:pk>/', AdminPurchaseDetailView.as_view(), name='admin-purchase-detail'),
     
     # تراکنش‌های کیف پول ادمین
-    path('wallet/transactions/', AdminWalletTransactionsView.as_view(), name='admin-wallet-transactions'),
+    path('wallet/transactions/', AdminOwnWalletTransactionsView.as_view(), name='admin-own-wallet-transactions'),
 
     path('withdraw-request/<int:pk>/', AdminWithdrawRequestView.as_view(), name='admin-withdraw-request'),
     
@@ -35,10 +36,16 @@ urlpatterns = [
     # جزئیات درخواست برداشت خاص
     path('withdraw-requests-detail/<int:pk>/', AdminWithdrawRequestDetailView.as_view(), name='admin-withdraw-request-detail'),
     
+    # خروجی CSV/XLSX گزارش‌های مالی (مثلا exports/purchases.csv)
+    path('exports/<slug:report>.<slug:file_type>', AdminFinanceExportView.as_view(), name='admin-finance-export'),
+    
     # آمار ماهانه - باشگاه و مربی برتر
     path('monthly-stats/', MonthlyStatsAPIView.as_view(), name='admin-monthly-stats'),
     
     # آمار فروش بر اساس gender در یک ماه گذشته
     path('gym-gender-sales/', GymGenderSalesAPIView.as_view(), name='admin-gym-gender-sales'),
 
+    # زمان پاسخ، خطاها و وضعیت circuit breaker درگاه پرداخت
+    path('gateway-metrics/', PaymentGatewayMetricsAPIView.as_view(), name='admin-gateway-metrics'),
+
 ]
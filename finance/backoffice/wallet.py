@@ -1,12 +1,15 @@
 from rest_framework.views import APIView
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema
 from decimal import Decimal
 from django.db import transaction
+from finance.ledger import get_admin_wallet
 from finance.models import Wallet, Transaction, Purchase,AdminWallet
 from finance.serializers import *
+from fitness.pagination import keyset_ordering, paginated_response
 from accounts.models import User
 
 
@@ -28,12 +31,8 @@ class AdminWalletListView(APIView):
     )
     def get(self, request):
         try:
-            admin_wallet = AdminWallet.objects.get(id=1)
-            serializer = AdminWalletSerializer(admin_wallet)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except AdminWallet.DoesNotExist:
-            # اگر کیف پول ادمین وجود نداشت، آن را ایجاد می‌کنیم
-            admin_wallet = AdminWallet.objects.create(id=1, balance=0)
+            # اگر کیف پول ادمین وجود نداشت ساخته می‌شود؛ موجودی = سطر اصلی + مجموع shardها
+            admin_wallet = get_admin_wallet()
             serializer = AdminWalletSerializer(admin_wallet)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -181,14 +180,14 @@ class AdminWalletTransactionsView(APIView):
     def get(self, request, pk):
         try:
             wallet = Wallet.objects.get(pk=pk)
-            transactions = wallet.transactions.all().order_by('-created_at')
-            serializer = TransactionSerializer(transactions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, wallet.transactions.all(), TransactionSerializer, view=self)
         except Wallet.DoesNotExist:
             return Response(
                 {'error': 'کیف پول مورد نظر یافت نشد'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت تراکنش‌ها: {str(e)}'}, 
@@ -218,9 +217,10 @@ class AdminWalletSearchView(APIView):
             if name:
                 wallets = wallets.filter(owner__full_name__icontains=name)
             
-            serializer = WalletSerializer(wallets, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, wallets, WalletSerializer, view=self)
             
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در جستجوی کیف پول‌ها: {str(e)}'}, 
@@ -228,6 +228,36 @@ class AdminWalletSearchView(APIView):
             )
 
 
+def filter_admin_purchases(purchases, params):
+    """فیلترهای لیست خریدهای ادمین؛ خروجی CSV/XLSX خریدها هم از همین استفاده می‌کند"""
+    # فیلتر بر اساس وضعیت پرداخت
+    payment_status = params.get('payment_status')
+    if payment_status:
+        purchases = purchases.filter(payment_status=payment_status)
+
+    # فیلتر بر اساس وضعیت تایید
+    verification_status = params.get('verification_status')
+    if verification_status:
+        purchases = purchases.filter(verification_status=verification_status)
+
+    # جستجو بر اساس شماره تلفن کاربر
+    phone = params.get('phone')
+    if phone:
+        purchases = purchases.filter(user__phone__icontains=phone)
+
+    # جستجو بر اساس نام کاربر
+    name = params.get('name')
+    if name:
+        purchases = purchases.filter(user__full_name__icontains=name)
+
+    # جستجو بر اساس buyer_code
+    buyer_code = params.get('buyer_code')
+    if buyer_code:
+        purchases = purchases.filter(buyer_code__icontains=buyer_code)
+
+    return purchases
+
+
 class AdminPurchaseListView(APIView):
     """لیست همه purchase ها برای admin"""
     permission_classes = [IsStaffPermission]
@@ -241,38 +271,20 @@ class AdminPurchaseListView(APIView):
         try:
             purchases = Purchase.objects.select_related('user', 'package', 'verified_by').all()
             
-            # فیلتر بر اساس وضعیت پرداخت
-            payment_status = request.query_params.get('payment_status')
-            if payment_status:
-                purchases = purchases.filter(payment_status=payment_status)
-            
-            # فیلتر بر اساس وضعیت تایید
-            verification_status = request.query_params.get('verification_status')
-            if verification_status:
-                purchases = purchases.filter(verification_status=verification_status)
+            purchases = filter_admin_purchases(purchases, request.query_params)
             
-            # جستجو بر اساس شماره تلفن کاربر
-            phone = request.query_params.get('phone')
-            if phone:
-                purchases = purchases.filter(user__phone__icontains=phone)
-            
-            # جستجو بر اساس نام کاربر
-            name = request.query_params.get('name')
-            if name:
-                purchases = purchases.filter(user__full_name__icontains=name)
-            
-            # جستجو بر اساس buyer_code
-            buyer_code = request.query_params.get('buyer_code')
-            if buyer_code:
-                purchases = purchases.filter(buyer_code__icontains=buyer_code)
-            
-            # مرتب‌سازی
-            ordering = request.query_params.get('ordering', '-purchase_date')
-            purchases = purchases.order_by(ordering)
+            # مرتب‌سازی؛ فقط ترتیب‌هایی که با cursor روی id صفحه‌بندی می‌شوند
+            ordering = keyset_ordering(request.query_params.get('ordering'), default='-purchase_date')
+            if ordering is None:
+                return Response(
+                    {'error': 'ordering فقط می‌تواند id یا purchase_date (صعودی یا نزولی) باشد'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            serializer = PurchaseSerializer(purchases, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, purchases, PurchaseSerializer, view=self, ordering=ordering)
             
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت لیست خریدها: {str(e)}'}, 
@@ -306,7 +318,7 @@ class AdminPurchaseDetailView(APIView):
             )
 
 
-class AdminWalletTransactionsView(APIView):
+class AdminOwnWalletTransactionsView(APIView):
     """تراکنش‌های کیف پول ادمین"""
     permission_classes = [IsStaffPermission]
     
@@ -318,14 +330,14 @@ class AdminWalletTransactionsView(APIView):
     def get(self, request):
         try:
             admin_wallet = AdminWallet.objects.get(id=1)
-            transactions = admin_wallet.transactions.all().order_by('-created_at')
-            serializer = TransactionSerializer(transactions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, admin_wallet.transactions.all(), TransactionSerializer, view=self)
         except AdminWallet.DoesNotExist:
             return Response(
                 {'error': 'کیف پول ادمین یافت نشد'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت تراکنش‌ها: {str(e)}'}, 
@@ -1,9 +1,11 @@
 from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema
 from ..serializers import *
 from django.db import transaction
+from fitness.pagination import keyset_ordering, paginated_response
 
 
 @extend_schema(tags=['Admin Withdraw Request'])
@@ -58,6 +60,26 @@ class IsStaffPermission(permissions.BasePermission):
         return request.user and request.user.is_authenticated and request.user.is_staff
 
 
+def filter_admin_withdraw_requests(withdraw_requests, params):
+    """فیلترهای لیست درخواست‌های برداشت ادمین؛ خروجی CSV/XLSX هم از همین استفاده می‌کند"""
+    # فیلتر بر اساس وضعیت
+    status_filter = params.get('status')
+    if status_filter:
+        withdraw_requests = withdraw_requests.filter(status=status_filter)
+
+    # جستجو بر اساس شماره تلفن کاربر
+    phone = params.get('phone')
+    if phone:
+        withdraw_requests = withdraw_requests.filter(user__phone__icontains=phone)
+
+    # جستجو بر اساس نام کاربر
+    name = params.get('name')
+    if name:
+        withdraw_requests = withdraw_requests.filter(user__full_name__icontains=name)
+
+    return withdraw_requests
+
+
 class AdminWithdrawRequestListView(APIView):
     """لیست همه درخواست‌های برداشت برای admin"""
     permission_classes = [IsStaffPermission]
@@ -71,28 +93,20 @@ class AdminWithdrawRequestListView(APIView):
         try:
             withdraw_requests = WithdrawRequest.objects.select_related('user', 'wallet__owner').all()
             
-            # فیلتر بر اساس وضعیت
-            status_filter = request.query_params.get('status')
-            if status_filter:
-                withdraw_requests = withdraw_requests.filter(status=status_filter)
+            withdraw_requests = filter_admin_withdraw_requests(withdraw_requests, request.query_params)
             
-            # جستجو بر اساس شماره تلفن کاربر
-            phone = request.query_params.get('phone')
-            if phone:
-                withdraw_requests = withdraw_requests.filter(user__phone__icontains=phone)
-            
-            # جستجو بر اساس نام کاربر
-            name = request.query_params.get('name')
-            if name:
-                withdraw_requests = withdraw_requests.filter(user__full_name__icontains=name)
-            
-            # مرتب‌سازی
-            ordering = request.query_params.get('ordering', '-id')
-            withdraw_requests = withdraw_requests.order_by(ordering)
+            # مرتب‌سازی؛ فقط ترتیب‌هایی که با cursor روی id صفحه‌بندی می‌شوند
+            ordering = keyset_ordering(request.query_params.get('ordering'))
+            if ordering is None:
+                return Response(
+                    {'error': 'ordering فقط می‌تواند id یا -id باشد'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            serializer = WithdrawRequestSerializer(withdraw_requests, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, withdraw_requests, WithdrawRequestSerializer, view=self, ordering=ordering)
             
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت لیست درخواست‌های برداشت: {str(e)}'}, 
@@ -0,0 +1,99 @@
+"""
+کد خریدار بدون جستجو در دیتابیس.
+
+کد هر خرید از id همان خرید ساخته می‌شود: id با یک جایگشت کلیددار (شبکه‌ی Feistel روی
+ارقام دهدهی) به یک عدد هم‌طول نگاشت می‌شود و یک رقم کنترل Damm به انتهایش اضافه می‌شود.
+چون جایگشت یک‌به‌یک است دو خرید هیچ‌وقت کد یکسان نمی‌گیرند و برخلاف روش قبلی (انتخاب تصادفی و
+exists() تا پیدا شدن کد آزاد) هزینه‌ی ساخت کد به پر بودن فضای کدها بستگی ندارد.
+
+فضای کدها دوره به دوره بزرگ می‌شود: 10^6 خرید اول بدنه‌ی ۶ رقمی (کد ۷ رقمی)، 10^8 خرید بعدی
+بدنه‌ی ۸ رقمی و ... ؛ طول متفاوت یعنی کدهای دوره‌های مختلف با هم برخورد ندارند. کدهای ۶ رقمی
+قدیمی (بدون رقم کنترل) هم همچنان معتبرند.
+
+BUYER_CODE_KEY (پیش‌فرض SECRET_KEY) نباید بعد از صدور کدها عوض شود. اگر با این حال کدی تکراری
+شد (مثلاً کلید عوض شده)، خرید با version بالاتر کد دیگری می‌گیرد: کلید دیگر و بدنه‌ی بلندتر.
+"""
+import hashlib
+import hmac
+from functools import lru_cache
+
+from django.conf import settings
+
+BASE_WIDTH = 6
+LEGACY_LENGTH = 6
+ROUNDS = 4
+
+# جدول quasigroup الگوریتم Damm: همه‌ی خطاهای تک رقمی و جابه‌جایی ارقام مجاور را پیدا می‌کند
+_DAMM = (
+    (0, 3, 1, 7, 5, 9, 8, 6, 4, 2),
+    (7, 0, 9, 2, 1, 5, 4, 8, 6, 3),
+    (4, 2, 0, 6, 8, 7, 1, 3, 5, 9),
+    (1, 7, 5, 0, 9, 8, 3, 4, 2, 6),
+    (6, 1, 2, 3, 0, 4, 5, 9, 7, 8),
+    (3, 6, 7, 4, 2, 0, 9, 5, 8, 1),
+    (5, 8, 6, 9, 7, 2, 0, 1, 3, 4),
+    (8, 9, 4, 5, 3, 6, 2, 0, 1, 7),
+    (9, 4, 3, 8, 6, 1, 7, 2, 0, 5),
+    (2, 5, 8, 1, 4, 3, 6, 7, 9, 0),
+)
+
+
+def damm_digit(digits):
+    interim = 0
+    for digit in digits:
+        interim = _DAMM[interim][int(digit)]
+    return interim
+
+
+@lru_cache(maxsize=8)
+def _key(secret, version=0):
+    if version:
+        return hashlib.sha256(f'buyer-code:v{version}:{secret}'.encode()).digest()
+    return hashlib.sha256(f'buyer-code:{secret}'.encode()).digest()
+
+
+def _round_value(key, half, index, value):
+    digest = hmac.new(key, f'{half}:{index}:{value}'.encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big') % 10 ** half
+
+
+def permute(number, width, key):
+    """جایگشت کلیددار روی [0, 10**width)؛ width زوج است"""
+    half = width // 2
+    modulus = 10 ** half
+    left, right = divmod(number, modulus)
+    for index in range(ROUNDS):
+        left, right = right, (left + _round_value(key, half, index, right)) % modulus
+    return left * modulus + right
+
+
+def _namespace(sequence):
+    """(طول بدنه، شماره داخل دوره) برای شماره‌ی ترتیبی sequence"""
+    width, start = BASE_WIDTH, 0
+    while sequence >= start + 10 ** width:
+        start += 10 ** width
+        width += 2
+    return width, sequence - start
+
+
+def generate_buyer_code(purchase_id, version=0):
+    """
+    کد خریدار یکتا برای خرید با این id؛ بدون هیچ query. version فقط بعد از برخورد با یک کد
+    موجود بالا می‌رود و هر نسخه دو رقم به بدنه اضافه می‌کند.
+    """
+    width, offset = _namespace(purchase_id)
+    width += 2 * version
+    key = _key(settings.BUYER_CODE_KEY or settings.SECRET_KEY, version)
+    body = str(permute(offset, width, key)).zfill(width)
+    return f'{body}{damm_digit(body)}'
+
+
+def is_valid_buyer_code(code):
+    """بررسی شکل کد و رقم کنترل بدون دیتابیس؛ کدهای ۶ رقمی قدیمی رقم کنترل ندارند"""
+    code = str(code).strip()
+    if not code.isascii() or not code.isdigit():
+        return False
+    if len(code) == LEGACY_LENGTH:
+        return True
+    body_width = len(code) - 1
+    return body_width >= BASE_WIDTH and body_width % 2 == 0 and damm_digit(code) == 0
@@ -1,9 +1,27 @@
+"""
+ارتباط با درگاه زرین‌پال (REST v4).
+
+get_zarinpal_client یک کلاینت مشترک در هر process برمی‌گرداند که روی یک requests.Session با
+connection pool و keep-alive کار می‌کند، پس هر پرداخت هزینه‌ی اتصال و TLS handshake جدید ندارد.
+اگر درگاه پشت سر هم خطا بدهد circuit breaker باز می‌شود و تا PAYMENT_GATEWAY_BREAKER_RESET
+ثانیه درخواست‌ها بدون تماس با درگاه با PaymentGatewayError رد می‌شوند. زمان و خطای هر تماس
+در gateway_metrics() جمع می‌شود.
+"""
+import logging
+import threading
+import time
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Any
 
+import requests
 from django.conf import settings
-from zarinpal import Config, ZarinPal
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_BASE_URL = 'https://payment.zarinpal.com'
+SANDBOX_BASE_URL = 'https://sandbox.zarinpal.com'
 
 
 class PaymentGatewayError(Exception):
@@ -24,17 +42,207 @@ class PaymentVerificationResult:
     raw_response: dict[str, Any]
 
 
-def get_zarinpal_client() -> ZarinPal:
-    merchant_id = getattr(settings, 'PAYMENT_GATEWAY_MERCHANT_ID', '').strip()
+class CircuitBreaker:
+    """
+    بعد از failure_threshold خطای پشت سر هم باز می‌شود؛ بعد از reset_timeout ثانیه فقط یک
+    درخواست آزمایشی (half-open) عبور می‌کند و موفقیت آن breaker را می‌بندد.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+
+class GatewayMetrics:
+    """شمارنده‌های درون process برای هر عملیات درگاه (request / verify)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def record(self, operation, latency=None, error=None):
+        with self._lock:
+            stats = self._operations.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'rejected': 0, 'total_latency': 0.0, 'max_latency': 0.0,
+            })
+            if error == 'circuit_open':
+                stats['rejected'] += 1
+                return
+            stats['calls'] += 1
+            if error:
+                stats['errors'] += 1
+            if latency is not None:
+                stats['total_latency'] += latency
+                stats['max_latency'] = max(stats['max_latency'], latency)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                operation: {
+                    **stats,
+                    'avg_latency': stats['total_latency'] / stats['calls'] if stats['calls'] else 0.0,
+                }
+                for operation, stats in self._operations.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+_metrics = GatewayMetrics()
+
+
+class ZarinpalClient:
+    """کلاینت REST زرین‌پال با connection pool مشترک، timeout و circuit breaker"""
+
+    def __init__(self, merchant_id, base_url=None, sandbox=False, timeout=None, pool_size=10, breaker=None,
+                 metrics=None):
+        self.merchant_id = merchant_id
+        self.base_url = (base_url or (SANDBOX_BASE_URL if sandbox else PRODUCTION_BASE_URL)).rstrip('/')
+        # (connect, read) ثانیه
+        self.timeout = timeout or (3, 10)
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or _metrics
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _post(self, operation, path, payload):
+        if not self.breaker.allow():
+            self.metrics.record(operation, error='circuit_open')
+            raise PaymentGatewayError('Payment gateway is temporarily unavailable')
+
+        started = time.monotonic()
+        try:
+            response = self.session.post(
+                f'{self.base_url}{path}',
+                json={'merchant_id': self.merchant_id, **payload},
+                headers={'Accept': 'application/json'},
+                timeout=self.timeout,
+            )
+            # خطاهای 4xx پاسخ معتبر درگاه هستند (مثلا پرداخت لغوشده) و کد آن‌ها بررسی می‌شود
+            if response.status_code >= 500:
+                raise PaymentGatewayError(f'Payment gateway returned HTTP {response.status_code}')
+            try:
+                data = response.json()
+            except ValueError as exc:
+                raise PaymentGatewayError('Payment gateway returned an invalid response') from exc
+        except (requests.RequestException, PaymentGatewayError) as exc:
+            latency = time.monotonic() - started
+            self.breaker.record_failure()
+            self.metrics.record(operation, latency, error=type(exc).__name__)
+            logger.warning(f"Zarinpal {operation} failed after {latency:.3f}s: {exc}")
+            if isinstance(exc, PaymentGatewayError):
+                raise
+            raise PaymentGatewayError(f'Payment {operation} failed: {exc}') from exc
+
+        latency = time.monotonic() - started
+        self.breaker.record_success()
+        self.metrics.record(operation, latency)
+        logger.info(f"Zarinpal {operation} answered in {latency:.3f}s")
+        return data
+
+    def request(self, payload):
+        return self._post('request', '/pg/v4/payment/request.json', payload)
+
+    def verify(self, payload):
+        return self._post('verify', '/pg/v4/payment/verify.json', payload)
+
+    def payment_url(self, authority):
+        return f'{self.base_url}/pg/StartPay/{authority}'
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def gateway_metrics():
+    """آمار تماس‌های درگاه در همین process و وضعیت circuit breaker کلاینت مشترک"""
+    client = _client
+    return {
+        'circuit_state': client.breaker.state if client is not None else 'closed',
+        'operations': _metrics.snapshot(),
+    }
+
+
+def _client_settings():
+    timeout = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUT', 10)
+    return (
+        getattr(settings, 'PAYMENT_GATEWAY_MERCHANT_ID', '').strip(),
+        getattr(settings, 'PAYMENT_GATEWAY_BASE_URL', ''),
+        getattr(settings, 'PAYMENT_GATEWAY_SANDBOX', False),
+        (getattr(settings, 'PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3), timeout),
+        getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 10),
+        getattr(settings, 'PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5),
+        getattr(settings, 'PAYMENT_GATEWAY_BREAKER_RESET', 30),
+    )
+
+
+def get_zarinpal_client() -> ZarinpalClient:
+    """کلاینت مشترک process؛ با تغییر تنظیمات درگاه دوباره ساخته می‌شود"""
+    global _client, _client_key
+
+    key = _client_settings()
+    merchant_id, base_url, sandbox, timeout, pool_size, threshold, reset = key
     if not merchant_id:
         raise PaymentGatewayError('Payment gateway merchant id is not configured')
 
-    config = Config(
-        merchant_id=merchant_id,
-        access_token=getattr(settings, 'PAYMENT_GATEWAY_ACCESS_TOKEN', None),
-        sandbox=getattr(settings, 'PAYMENT_GATEWAY_SANDBOX', False),
-    )
-    return ZarinPal(config)
+    with _client_lock:
+        if _client is None or _client_key != key:
+            if _client is not None:
+                _client.close()
+            _client = ZarinpalClient(
+                merchant_id,
+                base_url=base_url or None,
+                sandbox=sandbox,
+                timeout=timeout,
+                pool_size=pool_size,
+                breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=reset),
+            )
+            _client_key = key
+        return _client
 
 
 def _normalize_amount(amount: Any) -> int:
@@ -103,10 +311,7 @@ def request_payment(*, amount, description, callback_url, metadata=None):
     if metadata:
         payload['metadata'] = metadata
 
-    try:
-        response = client.payments.create(payload)
-    except Exception as exc:
-        raise PaymentGatewayError(f'Payment request failed: {exc}') from exc
+    response = client.request(payload)
 
     if not isinstance(response, dict):
         raise PaymentGatewayError('Payment gateway returned an invalid response')
@@ -122,7 +327,7 @@ def request_payment(*, amount, description, callback_url, metadata=None):
     if not authority:
         raise PaymentGatewayError('Payment gateway did not return an authority code')
 
-    payment_url = client.payments.generate_payment_url(authority)
+    payment_url = client.payment_url(authority)
     return PaymentRequestResult(
         authority=authority,
         payment_url=payment_url,
@@ -137,10 +342,7 @@ def verify_payment(*, amount, authority):
         'authority': authority,
     }
 
-    try:
-        response = client.verifications.verify(payload)
-    except Exception as exc:
-        raise PaymentGatewayError(f'Payment verification failed: {exc}') from exc
+    response = client.verify(payload)
 
     if not isinstance(response, dict):
         raise PaymentGatewayError('Payment gateway returned an invalid response')
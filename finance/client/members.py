@@ -1,12 +1,16 @@
-from django.db.models import Q
+from django.db.models import Case, F, Max, Q, Value, When, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
 from rest_framework import permissions
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from finance.models import Purchase
 from finance.serializers import GymMemberSerializer
+from packages.models import Package
+from trainers.models import TrainerPackage
 
 
 class IsOwnerOrAdminUser(permissions.BasePermission):
@@ -18,17 +22,65 @@ class IsOwnerOrAdminUser(permissions.BasePermission):
         )
 
 
+class MemberCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-purchase_date', '-id')
+
+
+def package_title_q(text):
+    """فیلتر عنوان پکیج روی content_object و فیلد قدیمی package بدون resolve کردن GenericForeignKey"""
+    return (
+        Q(purchase_type='gym', object_id__in=Package.objects.filter(title__icontains=text).values('pk'))
+        | Q(purchase_type='trainer', object_id__in=TrainerPackage.objects.filter(title__icontains=text).values('pk'))
+        | Q(object_id__isnull=True, package__title__icontains=text)
+    )
+
+
+def active_membership_q(now):
+    return Q(
+        payment_status='paid',
+        verification_status='verified',
+        expire_date__isnull=False,
+        expire_date__gte=now,
+    )
+
+
+def latest_memberships(queryset, now, status=None):
+    """
+    برای هر عضو (کاربر + باشگاه یا مربی) فقط یک خرید: جدیدترین خرید فعال و اگر خرید فعالی
+    نداشت جدیدترین خرید. رتبه‌بندی با window function در دیتابیس انجام می‌شود و نتیجه
+    به صورت pk__in برگردانده می‌شود تا فیلترهای بعدی (مثل cursor) رتبه‌بندی را تغییر ندهند.
+    """
+    member = [F('user_id'), F('purchase_type'), F('gym_id'), F('trainer_id')]
+    is_active = Case(When(active_membership_q(now), then=Value(1)), default=Value(0))
+    ranked = queryset.annotate(
+        membership_rank=Window(
+            RowNumber(),
+            partition_by=member,
+            order_by=[is_active.desc(), F('purchase_date').desc(), F('id').desc()],
+        ),
+        member_is_active=Window(Max(is_active), partition_by=member),
+    ).filter(membership_rank=1)
+
+    if status == 'active':
+        ranked = ranked.filter(member_is_active=1)
+    elif status == 'inactive':
+        ranked = ranked.filter(member_is_active=0)
+
+    return Purchase.objects.filter(pk__in=ranked.values('pk'))
+
+
 @extend_schema(tags=['member'])
 class GymMemberListView(APIView):
     """لیست اعضای باشگاه و شاگردان مربی"""
     permission_classes = [IsOwnerOrAdminUser]
+    pagination_class = MemberCursorPagination
 
     def get(self, request):
         user = request.user
-        queryset = Purchase.objects.select_related(
-            'user',
-            'content_type',
-        )
+        queryset = Purchase.objects.all()
 
         user_role = getattr(user, 'role', None)
         
@@ -40,13 +92,13 @@ class GymMemberListView(APIView):
             # Owner sees only gym purchases for their gyms
             queryset = queryset.filter(
                 purchase_type='gym',
-                content_object__gym__owner=user
+                owner_user=user
             )
         elif user_role == 'trainer':
             # Trainer sees only their own trainer purchases
             queryset = queryset.filter(
                 purchase_type='trainer',
-                content_object__trainer__user=user
+                owner_user=user
             )
         else:
             return Response({'error': 'Access denied'}, status=403)
@@ -58,11 +110,11 @@ class GymMemberListView(APIView):
 
         gym_id = request.query_params.get('gym_id')
         if gym_id:
-            queryset = queryset.filter(purchase_type='gym', content_object__gym_id=gym_id)
+            queryset = queryset.filter(purchase_type='gym', gym_id=gym_id)
 
         trainer_id = request.query_params.get('trainer_id')
         if trainer_id:
-            queryset = queryset.filter(purchase_type='trainer', content_object__trainer_id=trainer_id)
+            queryset = queryset.filter(purchase_type='trainer', trainer_id=trainer_id)
 
         payment_status = request.query_params.get('payment_status')
         if payment_status:
@@ -82,9 +134,7 @@ class GymMemberListView(APIView):
 
         package_title = request.query_params.get('package_title')
         if package_title:
-            queryset = queryset.filter(
-                Q(content_object__title__icontains=package_title)
-            )
+            queryset = queryset.filter(package_title_q(package_title))
 
         buyer_code = request.query_params.get('buyer_code')
         if buyer_code:
@@ -95,54 +145,20 @@ class GymMemberListView(APIView):
             queryset = queryset.filter(
                 Q(user__phone__icontains=search)
                 | Q(user__full_name__icontains=search)
-                | Q(content_object__title__icontains=search)
+                | package_title_q(search)
                 | Q(buyer_code__icontains=search)
             )
 
-        queryset = queryset.order_by(
-            '-purchase_date',
-            '-id',
-        )
-
         now = timezone.now()
-        grouped_memberships = {}
-        for purchase in queryset:
-            # Group by user and package owner (gym or trainer)
-            if purchase.purchase_type == 'trainer':
-                pkg = purchase.get_package()
-                key = (purchase.user_id, 'trainer', pkg.trainer_id if pkg else None)
-            else:
-                pkg = purchase.get_package()
-                key = (purchase.user_id, 'gym', pkg.gym_id if pkg else None)
-            grouped_memberships.setdefault(key, []).append(purchase)
-
-        def is_active_membership(purchase):
-            return (
-                purchase.payment_status == 'paid'
-                and purchase.verification_status == 'verified'
-                and purchase.expire_date is not None
-                and purchase.expire_date >= now
-            )
-
-        latest_memberships = []
-        for purchases in grouped_memberships.values():
-            active_purchases = [purchase for purchase in purchases if is_active_membership(purchase)]
-            if active_purchases:
-                latest_memberships.append(active_purchases[0])
-            else:
-                latest_memberships.append(purchases[0])
-
         status_filter = request.query_params.get('membership_status') or request.query_params.get('status')
-
-        if status_filter in {'active', 'inactive'}:
-            filtered = []
-            for purchase in latest_memberships:
-                is_active = is_active_membership(purchase)
-                if status_filter == 'active' and is_active:
-                    filtered.append(purchase)
-                if status_filter == 'inactive' and not is_active:
-                    filtered.append(purchase)
-            latest_memberships = filtered
-
-        serializer = GymMemberSerializer(latest_memberships, many=True, context={'request': request, 'now': now})
-        return Response(serializer.data)
+        memberships = latest_memberships(queryset, now, status_filter).select_related(
+            'user',
+            'gym',
+            'trainer',
+            'package',
+        ).prefetch_related('content_object')
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(memberships, request, view=self)
+        serializer = GymMemberSerializer(page, many=True, context={'request': request, 'now': now})
+        return paginator.get_paginated_response(serializer.data)
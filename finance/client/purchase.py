@@ -1,11 +1,9 @@
-import random
 import logging
-import requests
 from datetime import timedelta
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from django.conf import settings
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
@@ -14,43 +12,27 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from finance.buyer_codes import generate_buyer_code, is_valid_buyer_code
 from finance.client.gateway import PaymentGatewayError, verify_payment
-from finance.models import AdminWallet, Purchase, Transaction, Wallet
+from finance.ledger import ADMIN_WALLET_ID, InsufficientAdminBalance, credit_admin_wallet, debit_admin_wallet
+from finance.models import PaymentCallback, Purchase, Transaction, Wallet
 from finance.serializers import PurchaseSerializer
+from notifications.sms import PURCHASE_BODY_ID, enqueue_sms
 
 # Define logger at module level so all functions can use it safely
 logger = logging.getLogger(__name__)
 
+# چند بار بعد از برخورد کد خریدار با یک کد موجود، کد نسخه‌ی بعدی امتحان شود
+BUYER_CODE_VERSIONS = 4
 
-def send_purchase_notification(phone, gym_or_trainer, package_title, buyer_code, is_trainer=False):
-    if not settings.MELIPAYAMAK_API_KEY:
-        logger.error("MELIPAYAMAK_API_KEY is not configured")
-        return {"error": "SMS API key not configured"}
-    
-    url = f"https://console.melipayamak.com/api/send/shared/{settings.MELIPAYAMAK_API_KEY}"
-
-    payload = {
-        'bodyId': '487687',
-        'to': phone,
-        'args': [gym_or_trainer or '', package_title or '', '7', buyer_code or '']
-    }
-
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        logger.info(f"SMS sent successfully to {phone}: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Failed to send SMS to {phone}: {str(e)}")
-        return {"error": str(e)}
-
-
-def generate_buyer_code():
-    while True:
-        code = ''.join(random.choices('0123456789', k=6))
-        if not Purchase.objects.filter(buyer_code=code).exists():
-            return code
+def send_purchase_notification(purchase, gym_or_trainer, package_title, buyer_code, is_trainer=False):
+    # ثبت در صف پیامک داخل همان تراکنش پرداخت؛ ارسال واقعی خارج از قفل‌ها توسط runworker
+    return enqueue_sms(
+        purchase.user.phone,
+        PURCHASE_BODY_ID,
+        [gym_or_trainer or '', package_title or '', '7', buyer_code or ''],
+        idempotency_key=f"purchase-paid:{purchase.id}",
+    )
 
 
 def _request_value(request, key, default=None):
@@ -84,22 +66,44 @@ def _get_safe_package_title(purchase):
     return 'پکیج آموزشی'
 
 
+def _save_paid_purchase(purchase):
+    """
+    ذخیره‌ی خرید پرداخت‌شده همراه کد خریدار. کدها فقط وقتی تکراری می‌شوند که BUYER_CODE_KEY
+    عوض شده باشد؛ در آن صورت به‌جای خطا دادن وسط پرداخت، نسخه‌ی بعدی کد امتحان می‌شود.
+    """
+    update_fields = ['payment_status', 'buyer_code', 'payment_reference_id']
+    if purchase.buyer_code:
+        purchase.save(update_fields=update_fields)
+        return
+    for version in range(BUYER_CODE_VERSIONS):
+        purchase.buyer_code = generate_buyer_code(purchase.id, version=version)
+        try:
+            with transaction.atomic():
+                purchase.save(update_fields=update_fields)
+            return
+        except IntegrityError:
+            taken = Purchase.objects.filter(buyer_code=purchase.buyer_code).exclude(pk=purchase.pk).exists()
+            if not taken or version == BUYER_CODE_VERSIONS - 1:
+                raise
+            logger.error(
+                "Buyer code %s for purchase %s is already taken (was BUYER_CODE_KEY rotated?); trying version %s",
+                purchase.buyer_code, purchase.id, version + 1,
+            )
+
+
 def _finalize_paid_purchase(*, purchase, transaction_obj, reference_id=None):
     from finance.models import TrainerWallet
     
-    admin_wallet, _ = AdminWallet.objects.select_for_update().get_or_create(
-        id=1,
-        defaults={'balance': 0},
-    )
-
     purchase.payment_status = 'paid'
-    purchase.buyer_code = purchase.buyer_code or generate_buyer_code()
     if reference_id:
         purchase.payment_reference_id = reference_id
 
-    purchase.save(update_fields=['payment_status', 'buyer_code', 'payment_reference_id'])
+    _save_paid_purchase(purchase)
+
+    # فقط shard این خرید به‌روز می‌شود، نه یک سطر مشترک برای همه‌ی پرداخت‌ها
+    credit_admin_wallet(purchase.final_amount, key=purchase.id)
 
-    transaction_obj.admin_wallet = admin_wallet
+    transaction_obj.admin_wallet_id = ADMIN_WALLET_ID
     transaction_obj.amount = purchase.final_amount
     transaction_obj.type = 'credit'
     transaction_obj.status = 'completed'
@@ -107,9 +111,6 @@ def _finalize_paid_purchase(*, purchase, transaction_obj, reference_id=None):
     transaction_obj.description = f"Purchase #{purchase.id} paid by {purchase.user.phone}"
     transaction_obj.save(update_fields=['admin_wallet', 'amount', 'type', 'status', 'payment_id', 'description'])
 
-    AdminWallet.objects.filter(pk=admin_wallet.pk).update(balance=F('balance') + purchase.final_amount)
-    admin_wallet.refresh_from_db(fields=['balance'])
-
     # Consume discount code if applicable
     if purchase.discount_code:
         from discount.models import DiscountCode, DiscountUsage
@@ -139,7 +140,7 @@ def _finalize_paid_purchase(*, purchase, transaction_obj, reference_id=None):
     safe_title = _get_safe_package_title(purchase)
     
     send_purchase_notification(
-        phone=purchase.user.phone,
+        purchase=purchase,
         gym_or_trainer=gym_or_trainer_name,
         package_title=safe_title,
         buyer_code=purchase.buyer_code,
@@ -270,8 +271,100 @@ class FinalizePurchaseView(APIView):
             return Response({'error': str(exc)}, status=500)
 
 
+def _callback_transaction(purchase):
+    trans = Transaction.objects.select_for_update().filter(
+        purchase=purchase,
+        status='pending',
+    ).order_by('-id').first()
+    if trans is None:
+        trans = Transaction.objects.select_for_update().filter(
+            purchase=purchase,
+        ).order_by('-id').first()
+    return trans
+
+
+def _claim_payment_callback(purchase):
+    """
+    گرفتن نوبت verify برای authority خرید با یک UPDATE شرطی؛ فقط یک درخواست True می‌گیرد.
+    نوبتی که بیشتر از PAYMENT_CALLBACK_CLAIM_TIMEOUT در verifying مانده (مثلا worker از کار
+    افتاده) دوباره قابل گرفتن است.
+    """
+    record, _ = PaymentCallback.objects.get_or_create(
+        authority=purchase.payment_authority,
+        defaults={'purchase': purchase},
+    )
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'PAYMENT_CALLBACK_CLAIM_TIMEOUT', 60))
+    # بازگشت تکراری در حین verify فقط می‌خواند و روی سطر نمی‌نویسد
+    if record.state != 'received' and not (record.state == 'verifying' and record.updated_at < now - timeout):
+        return False
+    return bool(PaymentCallback.objects.filter(
+        Q(state='received') | Q(state='verifying', updated_at__lt=now - timeout),
+        authority=purchase.payment_authority,
+    ).update(state='verifying', attempts=F('attempts') + 1, updated_at=now))
+
+
+def _release_payment_callback(authority):
+    """برگرداندن نوبت به received تا بازگشت بعدی (یا reconcile) دوباره verify کند"""
+    PaymentCallback.objects.filter(authority=authority, state='verifying').update(
+        state='received', updated_at=timezone.now(),
+    )
+
+
+def _settle_payment_callback(purchase_id, authority, verification=None, reason=None):
+    """
+    تراکنش کوتاه پایانی: قفل خرید، بررسی دوباره‌ی pending و ثبت paid یا failed.
+    verification=None یعنی پرداخت در درگاه لغو شده و reason در تراکنش ثبت می‌شود.
+    خروجی: (purchase، outcome)
+    """
+    with transaction.atomic():
+        purchase = Purchase.objects.select_for_update(of=('self',)).select_related('user').get(pk=purchase_id)
+        if purchase.payment_status == 'paid':
+            outcome = 'already_paid'
+        elif purchase.payment_status != 'pending':
+            outcome = 'failed'
+        elif verification is not None and verification.success:
+            trans = _callback_transaction(purchase)
+            if trans is None:
+                trans = Transaction.objects.create(
+                    purchase=purchase,
+                    amount=purchase.final_amount,
+                    type='credit',
+                    status='pending',
+                    description=f'Gateway payment for purchase #{purchase.id}',
+                )
+            _finalize_paid_purchase(
+                purchase=purchase,
+                transaction_obj=trans,
+                reference_id=verification.reference_id,
+            )
+            outcome = 'success'
+        else:
+            reason = reason or f'Gateway verification failed for purchase #{purchase.id}'
+            trans = _callback_transaction(purchase)
+            if trans is not None:
+                _mark_payment_failed(purchase=purchase, transaction_obj=trans, reason=reason)
+            else:
+                purchase.payment_status = 'failed'
+                purchase.save(update_fields=['payment_status'])
+            outcome = 'failed'
+
+        PaymentCallback.objects.filter(authority=authority).update(
+            state='paid' if purchase.payment_status == 'paid' else 'failed',
+            reference_id=purchase.payment_reference_id,
+            updated_at=timezone.now(),
+        )
+    return purchase, outcome
+
+
 @extend_schema(tags=['purchase'])
 class PaymentCallbackView(APIView):
+    """
+    بازگشت درگاه زرین‌پال به صورت یک state machine روی PaymentCallback:
+    authority پردازش‌شده بدون قفل پاسخ داده می‌شود، verify درگاه بیرون از تراکنش دیتابیس و
+    فقط توسط درخواستی که نوبت را گرفته صدا زده می‌شود و تغییر وضعیت در یک تراکنش کوتاه ثبت
+    می‌شود. بازگشت تکراری در حین verify پاسخ processing (202) می‌گیرد.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
@@ -282,106 +375,41 @@ class PaymentCallbackView(APIView):
             return Response({'error': 'authority is required'}, status=400)
 
         try:
-            with transaction.atomic():
-                purchase = Purchase.objects.select_for_update().select_related(
-                    'user',
-                ).get(payment_authority=authority)
-                logger.info(f"Found purchase {purchase.id} with payment_status={purchase.payment_status}, purchase_type={purchase.purchase_type}")
-                
-                if purchase.content_type_id:
-                    from django.contrib.contenttypes.models import ContentType
-                    purchase.content_type = ContentType.objects.filter(id=purchase.content_type_id).first()
-                    logger.info(f"Fetched content_type: {purchase.content_type}")
-                
-                if purchase.package_id:
-                    purchase.package = purchase._meta.get_field('package').related_model.objects.filter(
-                        id=purchase.package_id
-                    ).first()
-                    logger.info(f"Fetched gym package: {purchase.package}")
-                
-                if purchase.content_type and purchase.object_id:
-                    try:
-                        purchase.content_object = purchase.content_type.get_object_for_this_type(
-                            id=purchase.object_id
-                        )
-                        if purchase.content_object:
-                            logger.info(f"Fetched package via generic FK: {purchase.content_object}")
-                        else:
-                            logger.error(f"get_object_for_this_type returned None for content_type={purchase.content_type}, object_id={purchase.object_id}")
-                            return Response({
-                                'error': 'Package not found. Please contact support.',
-                                'authority': authority,
-                                'status': gateway_status
-                            }, status=500)
-                    except Exception as e:
-                        logger.error(f"Failed to fetch generic FK: {e}", exc_info=True)
-                        return Response({
-                            'error': 'Failed to load package. Please contact support.',
-                            'authority': authority,
-                            'status': gateway_status
-                        }, status=500)
-                
-                trans = Transaction.objects.select_for_update().filter(
-                    purchase=purchase,
-                    status='pending',
-                ).order_by('-id').first()
-                if trans is None:
-                    trans = Transaction.objects.select_for_update().filter(
-                        purchase=purchase,
-                    ).order_by('-id').first()
-                logger.info(f"Transaction: {trans.id if trans else None}")
-
-                if purchase.payment_status == 'paid':
-                    return self._respond(purchase, 'already_paid')
-                if purchase.payment_status != 'pending':
-                    return self._respond(purchase, 'failed')
-
+            # مسیر سریع: authority پردازش‌شده بدون قفل و بدون تماس با درگاه
+            record = PaymentCallback.objects.select_related('purchase__user').filter(authority=authority).first()
+            if record is not None and record.state in ('paid', 'failed'):
+                outcome = 'already_paid' if record.state == 'paid' else 'failed'
+                return self._respond(record.purchase, outcome, record.reference_id)
+
+            purchase = record.purchase if record is not None else (
+                Purchase.objects.select_related('user').get(payment_authority=authority)
+            )
+            logger.info(f"Found purchase {purchase.id} with payment_status={purchase.payment_status}, purchase_type={purchase.purchase_type}")
+            if purchase.payment_status == 'paid':
+                return self._respond(purchase, 'already_paid')
+            if purchase.payment_status != 'pending':
+                return self._respond(purchase, 'failed')
+
+            if not _claim_payment_callback(purchase):
+                logger.info(f"Payment callback for authority {authority} is already being verified")
+                return self._respond(purchase, 'processing')
+
+            try:
                 if gateway_status and gateway_status != 'OK':
-                    if trans is not None:
-                        _mark_payment_failed(
-                            purchase=purchase,
-                            transaction_obj=trans,
-                            reason=f'Payment canceled for purchase #{purchase.id}',
-                        )
-                    else:
-                        purchase.payment_status = 'failed'
-                        purchase.save(update_fields=['payment_status'])
-                    return self._respond(purchase, 'failed')
+                    purchase, outcome = _settle_payment_callback(
+                        purchase.id, authority, reason=f'Payment canceled for purchase #{purchase.id}',
+                    )
+                    return self._respond(purchase, outcome)
 
                 logger.info(f"Verifying payment with amount={purchase.final_amount}, authority={authority}")
                 verification = verify_payment(amount=purchase.final_amount, authority=authority)
                 logger.info(f"Verification result: success={verification.success}, ref_id={verification.reference_id}")
-                
-                if not verification.success:
-                    if trans is not None:
-                        _mark_payment_failed(
-                            purchase=purchase,
-                            transaction_obj=trans,
-                            reason=f'Gateway verification failed for purchase #{purchase.id}',
-                        )
-                    else:
-                        purchase.payment_status = 'failed'
-                        purchase.save(update_fields=['payment_status'])
-                    return self._respond(purchase, 'failed')
-
-                if trans is None:
-                    logger.info("Creating new transaction")
-                    trans = Transaction.objects.create(
-                        purchase=purchase,
-                        amount=purchase.final_amount,
-                        type='credit',
-                        status='pending',
-                        description=f'Gateway payment for purchase #{purchase.id}',
-                    )
-
-                logger.info("Finalizing paid purchase")
-                _finalize_paid_purchase(
-                    purchase=purchase,
-                    transaction_obj=trans,
-                    reference_id=verification.reference_id,
-                )
 
-                return self._respond(purchase, 'success', verification.reference_id)
+                purchase, outcome = _settle_payment_callback(purchase.id, authority, verification)
+            except Exception:
+                _release_payment_callback(authority)
+                raise
+            return self._respond(purchase, outcome, verification.reference_id)
 
         except Purchase.DoesNotExist:
             logger.error(f"Purchase not found for authority: {authority}")
@@ -418,6 +446,8 @@ class PaymentCallbackView(APIView):
             redirect_target = urlunparse(parsed._replace(query=urlencode(existing_query)))
             return redirect(redirect_target)
 
+        if outcome == 'processing':
+            return Response(payload, status=202)
         return Response(payload, status=200 if outcome in {'success', 'already_paid', 'failed'} else 404)
 
 
@@ -435,6 +465,11 @@ class VerifyPurchaseView(APIView):
         if not (request.user.role in ['owner', 'operator', 'trainer'] or request.user.is_staff or request.user.is_superuser):
             return Response({'error': 'Only gym owners, operators, trainers, and admins can verify purchases'}, status=403)
 
+        # کد اشتباه تایپ‌شده با رقم کنترل و بدون query رد می‌شود
+        buyer_code = str(buyer_code).strip()
+        if not is_valid_buyer_code(buyer_code):
+            return Response({'error': 'Invalid buyer code'}, status=400)
+
         try:
             with transaction.atomic():
                 # Avoid locking through nullable joins; PostgreSQL rejects FOR UPDATE
@@ -502,8 +537,9 @@ class VerifyPurchaseView(APIView):
                             'code_expire_date': code_expire_date.strftime('%Y-%m-%d %H:%M'),
                         }, status=400)
 
-                admin_wallet = AdminWallet.objects.select_for_update().get(id=1)
-                if admin_wallet.balance < purchase.net_amount:
+                try:
+                    debit_admin_wallet(purchase.net_amount, key=purchase.id)
+                except InsufficientAdminBalance:
                     return Response({'error': 'Admin wallet balance is not enough'}, status=400)
 
                 if purchase.purchase_type == 'trainer':
@@ -549,7 +585,7 @@ class VerifyPurchaseView(APIView):
                     )
 
                 Transaction.objects.create(
-                    admin_wallet=admin_wallet,
+                    admin_wallet_id=ADMIN_WALLET_ID,
                     purchase=purchase,
                     amount=purchase.net_amount,
                     type='debit',
@@ -565,17 +601,11 @@ class VerifyPurchaseView(APIView):
                     Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + purchase.net_amount)
                     wallet.refresh_from_db(fields=['balance'])
                     logger.info(f"Updated gym wallet {wallet.id} balance to: {wallet.balance}")
-                
-                AdminWallet.objects.filter(pk=admin_wallet.pk).update(balance=F('balance') - purchase.net_amount)
-                admin_wallet.refresh_from_db(fields=['balance'])
-                logger.info(f"Updated admin wallet balance to: {admin_wallet.balance}")
 
                 return Response({
                     'message': 'Purchase verified successfully',
                     'purchase': PurchaseSerializer(purchase, context={'request': request}).data,
                 }, status=200)
 
-        except AdminWallet.DoesNotExist:
-            return Response({'error': 'Admin wallet not found'}, status=500)
         except Exception as exc:
             return Response({'error': str(exc)}, status=500)
@@ -1,28 +1,37 @@
-from datetime import timedelta
-
 from django.db.models import Q
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from finance.models import Purchase
 from finance.serializers import PurchaseHistorySerializer
+from .members import package_title_q
+
+
+class PurchaseHistoryPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 @extend_schema(tags=['purchase'])
 class PurchaseHistoryView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = PurchaseHistoryPagination
 
     def get(self, request):
         user = request.user
         queryset = Purchase.objects.select_related(
             'user',
             'content_type',
+            'package',
+            'gym',
+            'trainer',
             'discount_code',
             'verified_by',
-        )
+        ).prefetch_related('content_object')
 
         user_role = getattr(user, 'role', None)
         
@@ -42,11 +51,11 @@ class PurchaseHistoryView(APIView):
 
             gym_id = request.query_params.get('gym_id')
             if gym_id:
-                queryset = queryset.filter(purchase_type='gym', content_object__gym_id=gym_id)
+                queryset = queryset.filter(purchase_type='gym', gym_id=gym_id)
 
             trainer_id = request.query_params.get('trainer_id')
             if trainer_id:
-                queryset = queryset.filter(purchase_type='trainer', content_object__trainer_id=trainer_id)
+                queryset = queryset.filter(purchase_type='trainer', trainer_id=trainer_id)
 
         # Apply filters
         purchase_type = request.query_params.get('purchase_type')
@@ -61,42 +70,21 @@ class PurchaseHistoryView(APIView):
         if verification_status:
             queryset = queryset.filter(verification_status=verification_status)
 
+        now = timezone.now()
+        queryset = queryset.with_membership_status(now)
+
         membership_status = request.query_params.get('membership_status')
-        if membership_status:
-            now = timezone.now()
-            filtered_ids = []
-            for purchase in queryset:
-                end_date = purchase.expire_date
-                if end_date is None and purchase.verified_at is not None:
-                    end_date = purchase.verified_at + timedelta(days=purchase.get_package_duration())
-
-                is_active = (
-                    purchase.payment_status == 'paid'
-                    and purchase.verification_status == 'verified'
-                    and end_date is not None
-                    and end_date >= now
-                )
-
-                if membership_status == 'active' and is_active:
-                    filtered_ids.append(purchase.id)
-                elif membership_status == 'inactive' and not is_active:
-                    filtered_ids.append(purchase.id)
-                elif membership_status == 'expired' and purchase.payment_status == 'paid' and purchase.verification_status == 'verified' and end_date is not None and end_date < now:
-                    filtered_ids.append(purchase.id)
-                elif membership_status == 'pending_payment' and purchase.payment_status != 'paid':
-                    filtered_ids.append(purchase.id)
-                elif membership_status == 'pending_verification' and purchase.payment_status == 'paid' and purchase.verification_status != 'verified':
-                    filtered_ids.append(purchase.id)
-                elif membership_status == 'rejected' and purchase.verification_status == 'rejected':
-                    filtered_ids.append(purchase.id)
-            queryset = queryset.filter(id__in=filtered_ids)
+        if membership_status == 'inactive':
+            queryset = queryset.exclude(membership_status='active')
+        elif membership_status:
+            queryset = queryset.filter(membership_status=membership_status)
 
         search = request.query_params.get('search')
         if search:
             queryset = queryset.filter(
                 Q(user__phone__icontains=search)
                 | Q(user__full_name__icontains=search)
-                | Q(content_object__title__icontains=search)
+                | package_title_q(search)
                 | Q(buyer_code__icontains=search)
                 | Q(discount_code__code__icontains=search)
             )
@@ -112,7 +100,9 @@ class PurchaseHistoryView(APIView):
         if ordering not in allowed_ordering:
             ordering = '-purchase_date'
 
-        queryset = queryset.order_by(ordering)
+        queryset = queryset.order_by(ordering) if ordering in {'id', '-id'} else queryset.order_by(ordering, '-id')
 
-        serializer = PurchaseHistorySerializer(queryset, many=True, context={'request': request, 'now': timezone.now()})
-        return Response(serializer.data)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = PurchaseHistorySerializer(page, many=True, context={'request': request, 'now': now})
+        return paginator.get_paginated_response(serializer.data)
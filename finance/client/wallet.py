@@ -1,9 +1,11 @@
 from rest_framework import permissions, status
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema
 from finance.models import Wallet
 from finance.serializers import WalletSerializer
+from fitness.pagination import paginated_response
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -87,9 +89,8 @@ class WalletListView(APIView):
         try:
             if request.user.is_staff:
                 # admin می‌تواند همه کیف پول‌ها را ببیند
-                wallets = Wallet.objects.all()
-                serializer = WalletSerializer(wallets, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                wallets = Wallet.objects.select_related('owner')
+                return paginated_response(request, wallets, WalletSerializer, view=self)
             elif request.user.role == 'owner':
                 # owner فقط کیف پول خودش را می‌بیند (به صورت آبجکت واحد)
                 wallet = Wallet.objects.filter(owner=request.user).first()
@@ -106,6 +107,8 @@ class WalletListView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت اطلاعات کیف پول: {str(e)}'},
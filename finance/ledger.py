@@ -0,0 +1,87 @@
+"""
+موجودی کیف پول ادمین به صورت shard شده.
+
+هر پرداخت یا تایید خرید فقط سطر AdminWalletShard مربوط به خودش (id خرید % تعداد shardها) را
+با F() به‌روز می‌کند؛ پس پرداخت‌های همزمان دیگر پشت قفل یک سطر (AdminWallet id=1) صف نمی‌کشند.
+موجودی واقعی = AdminWallet.balance + مجموع shardها (AdminWallet.total_balance).
+
+برداشت اول فقط از shard خودش با شرط balance >= amount انجام می‌شود؛ اگر آن shard کافی نبود،
+سطر کیف پول و همه‌ی shardها به ترتیب index قفل و از مجموعشان برداشته می‌شود، پس موجودی
+هیچ‌وقت منفی نمی‌شود (CheckConstraint روی هر سطر هم همین را تضمین می‌کند).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from finance.models import AdminWallet, AdminWalletShard
+
+ADMIN_WALLET_ID = 1
+
+
+class InsufficientAdminBalance(Exception):
+    pass
+
+
+def shard_count():
+    return max(1, getattr(settings, 'ADMIN_WALLET_SHARDS', 8))
+
+
+def shard_index(key):
+    return key % shard_count()
+
+
+def get_admin_wallet(wallet_id=ADMIN_WALLET_ID):
+    """کیف پول ادمین به همراه مجموع shardها (برای total_balance بدون کوئری اضافه)"""
+    AdminWallet.objects.get_or_create(id=wallet_id, defaults={'balance': 0})
+    return AdminWallet.objects.annotate(shards_total=Sum('shards__balance')).get(id=wallet_id)
+
+
+def credit_admin_wallet(amount, key, wallet_id=ADMIN_WALLET_ID):
+    shard = AdminWalletShard.objects.filter(wallet_id=wallet_id, index=shard_index(key))
+    if not shard.update(balance=F('balance') + amount):
+        AdminWallet.objects.get_or_create(id=wallet_id, defaults={'balance': 0})
+        AdminWalletShard.objects.get_or_create(wallet_id=wallet_id, index=shard_index(key))
+        shard.update(balance=F('balance') + amount)
+
+
+def debit_admin_wallet(amount, key, wallet_id=ADMIN_WALLET_ID):
+    """برداشت از کیف پول ادمین؛ اگر مجموع موجودی کافی نباشد InsufficientAdminBalance"""
+    own_index = shard_index(key)
+    if AdminWalletShard.objects.filter(
+        wallet_id=wallet_id, index=own_index, balance__gte=amount,
+    ).update(balance=F('balance') - amount):
+        return
+
+    with transaction.atomic():
+        # ترتیب ثابت قفل‌ها (اول کیف پول، بعد shardها به ترتیب index) تا بن‌بست پیش نیاید
+        wallet = AdminWallet.objects.select_for_update().filter(id=wallet_id).first()
+        if wallet is None:
+            raise InsufficientAdminBalance
+        shards = list(AdminWalletShard.objects.select_for_update().filter(wallet_id=wallet_id).order_by('index'))
+        if wallet.balance + sum(shard.balance for shard in shards) < amount:
+            raise InsufficientAdminBalance
+
+        remaining = Decimal(amount)
+        shards.sort(key=lambda shard: shard.index != own_index)
+        for shard in shards:
+            take = min(shard.balance, remaining)
+            if take > 0:
+                AdminWalletShard.objects.filter(pk=shard.pk).update(balance=F('balance') - take)
+                remaining -= take
+        if remaining > 0:
+            AdminWallet.objects.filter(pk=wallet.pk).update(balance=F('balance') - remaining)
+
+
+def rollup_admin_wallet(wallet_id=ADMIN_WALLET_ID):
+    """انتقال موجودی shardها به AdminWallet.balance؛ مجموع عوض نمی‌شود"""
+    with transaction.atomic():
+        wallet = AdminWallet.objects.select_for_update().filter(id=wallet_id).first()
+        if wallet is None:
+            return Decimal('0')
+        shards = AdminWalletShard.objects.select_for_update().filter(wallet_id=wallet_id).order_by('index')
+        moved = sum((shard.balance for shard in shards), Decimal('0'))
+        AdminWalletShard.objects.filter(wallet_id=wallet_id).update(balance=0)
+        AdminWallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + moved)
+    return moved
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+
+from finance.models import Purchase
+from gyms.models import Gym
+from packages.models import Package
+from trainers.models import Trainer, TrainerPackage
+
+
+def _subquery(model, pk_field, value_field):
+    return Subquery(model.objects.filter(pk=OuterRef(pk_field)).values(value_field)[:1])
+
+
+def backfill_range(start_id, end_id):
+    """پر کردن gym/trainer/owner_user برای خریدهای start_id <= id < end_id با چند UPDATE مجموعه‌ای"""
+    batch = Purchase.objects.filter(id__gte=start_id, id__lt=end_id)
+    missing = batch.filter(owner_user__isnull=True)
+
+    # مثل Purchase.get_package: اول content_object و اگر نبود فیلد قدیمی package
+    missing.filter(purchase_type='gym', gym__isnull=True, object_id__isnull=False).update(
+        gym_id=_subquery(Package, 'object_id', 'gym_id'),
+    )
+    missing.filter(purchase_type='gym', gym__isnull=True, package__isnull=False).update(
+        gym_id=_subquery(Package, 'package_id', 'gym_id'),
+    )
+    missing.filter(purchase_type='trainer', trainer__isnull=True, object_id__isnull=False).update(
+        trainer_id=_subquery(TrainerPackage, 'object_id', 'trainer_id'),
+    )
+
+    updated = missing.filter(purchase_type='gym', gym__isnull=False).update(
+        owner_user_id=_subquery(Gym, 'gym_id', 'owner_id'),
+    )
+    updated += missing.filter(purchase_type='trainer', trainer__isnull=False).update(
+        owner_user_id=_subquery(Trainer, 'trainer_id', 'user_id'),
+    )
+    return updated
+
+
+class Command(BaseCommand):
+    help = (
+        "پر کردن ستون‌های gym، trainer و owner_user خریدهای قدیمی به صورت دسته‌ای "
+        "(هر دسته یک بازه‌ی id و یک تراکنش کوتاه)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Purchase.objects.filter(owner_user__isnull=True).aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS("0 purchase(s) updated"))
+            return
+
+        total = 0
+        for start_id in range(bounds['first'], bounds['last'] + 1, batch_size):
+            with transaction.atomic():
+                total += backfill_range(start_id, start_id + batch_size)
+
+        remaining = Purchase.objects.filter(owner_user__isnull=True).filter(
+            Q(gym__isnull=False) | Q(trainer__isnull=False)
+        ).count()
+        self.stdout.write(self.style.SUCCESS(f"{total} purchase(s) updated, {remaining} without owner"))
@@ -0,0 +1,93 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Max
+
+from finance.ledger import credit_admin_wallet, debit_admin_wallet
+from finance.models import AdminWallet
+
+
+def legacy_callback(wallet_id, key, amount, work):
+    """پیاده‌سازی قبلی: قفل سطر کیف پول ادمین در کل تراکنش پرداخت"""
+    with transaction.atomic():
+        AdminWallet.objects.select_for_update().get(id=wallet_id)
+        time.sleep(work)
+        AdminWallet.objects.filter(id=wallet_id).update(balance=F('balance') + amount)
+    with transaction.atomic():
+        wallet = AdminWallet.objects.select_for_update().get(id=wallet_id)
+        time.sleep(work)
+        if wallet.balance >= amount:
+            AdminWallet.objects.filter(id=wallet_id).update(balance=F('balance') - amount)
+
+
+def sharded_callback(wallet_id, key, amount, work):
+    with transaction.atomic():
+        credit_admin_wallet(amount, key=key, wallet_id=wallet_id)
+        time.sleep(work)
+    with transaction.atomic():
+        debit_admin_wallet(amount, key=key, wallet_id=wallet_id)
+        time.sleep(work)
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک همزمانی کیف پول ادمین: پرداخت و تایید موازی با قفل یک سطر (قبلی) در برابر "
+        "shardها. روی PostgreSQL اجرا شود؛ SQLite همه‌ی نوشتن‌ها را سریال می‌کند"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=50, help='تعداد پرداخت هر thread')
+        parser.add_argument('--work-ms', type=float, default=5.0,
+                            help='زمان بقیه‌ی کارهای تراکنش پرداخت که قفل در آن نگه داشته می‌شود')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f"database is {connection.vendor}; row-level locking numbers are only meaningful on PostgreSQL "
+                "(SQLite serializes writers and may fail with 'database is locked' for --threads > 1)"
+            ))
+
+        # کیف پول جداگانه تا موجودی کیف پول واقعی دست نخورد
+        wallet_id = (AdminWallet.objects.aggregate(last=Max('id'))['last'] or 0) + 1000
+        wallet = AdminWallet.objects.create(id=wallet_id, balance=0)
+        try:
+            for name, callback in (('single row', legacy_callback), ('sharded', sharded_callback)):
+                elapsed = self._run(callback, wallet_id, options)
+                total = options['threads'] * options['operations']
+                wallet = AdminWallet.objects.get(id=wallet_id)
+                self.stdout.write(
+                    f"{name:<10} {total} payments in {elapsed:6.2f}s -> {total / elapsed:8.1f} payments/s "
+                    f"(final balance {wallet.total_balance})"
+                )
+        finally:
+            AdminWallet.objects.filter(id=wallet_id).delete()
+
+    @staticmethod
+    def _run(callback, wallet_id, options):
+        work = options['work_ms'] / 1000
+        errors = []
+
+        def worker(thread_index):
+            try:
+                for operation in range(options['operations']):
+                    key = thread_index * options['operations'] + operation
+                    callback(wallet_id, key, Decimal('1000.00'), work)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        return elapsed
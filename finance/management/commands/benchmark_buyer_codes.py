@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from finance.buyer_codes import BASE_WIDTH, generate_buyer_code
+
+TABLE = 'benchmark_buyer_code'
+
+
+def legacy_code(cursor, stats):
+    """پیاده‌سازی قبلی: کد تصادفی ۶ رقمی و exists() تا پیدا شدن کد آزاد"""
+    while True:
+        code = ''.join(random.choices('0123456789', k=BASE_WIDTH))
+        stats['queries'] += 1
+        cursor.execute(f'SELECT 1 FROM {TABLE} WHERE code = %s', [code])
+        if cursor.fetchone() is None:
+            return code
+
+
+def permuted_code(cursor, stats):
+    code = generate_buyer_code(stats['next_id'])
+    stats['next_id'] += 1
+    return code
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک ساخت کد خریدار وقتی بخش زیادی از فضای کدها پر است (پیش‌فرض ۹۰٪): انتخاب تصادفی "
+        "و exists() (قبلی) در برابر جایگشت کلیددار finance.buyer_codes. روی یک جدول موقت اجرا می‌شود"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--occupancy', type=float, default=0.9, help='نسبت کدهای استفاده‌شده (0 تا 1)')
+        parser.add_argument('--codes', type=int, default=2000, help='تعداد کد ساخته‌شده با هر روش')
+
+    def handle(self, *args, **options):
+        occupancy = options['occupancy']
+        if not 0 <= occupancy < 1:
+            raise CommandError('--occupancy must be in [0, 1)')
+        namespace = 10 ** BASE_WIDTH
+        filled = int(namespace * occupancy)
+        if filled + options['codes'] > namespace:
+            raise CommandError('--codes does not fit in the remaining namespace')
+
+        # کدهای موجود هر روش: نمونه‌ی تصادفی برای روش قبلی و کد خریدهای 0..filled-1 برای جایگشت
+        methods = (
+            ('random+exists', legacy_code,
+             lambda: (str(code).zfill(BASE_WIDTH) for code in random.sample(range(namespace), filled))),
+            ('permutation', permuted_code,
+             lambda: (generate_buyer_code(purchase_id) for purchase_id in range(filled))),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE {TABLE} (code varchar(16) PRIMARY KEY)')
+            try:
+                for name, allocate, existing in methods:
+                    cursor.execute(f'DELETE FROM {TABLE}')
+                    cursor.executemany(f'INSERT INTO {TABLE} (code) VALUES (%s)', ([code] for code in existing()))
+                    stats = {'queries': 0, 'next_id': filled}
+
+                    started = time.perf_counter()
+                    for _ in range(options['codes']):
+                        code = allocate(cursor, stats)
+                        # کلید اصلی جدول تکراری بودن کد را رد می‌کند
+                        cursor.execute(f'INSERT INTO {TABLE} (code) VALUES (%s)', [code])
+                    elapsed = time.perf_counter() - started
+
+                    self.stdout.write(
+                        f"{name:<14} {options['codes']} codes at {occupancy:.0%} occupancy: "
+                        f"{elapsed / options['codes'] * 1e6:8.1f} us/code, "
+                        f"{stats['queries'] / options['codes']:5.2f} lookups/code"
+                    )
+            finally:
+                cursor.execute(f'DROP TABLE {TABLE}')
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.reconciliation import DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, reconcile_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "بررسی خریدهای pending قدیمی با درگاه: پرداخت‌شده‌ها نهایی و رهاشده‌ها failed می‌شوند. "
+        "همزمان با بازگشت‌های درگاه قابل اجراست"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=60, help='حداقل عمر خرید (دقیقه)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='تعداد verify همزمان')
+        parser.add_argument('--limit', type=int, default=None, help='حداکثر تعداد خرید در این اجرا')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+
+        def on_batch(report):
+            self.stdout.write(
+                f"batch {report.batches}: {report.processed} processed, {report.throughput:.1f} purchases/s"
+            )
+
+        report = reconcile_pending(
+            older_than=timedelta(minutes=options['older_than']),
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            limit=options['limit'],
+            on_batch=on_batch if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.paid} paid, {report.failed} failed, {report.skipped} skipped, {report.errors} errors "
+            f"in {report.elapsed:.1f}s ({report.throughput:.1f} purchases/s)"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from finance.ledger import get_admin_wallet, rollup_admin_wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "انتقال موجودی shardهای کیف پول ادمین به سطر اصلی (AdminWallet.balance). "
+        "موجودی کل تغییر نمی‌کند؛ برای اجرای دوره‌ای در ساعات کم‌ترافیک"
+    )
+
+    def handle(self, *args, **options):
+        moved = rollup_admin_wallet()
+        self.stdout.write(self.style.SUCCESS(
+            f"{moved} moved to admin wallet, total balance {get_admin_wallet().total_balance}"
+        ))
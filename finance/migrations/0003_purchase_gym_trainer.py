@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_gym_and_trainer(apps, schema_editor):
+    Purchase = apps.get_model('finance', 'Purchase')
+    Package = apps.get_model('packages', 'Package')
+    TrainerPackage = apps.get_model('trainers', 'TrainerPackage')
+
+    # مثل Purchase.get_package: اول content_object و اگر نبود فیلد قدیمی package
+    Purchase.objects.filter(purchase_type='gym', object_id__isnull=False).update(
+        gym_id=Subquery(Package.objects.filter(pk=OuterRef('object_id')).values('gym_id')[:1])
+    )
+    Purchase.objects.filter(purchase_type='gym', gym_id__isnull=True, package_id__isnull=False).update(
+        gym_id=Subquery(Package.objects.filter(pk=OuterRef('package_id')).values('gym_id')[:1])
+    )
+    Purchase.objects.filter(purchase_type='trainer', object_id__isnull=False).update(
+        trainer_id=Subquery(TrainerPackage.objects.filter(pk=OuterRef('object_id')).values('trainer_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_purchase_content_type_purchase_object_id_and_more'),
+        ('packages', '0001_initial'),
+        ('gyms', '0004_gym_rating_sum'),
+        ('trainers', '0002_trainer_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='gym',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchases', to='gyms.gym'),
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='trainer',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchases', to='trainers.trainer'),
+        ),
+        migrations.RunPython(fill_gym_and_trainer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('discount', '0001_initial'),
+        ('finance', '0004_purchase_owner_user'),
+        ('gyms', '0004_gym_rating_sum'),
+        ('packages', '0001_initial'),
+        ('trainers', '0002_trainer_rating_sum'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['user', 'payment_status', 'verification_status', 'expire_date'], name='purchase_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_admin_list_keyset_indexes'),
+        ('gyms', '0004_gym_rating_sum'),
+        ('trainers', '0002_trainer_rating_sum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('purchase_type', models.CharField(choices=[('gym', 'Gym Package'), ('trainer', 'Trainer Package')], max_length=10)),
+                ('gender', models.CharField(blank=True, default='', max_length=10)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('verified_count', models.IntegerField(default=0)),
+                ('verified_net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gym', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='gyms.gym')),
+                ('trainer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='trainers.trainer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['purchase_type', 'date'], name='daily_sales_type_date_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('purchase_type', 'gym')), fields=('date', 'gym', 'gender'), name='unique_daily_sales_gym'), models.UniqueConstraint(condition=models.Q(('purchase_type', 'trainer')), fields=('date', 'trainer', 'gender'), name='unique_daily_sales_trainer')],
+            },
+        ),
+    ]
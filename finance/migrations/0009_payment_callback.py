@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_daily_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('authority', models.CharField(max_length=128, unique=True)),
+                ('state', models.CharField(choices=[('received', 'Received'), ('verifying', 'Verifying'), ('paid', 'Paid'), ('failed', 'Failed')], default='received', max_length=20)),
+                ('reference_id', models.CharField(blank=True, max_length=128, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('purchase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_callbacks', to='finance.purchase')),
+            ],
+        ),
+    ]
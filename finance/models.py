@@ -1,5 +1,8 @@
+from datetime import timedelta
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -8,6 +11,59 @@ from packages.models import Package
 from discount.models import DiscountCode
 
 
+def sales_state(payment_status, verification_status, verified_at):
+    """(پرداخت شده؟، زمان تایید یا None) که سهم یک خرید در DailySales را مشخص می‌کند"""
+    verified_on = verified_at if verification_status == 'verified' else None
+    return payment_status == 'paid', verified_on
+
+
+class PurchaseQuerySet(models.QuerySet):
+    def with_membership_status(self, now):
+        """
+        محاسبه‌ی وضعیت عضویت در SQL با همان قواعد PurchaseHistorySerializer.
+        annotate: package_duration، membership_start، membership_end و membership_status
+        (active, expired, pending_payment, pending_verification, rejected, failed_payment)
+        """
+        from trainers.models import TrainerPackage
+
+        # مثل get_package_duration: پکیج content_object و اگر نبود فیلد قدیمی package
+        package_duration = Case(
+            When(
+                purchase_type='trainer',
+                then=Subquery(TrainerPackage.objects.filter(pk=OuterRef('object_id')).values('duration')[:1]),
+            ),
+            default=Subquery(Package.objects.filter(pk=OuterRef('object_id')).values('duration')[:1]),
+        )
+        start = Case(
+            When(verification_status='verified', verified_at__isnull=False, then=F('verified_at')),
+            When(payment_status='paid', then=F('purchase_date')),
+            default=Value(None),
+            output_field=models.DateTimeField(),
+        )
+        return self.annotate(
+            package_duration=Coalesce(package_duration, F('package__duration'), Value(0)),
+            membership_start=start,
+        ).annotate(
+            membership_end=Coalesce(
+                F('expire_date'),
+                F('membership_start') + ExpressionWrapper(
+                    F('package_duration') * Value(timedelta(days=1)),
+                    output_field=DurationField(),
+                ),
+            ),
+        ).annotate(
+            membership_status=Case(
+                When(payment_status='failed', then=Value('failed_payment')),
+                When(~Q(payment_status='paid'), then=Value('pending_payment')),
+                When(verification_status='rejected', then=Value('rejected')),
+                When(~Q(verification_status='verified'), then=Value('pending_verification')),
+                When(membership_end__gte=now, then=Value('active')),
+                default=Value('expired'),
+                output_field=models.CharField(),
+            ),
+        )
+
+
 class Purchase(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -37,6 +93,12 @@ class Purchase(models.Model):
     
     # Keep package field for backward compatibility (gym packages)
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='purchases', null=True, blank=True)
+
+    # باشگاه/مربی پکیج به صورت denormalized تا فیلتر و گروه‌بندی بدون resolve کردن content_object انجام شود
+    gym = models.ForeignKey('gyms.Gym', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='purchases')
+    trainer = models.ForeignKey('trainers.Trainer', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='purchases')
+    # صاحب باشگاه یا کاربر مربی؛ فیلترهای «فروش‌های من» فقط روی همین ستون انجام می‌شوند
+    owner_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='sold_purchases')
     
     buyer_code = models.CharField(max_length=100, null=True, blank=True, unique=True)
     payment_authority = models.CharField(max_length=128, null=True, blank=True, unique=True)
@@ -53,8 +115,29 @@ class Purchase(models.Model):
     discount_code = models.ForeignKey(DiscountCode, on_delete=models.SET_NULL, null=True, blank=True, related_name='discount_code')
     final_amount = models.DecimalField(max_digits=10, decimal_places=2)
     admin_notes = models.TextField(blank=True, null=True, help_text="توضیحات ادمین - فقط برای ادمین قابل مشاهده")
+
+    objects = PurchaseQuerySet.as_manager()
     
     class Meta:
+        indexes = [
+            # تاریخچه‌ی خرید کاربر با فیلتر وضعیت عضویت
+            models.Index(
+                fields=['user', 'payment_status', 'verification_status', 'expire_date'],
+                name='purchase_user_status_idx',
+            ),
+            # خریدهای pending قدیمی برای reconcile_pending_purchases
+            models.Index(
+                fields=['purchase_date'],
+                condition=models.Q(payment_status='pending'),
+                name='purchase_pending_date_idx',
+            ),
+            # یادآوری انقضای پلن (notifications.tasks.send_plan_expiry_notifications)
+            models.Index(
+                fields=['expire_date'],
+                condition=models.Q(verification_status='verified'),
+                name='purchase_verified_expiry_idx',
+            ),
+        ]
         constraints = [
             models.CheckConstraint(
                 condition=models.Q(total_amount__gte=0),
@@ -119,7 +202,33 @@ class Purchase(models.Model):
             return pkg.trainer.name if pkg else ''
         return pkg.gym.name if pkg else ''
 
+    def fill_owner_keys(self, pkg=None):
+        """پر کردن gym/trainer/owner_user از روی پکیج خریداری‌شده"""
+        pkg = pkg or self.get_package()
+        if pkg is None:
+            return
+        if self.purchase_type == 'trainer':
+            self.trainer_id = pkg.trainer_id
+            self.owner_user_id = pkg.trainer.user_id if pkg.trainer_id else None
+        else:
+            self.gym_id = pkg.gym_id
+            self.owner_user_id = pkg.gym.owner_id if pkg.gym_id else None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # وضعیت پرداخت/تایید هنگام خواندن؛ DailySales فقط با تغییر این وضعیت به‌روز می‌شود
+        loaded = dict(zip(field_names, values))
+        if {'payment_status', 'verification_status', 'verified_at'} <= loaded.keys():
+            instance._sales_state = sales_state(
+                loaded['payment_status'], loaded['verification_status'], loaded['verified_at'],
+            )
+        return instance
+
     def save(self, *args, **kwargs):
+        previous_sales_state = (False, None) if self._state.adding else getattr(self, '_sales_state', None)
+        if self._state.adding and self.gym_id is None and self.trainer_id is None:
+            self.fill_owner_keys()
         if not self.total_amount:
             pkg = self.get_package()
             if pkg:
@@ -130,7 +239,14 @@ class Purchase(models.Model):
                 self.commission_amount = self.total_amount * Decimal(str(pkg.commission_rate))
         if self.net_amount is None:
             self.net_amount = self.total_amount - self.commission_amount
-        super().save(*args, **kwargs)
+        # خرید و سطر DailySales آن با هم commit می‌شوند؛ rebuild_daily_sales یا هر دو را می‌بیند یا هیچ‌کدام
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+            # وضعیت ناشناخته (مثلا فیلدهای defer شده) فقط با rebuild_daily_sales جبران می‌شود
+            if previous_sales_state is not None:
+                from finance.rollups import record_transition
+                self._sales_state = record_transition(self, previous_sales_state)
 
     def __str__(self):
         pkg = self.get_package()
@@ -138,6 +254,44 @@ class Purchase(models.Model):
         return f"Purchase #{self.id} - {self.user.full_name} - {pkg_title}"
 
 
+class DailySales(models.Model):
+    """
+    فروش روزانه‌ی هر باشگاه یا مربی به تفکیک جنسیت پکیج (finance/rollups.py).
+    ستون‌های paid_* بر اساس روز خرید و verified_* بر اساس روز تایید شمرده می‌شوند.
+    """
+    date = models.DateField()
+    purchase_type = models.CharField(max_length=10, choices=Purchase.PURCHASE_TYPE_CHOICES)
+    gym = models.ForeignKey('gyms.Gym', on_delete=models.CASCADE, null=True, blank=True, related_name='daily_sales')
+    trainer = models.ForeignKey('trainers.Trainer', on_delete=models.CASCADE, null=True, blank=True, related_name='daily_sales')
+    gender = models.CharField(max_length=10, blank=True, default='')
+    paid_count = models.IntegerField(default=0)
+    # مجموع final_amount خریدهای پرداخت‌شده
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    verified_count = models.IntegerField(default=0)
+    verified_net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'gym', 'gender'], condition=models.Q(purchase_type='gym'),
+                name='unique_daily_sales_gym',
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'trainer', 'gender'], condition=models.Q(purchase_type='trainer'),
+                name='unique_daily_sales_trainer',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['purchase_type', 'date'], name='daily_sales_type_date_idx'),
+        ]
+
+    def __str__(self):
+        seller = f"gym {self.gym_id}" if self.purchase_type == 'gym' else f"trainer {self.trainer_id}"
+        return f"{self.date} {seller} {self.gender}: {self.paid_count} paid, {self.gross}"
+
+
 class Wallet(models.Model):
     owner = models.OneToOneField(User, on_delete=models.CASCADE, limit_choices_to={'role': 'owner'})
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -174,11 +328,20 @@ class TrainerWallet(models.Model):
 
 
 class AdminWallet(models.Model):
+    # موجودی تجمیع‌شده (roll-up)؛ تغییرات پرداخت‌ها در AdminWalletShard ثبت می‌شوند
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Admin Wallet - Balance: {self.balance}"
+        return f"Admin Wallet - Balance: {self.total_balance}"
+
+    @property
+    def total_balance(self):
+        """موجودی واقعی: balance به‌علاوه‌ی مجموع shardها"""
+        shards_total = getattr(self, 'shards_total', None)
+        if shards_total is None:
+            shards_total = self.shards.aggregate(total=models.Sum('balance'))['total']
+        return self.balance + (shards_total or 0)
 
     class Meta:
         constraints = [
@@ -189,6 +352,29 @@ class AdminWallet(models.Model):
         ]
 
 
+class AdminWalletShard(models.Model):
+    """
+    یکی از N سطر موجودی کیف پول ادمین. هر پرداخت فقط سطر shard خودش (بر اساس id خرید) را
+    به‌روز می‌کند تا همه‌ی پرداخت‌ها روی یک سطر قفل صف نکشند.
+    """
+    wallet = models.ForeignKey(AdminWallet, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'index'], name='unique_admin_wallet_shard'),
+            models.CheckConstraint(
+                condition=models.Q(balance__gte=0),
+                name='check_admin_wallet_shard_balance_non_negative'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Admin Wallet #{self.wallet_id} shard {self.index} - Balance: {self.balance}"
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
         ('credit', 'Credit'),
@@ -225,6 +411,11 @@ class Transaction(models.Model):
         return f"{self.type.capitalize()} - {self.amount} ({owner_name})"
 
     class Meta:
+        indexes = [
+            # لیست تراکنش‌های هر کیف پول با صفحه‌بندی cursor روی id
+            models.Index(fields=['wallet', '-id'], name='transaction_wallet_id_idx'),
+            models.Index(fields=['admin_wallet', '-id'], name='transaction_admin_wallet_idx'),
+        ]
         constraints = [
             models.CheckConstraint(
                 condition=models.Q(amount__gte=0),
@@ -233,6 +424,32 @@ class Transaction(models.Model):
         ]
 
 
+class PaymentCallback(models.Model):
+    """
+    رکورد idempotency بازگشت درگاه برای هر authority (finance/client/purchase.py).
+    received -> verifying (فقط یک درخواست verify درگاه را صدا می‌زند) -> paid یا failed؛
+    بازگشت‌های تکراری بعد از paid/failed بدون قفل و بدون تماس با درگاه پاسخ داده می‌شوند.
+    """
+    STATE_CHOICES = [
+        ('received', 'Received'),
+        ('verifying', 'Verifying'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+    ]
+
+    authority = models.CharField(max_length=128, unique=True)
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='payment_callbacks')
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='received')
+    reference_id = models.CharField(max_length=128, null=True, blank=True)
+    # تعداد دفعاتی که verify درگاه برای این authority شروع شده است
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Callback {self.authority} ({self.state}) - Purchase #{self.purchase_id}"
+
+
 class WithdrawRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -251,6 +468,10 @@ class WithdrawRequest(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
+        indexes = [
+            # لیست درخواست‌ها برای ادمین با فیلتر وضعیت و صفحه‌بندی cursor روی id
+            models.Index(fields=['status', '-id'], name='withdraw_status_id_idx'),
+        ]
         constraints = [
             models.CheckConstraint(
                 condition=models.Q(amount__gte=0),
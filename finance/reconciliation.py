@@ -0,0 +1,127 @@
+"""
+تطبیق خریدهای pending قدیمی با درگاه.
+
+خریدهایی که کاربر صفحه‌ی پرداخت را رها کرده برای همیشه pending می‌مانند. reconcile_pending
+آن‌ها را به ترتیب id و دسته به دسته برمی‌دارد و هر دسته را با یک thread pool محدود بررسی
+می‌کند: مثل بازگشت درگاه (finance/client/purchase.py) اول نوبت PaymentCallback گرفته می‌شود،
+verify بیرون از تراکنش انجام می‌شود و نتیجه در تراکنش کوتاه _settle_payment_callback ثبت
+می‌شود؛ پس اجرای همزمان با بازگشت‌های واقعی درگاه خرید را دو بار نهایی نمی‌کند.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+from finance.client.gateway import PaymentGatewayError, verify_payment
+from finance.client.purchase import _claim_payment_callback, _release_payment_callback, _settle_payment_callback
+from finance.models import Purchase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WORKERS = 4
+
+
+@dataclass
+class ReconcileReport:
+    paid: int = 0
+    failed: int = 0
+    # در حال بررسی توسط بازگشت درگاه یا اجرای دیگر
+    skipped: int = 0
+    errors: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    @property
+    def processed(self):
+        return self.paid + self.failed + self.skipped + self.errors
+
+    @property
+    def throughput(self):
+        """خرید در ثانیه"""
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def add(self, result):
+        setattr(self, result, getattr(self, result) + 1)
+
+
+def _reconcile_one(purchase):
+    """یک خرید pending؛ خروجی یکی از paid، failed، skipped یا errors"""
+    try:
+        if not purchase.payment_authority:
+            # درخواست پرداخت هیچ‌وقت به درگاه نرسیده است
+            _, outcome = _settle_payment_callback(
+                purchase.id, None, reason=f'Payment was never started for purchase #{purchase.id}',
+            )
+            return 'paid' if outcome in ('success', 'already_paid') else 'failed'
+
+        if not _claim_payment_callback(purchase):
+            return 'skipped'
+        try:
+            verification = verify_payment(amount=purchase.final_amount, authority=purchase.payment_authority)
+            _, outcome = _settle_payment_callback(
+                purchase.id,
+                purchase.payment_authority,
+                verification,
+                reason=f'Payment abandoned for purchase #{purchase.id}',
+            )
+        except Exception:
+            _release_payment_callback(purchase.payment_authority)
+            raise
+        return 'paid' if outcome in ('success', 'already_paid') else 'failed'
+    except PaymentGatewayError as exc:
+        logger.warning(f"Reconcile of purchase {purchase.id} failed: {exc}")
+        return 'errors'
+    except Exception:
+        logger.exception(f"Reconcile of purchase {purchase.id} failed")
+        return 'errors'
+
+
+def _reconcile_in_thread(purchase):
+    try:
+        return _reconcile_one(purchase)
+    finally:
+        # اتصال دیتابیس هر thread متعلق به همان thread است
+        connections.close_all()
+
+
+def stale_pending_purchases(older_than, now=None):
+    cutoff = (now or timezone.now()) - older_than
+    return Purchase.objects.filter(payment_status='pending', purchase_date__lt=cutoff)
+
+
+def reconcile_pending(older_than=timedelta(hours=1), batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                      limit=None, now=None, on_batch=None):
+    """
+    بررسی خریدهای pending قدیمی‌تر از older_than. هر دسته با workers thread همزمان verify
+    می‌شود (workers=1 یعنی در همین thread). on_batch(report) بعد از هر دسته صدا زده می‌شود.
+    """
+    report = ReconcileReport()
+    pending = stale_pending_purchases(older_than, now).select_related('user').order_by('id')
+    last_id = 0
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while limit is None or report.processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - report.processed)
+            batch = list(pending.filter(id__gt=last_id)[:size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            results = pool.map(_reconcile_in_thread, batch) if pool else map(_reconcile_one, batch)
+            for result in results:
+                report.add(result)
+            report.batches += 1
+            report.elapsed = time.monotonic() - report.started
+            if on_batch:
+                on_batch(report)
+    finally:
+        if pool:
+            pool.shutdown()
+    report.elapsed = time.monotonic() - report.started
+    return report
@@ -0,0 +1,172 @@
+"""
+جدول فروش روزانه (DailySales) برای آمار پنل مدیریت.
+
+هر بار که یک خرید پرداخت یا تایید می‌شود (یا از این وضعیت خارج می‌شود) Purchase.save فقط یک
+سطر روز/باشگاه یا مربی/جنسیت را با F() به‌روز می‌کند؛ آمارها به جای اسکن همه‌ی خریدها روی
+همین جدول جمع زده می‌شوند و هزینه‌شان به تعداد روزهای بازه بستگی دارد نه تعداد خریدها.
+تغییرهایی که از save عبور نمی‌کنند (queryset.update، داده‌ی قدیمی) با
+rebuild_daily_sales (دستور rebuild_daily_sales) از روی خود خریدها بازسازی می‌شوند؛ بازسازی
+جدول را قفل می‌کند و save خریدها تا پایان آن منتظر می‌ماند.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from finance.models import DailySales, Purchase, sales_state
+from packages.models import Package
+from trainers.models import TrainerPackage
+
+PAID_AGGREGATES = {
+    'paid_count': Count('id'),
+    'gross': Sum('final_amount'),
+    'commission': Sum('commission_amount'),
+    'net': Sum('net_amount'),
+}
+VERIFIED_AGGREGATES = {
+    'verified_count': Count('id'),
+    'verified_net': Sum('net_amount'),
+}
+
+
+def _seller(purchase):
+    if purchase.purchase_type == 'trainer':
+        return {'purchase_type': 'trainer', 'trainer_id': purchase.trainer_id} if purchase.trainer_id else None
+    return {'purchase_type': 'gym', 'gym_id': purchase.gym_id} if purchase.gym_id else None
+
+
+def _bump(key, deltas):
+    rows = DailySales.objects.filter(**key)
+    if rows.update(**{field: F(field) + value for field, value in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(**key, **deltas)
+    except IntegrityError:
+        # سطر همزمان توسط خرید دیگری ساخته شد
+        rows.update(**{field: F(field) + value for field, value in deltas.items()})
+
+
+def record_transition(purchase, previous):
+    """
+    اعمال تغییر وضعیت یک خرید روی DailySales. previous و مقدار برگشتی هر دو خروجی
+    finance.models.sales_state هستند: (پرداخت شده؟، زمان تایید یا None)
+    """
+    current = sales_state(purchase.payment_status, purchase.verification_status, purchase.verified_at)
+    seller = _seller(purchase)
+    if current == previous or seller is None:
+        return current
+
+    pkg = purchase.get_package()
+    seller['gender'] = getattr(pkg, 'gender', '') or ''
+
+    was_paid, was_verified_on = previous
+    is_paid, verified_on = current
+    if is_paid != was_paid:
+        sign = 1 if is_paid else -1
+        _bump({**seller, 'date': timezone.localdate(purchase.purchase_date)}, {
+            'paid_count': sign,
+            'gross': sign * purchase.final_amount,
+            'commission': sign * (purchase.commission_amount or 0),
+            'net': sign * (purchase.net_amount or 0),
+        })
+    if verified_on != was_verified_on:
+        if was_verified_on is not None:
+            _bump({**seller, 'date': timezone.localdate(was_verified_on)}, {
+                'verified_count': -1, 'verified_net': -(purchase.net_amount or 0),
+            })
+        if verified_on is not None:
+            _bump({**seller, 'date': timezone.localdate(verified_on)}, {
+                'verified_count': 1, 'verified_net': purchase.net_amount or 0,
+            })
+    return current
+
+
+def purchase_gender():
+    """جنسیت پکیج خرید در SQL؛ مثل Purchase.get_package اول content_object و بعد فیلد package"""
+    return Coalesce(
+        Case(
+            When(
+                purchase_type='trainer',
+                then=Subquery(TrainerPackage.objects.filter(pk=OuterRef('object_id')).values('gender')[:1]),
+            ),
+            default=Coalesce(
+                Subquery(Package.objects.filter(pk=OuterRef('object_id')).values('gender')[:1]),
+                F('package__gender'),
+            ),
+        ),
+        Value(''),
+    )
+
+
+def _aggregate(purchases, day_field, aggregates, start, end):
+    purchases = purchases.filter(
+        Q(purchase_type='gym', gym__isnull=False) | Q(purchase_type='trainer', trainer__isnull=False),
+    ).annotate(day=TruncDate(day_field), package_gender=purchase_gender())
+    if start:
+        purchases = purchases.filter(day__gte=start)
+    if end:
+        purchases = purchases.filter(day__lte=end)
+    return purchases.values('day', 'purchase_type', 'gym_id', 'trainer_id', 'package_gender').annotate(
+        **aggregates,
+    ).order_by()
+
+
+def _lock_daily_sales():
+    """
+    قفل نوشتن روی کل DailySales تا پایان تراکنش؛ _bump خریدهای همزمان (سطر موجود یا سطر تازه)
+    منتظر می‌ماند و بعد از بازسازی روی سطرهای جدید اعمال می‌شود. خواندن آمار قفل نمی‌شود.
+    در SQLite نوشتن همیشه سراسری است و delete اول بازسازی همین قفل را می‌گیرد.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {DailySales._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+
+
+def rebuild_daily_sales(start=None, end=None):
+    """
+    بازسازی DailySales بین start و end (تاریخ، هر دو اختیاری) از روی Purchase؛ تعداد سطرها.
+    جمع زدن بعد از گرفتن قفل و داخل همان تراکنش انجام می‌شود تا تغییری که بین جمع زدن و حذف
+    سطرهای قبلی commit می‌شود از دست نرود.
+    """
+    existing = DailySales.objects.all()
+    if start:
+        existing = existing.filter(date__gte=start)
+    if end:
+        existing = existing.filter(date__lte=end)
+
+    with transaction.atomic():
+        _lock_daily_sales()
+        existing.delete()
+
+        rows = {}
+        sources = (
+            (Purchase.objects.filter(payment_status='paid'), 'purchase_date', PAID_AGGREGATES),
+            (
+                Purchase.objects.filter(verification_status='verified', verified_at__isnull=False),
+                'verified_at',
+                VERIFIED_AGGREGATES,
+            ),
+        )
+        for purchases, day_field, aggregates in sources:
+            for row in _aggregate(purchases, day_field, aggregates, start, end):
+                is_trainer = row['purchase_type'] == 'trainer'
+                key = (
+                    row['day'],
+                    row['purchase_type'],
+                    None if is_trainer else row['gym_id'],
+                    row['trainer_id'] if is_trainer else None,
+                    row['package_gender'],
+                )
+                sales = rows.setdefault(key, DailySales(
+                    date=key[0], purchase_type=key[1], gym_id=key[2], trainer_id=key[3], gender=key[4],
+                ))
+                for field in aggregates:
+                    setattr(sales, field, getattr(sales, field) + (row[field] or 0))
+
+        DailySales.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def sales_between(start, end, purchase_type):
+    return DailySales.objects.filter(purchase_type=purchase_type, date__gte=start, date__lte=end)
@@ -2,13 +2,14 @@ from decimal import Decimal
 from datetime import timedelta
 
 from django.db import transaction
-from django.db.models import F, Q
+from django.db.models import F
 from django.contrib.contenttypes.models import ContentType
 
 from finance.models import Purchase, Wallet, AdminWallet, Transaction, WithdrawRequest, TrainerWallet
 from rest_framework import serializers
 from django.utils import timezone
 from discount.models import DiscountCode, PackageDiscount
+from discount.pricing import DiscountCodeError, find_discount_code, quote
 from trainers.models import TrainerPackage
 
 
@@ -91,32 +92,15 @@ class PurchaseSerializer(serializers.ModelSerializer):
         # Validate discount code (if provided)
         discount_code_str = data.get('discount_code')
         if discount_code_str:
-            code_str = discount_code_str.strip()
-            discount = DiscountCode.objects.filter(code=code_str).prefetch_related('packages').first()
-            if not discount:
-                raise serializers.ValidationError({"discount_code": "کد تخفیف یافت نشد"})
-
-            if not discount.is_valid():
-                raise serializers.ValidationError({"discount_code": "کد تخفیف معتبر نیست یا ظرفیت آن تمام شده است"})
-
-            user = self.context['request'].user
-            
-            # For gym packages, check gym match
-            if package:
-                gym = package.gym
-                if discount.gym and discount.gym_id != gym.id:
-                    raise serializers.ValidationError({"discount_code": "این کد برای باشگاه انتخاب‌شده معتبر نیست"})
-                
-                # If packages are selected, check if this package is in them
-                if discount.packages.exists():
-                    if package not in discount.packages.all():
-                        raise serializers.ValidationError({"discount_code": "این کد برای پکیج انتخاب‌شده معتبر نیست"})
-            
-            if not discount.can_user_use(user):
-                raise serializers.ValidationError({"discount_code": "شما مجاز به استفاده از این کد نیستید"})
-
-            # Pass object for create
-            data['discount_code_obj'] = discount
+            try:
+                # Pass object for create
+                data['discount_code_obj'] = find_discount_code(
+                    discount_code_str,
+                    package or trainer_package,
+                    self.context['request'].user,
+                )
+            except DiscountCodeError as e:
+                raise serializers.ValidationError({"discount_code": str(e)})
 
         return data
 
@@ -137,12 +121,6 @@ class PurchaseSerializer(serializers.ModelSerializer):
             content_type = ContentType.objects.get_for_model(package.__class__)
             object_id = package.pk
         
-        total_amount = pkg.price
-        commission_rate = Decimal(str(pkg.commission_rate))
-
-        # Initial admin commission (before discount)
-        admin_commission_before_discount = total_amount * commission_rate
-
         # Discount code (if valid, injected from validate)
         discount_code_obj = validated_data.pop('discount_code_obj', None)
         if discount_code_obj:
@@ -150,123 +128,32 @@ class PurchaseSerializer(serializers.ModelSerializer):
             if not discount_code_obj.is_valid() or not discount_code_obj.can_user_use(user):
                 raise serializers.ValidationError({"discount_code": "کد تخفیف دیگر قابل استفاده نیست"})
 
-        # Check package discount
-        package_discount_obj = None
-        from django.utils import timezone
-        now = timezone.now()
-        
-        # Only gym packages have PackageDiscount
-        if purchase_type == 'gym':
-            package_discount_obj = pkg.discounts.filter(
-                is_active=True,
-            ).filter(
-                Q(start_date__isnull=True) | Q(start_date__lte=now),
-                Q(end_date__isnull=True) | Q(end_date__gte=now),
-            ).first()
-
-        # Calculate discount amount with limits
-        discount_amount = Decimal('0')
-        discount_source = None
-        discount_details = []
-
-        # Calculate package discount (if exists)
-        package_discount_amount = Decimal('0')
-        if package_discount_obj:
-            if package_discount_obj.discount_type == 'percent':
-                requested_percent = Decimal(str(package_discount_obj.value))
-                # For backward compatibility: if value < 1, convert to percent
-                if requested_percent < Decimal('1'):
-                    requested_percent = requested_percent * Decimal('100')
-                if package_discount_obj.source_type == 'admin':
-                    max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
-                    effective_percent = min(requested_percent, max_admin_percent)
-                else:
-                    effective_percent = requested_percent
-                package_discount_amount = (total_amount * effective_percent) / Decimal('100')
-                discount_details.append(f"تخفیف پکیج: ({effective_percent}% از {package_discount_obj.source_type})")
-            else:  # amount
-                requested_amount = Decimal(str(package_discount_obj.value))
-                if package_discount_obj.source_type == 'admin':
-                    effective_amount = min(requested_amount, admin_commission_before_discount)
-                else:
-                    effective_amount = requested_amount
-                package_discount_amount = effective_amount
-                discount_details.append(f"تخفیف پکیج: ({effective_amount} تومان از {package_discount_obj.source_type})")
-
-        # Calculate code discount (on price after package discount)
-        code_discount_amount = Decimal('0')
-        if discount_code_obj:
-            price_after_package_discount = total_amount - package_discount_amount
-            if discount_code_obj.discount_type == 'percent':
-                requested_percent = Decimal(str(discount_code_obj.value))
-                # For backward compatibility: if value < 1, convert to percent
-                if requested_percent < Decimal('1'):
-                    requested_percent = requested_percent * Decimal('100')
-                if discount_code_obj.source_type == 'admin':
-                    max_admin_percent = (commission_rate * Decimal('100')).quantize(Decimal('1.0000'))
-                    effective_percent = min(requested_percent, max_admin_percent)
-                else:
-                    effective_percent = requested_percent
-                code_discount_amount = (price_after_package_discount * effective_percent) / Decimal('100')
-                discount_details.append(f"کد تخفیف: {discount_code_obj.code} ({effective_percent}% از {discount_code_obj.source_type})")
-            else:  # amount
-                requested_amount = Decimal(str(discount_code_obj.value))
-                if discount_code_obj.source_type == 'admin':
-                    effective_amount = min(requested_amount, admin_commission_before_discount)
-                else:
-                    effective_amount = requested_amount
-                code_discount_amount = effective_amount
-                discount_details.append(f"کد تخفیف: {discount_code_obj.code} ({effective_amount} تومان از {discount_code_obj.source_type})")
-
-        # Total discount (stacked)
-        discount_amount = package_discount_amount + code_discount_amount
-        
-        # Determine discount source for share calculation (code has priority)
-        if discount_code_obj:
-            discount_source = discount_code_obj.source_type
-        elif package_discount_obj:
-            discount_source = package_discount_obj.source_type
-
-        # Calculate final_amount for user (should not be negative)
-        final_amount = total_amount - discount_amount
-        if final_amount < 0:
-            final_amount = Decimal('0')
-
-        # Apply discount to shares based on discount source
-        if discount_source == 'admin':
-            # Discount deducted from admin share; gym/trainer share stays fixed
-            commission_amount = admin_commission_before_discount - min(discount_amount, admin_commission_before_discount)
-            if commission_amount < 0:
-                commission_amount = Decimal('0')
-            net_amount = total_amount - admin_commission_before_discount
-        else:
-            # Club/trainer discount deducted from their share; admin commission stays fixed
-            commission_amount = admin_commission_before_discount
-            net_amount = final_amount - commission_amount
-            if net_amount < 0:
-                net_amount = Decimal('0')
+        # تخفیف پکیج (فقط پکیج‌های باشگاه) و کد تخفیف با همان محاسبه‌ی بررسی کد تخفیف
+        price_quote = quote(pkg, discount_code=discount_code_obj)
 
         # Build admin notes
-        admin_notes = f"قیمت اصلی: {total_amount} تومان\n"
-        if discount_details:
-            admin_notes += "\n".join(discount_details) + "\n"
-        admin_notes += f"قیمت نهایی: {final_amount} تومان\n"
-        admin_notes += f"کمیسیون ادمین: {commission_amount} تومان\n"
-        admin_notes += f"سهم {'مربی' if purchase_type == 'trainer' else 'باشگاه'}: {net_amount} تومان"
-
-        purchase = Purchase.objects.create(
+        admin_notes = f"قیمت اصلی: {price_quote.original} تومان\n"
+        if price_quote.details:
+            admin_notes += "\n".join(price_quote.details) + "\n"
+        admin_notes += f"قیمت نهایی: {price_quote.final} تومان\n"
+        admin_notes += f"کمیسیون ادمین: {price_quote.commission} تومان\n"
+        admin_notes += f"سهم {'مربی' if purchase_type == 'trainer' else 'باشگاه'}: {price_quote.net} تومان"
+
+        purchase = Purchase(
             user=user,
             purchase_type=purchase_type,
             content_type=content_type,
             object_id=object_id,
             package=package,  # Keep for backward compatibility
             discount_code=discount_code_obj,
-            total_amount=total_amount,
-            commission_amount=commission_amount,
-            net_amount=net_amount,
-            final_amount=final_amount,
+            total_amount=price_quote.original,
+            commission_amount=price_quote.commission,
+            net_amount=price_quote.net,
+            final_amount=price_quote.final,
             admin_notes=admin_notes
         )
+        purchase.fill_owner_keys(pkg)
+        purchase.save()
         return purchase
 
 
@@ -310,6 +197,10 @@ class TrainerWalletSerializer(serializers.ModelSerializer):
 
 
 class AdminWalletSerializer(serializers.ModelSerializer):
+    # موجودی واقعی (سطر اصلی + shardها)؛ settled_balance فقط بخش roll-up شده است
+    balance = serializers.DecimalField(source='total_balance', max_digits=12, decimal_places=2, read_only=True)
+    settled_balance = serializers.DecimalField(source='balance', max_digits=12, decimal_places=2, read_only=True)
+
     class Meta:
         model = AdminWallet
         fields = '__all__'
@@ -440,11 +331,19 @@ class GymMemberSerializer(serializers.Serializer):
         trainer_name = ''
         
         if purchase.purchase_type == 'trainer':
-            trainer_id = pkg.trainer_id if pkg else None
-            trainer_name = pkg.trainer.name if pkg and hasattr(pkg, 'trainer') else ''
+            if purchase.trainer_id is not None:
+                trainer_id = purchase.trainer_id
+                trainer_name = purchase.trainer.name
+            else:
+                trainer_id = pkg.trainer_id if pkg else None
+                trainer_name = pkg.trainer.name if pkg and hasattr(pkg, 'trainer') else ''
         else:
-            gym_id = pkg.gym_id if pkg else None
-            gym_name = pkg.gym.name if pkg and hasattr(pkg, 'gym') else ''
+            if purchase.gym_id is not None:
+                gym_id = purchase.gym_id
+                gym_name = purchase.gym.name
+            else:
+                gym_id = pkg.gym_id if pkg else None
+                gym_name = pkg.gym.name if pkg and hasattr(pkg, 'gym') else ''
         
         expire_date = purchase.expire_date
         is_active = (
@@ -531,39 +430,50 @@ class PurchaseHistorySerializer(serializers.Serializer):
         trainer_name = ''
         
         if purchase.purchase_type == 'trainer':
-            trainer_id = pkg.trainer_id if pkg else None
-            trainer_name = pkg.trainer.name if pkg and hasattr(pkg, 'trainer') else ''
+            if purchase.trainer_id is not None:
+                trainer_id = purchase.trainer_id
+                trainer_name = purchase.trainer.name
+            else:
+                trainer_id = pkg.trainer_id if pkg else None
+                trainer_name = pkg.trainer.name if pkg and hasattr(pkg, 'trainer') else ''
         else:
-            gym_id = pkg.gym_id if pkg else None
-            gym_name = pkg.gym.name if pkg and hasattr(pkg, 'gym') else ''
-
-        start_date = purchase.verified_at if purchase.verification_status == 'verified' else None
-        if start_date is None and purchase.payment_status == 'paid':
-            start_date = purchase.purchase_date
-
-        end_date = purchase.expire_date
-        if end_date is None and start_date is not None:
-            end_date = start_date + timedelta(days=purchase.get_package_duration())
-
-        is_active = (
-            purchase.payment_status == 'paid'
-            and purchase.verification_status == 'verified'
-            and end_date is not None
-            and end_date >= now
-        )
-
-        if purchase.payment_status == 'failed':
-            membership_status = 'failed_payment'
-        elif purchase.payment_status != 'paid':
-            membership_status = 'pending_payment'
-        elif purchase.verification_status == 'rejected':
-            membership_status = 'rejected'
-        elif purchase.verification_status != 'verified':
-            membership_status = 'pending_verification'
-        elif is_active:
-            membership_status = 'active'
+            if purchase.gym_id is not None:
+                gym_id = purchase.gym_id
+                gym_name = purchase.gym.name
+            else:
+                gym_id = pkg.gym_id if pkg else None
+                gym_name = pkg.gym.name if pkg and hasattr(pkg, 'gym') else ''
+
+        if hasattr(purchase, 'membership_status'):
+            # محاسبه‌شده در SQL با Purchase.objects.with_membership_status(now)
+            package_duration = purchase.package_duration
+            start_date = purchase.membership_start
+            end_date = purchase.membership_end
+            membership_status = purchase.membership_status
         else:
-            membership_status = 'expired'
+            package_duration = purchase.get_package_duration()
+            start_date = purchase.verified_at if purchase.verification_status == 'verified' else None
+            if start_date is None and purchase.payment_status == 'paid':
+                start_date = purchase.purchase_date
+
+            end_date = purchase.expire_date
+            if end_date is None and start_date is not None:
+                end_date = start_date + timedelta(days=package_duration)
+
+            if purchase.payment_status == 'failed':
+                membership_status = 'failed_payment'
+            elif purchase.payment_status != 'paid':
+                membership_status = 'pending_payment'
+            elif purchase.verification_status == 'rejected':
+                membership_status = 'rejected'
+            elif purchase.verification_status != 'verified':
+                membership_status = 'pending_verification'
+            elif end_date is not None and end_date >= now:
+                membership_status = 'active'
+            else:
+                membership_status = 'expired'
+
+        is_active = membership_status == 'active'
 
         discount_amount = purchase.total_amount - purchase.final_amount
         discount_percentage = Decimal('0')
@@ -587,7 +497,7 @@ class PurchaseHistorySerializer(serializers.Serializer):
             'trainer_name': trainer_name,
             'package_id': purchase.object_id,
             'package_title': purchase.get_package_title(),
-            'package_duration': purchase.get_package_duration(),
+            'package_duration': package_duration,
             'payment_status': purchase.payment_status,
             'verification_status': purchase.verification_status,
             'membership_status': membership_status,
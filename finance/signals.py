@@ -0,0 +1,47 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+# صاحب قبلی معلوم نیست (رکورد جدید یا save بدون pre_save)
+_UNKNOWN = object()
+
+
+def _remember_owner(sender, instance, field):
+    # صاحب قبلی با یک کوئری روی کلید اصلی؛ برای ساخت رکورد جدید خریدی وجود ندارد
+    instance._previous_owner_id = _UNKNOWN
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(field, flat=True)
+        if previous:
+            instance._previous_owner_id = previous[0]
+
+
+def _move_purchases(instance, field, owner_id):
+    from finance.models import Purchase
+
+    previous_owner_id = getattr(instance, '_previous_owner_id', _UNKNOWN)
+    instance._previous_owner_id = owner_id
+    if previous_owner_id is _UNKNOWN or previous_owner_id == owner_id:
+        return
+    # owner_user روی خریدها denormalized است؛ با تغییر صاحب همه با یک UPDATE منتقل می‌شوند
+    Purchase.objects.filter(**{field: instance}).update(owner_user_id=owner_id)
+
+
+@receiver(pre_save, sender='gyms.Gym', dispatch_uid='finance.owner_key_gym_before')
+def remember_gym_owner(sender, instance, **kwargs):
+    _remember_owner(sender, instance, 'owner_id')
+
+
+@receiver(post_save, sender='gyms.Gym', dispatch_uid='finance.owner_key_gym_saved')
+def move_gym_purchases(sender, instance, created, **kwargs):
+    if not created:
+        _move_purchases(instance, 'gym', instance.owner_id)
+
+
+@receiver(pre_save, sender='trainers.Trainer', dispatch_uid='finance.owner_key_trainer_before')
+def remember_trainer_user(sender, instance, **kwargs):
+    _remember_owner(sender, instance, 'user_id')
+
+
+@receiver(post_save, sender='trainers.Trainer', dispatch_uid='finance.owner_key_trainer_saved')
+def move_trainer_purchases(sender, instance, created, **kwargs):
+    if not created:
+        _move_purchases(instance, 'trainer', instance.user_id)
@@ -1,15 +1,39 @@
+import csv
+import io
+import json
+import threading
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 from unittest.mock import patch
+from xml.etree import ElementTree
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from rest_framework.test import APIClient
 
 from accounts.models import User
-from finance.client.gateway import PaymentRequestResult, PaymentVerificationResult
-from finance.models import AdminWallet, Purchase, Transaction, Wallet, TrainerWallet
+from finance.buyer_codes import generate_buyer_code, is_valid_buyer_code, permute
+from finance.client.gateway import (
+    PaymentGatewayError, PaymentRequestResult, PaymentVerificationResult, gateway_metrics, get_zarinpal_client,
+    request_payment, verify_payment,
+)
+from finance.client.purchase import _claim_payment_callback, _finalize_paid_purchase, _settle_payment_callback
+from finance.ledger import InsufficientAdminBalance, credit_admin_wallet, debit_admin_wallet
+from finance.reconciliation import reconcile_pending
+from finance.models import (
+    AdminWallet, AdminWalletShard, DailySales, PaymentCallback, Purchase, Transaction, Wallet, TrainerWallet,
+)
+from finance.serializers import PurchaseHistorySerializer
 from discount.models import DiscountCode, PackageDiscount
 from gyms.models import Gym, GymOperator
 from packages.models import GroupPackage, Package
@@ -72,7 +96,7 @@ class PurchaseFlowTests(TestCase):
 
         self.assertEqual(verify.status_code, 200)
         self.assertEqual(Wallet.objects.get(owner=self.owner).balance, Decimal('90.00'))
-        self.assertEqual(AdminWallet.objects.get(id=1).balance, Decimal('10.00'))
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('10.00'))
 
     @patch('finance.client.pending_purchase.request_payment')
     @patch('finance.client.purchase.verify_payment')
@@ -100,13 +124,13 @@ class PurchaseFlowTests(TestCase):
         purchase = Purchase.objects.get()
         self.assertEqual(purchase.payment_status, 'paid')
         self.assertEqual(purchase.payment_reference_id, '987654321')
-        self.assertEqual(AdminWallet.objects.get(id=1).balance, Decimal('100.00'))
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('100.00'))
 
         self.client.force_authenticate(self.owner)
         verify = self.client.post('/api/v1/verify-by-gym/', {'buyer_code': purchase.buyer_code}, format='json')
         self.assertEqual(verify.status_code, 200)
         self.assertEqual(Wallet.objects.get(owner=self.owner).balance, Decimal('90.00'))
-        self.assertEqual(AdminWallet.objects.get(id=1).balance, Decimal('10.00'))
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('10.00'))
 
     def test_trainer_verify_with_generic_purchase_succeeds(self):
         trainer_user = User.objects.create_user(phone='09120000003', role='trainer', full_name='Trainer User')
@@ -194,6 +218,7 @@ class GymMemberListTests(TestCase):
         )
         self.other_package = Package.objects.create(
             group_package=self.other_group,
+            gym=self.other_gym,
             title='Silver',
             gender='male',
             price=Decimal('80.00'),
@@ -231,9 +256,10 @@ class GymMemberListTests(TestCase):
         response = self.client.get('/api/finance/members/', {'membership_status': 'active'})
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['gym_name'], 'Main Gym')
-        self.assertEqual(response.data[0]['membership_status'], 'active')
+        results = response.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['gym_name'], 'Main Gym')
+        self.assertEqual(results[0]['membership_status'], 'active')
 
     def test_admin_can_filter_by_gym_and_inactive(self):
         self.client.force_authenticate(self.admin)
@@ -243,9 +269,62 @@ class GymMemberListTests(TestCase):
         })
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['gym_id'], self.other_gym.id)
-        self.assertEqual(response.data[0]['membership_status'], 'inactive')
+        results = response.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['gym_id'], self.other_gym.id)
+        self.assertEqual(results[0]['membership_status'], 'inactive')
+
+    def _purchase(self, user, package, days_left, **kwargs):
+        now = timezone.now()
+        return Purchase.objects.create(
+            user=user,
+            content_type=ContentType.objects.get_for_model(Package),
+            object_id=package.id,
+            package=package,
+            total_amount=package.price,
+            final_amount=package.price,
+            payment_status='paid',
+            verification_status='verified',
+            verified_at=now,
+            expire_date=now + timedelta(days=days_left),
+            **kwargs,
+        )
+
+    def test_member_is_listed_once_with_active_membership_preferred(self):
+        active = Purchase.objects.get(user=self.customer_active)
+        # خرید جدیدتر ولی منقضی‌شده نباید جای عضویت فعال را بگیرد
+        self._purchase(self.customer_active, self.package, -1)
+        self.client.force_authenticate(self.owner)
+
+        response = self.client.get('/api/finance/members/', {'gym_id': self.gym.id})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([row['purchase_id'] for row in results], [active.id])
+        self.assertTrue(results[0]['is_active'])
+
+        response = self.client.get('/api/finance/members/', {'gym_id': self.gym.id, 'membership_status': 'inactive'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_cursor_pagination_lists_each_member_once(self):
+        for index in range(5):
+            member = User.objects.create_user(phone=f'0912100000{index}')
+            self._purchase(member, self.package, -3)
+            self._purchase(member, self.package, 20)
+        self.client.force_authenticate(self.owner)
+
+        seen = []
+        url, params = '/api/finance/members/', {'page_size': 2}
+        while url:
+            # صفحه‌ی اعضا + prefetch پکیج‌ها، مستقل از تعداد ردیف‌ها
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertLessEqual(len(queries), 2)
+            seen.extend(row['user_id'] for row in response.data['results'])
+            url, params = response.data['next'], None
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
 
 
 class PurchaseHistoryTests(TestCase):
@@ -310,8 +389,8 @@ class PurchaseHistoryTests(TestCase):
         response = self.client.get('/api/finance/purchase-history/')
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
-        item = response.data[0]
+        self.assertEqual(len(response.data['results']), 1)
+        item = response.data['results'][0]
         self.assertEqual(item['package_title'], 'Platinum')
         self.assertEqual(item['gym_name'], 'History Gym')
         self.assertEqual(item['buyer_code'], '123456')
@@ -327,8 +406,291 @@ class PurchaseHistoryTests(TestCase):
         response = self.client.get('/api/finance/purchase-history/', {'user_id': self.customer.id})
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['user_phone'], self.customer.phone)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['user_phone'], self.customer.phone)
+
+    def test_membership_status_is_computed_in_sql(self):
+        now = timezone.now()
+        base = dict(
+            user=self.customer,
+            package=self.package,
+            total_amount=Decimal('200.00'),
+            final_amount=Decimal('200.00'),
+        )
+        expected = {
+            Purchase.objects.create(**base, payment_status='failed').id: 'failed_payment',
+            Purchase.objects.create(**base, payment_status='pending').id: 'pending_payment',
+            Purchase.objects.create(**base, payment_status='paid', verification_status='rejected').id: 'rejected',
+            Purchase.objects.create(**base, payment_status='paid').id: 'pending_verification',
+            # بدون expire_date: پایان = verified_at + مدت پکیج (۹۰ روز)
+            Purchase.objects.create(
+                **base, payment_status='paid', verification_status='verified', verified_at=now - timedelta(days=80),
+            ).id: 'active',
+            Purchase.objects.create(
+                **base, payment_status='paid', verification_status='verified', verified_at=now - timedelta(days=100),
+            ).id: 'expired',
+            self.active_purchase.id: 'active',
+        }
+        self.client.force_authenticate(self.customer)
+
+        for status, count in (('expired', 1), ('active', 2), ('inactive', 5), ('pending_payment', 1)):
+            response = self.client.get('/api/finance/purchase-history/', {'membership_status': status})
+            self.assertEqual(response.data['count'], count, status)
+
+        # count + صفحه؛ بدون کوئری جدا برای مدت پکیج هر ردیف
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/finance/purchase-history/', {'page_size': 50})
+        rows = {row['purchase_id']: row for row in response.data['results']}
+        self.assertEqual({pk: rows[pk]['membership_status'] for pk in expected}, expected)
+
+        # خروجی SQL با محاسبه‌ی پایتونی سریالایزر یکی است
+        purchases = Purchase.objects.filter(pk__in=expected).order_by('pk')
+        context = {'now': now}
+        self.assertEqual(
+            PurchaseHistorySerializer(purchases.with_membership_status(now), many=True, context=context).data,
+            PurchaseHistorySerializer(purchases, many=True, context=context).data,
+        )
+
+
+class PurchaseOwnerKeyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone='09120000061', role='owner', full_name='Key Owner')
+        self.admin = User.objects.create_user(phone='09120000062', role='admin')
+        self.admin.is_staff = True
+        self.admin.is_superuser = True
+        self.admin.save(update_fields=['is_staff', 'is_superuser'])
+        self.gym = Gym.objects.create(owner=self.owner, name='Key Gym', latitude=35.0, longitude=51.0)
+        self.group = GroupPackage.objects.create(title='Monthly')
+        self.package = Package.objects.create(
+            group_package=self.group,
+            gym=self.gym,
+            title='Keyed',
+            gender='male',
+            price=Decimal('100.00'),
+            duration=30,
+        )
+        self.trainer_user = User.objects.create_user(phone='09120000063', role='trainer')
+        self.trainer = Trainer.objects.create(user=self.trainer_user, name='Key Trainer')
+        self.trainer_package = TrainerPackage.objects.create(
+            trainer=self.trainer,
+            group_package=TrainerGroupPackage.objects.create(title='Coaching'),
+            title='Coach',
+            gender='male',
+            price=Decimal('50.00'),
+            duration=30,
+        )
+
+    def _purchases(self, count, **kwargs):
+        purchases = []
+        for _ in range(count):
+            customer = User.objects.create_user(phone=f'0912200{User.objects.count():04d}')
+            purchases.append(Purchase.objects.create(
+                user=customer,
+                content_type=ContentType.objects.get_for_model(Package),
+                object_id=self.package.id,
+                package=self.package,
+                total_amount=Decimal('100.00'),
+                final_amount=Decimal('100.00'),
+                payment_status='paid',
+                **kwargs,
+            ))
+        return purchases
+
+    def test_keys_are_filled_on_create(self):
+        gym_purchase = self._purchases(1)[0]
+        trainer_purchase = Purchase.objects.create(
+            user=self.admin,
+            purchase_type='trainer',
+            content_type=ContentType.objects.get_for_model(TrainerPackage),
+            object_id=self.trainer_package.id,
+            total_amount=Decimal('50.00'),
+            final_amount=Decimal('50.00'),
+        )
+
+        self.assertEqual((gym_purchase.gym_id, gym_purchase.trainer_id, gym_purchase.owner_user_id), (self.gym.id, None, self.owner.id))
+        self.assertEqual(
+            (trainer_purchase.gym_id, trainer_purchase.trainer_id, trainer_purchase.owner_user_id),
+            (None, self.trainer.id, self.trainer_user.id),
+        )
+
+    def test_backfill_command_fills_missing_keys(self):
+        purchases = self._purchases(3)
+        Purchase.objects.update(gym=None, trainer=None, owner_user=None)
+
+        out = StringIO()
+        call_command('backfill_purchase_owner_keys', '--batch-size', '2', stdout=out)
+
+        self.assertIn('3 purchase(s) updated', out.getvalue())
+        self.assertEqual(
+            set(Purchase.objects.values_list('gym_id', 'owner_user_id')),
+            {(self.gym.id, self.owner.id)},
+        )
+        self.assertEqual(len(purchases), Purchase.objects.filter(owner_user=self.owner).count())
+
+    def test_owner_change_moves_purchases(self):
+        from notifications.models import Notification
+
+        self._purchases(2, verification_status='verified')
+        new_owner = User.objects.create_user(phone='09120000064', role='owner')
+        self.gym.owner = new_owner
+        self.gym.save()
+
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(len(self.client.get('/api/finance/members/').data['results']), 0)
+        self.client.force_authenticate(new_owner)
+        self.assertEqual(len(self.client.get('/api/finance/members/').data['results']), 2)
+
+        purchase = self._purchases(1)[0]
+        purchase.payment_status = 'paid'
+        purchase.save()
+        self.assertTrue(Notification.objects.filter(recipient=new_owner, data__purchase_id=purchase.pk).exists())
+        self.assertFalse(Notification.objects.filter(recipient=self.owner, data__purchase_id=purchase.pk).exists())
+
+        # مربی هم با تغییر کاربرش خریدهایش را منتقل می‌کند
+        trainer_purchase = Purchase.objects.create(
+            user=self.admin,
+            purchase_type='trainer',
+            content_type=ContentType.objects.get_for_model(TrainerPackage),
+            object_id=self.trainer_package.id,
+            total_amount=Decimal('50.00'),
+            final_amount=Decimal('50.00'),
+        )
+        new_trainer_user = User.objects.create_user(phone='09120000065', role='trainer')
+        self.trainer.user = new_trainer_user
+        self.trainer.save()
+        trainer_purchase.refresh_from_db()
+        self.assertEqual(trainer_purchase.owner_user_id, new_trainer_user.id)
+
+    def test_member_list_query_count_does_not_grow(self):
+        self._purchases(2, verification_status='verified')
+        self.client.force_authenticate(self.owner)
+        with self.assertNumQueries(2):
+            self.client.get('/api/finance/members/')
+
+        self._purchases(5, verification_status='verified')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/finance/members/')
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_purchase_history_gym_filter_query_count_does_not_grow(self):
+        self._purchases(2)
+        self.client.force_authenticate(self.admin)
+        # count + صفحه + prefetch پکیج‌ها
+        with self.assertNumQueries(3):
+            self.client.get('/api/finance/purchase-history/', {'gym_id': self.gym.id})
+
+        self._purchases(5)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/finance/purchase-history/', {'gym_id': self.gym.id})
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_monthly_stats_use_single_query_per_section(self):
+        self._purchases(3)
+        Purchase.objects.create(
+            user=self.owner,
+            purchase_type='trainer',
+            content_type=ContentType.objects.get_for_model(TrainerPackage),
+            object_id=self.trainer_package.id,
+            total_amount=Decimal('50.00'),
+            final_amount=Decimal('50.00'),
+            payment_status='paid',
+        )
+        self.client.force_authenticate(self.admin)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/finance/monthly-stats/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['gym_stats'][0]['package__gym__id'], self.gym.id)
+        self.assertEqual(response.data['gym_stats'][0]['total_count'], 3)
+        self.assertEqual(response.data['trainer_stats'][0]['trainer_id'], self.trainer.id)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/admin/finance/gym-gender-sales/')
+        stats = {row['gym_id']: row for row in response.data['gym_gender_stats']}
+        self.assertEqual(stats[self.gym.id]['male_count'], 3)
+
+    def test_paid_notification_reaches_owner_without_resolving_package_owner(self):
+        from notifications.models import Notification
+
+        purchase = self._purchases(1)[0]
+        purchase = Purchase.objects.select_related('user', 'gym', 'owner_user').get(pk=purchase.pk)
+        purchase.payment_status = 'paid'
+
+        # package + insert (owner) + owner's unread counter + insert (admin broadcast) + save
+        with self.assertNumQueries(5):
+            purchase.save()
+
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.owner,
+            notification_type=Notification.NotificationType.PURCHASE,
+        ).exists())
+
+
+class AdminWalletLedgerTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(phone='09120000009', is_staff=True)
+
+    def test_credits_spread_over_shards_and_sum_to_total(self):
+        with self.settings(ADMIN_WALLET_SHARDS=4):
+            for key in range(8):
+                credit_admin_wallet(Decimal('10.00'), key=key)
+
+        self.assertEqual(AdminWalletShard.objects.count(), 4)
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('80.00'))
+
+    def test_debit_uses_own_shard_without_locking_others(self):
+        with self.settings(ADMIN_WALLET_SHARDS=4):
+            credit_admin_wallet(Decimal('50.00'), key=1)
+            credit_admin_wallet(Decimal('50.00'), key=2)
+            debit_admin_wallet(Decimal('30.00'), key=5)
+
+        self.assertEqual(
+            dict(AdminWalletShard.objects.values_list('index', 'balance')),
+            {1: Decimal('20.00'), 2: Decimal('50.00')},
+        )
+
+    def test_debit_falls_back_to_other_shards_and_main_row(self):
+        AdminWallet.objects.create(id=1, balance=Decimal('5.00'))
+        with self.settings(ADMIN_WALLET_SHARDS=4):
+            credit_admin_wallet(Decimal('10.00'), key=1)
+            credit_admin_wallet(Decimal('10.00'), key=2)
+            debit_admin_wallet(Decimal('22.00'), key=1)
+
+        wallet = AdminWallet.objects.get(id=1)
+        self.assertEqual(wallet.total_balance, Decimal('3.00'))
+        self.assertFalse(AdminWalletShard.objects.filter(balance__lt=0).exists())
+
+    def test_debit_more_than_total_is_rejected(self):
+        credit_admin_wallet(Decimal('10.00'), key=1)
+        credit_admin_wallet(Decimal('10.00'), key=2)
+
+        with self.assertRaises(InsufficientAdminBalance):
+            debit_admin_wallet(Decimal('20.01'), key=1)
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('20.00'))
+
+    def test_rollup_keeps_total_balance(self):
+        credit_admin_wallet(Decimal('10.00'), key=1)
+        credit_admin_wallet(Decimal('15.00'), key=2)
+
+        call_command('rollup_admin_wallet', stdout=StringIO())
+
+        wallet = AdminWallet.objects.get(id=1)
+        self.assertEqual(wallet.balance, Decimal('25.00'))
+        self.assertEqual(wallet.total_balance, Decimal('25.00'))
+
+    def test_admin_wallet_view_reports_total_balance(self):
+        AdminWallet.objects.create(id=1, balance=Decimal('5.00'))
+        credit_admin_wallet(Decimal('10.00'), key=3)
+
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get('/api/admin/finance/wallet/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['balance']), Decimal('15.00'))
+        self.assertEqual(Decimal(response.data['settled_balance']), Decimal('5.00'))
 
 
 class CodeExpiryTests(TestCase):
@@ -523,7 +885,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('95000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('2000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('2000.00'))
     
     def test_discount_code_gym_share_reduction(self):
         """تست 2: کد تخفیف از سهم باشگاه - سهم باشگاه کم میشه، سهم ادمین ثابت"""
@@ -566,7 +928,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('85000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('5000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('5000.00'))
     
     def test_package_discount_admin_share_reduction(self):
         """تست 3: تخفیف پکیج از سهم ادمین - سهم ادمین کم میشه، سهم باشگاه ثابت"""
@@ -609,7 +971,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('95000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('2000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('2000.00'))
     
     def test_package_discount_gym_share_reduction(self):
         """تست 4: تخفیف پکیج از سهم باشگاه - سهم باشگاه کم میشه، سهم ادمین ثابت"""
@@ -651,7 +1013,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('85000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('5000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('5000.00'))
     
     def test_combined_admin_code_gym_package_discount(self):
         """تست 5: کد تخفیف ادمین + تخفیف پکیج باشگاه"""
@@ -706,7 +1068,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('90000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('3100.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('3100.00'))
     
     def test_combined_gym_code_admin_package_discount(self):
         """تست 6: کد تخفیف باشگاه + تخفیف پکیج ادمین"""
@@ -761,7 +1123,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('93100.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('3000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('3000.00'))
     
     def test_combined_both_admin_discounts(self):
         """تست 7: هر دو تخفیف از ادمین - محدودیت 5%"""
@@ -818,7 +1180,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('95000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('0.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('0.00'))
     
     def test_combined_both_gym_discounts(self):
         """تست 8: هر دو تخفیف از باشگاه - بدون محدودیت"""
@@ -872,7 +1234,7 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('80500.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('5000.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('5000.00'))
     
     def test_admin_discount_exceeds_commission_limit(self):
         """تست 9: تخفیف ادمین بیشتر از کمیسیون - باید محدود شود"""
@@ -917,4 +1279,745 @@ class FinancialDiscountTests(TestCase):
         self.assertEqual(wallet.balance, Decimal('95000.00'))
         
         admin_wallet = AdminWallet.objects.get(id=1)
-        self.assertEqual(admin_wallet.balance, Decimal('0.00'))
+        self.assertEqual(admin_wallet.total_balance, Decimal('0.00'))
+
+
+class AdminListPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(phone='09120000701', is_staff=True)
+        self.owner = User.objects.create_user(phone='09120000702', role='owner')
+        self.wallet, _ = Wallet.objects.get_or_create(owner=self.owner)
+        gym = Gym.objects.create(owner=self.owner, name='Paged Gym', latitude=35.0, longitude=51.0)
+        package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='Monthly'), gym=gym, title='Basic',
+            gender='male', price=Decimal('100.00'), duration=30, commission_rate=0.10,
+        )
+        for index in range(7):
+            Purchase.objects.create(
+                user=self.owner, package=package, total_amount=Decimal('100.00'),
+                commission_amount=Decimal('10.00'), net_amount=Decimal('90.00'), final_amount=Decimal('100.00'),
+            )
+            Transaction.objects.create(wallet=self.wallet, amount=Decimal(index), status='completed')
+        self.client.force_authenticate(self.admin)
+
+    def _walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_purchase_list_cursor_visits_every_row_once(self):
+        expected = list(Purchase.objects.order_by('-id').values_list('id', flat=True))
+
+        self.assertEqual(self._walk('/api/admin/finance/purchases/', {'page_size': 3}), expected)
+        self.assertEqual(
+            self._walk('/api/admin/finance/purchases/', {'page_size': 3, 'ordering': 'purchase_date'}),
+            expected[::-1],
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        for url in (
+            '/api/admin/finance/purchases/',
+            f'/api/admin/finance/wallets/{self.wallet.pk}/transactions/',
+        ):
+            response = self.client.get(url, {'cursor': 'not-a-cursor'})
+
+            self.assertEqual(response.status_code, 404, url)
+
+    def test_purchase_list_rejects_unindexed_ordering(self):
+        response = self.client.get('/api/admin/finance/purchases/', {'ordering': 'final_amount'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_wallet_transactions_by_pk_is_paginated(self):
+        expected = list(self.wallet.transactions.order_by('-id').values_list('id', flat=True))
+
+        ids = self._walk(f'/api/admin/finance/wallets/{self.wallet.pk}/transactions/', {'page_size': 4})
+
+        self.assertEqual(ids, expected)
+
+    def test_ndjson_export_streams_every_row(self):
+        response = self.client.get('/api/admin/finance/purchases/', {'export': 'ndjson', 'payment_status': 'pending'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            list(Purchase.objects.order_by('-purchase_date', '-id').values_list('id', flat=True)),
+        )
+        self.assertEqual(rows[0]['final_amount'], '100.00')
+
+
+class FinanceExportTests(TestCase):
+    EXPORT_ROWS = 200_000
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(phone='09120000801', is_staff=True)
+        self.owner = User.objects.create_user(phone='09120000802', role='owner', full_name='مالک')
+        self.wallet, _ = Wallet.objects.get_or_create(owner=self.owner)
+        self.client.force_authenticate(self.admin)
+
+    def test_purchase_csv_uses_admin_list_filters_and_jalali_dates(self):
+        gym = Gym.objects.create(owner=self.owner, name='Export Gym', latitude=35.0, longitude=51.0)
+        package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='Monthly'), gym=gym, title='Basic',
+            gender='male', price=Decimal('100.00'), duration=30, commission_rate=0.10,
+        )
+        for payment_status in ('paid', 'pending'):
+            Purchase.objects.create(
+                user=self.owner, package=package, payment_status=payment_status, total_amount=Decimal('100.00'),
+                commission_amount=Decimal('10.00'), net_amount=Decimal('90.00'), final_amount=Decimal('100.00'),
+            )
+        Purchase.objects.update(purchase_date=timezone.make_aware(timezone.datetime(2024, 3, 20, 10, 30)))
+
+        response = self.client.get('/api/admin/finance/exports/purchases.csv', {'payment_status': 'paid'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('purchases-', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][0], 'شناسه')
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['وضعیت پرداخت'], 'paid')
+        self.assertEqual(row['باشگاه'], 'Export Gym')
+        self.assertEqual(row['مبلغ نهایی'], '100.00')
+        self.assertEqual(row['تاریخ خرید'], '1403/01/01 10:30')
+        self.assertEqual(row['تاریخ انقضا'], '')
+
+    def test_xlsx_is_a_valid_workbook(self):
+        Transaction.objects.create(wallet=self.wallet, amount=Decimal('12.50'), description='<واریز & "برداشت">')
+
+        response = self.client.get('/api/admin/finance/exports/transactions.xlsx')
+
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('s:sheetData/s:row', namespace)
+        self.assertEqual(len(rows), 2)
+        cells = rows[1].findall('s:c', namespace)
+        self.assertEqual(cells[3].find('s:v', namespace).text, '12.50')
+        self.assertEqual(''.join(cells[9].itertext()), '<واریز & "برداشت">')
+        self.assertEqual(cells[4].find('s:is/s:t', namespace).text, self.owner.phone)
+
+    def test_formula_like_text_is_neutralised_in_csv_and_xlsx(self):
+        Transaction.objects.create(wallet=self.wallet, amount=Decimal('12.50'), description='=HYPERLINK("http://x","y")')
+        Transaction.objects.create(wallet=self.wallet, amount=Decimal('5.00'), description='\tعادی')
+
+        content = b''.join(self.client.get('/api/admin/finance/exports/transactions.csv').streaming_content)
+        rows = list(csv.reader(content.decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[1][9], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(rows[2][9], "'\tعادی")
+        self.assertEqual(rows[1][3], '12.50')
+
+        response = self.client.get('/api/admin/finance/exports/transactions.xlsx')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        cells = sheet.findall('s:sheetData/s:row', namespace)[1].findall('s:c', namespace)
+        self.assertEqual(''.join(cells[9].itertext()), '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(cells[3].find('s:v', namespace).text, '12.50')
+
+    def test_unknown_report_and_bad_dates_are_rejected(self):
+        self.assertEqual(self.client.get('/api/admin/finance/exports/users.csv').status_code, 404)
+        self.assertEqual(self.client.get('/api/admin/finance/exports/purchases.pdf').status_code, 400)
+        response = self.client.get('/api/admin/finance/exports/purchases.csv', {'from': '1403-13-40'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_memory_is_bounded_for_large_tables(self):
+        # سطرهای مصنوعی مستقیم با executemany درج می‌شوند (bulk_create برای 200 هزار سطر کند است)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {Transaction._meta.db_table} '
+                '(wallet_id, amount, type, status, description, created_at) VALUES (%s, %s, %s, %s, %s, %s)',
+                [
+                    (self.wallet.pk, index % 1000, 'credit', 'completed', f'synthetic transaction {index}',
+                     timezone.now())
+                    for index in range(self.EXPORT_ROWS)
+                ],
+            )
+        self.assertEqual(Transaction.objects.count(), self.EXPORT_ROWS)
+
+        response = self.client.get('/api/admin/finance/exports/transactions.csv')
+        size = rows = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                rows += chunk.count(b'\n')
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(rows, self.EXPORT_ROWS + 1)
+        # خروجی حدود 16MB است؛ حافظه‌ی مصرفی فقط به اندازه‌ی یک chunk از سطرها است
+        self.assertGreater(size, 10 * 1024 * 1024)
+        self.assertLess(peak, 8 * 1024 * 1024)
+
+
+class DailySalesRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone='09120000901', role='owner')
+        self.admin = User.objects.create_user(phone='09120000902', is_staff=True)
+        self.customer = User.objects.create_user(phone='09120000903')
+        self.gym = Gym.objects.create(owner=self.owner, name='Rollup Gym', latitude=35.0, longitude=51.0)
+        group = GroupPackage.objects.create(title='Monthly')
+        self.packages = {
+            gender: Package.objects.create(
+                group_package=group, gym=self.gym, title=gender, gender=gender,
+                price=Decimal('100.00'), duration=30, commission_rate=0.10,
+            )
+            for gender in ('male', 'female')
+        }
+        trainer = Trainer.objects.create(user=User.objects.create_user(phone='09120000904'), name='Rollup Trainer')
+        self.trainer = trainer
+        self.trainer_package = TrainerPackage.objects.create(
+            trainer=trainer, group_package=TrainerGroupPackage.objects.create(title='Coaching'),
+            title='Coach', gender='female', price=Decimal('50.00'), duration=30,
+        )
+
+    def _purchase(self, pkg, amount, **kwargs):
+        return Purchase.objects.create(
+            user=self.customer,
+            purchase_type='trainer' if isinstance(pkg, TrainerPackage) else 'gym',
+            content_type=ContentType.objects.get_for_model(pkg),
+            object_id=pkg.id,
+            total_amount=amount,
+            commission_amount=amount / 10,
+            net_amount=amount - amount / 10,
+            final_amount=amount,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _rollup():
+        return sorted(
+            DailySales.objects.values_list(
+                'date', 'purchase_type', 'gym_id', 'trainer_id', 'gender',
+                'paid_count', 'gross', 'commission', 'net', 'verified_count', 'verified_net',
+            ),
+            key=str,
+        )
+
+    def test_transitions_update_rollup_incrementally_and_match_rebuild(self):
+        today = timezone.localdate()
+        male = self._purchase(self.packages['male'], Decimal('100.00'))
+        self.assertFalse(DailySales.objects.exists())
+
+        male = Purchase.objects.get(pk=male.pk)
+        male.payment_status = 'paid'
+        male.save(update_fields=['payment_status'])
+        self._purchase(self.packages['male'], Decimal('200.00'), payment_status='paid')
+        self._purchase(self.packages['female'], Decimal('80.00'), payment_status='paid')
+        self._purchase(self.trainer_package, Decimal('50.00'), payment_status='paid')
+        refunded = self._purchase(self.packages['female'], Decimal('30.00'), payment_status='paid')
+        refunded.payment_status = 'refunded'
+        refunded.save(update_fields=['payment_status'])
+
+        male.verification_status = 'verified'
+        male.verified_at = timezone.now()
+        male.save(update_fields=['verification_status', 'verified_at'])
+        male.save()
+
+        rows = {(row.purchase_type, row.gender): row for row in DailySales.objects.all()}
+        self.assertEqual(len(rows), 3)
+        gym_male = rows[('gym', 'male')]
+        self.assertEqual((gym_male.date, gym_male.gym_id), (today, self.gym.id))
+        self.assertEqual((gym_male.paid_count, gym_male.gross, gym_male.net), (2, Decimal('300.00'), Decimal('270.00')))
+        self.assertEqual((gym_male.verified_count, gym_male.verified_net), (1, Decimal('90.00')))
+        self.assertEqual((rows[('gym', 'female')].paid_count, rows[('gym', 'female')].gross), (1, Decimal('80.00')))
+        self.assertEqual(rows[('trainer', 'female')].trainer_id, self.trainer.id)
+
+        incremental = self._rollup()
+        call_command('rebuild_daily_sales', stdout=StringIO())
+        self.assertEqual(self._rollup(), incremental)
+
+    def test_admin_reject_action_updates_rollup(self):
+        from django.contrib.admin.sites import site
+
+        purchase = self._purchase(self.packages['male'], Decimal('100.00'), payment_status='paid')
+        purchase.verification_status = 'verified'
+        purchase.verified_at = timezone.now()
+        purchase.save(update_fields=['verification_status', 'verified_at'])
+        self.assertEqual(DailySales.objects.get().verified_count, 1)
+
+        site._registry[Purchase].mark_as_rejected(None, Purchase.objects.filter(pk=purchase.pk))
+
+        self.assertEqual(DailySales.objects.get().verified_count, 0)
+        incremental = self._rollup()
+        call_command('rebuild_daily_sales', stdout=StringIO())
+        self.assertEqual(self._rollup(), incremental)
+
+    def test_rebuild_with_range_keeps_other_days(self):
+        old = self._purchase(self.packages['male'], Decimal('100.00'), payment_status='paid')
+        self._purchase(self.packages['male'], Decimal('100.00'), payment_status='paid')
+        # update از save عبور نمی‌کند؛ سطر امروز هنوز خرید قدیمی را هم می‌شمارد
+        Purchase.objects.filter(pk=old.pk).update(purchase_date=timezone.now() - timedelta(days=40))
+
+        today = timezone.localdate()
+        call_command('rebuild_daily_sales', '--from', str(today - timedelta(days=45)), '--to', str(today - timedelta(days=35)),
+                     stdout=StringIO())
+
+        self.assertEqual(
+            sorted(DailySales.objects.values_list('date', 'paid_count')),
+            [(today - timedelta(days=40), 1), (today, 2)],
+        )
+
+    def test_stats_read_rollup_for_requested_range(self):
+        self._purchase(self.packages['male'], Decimal('100.00'), payment_status='paid')
+        self._purchase(self.packages['female'], Decimal('70.00'), payment_status='paid')
+        self._purchase(self.trainer_package, Decimal('50.00'), payment_status='paid')
+        old = self._purchase(self.packages['male'], Decimal('500.00'), payment_status='paid')
+        Purchase.objects.filter(pk=old.pk).update(purchase_date=timezone.now() - timedelta(days=60))
+        call_command('rebuild_daily_sales', stdout=StringIO())
+        self.client.force_authenticate(self.admin)
+        today = timezone.localdate()
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/admin/finance/monthly-stats/', {'from': str(today - timedelta(days=7))})
+        self.assertEqual(response.data['gym_stats'][0]['total_sales'], Decimal('170.00'))
+        self.assertEqual(response.data['gym_stats'][0]['total_count'], 2)
+        self.assertEqual(response.data['trainer_stats'][0]['trainer_name'], 'Rollup Trainer')
+
+        response = self.client.get('/api/admin/finance/monthly-stats/', {'from': str(today - timedelta(days=90))})
+        self.assertEqual(response.data['gym_stats'][0]['total_count'], 3)
+
+        response = self.client.get('/api/admin/finance/gym-gender-sales/')
+        self.assertEqual(response.data['period'], 'last_30_days')
+        self.assertEqual(
+            response.data['gym_gender_stats'],
+            [{'gym_id': self.gym.id, 'gym_name': 'Rollup Gym', 'male_sales': 100.0, 'male_count': 1,
+              'female_sales': 70.0, 'female_count': 1}],
+        )
+
+        response = self.client.get('/api/admin/finance/gym-gender-sales/', {'from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeZarinpal:
+    """کلاینت جعلی زرین‌پال برای get_zarinpal_client؛ verify تا باز شدن gate منتظر می‌ماند"""
+
+    def __init__(self, code=100, ref_id=778899, error=None, codes=None, delay=0):
+        self.code = code
+        self.delay = delay
+        self.active = self.max_active = 0
+        # کد پاسخ برای authorityهای خاص
+        self.codes = codes or {}
+        self.ref_id = ref_id
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+        self._lock = threading.Lock()
+
+    def verify(self, payload):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.started.set()
+        self.gate.wait(10)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if self.error:
+            raise self.error
+        code = self.codes.get(payload['authority'], self.code)
+        return {'data': {'code': code, 'ref_id': self.ref_id, 'authority': payload['authority']}}
+
+
+def _callback_purchase(phone, authority):
+    customer = User.objects.create_user(phone=phone)
+    owner = User.objects.create_user(phone=f'0913{phone[4:]}', role='owner')
+    gym = Gym.objects.create(owner=owner, name='Callback Gym', latitude=35.0, longitude=51.0)
+    package = Package.objects.create(
+        group_package=GroupPackage.objects.create(title='Monthly'), gym=gym, title='Basic', gender='male',
+        price=Decimal('100000.00'), duration=30, commission_rate=0.10,
+    )
+    purchase = Purchase.objects.create(
+        user=customer,
+        package=package,
+        content_type=ContentType.objects.get_for_model(Package),
+        object_id=package.id,
+        payment_authority=authority,
+        total_amount=Decimal('100000.00'),
+        commission_amount=Decimal('10000.00'),
+        net_amount=Decimal('90000.00'),
+        final_amount=Decimal('100000.00'),
+    )
+    Transaction.objects.create(purchase=purchase, amount=purchase.final_amount, status='pending')
+    return purchase
+
+
+@override_settings(PAYMENT_GATEWAY_MERCHANT_ID='test-merchant')
+class PaymentCallbackPipelineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.purchase = _callback_purchase('09120000951', 'AUTH-CB-1')
+        self.gateway = FakeZarinpal()
+        patcher = patch('finance.client.gateway.get_zarinpal_client', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _callback(self, status='OK'):
+        return self.client.get('/api/finance/payment/callback/', {'Authority': 'AUTH-CB-1', 'Status': status})
+
+    def test_duplicate_callback_uses_fast_path_without_gateway(self):
+        first = self._callback()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['status'], 'success')
+
+        second = self._callback()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['status'], 'already_paid')
+        self.assertEqual(second.data['reference_id'], '778899')
+        self.assertEqual(second.data['buyer_code'], generate_buyer_code(self.purchase.id))
+
+        self.assertEqual(self.gateway.calls, 1)
+        record = PaymentCallback.objects.get(authority='AUTH-CB-1')
+        self.assertEqual((record.state, record.reference_id, record.attempts), ('paid', '778899', 1))
+        self.assertEqual(Transaction.objects.filter(purchase=self.purchase, status='completed').count(), 1)
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('100000.00'))
+
+    def test_canceled_payment_fails_without_verify(self):
+        response = self._callback(status='NOK')
+
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(self.gateway.calls, 0)
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'failed')
+        self.assertEqual(PaymentCallback.objects.get(authority='AUTH-CB-1').state, 'failed')
+        self.assertEqual(self._callback().data['status'], 'failed')
+        self.assertEqual(self.gateway.calls, 0)
+
+    def test_gateway_error_releases_claim_for_retry(self):
+        self.gateway.error = PaymentGatewayError('Payment verify failed: timeout')
+        response = self._callback()
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(PaymentCallback.objects.get(authority='AUTH-CB-1').state, 'received')
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'pending')
+
+        self.gateway.error = None
+        self.assertEqual(self._callback().data['status'], 'success')
+        self.assertEqual(PaymentCallback.objects.get(authority='AUTH-CB-1').attempts, 2)
+
+    def test_stale_verifying_claim_is_taken_over(self):
+        PaymentCallback.objects.create(authority='AUTH-CB-1', purchase=self.purchase, state='verifying', attempts=1)
+        self.assertEqual(self._callback().status_code, 202)
+        self.assertEqual(self.gateway.calls, 0)
+
+        PaymentCallback.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self._callback().data['status'], 'success')
+        self.assertEqual(self.gateway.calls, 1)
+
+
+@override_settings(PAYMENT_GATEWAY_MERCHANT_ID='test-merchant')
+class PaymentCallbackConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicate_callbacks_verify_once(self):
+        purchase = _callback_purchase('09120000961', 'AUTH-CB-2')
+        gateway = FakeZarinpal()
+        # verify اول تا پاسخ گرفتن همه‌ی بازگشت‌های تکراری باز نمی‌شود
+        gateway.gate.clear()
+
+        def callback():
+            try:
+                response = APIClient().get('/api/finance/payment/callback/', {'Authority': 'AUTH-CB-2', 'Status': 'OK'})
+                return response.status_code, response.data['status']
+            finally:
+                connection.close()
+
+        with patch('finance.client.gateway.get_zarinpal_client', return_value=gateway), \
+                ThreadPoolExecutor(max_workers=6) as pool:
+            verifier = pool.submit(callback)
+            self.assertTrue(gateway.started.wait(10))
+            duplicates = [pool.submit(callback) for _ in range(5)]
+            duplicate_results = [future.result(timeout=10) for future in duplicates]
+            gateway.gate.set()
+            self.assertEqual(verifier.result(timeout=10), (200, 'success'))
+
+        self.assertEqual(duplicate_results, [(202, 'processing')] * 5)
+        self.assertEqual(gateway.calls, 1)
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.payment_status, 'paid')
+        self.assertEqual(Transaction.objects.filter(purchase=purchase, status='completed').count(), 1)
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('100000.00'))
+
+
+class _FakeZarinpalHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 تا اتصال keep-alive بماند و استفاده‌ی دوباره از آن قابل بررسی باشد
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        self.server.received.append((self.path, body, self.client_address[1]))
+        status, delay = self.server.script.pop(0) if self.server.script else (200, 0)
+        time.sleep(delay)
+        if self.path.endswith('/request.json'):
+            data = {'data': {'code': 100, 'message': 'Success', 'authority': 'A00000000000000000000000000000012345'}}
+        elif status == 200:
+            data = {'data': {'code': 100, 'message': 'Verified', 'ref_id': 201}}
+        else:
+            data = {'data': [], 'errors': {'code': -51, 'message': 'Session is not active'}}
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class ZarinpalGatewayTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeZarinpalHandler)
+        cls.server.received = []
+        cls.server.script = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.received.clear()
+        self.server.script.clear()
+        settings_override = override_settings(
+            PAYMENT_GATEWAY_MERCHANT_ID='merchant-1',
+            PAYMENT_GATEWAY_BASE_URL=f'http://127.0.0.1:{self.server.server_port}',
+            PAYMENT_GATEWAY_TIMEOUT=0.5,
+            PAYMENT_GATEWAY_BREAKER_THRESHOLD=2,
+            PAYMENT_GATEWAY_BREAKER_RESET=60,
+            PAYMENT_GATEWAY_AMOUNT_MULTIPLIER=1,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.gateway = get_zarinpal_client()
+        self.addCleanup(self.gateway.close)
+        self.gateway.metrics.reset()
+
+    def test_client_is_shared_and_reuses_connection(self):
+        result = request_payment(amount=Decimal('50000'), description='test', callback_url='https://app/cb')
+        verification = verify_payment(amount=Decimal('50000'), authority=result.authority)
+
+        self.assertIs(get_zarinpal_client(), self.gateway)
+        self.assertTrue(verification.success)
+        self.assertEqual(verification.reference_id, '201')
+        self.assertEqual(result.payment_url, f'{self.gateway.base_url}/pg/StartPay/{result.authority}')
+        paths = [path for path, _, _ in self.server.received]
+        self.assertEqual(paths, ['/pg/v4/payment/request.json', '/pg/v4/payment/verify.json'])
+        self.assertEqual(self.server.received[1][1], {
+            'merchant_id': 'merchant-1', 'amount': 50000, 'authority': result.authority,
+        })
+        # هر دو درخواست روی یک اتصال keep-alive رفته‌اند
+        self.assertEqual(len({port for _, _, port in self.server.received}), 1)
+
+        metrics = gateway_metrics()['operations']
+        self.assertEqual((metrics['request']['calls'], metrics['verify']['calls']), (1, 1))
+        self.assertEqual(metrics['verify']['errors'], 0)
+
+    def test_rejected_verification_is_not_a_gateway_failure(self):
+        self.server.script.append((400, 0))
+
+        verification = verify_payment(amount=Decimal('50000'), authority='A1')
+
+        self.assertFalse(verification.success)
+        self.assertEqual(self.gateway.breaker.failures, 0)
+
+    def test_circuit_breaker_fails_fast_after_repeated_errors(self):
+        self.server.script.extend([(500, 0), (200, 1)])
+
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayError):
+                verify_payment(amount=Decimal('50000'), authority='A1')
+        self.assertEqual(gateway_metrics()['circuit_state'], 'open')
+
+        with self.assertRaisesMessage(PaymentGatewayError, 'temporarily unavailable'):
+            verify_payment(amount=Decimal('50000'), authority='A1')
+        self.assertEqual(len(self.server.received), 2)
+
+        metrics = gateway_metrics()['operations']['verify']
+        self.assertEqual((metrics['calls'], metrics['errors'], metrics['rejected']), (2, 2, 1))
+        # خطای دوم timeout بوده است
+        self.assertGreaterEqual(metrics['max_latency'], 0.5)
+
+        # بعد از reset_timeout یک درخواست آزمایشی عبور می‌کند و موفقیتش breaker را می‌بندد
+        self.gateway.breaker.opened_at -= 60
+        self.assertEqual(gateway_metrics()['circuit_state'], 'half_open')
+        self.assertTrue(verify_payment(amount=Decimal('50000'), authority='A1').success)
+        self.assertEqual(gateway_metrics()['circuit_state'], 'closed')
+
+
+@override_settings(PAYMENT_GATEWAY_MERCHANT_ID='test-merchant')
+class PendingReconciliationTests(TestCase):
+    def setUp(self):
+        self.gateway = FakeZarinpal(codes={'AUTH-RC-2': -51})
+        patcher = patch('finance.client.gateway.get_zarinpal_client', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.paid = _callback_purchase('09120000971', 'AUTH-RC-1')
+        self.abandoned = _callback_purchase('09120000972', 'AUTH-RC-2')
+        self.never_started = _callback_purchase('09120000973', None)
+        self.in_callback = _callback_purchase('09120000974', 'AUTH-RC-4')
+        PaymentCallback.objects.create(authority='AUTH-RC-4', purchase=self.in_callback, state='verifying')
+        Purchase.objects.update(purchase_date=timezone.now() - timedelta(hours=3))
+        self.fresh = _callback_purchase('09120000975', 'AUTH-RC-5')
+
+    def test_stale_pending_purchases_are_finalized_or_failed(self):
+        report = reconcile_pending(older_than=timedelta(hours=1), batch_size=2, workers=1)
+
+        self.assertEqual((report.paid, report.failed, report.skipped, report.errors), (1, 2, 1, 0))
+        self.assertEqual(report.batches, 2)
+        statuses = dict(Purchase.objects.values_list('payment_authority', 'payment_status'))
+        self.assertEqual(statuses, {
+            'AUTH-RC-1': 'paid', 'AUTH-RC-2': 'failed', None: 'failed', 'AUTH-RC-4': 'pending', 'AUTH-RC-5': 'pending',
+        })
+        self.assertEqual(self.gateway.calls, 2)
+        self.assertEqual(
+            list(Transaction.objects.filter(purchase=self.abandoned).values_list('status', 'description')),
+            [('failed', f'Payment abandoned for purchase #{self.abandoned.id}')],
+        )
+        self.assertEqual(PaymentCallback.objects.get(authority='AUTH-RC-1').state, 'paid')
+        self.assertEqual(AdminWallet.objects.get(id=1).total_balance, Decimal('100000.00'))
+
+        # اجرای دوباره کاری برای انجام ندارد جز خریدی که هنوز در بازگشت درگاه است
+        report = reconcile_pending(older_than=timedelta(hours=1), workers=1)
+        self.assertEqual((report.processed, report.skipped), (1, 1))
+        self.assertEqual(self.gateway.calls, 2)
+
+    def test_gateway_error_leaves_purchase_pending(self):
+        self.gateway.error = PaymentGatewayError('Payment gateway is temporarily unavailable')
+
+        report = reconcile_pending(older_than=timedelta(hours=1), workers=1, limit=1)
+
+        self.assertEqual((report.processed, report.errors), (1, 1))
+        self.paid.refresh_from_db()
+        self.assertEqual(self.paid.payment_status, 'pending')
+        self.assertEqual(PaymentCallback.objects.get(authority='AUTH-RC-1').state, 'received')
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        call_command('reconcile_pending_purchases', '--workers', '1', '--older-than', '60', stdout=out)
+
+        self.assertIn('1 paid, 2 failed, 1 skipped, 0 errors', out.getvalue())
+        self.assertIn('purchases/s', out.getvalue())
+
+
+@override_settings(PAYMENT_GATEWAY_MERCHANT_ID='test-merchant')
+class PendingReconciliationPoolTests(TransactionTestCase):
+    def test_worker_pool_verifies_each_purchase_once(self):
+        gateway = FakeZarinpal(delay=0.1)
+        purchases = [_callback_purchase(f'0912000098{i}', f'AUTH-POOL-{i}') for i in range(4)]
+        Purchase.objects.update(purchase_date=timezone.now() - timedelta(hours=3))
+
+        # SQLite (shared cache) نوشتن همزمان از چند thread را نمی‌پذیرد؛ فقط بخش دیتابیس سریالی
+        # می‌شود و verify درگاه همچنان موازی اجرا می‌شود
+        db_lock = threading.Lock()
+
+        def serialized(func):
+            def wrapper(*args, **kwargs):
+                with db_lock:
+                    return func(*args, **kwargs)
+            return wrapper
+
+        with patch('finance.client.gateway.get_zarinpal_client', return_value=gateway), \
+                patch('finance.reconciliation._claim_payment_callback', serialized(_claim_payment_callback)), \
+                patch('finance.reconciliation._settle_payment_callback', serialized(_settle_payment_callback)):
+            report = reconcile_pending(older_than=timedelta(hours=1), batch_size=4, workers=4)
+
+        self.assertEqual((report.paid, report.errors), (4, 0))
+        self.assertEqual(gateway.calls, 4)
+        self.assertGreater(gateway.max_active, 1)
+        self.assertEqual(
+            Purchase.objects.filter(pk__in=[p.pk for p in purchases], payment_status='paid').count(), 4,
+        )
+
+
+class BuyerCodeTests(TestCase):
+    def test_permutation_is_a_bijection(self):
+        key = b'k' * 32
+        self.assertEqual(len({permute(number, 4, key) for number in range(10 ** 4)}), 10 ** 4)
+
+    def test_codes_are_unique_across_namespace_growth(self):
+        ids = list(range(1, 2000)) + list(range(10 ** 6 - 1000, 10 ** 6 + 1000))
+        codes = [generate_buyer_code(purchase_id) for purchase_id in ids]
+
+        self.assertEqual(len(set(codes)), len(codes))
+        self.assertEqual({len(code) for code in codes}, {7, 9})
+        self.assertEqual(len(generate_buyer_code(10 ** 6 - 1)), 7)
+        self.assertEqual(len(generate_buyer_code(10 ** 6)), 9)
+        self.assertTrue(all(is_valid_buyer_code(code) for code in codes))
+
+    def test_check_digit_rejects_typos(self):
+        for code in (generate_buyer_code(purchase_id) for purchase_id in range(1, 200)):
+            for index, digit in enumerate(code):
+                for other in '0123456789'.replace(digit, ''):
+                    self.assertFalse(is_valid_buyer_code(code[:index] + other + code[index + 1:]))
+                if index + 1 < len(code) and code[index] != code[index + 1]:
+                    swapped = code[:index] + code[index + 1] + code[index] + code[index + 2:]
+                    self.assertFalse(is_valid_buyer_code(swapped))
+        # کدهای ۶ رقمی قدیمی رقم کنترل ندارند
+        self.assertTrue(is_valid_buyer_code('123456'))
+        self.assertFalse(is_valid_buyer_code('12345'))
+        self.assertFalse(is_valid_buyer_code('12a4567'))
+
+    def test_verify_rejects_mistyped_code_without_queries(self):
+        owner = User.objects.create_user(phone='09120000991', role='owner')
+        code = generate_buyer_code(42)
+        typo = code[:-2] + code[-1] + code[-2] if code[-1] != code[-2] else code[:-1] + str((int(code[-1]) + 1) % 10)
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        with self.assertNumQueries(0):
+            response = client.post('/api/finance/verify-by-gym/', {'buyer_code': typo}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_taken_code_moves_payment_to_next_version(self):
+        owner = User.objects.create_user(phone='09120000992', role='owner')
+        buyer = User.objects.create_user(phone='09120000993')
+        gym = Gym.objects.create(owner=owner, name='Code Gym', latitude=35.0, longitude=51.0)
+        package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='Monthly'), gym=gym, title='Basic',
+            gender='male', price=Decimal('100.00'), duration=30, commission_rate=0.10,
+        )
+        amounts = dict(
+            total_amount=Decimal('100.00'), commission_amount=Decimal('10.00'),
+            net_amount=Decimal('90.00'), final_amount=Decimal('100.00'),
+        )
+        purchase = Purchase.objects.create(user=buyer, package=package, payment_status='pending', **amounts)
+        # کدی که قبل از عوض شدن کلید به خرید دیگری داده شده
+        Purchase.objects.create(
+            user=buyer, package=package, payment_status='paid', buyer_code=generate_buyer_code(purchase.id), **amounts,
+        )
+        wallet, _ = Wallet.objects.get_or_create(owner=buyer)
+        trans = Transaction.objects.create(wallet=wallet, amount=Decimal('100.00'), status='pending')
+
+        _finalize_paid_purchase(purchase=purchase, transaction_obj=trans)
+
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.payment_status, 'paid')
+        self.assertEqual(purchase.buyer_code, generate_buyer_code(purchase.id, version=1))
+        self.assertEqual(len(purchase.buyer_code), 9)
+        self.assertTrue(is_valid_buyer_code(purchase.buyer_code))
@@ -0,0 +1,143 @@
+"""
+کش پاسخ endpointهای عمومی کاتالوگ با invalidation نسخه‌دار.
+
+هر موجودیت (gym, package, trainer, discount) یک کلید نسخه در کش دارد که با سیگنال‌های
+post_save/post_delete همان اپ (signals.py) افزایش می‌یابد. کلید هر پاسخ کش‌شده شامل
+نسخه‌ی موجودیت‌هایی است که به آن‌ها وابسته است، پس با تغییر داده فقط همان صفحات
+بی‌اعتبار می‌شوند و نیازی به پاک کردن کش یا انتظار برای TTL نیست.
+
+برای چند worker (gunicorn) باید CACHE_BACKEND روی یک backend مشترک مثل Redis تنظیم شود؛
+در غیر این صورت هر worker نسخه‌های خودش را دارد و تغییرات فقط پس از TTL دیده می‌شوند.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ENTITIES = ('gym', 'package', 'trainer', 'discount')
+
+_KEY_PREFIX = 'catalog'
+
+
+def _version_key(entity):
+    return f'{_KEY_PREFIX}:version:{entity}'
+
+
+def _stats_key(name, outcome):
+    return f'{_KEY_PREFIX}:stats:{name}:{outcome}'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # کلید وجود ندارد (یا evict شده است)
+        cache.add(key, 1, timeout=None)
+        return 1
+
+
+def bump_version(*entities):
+    """بی‌اعتبار کردن همه‌ی پاسخ‌های کش‌شده‌ی وابسته به این موجودیت‌ها"""
+    for entity in entities:
+        if entity not in CATALOG_ENTITIES:
+            raise ValueError(f'Unknown catalog entity: {entity}')
+        key = _version_key(entity)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # نسخه‌ی اولیه بر اساس زمان است تا بعد از evict شدن کلید، صفحات قدیمی دوباره معتبر نشوند
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_versions(entities):
+    keys = [_version_key(entity) for entity in entities]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, time.time_ns(), timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key, 0)) for key in keys]
+
+
+def response_cache_key(name, entities, request):
+    versions = '.'.join(get_versions(entities))
+    # آدرس‌های مطلق (banner/images) به host و scheme درخواست وابسته‌اند
+    path = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'{_KEY_PREFIX}:response:{name}:{versions}:{path}'
+
+
+def record(name, outcome):
+    _incr(_stats_key(name, outcome))
+
+
+def get_stats(names):
+    keys = {name: (_stats_key(name, 'hit'), _stats_key(name, 'miss')) for name in names}
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    stats = {}
+    for name, (hit_key, miss_key) in keys.items():
+        hits = values.get(hit_key, 0)
+        misses = values.get(miss_key, 0)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def reset_stats(names):
+    cache.delete_many([_stats_key(name, outcome) for name in names for outcome in ('hit', 'miss')])
+
+
+# نام endpointهای کش‌شده برای گزارش آمار
+CACHED_ENDPOINTS = []
+
+
+def cache_response(name, entities):
+    """
+    دکوریتور متد get یک APIView: پاسخ‌های 200 تا تغییر یکی از entities کش می‌شوند.
+    هدر X-Cache مقدار HIT یا MISS دارد.
+    """
+    for entity in entities:
+        if entity not in CATALOG_ENTITIES:
+            raise ValueError(f'Unknown catalog entity: {entity}')
+    CACHED_ENDPOINTS.append(name)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            try:
+                key = response_cache_key(name, entities, request)
+                cached = cache.get(key)
+            except Exception:
+                logger.exception('Catalog cache unavailable for %s', name)
+                return method(view, request, *args, **kwargs)
+
+            if cached is not None:
+                record(name, 'hit')
+                response = Response(cached['data'], status=cached['status'])
+                response['X-Cache'] = 'HIT'
+                return response
+
+            record(name, 'miss')
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, {'data': response.data, 'status': response.status_code}, _timeout())
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
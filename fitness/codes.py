@@ -0,0 +1,55 @@
+"""
+ساخت کدهای یکتا (کد معرف کاربر، کد تخفیف معرفی) بدون جستجو در جدول.
+
+کد تصادفی مستقیم INSERT می‌شود و unique constraint همان ستون یکتایی را تضمین می‌کند؛ فقط اگر
+INSERT به خاطر تکراری بودن همان کد شکست بخورد کد تازه ساخته و دوباره امتحان می‌شود. با فضای
+کد بزرگ (مثلا 36^8) برخورد تقریبا هیچ‌وقت رخ نمی‌دهد، پس هر کد یک INSERT هزینه دارد و
+هزینه‌اش به تعداد سطرهای جدول بستگی ندارد.
+
+کد خریدار مسیر جداگانه‌ای دارد (finance/buyer_codes.py): از id خرید با جایگشت ساخته می‌شود و
+اصلا برخوردی ندارد.
+"""
+import secrets
+import string
+
+from django.db import IntegrityError, transaction
+
+ALPHANUMERIC = string.ascii_uppercase + string.digits
+DEFAULT_ATTEMPTS = 5
+
+
+class CodeAllocationError(Exception):
+    pass
+
+
+def random_code(length=8, alphabet=ALPHANUMERIC):
+    return ''.join(secrets.choice(alphabet) for _ in range(length))
+
+
+def save_with_unique_code(instance, field, generate, save=None, attempts=DEFAULT_ATTEMPTS):
+    """
+    ذخیره‌ی instance با کد تازه‌ی generate() در field؛ اگر از قبل کدی داشته باشد عادی ذخیره می‌شود.
+    save: تابع ذخیره، پیش‌فرض instance.save (مثلا super().save داخل Model.save).
+    خطای یکتایی ستون‌های دیگر (مثلا شماره تلفن تکراری) بدون تلاش دوباره بالا می‌رود.
+    """
+    save = save or instance.save
+    if getattr(instance, field):
+        # کدی که فراخواننده داده عوض نمی‌شود
+        save()
+        return instance
+    setattr(instance, field, generate())
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                save()
+            return instance
+        except IntegrityError:
+            code = getattr(instance, field)
+            if not type(instance)._default_manager.filter(**{field: code}).exists():
+                raise
+            setattr(instance, field, generate())
+    raise CodeAllocationError(f'could not allocate a unique {field} after {attempts} attempts')
+
+
+def create_with_unique_code(model, field, generate, attempts=DEFAULT_ATTEMPTS, **fields):
+    return save_with_unique_code(model(**fields), field, generate, attempts=attempts)
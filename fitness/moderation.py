@@ -0,0 +1,181 @@
+"""
+فیلتر کلمات نامناسب در متن نظرات.
+
+فهرست کلمات (badwords_fa.json) فقط یک بار در هر پروسه خوانده می‌شود و با تغییر mtime فایل
+دوباره بارگذاری می‌شود. متن و کلمات با یک تابع نرمال‌سازی (نیم‌فاصله، فاصله‌ها، اعراب و
+حروف عربی/فارسی) یکسان می‌شوند و همه‌ی کلمات با یک automaton آهو-کوراسیک در یک گذر روی
+متن جستجو می‌شوند. برای فهرست‌های کوتاه، جستجوی substring (در C) سریع‌تر از automaton
+پایتونی است و همان استفاده می‌شود (مرز: AHO_CORASICK_MIN_WORDS، با
+benchmark_moderation اندازه‌گیری شده).
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+AHO_CORASICK_MIN_WORDS = 100
+
+# حروف عربی که در متن فارسی با شکل فارسی‌شان یکی در نظر گرفته می‌شوند
+_LETTER_VARIANTS = {
+    'ي': 'ی',
+    'ى': 'ی',
+    'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    'آ': 'ا',
+    'ؤ': 'و',
+}
+_LETTER_TABLE = str.maketrans(_LETTER_VARIANTS)
+
+# فاصله‌ها، نیم‌فاصله و کاراکترهای کنترلی جهت متن، کشیده (ـ) و اعراب
+_IGNORED_PATTERN = r'\s\u200b-\u200f\u202a-\u202e\u2066-\u2069\ufeff\u0640\u064b-\u065f\u0670'
+_IGNORED_CHARS = re.compile(f'[{_IGNORED_PATTERN}]+')
+
+# رایج‌ترین‌ها با str.replace حذف می‌شوند؛ translate و re.sub (که برای هر حرف/تطابق هزینه دارند)
+# فقط وقتی اجرا می‌شوند که متن حرف دیگری از این دو دسته داشته باشد
+_COMMON_IGNORED = (' ', '\u200c', '\n', '\r', '\t')
+_NEEDS_CLEANUP = re.compile(f"[{_IGNORED_PATTERN}{''.join(_LETTER_VARIANTS)}]")
+
+
+def normalize_text(text):
+    text = text.lower()
+    for char in _COMMON_IGNORED:
+        text = text.replace(char, '')
+    if _NEEDS_CLEANUP.search(text):
+        text = _IGNORED_CHARS.sub('', text.translate(_LETTER_TABLE))
+    return text
+
+
+class AhoCorasick:
+    """automaton آهو-کوراسیک روی کلمات نرمال‌شده؛ هزینه‌ی جستجو متناسب با طول متن است"""
+
+    def __init__(self, words):
+        # هر state: (انتقال‌ها، لینک شکست، کلمه‌ای که در این state یا پسوندهایش تمام می‌شود)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        for word in words:
+            self._add(word)
+        self._build()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        if word and self._output[state] is None:
+            self._output[state] = word
+
+    def _build(self):
+        # لینک‌های شکست در خود جدول انتقال ادغام می‌شوند (DFA کامل روی حروف کلمات)
+        # تا جستجو برای هر حرف فقط یک lookup باشد
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fail_goto = self._goto[self._fail[state]]
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                if state:
+                    self._fail[next_state] = fail_goto.get(char, 0)
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[self._fail[next_state]]
+            if state:
+                for char, next_state in fail_goto.items():
+                    self._goto[state].setdefault(char, next_state)
+
+    def find(self, text):
+        """اولین کلمه‌ای که در text پیدا شود، یا None"""
+        goto, output = self._goto, self._output
+        root = goto[0]
+        state = 0
+        for char in text:
+            state = goto[state].get(char) or root.get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class SubstringMatcher:
+    """بررسی تک‌تک کلمات با in؛ برای فهرست‌های کوتاه سریع‌تر از automaton است"""
+
+    def __init__(self, words):
+        self._words = sorted(words, key=len)
+
+    def find(self, text):
+        for word in self._words:
+            if word in text:
+                return word
+        return None
+
+
+def build_matcher(words):
+    words = set(words)
+    if len(words) >= AHO_CORASICK_MIN_WORDS:
+        return AhoCorasick(words)
+    return SubstringMatcher(words)
+
+
+class BadWordFilter:
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._matcher = build_matcher(())
+        self._lock = threading.Lock()
+
+    def _current_matcher(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            # اگر فایل وجود ندارد، فیلتری اعمال نمی‌شود
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._matcher = build_matcher(self._load_words() if mtime is not None else ())
+                    self._mtime = mtime
+        return self._matcher
+
+    def _load_words(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                words = json.load(f)
+        except (OSError, ValueError):
+            logger.exception('Could not load bad words from %s', self.path)
+            return ()
+        return {word for word in map(normalize_text, words) if word}
+
+    def find(self, text):
+        return self._current_matcher().find(normalize_text(text))
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_bad_word_filter():
+    path = str(settings.BADWORDS_PATH)
+    word_filter = _filters.get(path)
+    if word_filter is None:
+        with _filters_lock:
+            word_filter = _filters.setdefault(path, BadWordFilter(path))
+    return word_filter
+
+
+def contains_bad_words(text):
+    return get_bad_word_filter().find(text) is not None
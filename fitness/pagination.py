@@ -0,0 +1,69 @@
+"""
+صفحه‌بندی لیست‌های مدیریتی بزرگ (کاربران، خریدها، تراکنش‌ها، ...).
+
+- AdminCursorPagination: صفحه‌بندی keyset روی id (کلید اصلی، یکتا و ایندکس‌دار)؛ هزینه‌ی هر
+  صفحه مستقل از عمق آن است و برخلاف OFFSET با اضافه شدن سطر جدید سطری تکرار یا جا نمی‌افتد.
+- ?export=ndjson: خروجی کامل برای export به صورت NDJSON (هر سطر یک JSON) که با
+  queryset.iterator تکه تکه از دیتابیس خوانده و stream می‌شود و کل جدول در حافظه نمی‌نشیند.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_QUERY_PARAM = 'export'
+NDJSON_CHUNK_SIZE = 2000
+
+# مقادیر ordering قابل قبول برای keyset؛ purchase_date و created_at همراه با id زیاد می‌شوند
+KEYSET_ORDERINGS = {
+    '-id': '-id',
+    'id': 'id',
+    '-purchase_date': '-id',
+    'purchase_date': 'id',
+    '-created_at': '-id',
+    'created_at': 'id',
+}
+
+
+class AdminCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+
+def keyset_ordering(value, default='-id'):
+    """ordering درخواست‌شده به ordering روی id، یا None اگر با keyset قابل صفحه‌بندی نباشد"""
+    return KEYSET_ORDERINGS.get(value or default)
+
+
+def wants_ndjson(request):
+    return request.query_params.get(EXPORT_QUERY_PARAM) == 'ndjson'
+
+
+def ndjson_response(queryset, serializer_class, context=None, chunk_size=NDJSON_CHUNK_SIZE):
+    encoder = JSONEncoder(ensure_ascii=False)
+
+    def rows():
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            yield encoder.encode(serializer_class(obj, context=context or {}).data) + '\n'
+
+    response = StreamingHttpResponse(rows(), content_type='application/x-ndjson; charset=utf-8')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def paginated_response(request, queryset, serializer_class, view=None, ordering='-id', context=None):
+    """
+    یک صفحه‌ی cursor از queryset، یا کل آن به صورت NDJSON اگر ?export=ndjson خواسته شده باشد.
+    cursor نامعتبر NotFound (404) می‌دهد؛ viewهایی که آن را در try می‌گذارند باید APIException را
+    دوباره raise کنند.
+    """
+    queryset = queryset.order_by(ordering)
+    if wants_ndjson(request):
+        return ndjson_response(queryset, serializer_class, context=context)
+
+    paginator = AdminCursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = serializer_class(page, many=True, context=context or {})
+    return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,78 @@
+"""
+به‌روزرسانی افزایشی امتیاز باشگاه/مربی.
+
+مجموع امتیازها (rating_sum) و تعداد نظرات شمرده‌شده روی خود باشگاه/مربی نگه داشته
+می‌شود و با هر تغییر نظر فقط اختلاف حالت قبلی و جدید آن نظر با F() اعمال می‌شود؛
+میانگین در همان UPDATE از مقادیر جدید محاسبه می‌شود.
+"""
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def apply_rating_delta(model, pk, *, count_field, rating_delta, count_delta):
+    if pk is None or (rating_delta == 0 and count_delta == 0):
+        return
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F(count_field) + count_delta
+    model.objects.filter(pk=pk).update(
+        rating_sum=new_sum,
+        **{count_field: new_count},
+        average_rating=Coalesce(
+            Cast(new_sum, FloatField()) / Cast(NullIf(new_count, 0), FloatField()),
+            Value(0.0),
+        ),
+    )
+
+
+def apply_review_change(model, *, count_field, old, new):
+    """
+    old/new: (target_id, rating) برای نظری که در امتیاز شمرده می‌شود، یا None.
+    اگر نظر بین دو باشگاه/مربی جابه‌جا شده باشد، سهم هر کدام جداگانه اصلاح می‌شود.
+    """
+    deltas = {}
+    if old is not None:
+        target, rating = old
+        rating_delta, count_delta = deltas.get(target, (0, 0))
+        deltas[target] = (rating_delta - rating, count_delta - 1)
+    if new is not None:
+        target, rating = new
+        rating_delta, count_delta = deltas.get(target, (0, 0))
+        deltas[target] = (rating_delta + rating, count_delta + 1)
+    for target, (rating_delta, count_delta) in deltas.items():
+        apply_rating_delta(
+            model, target, count_field=count_field,
+            rating_delta=rating_delta, count_delta=count_delta,
+        )
+    return any(delta != (0, 0) for delta in deltas.values())
+
+
+def rebuild_ratings(model, reviews, *, target_field, count_field, ids=None, batch_size=1000):
+    """
+    بازسازی rating_sum/تعداد/میانگین همه‌ی باشگاه‌ها یا مربی‌ها با یک کوئری aggregate.
+    reviews: queryset نظراتی که در امتیاز شمرده می‌شوند. تعداد رکوردهای تغییرکرده برگردانده می‌شود.
+    """
+    targets = model.objects.only('id', 'rating_sum', count_field, 'average_rating').order_by('pk')
+    if ids is not None:
+        reviews = reviews.filter(**{f'{target_field}__in': ids})
+        targets = targets.filter(pk__in=ids)
+
+    aggregates = {
+        row[target_field]: (row['rating_total'] or 0, row['review_count'])
+        for row in reviews.order_by().values(target_field).annotate(
+            rating_total=Sum('rating'),
+            review_count=Count('id'),
+        )
+    }
+
+    changed = []
+    for obj in targets.iterator(chunk_size=batch_size):
+        rating_sum, count = aggregates.get(obj.pk, (0, 0))
+        average = rating_sum / count if count else 0.0
+        if (obj.rating_sum, getattr(obj, count_field), obj.average_rating) != (rating_sum, count, average):
+            obj.rating_sum = rating_sum
+            setattr(obj, count_field, count)
+            obj.average_rating = average
+            changed.append(obj)
+
+    model.objects.bulk_update(changed, ['rating_sum', count_field, 'average_rating'], batch_size=batch_size)
+    return len(changed)
@@ -77,6 +77,7 @@ INSTALLED_APPS = [
     'discount',
     'notifications',
     'trainers',
+    'jobs',
     'corsheaders',
 ]
 
@@ -127,6 +128,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# پیش‌فرض LocMemCache (تست و توسعه). برای چند worker یک backend مشترک تنظیم کنید، مثلاً:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'fitness-default'),
+    }
+}
+
+# TTL پاسخ‌های کش‌شده‌ی کاتالوگ (invalidation اصلی با نسخه‌هاست، این فقط سقف است)
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# فهرست کلمات نامناسب برای فیلتر نظرات (با تغییر فایل، بدون ری‌استارت دوباره خوانده می‌شود)
+BADWORDS_PATH = os.getenv('BADWORDS_PATH') or str(BASE_DIR / 'badwords_fa.json')
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -242,6 +260,19 @@ MELIPAYAMAK_API_KEY = os.getenv('MELIPAYAMAK_API_KEY', '')
 MELIPAYAMAK_USERNAME = os.getenv('MELIPAYAMAK_USERNAME', '')
 MELIPAYAMAK_PASSWORD = os.getenv('MELIPAYAMAK_PASSWORD', '')
 MELIPAYAMAK_FROM = os.getenv('MELIPAYAMAK_FROM', '')
+MELIPAYAMAK_BASE_URL = os.getenv('MELIPAYAMAK_BASE_URL', 'https://console.melipayamak.com')
+
+# SMS outbox (notifications.sms)؛ ارسال با runworker و backoff همان JOB_RETRY_* است
+SMS_REQUEST_TIMEOUT = int(os.getenv('SMS_REQUEST_TIMEOUT', '10'))
+SMS_MAX_ATTEMPTS = int(os.getenv('SMS_MAX_ATTEMPTS', '6'))
+
+# تعداد سطرهای موجودی کیف پول ادمین (finance.ledger)؛ کاهش آن بعد از شروع کار مشکلی ندارد
+# چون برداشت در صورت نیاز از همه‌ی shardها انجام می‌شود
+ADMIN_WALLET_SHARDS = int(os.getenv('ADMIN_WALLET_SHARDS', '8'))
+
+# کلید جایگشت کدهای خریدار (finance.buyer_codes)؛ خالی یعنی SECRET_KEY. بعد از صدور اولین کد
+# هرگز نباید عوض شود، وگرنه کدهای جدید با کدهای قبلی برخورد می‌کنند
+BUYER_CODE_KEY = os.getenv('BUYER_CODE_KEY')
 
 # Payment gateway
 PAYMENT_GATEWAY_MERCHANT_ID = os.getenv('PAYMENT_GATEWAY_MERCHANT_ID', '')
@@ -251,6 +282,16 @@ PAYMENT_GATEWAY_AMOUNT_MULTIPLIER = int(os.getenv('PAYMENT_GATEWAY_AMOUNT_MULTIP
 PAYMENT_GATEWAY_CALLBACK_BASE_URL = os.getenv('PAYMENT_GATEWAY_CALLBACK_BASE_URL', '')
 PAYMENT_GATEWAY_SUCCESS_REDIRECT_URL = os.getenv('PAYMENT_GATEWAY_SUCCESS_REDIRECT_URL', '')
 PAYMENT_GATEWAY_FAILURE_REDIRECT_URL = os.getenv('PAYMENT_GATEWAY_FAILURE_REDIRECT_URL', '')
+# خالی یعنی آدرس پیش‌فرض زرین‌پال (یا sandbox)
+PAYMENT_GATEWAY_BASE_URL = os.getenv('PAYMENT_GATEWAY_BASE_URL', '')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_CONNECT_TIMEOUT', '3'))
+PAYMENT_GATEWAY_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_TIMEOUT', '10'))
+PAYMENT_GATEWAY_POOL_SIZE = int(os.getenv('PAYMENT_GATEWAY_POOL_SIZE', '10'))
+# بعد از این تعداد خطای پشت سر هم، درخواست‌ها تا BREAKER_RESET ثانیه بدون تماس با درگاه رد می‌شوند
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.getenv('PAYMENT_GATEWAY_BREAKER_THRESHOLD', '5'))
+PAYMENT_GATEWAY_BREAKER_RESET = float(os.getenv('PAYMENT_GATEWAY_BREAKER_RESET', '30'))
+# ثانیه‌هایی که یک بازگشت درگاه در وضعیت verifying می‌ماند تا بازگشت دیگری بتواند دوباره verify کند
+PAYMENT_CALLBACK_CLAIM_TIMEOUT = int(os.getenv('PAYMENT_CALLBACK_CLAIM_TIMEOUT', '60'))
 
 # Jazzmin Settings
 JAZZMIN_SETTINGS = {
@@ -359,20 +400,18 @@ JAZZMIN_UI_TWEAKS = {
 }
 
 # ---------------------------------------------------------------------------
-# Notifications — Scheduled Task (Plan Expiry)
-# ---------------------------------------------------------------------------
-# To enable the daily plan-expiry notifications, choose ONE of the options:
-#
-# Option A — django-crontab (add 'django_crontab' to INSTALLED_APPS):
-#   INSTALLED_APPS += ['django_crontab']
-#   CRONJOBS = [
-#       ('0 6 * * *', 'notifications.tasks.send_plan_expiry_notifications'),
-#   ]
-#
-# Option B — Celery beat (if Celery is already configured):
-#   from celery.schedules import crontab
-#   app.conf.beat_schedule['plan-expiry-notifications'] = {
-#       'task': 'notifications.tasks.send_plan_expiry_notifications_task',
-#       'schedule': crontab(hour=6, minute=0),
-#   }
+# Background jobs (jobs.queue / runworker)
 # ---------------------------------------------------------------------------
+# صف روی همین دیتابیس است و broker جداگانه لازم ندارد؛ کافی است `python manage.py runworker`
+# (مثلا با --workers 4) کنار وب‌سرور اجرا شود. ساعت‌ها به وقت TIME_ZONE هستند (jobs.periodic).
+PERIODIC_JOBS = {
+    'plan-expiry-notifications': {
+        'task': 'notifications.tasks.send_plan_expiry_notifications',
+        'at': os.getenv('PLAN_EXPIRY_NOTIFICATIONS_AT', '06:00'),
+    },
+}
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_DELAY = int(os.getenv('JOB_RETRY_BASE_DELAY', '30'))
+JOB_RETRY_MAX_DELAY = int(os.getenv('JOB_RETRY_MAX_DELAY', '3600'))
+# ثانیه‌هایی که یک worker برای اجرای کار برداشته‌شده وقت دارد؛ بعد از آن کار دوباره قابل برداشت است
+JOB_LEASE = int(os.getenv('JOB_LEASE', '300'))
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.safestring import mark_safe
 from django import forms
 from django.db import transaction
+from django.db.models import Sum
 from .models import Gym, GymImage, GymOperator
 from .services import promote_gym_owner
 
@@ -137,7 +138,10 @@ class PurchaseAdmin(admin.ModelAdmin):
     mark_as_verified.short_description = "علامت‌گذاری به عنوان تأیید شده"
     
     def mark_as_rejected(self, request, queryset):
-        queryset.update(verification_status='rejected')
+        # save تک‌تک خریدها تا DailySales هم از حالت تاییدشده خارج شود
+        for purchase in queryset:
+            purchase.verification_status = 'rejected'
+            purchase.save(update_fields=['verification_status'])
     mark_as_rejected.short_description = "علامت‌گذاری به عنوان رد شده"
 
 
@@ -171,13 +175,13 @@ class WalletAdmin(admin.ModelAdmin):
 
 @admin.register(AdminWallet)
 class AdminWalletAdmin(admin.ModelAdmin):
-    list_display = ("id", "balance", "transactions_count", "updated_at")
-    readonly_fields = ("updated_at", "transactions_count")
+    list_display = ("id", "total_balance", "balance", "transactions_count", "updated_at")
+    readonly_fields = ("updated_at", "transactions_count", "total_balance")
     inlines = [TransactionInline]
     
     fieldsets = (
         ("اطلاعات کیف پول ادمین", {
-            "fields": ("balance",)
+            "fields": ("total_balance", "balance")
         }),
         ("آمار", {
             "fields": ("transactions_count",)
@@ -187,10 +191,17 @@ class AdminWalletAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(shards_total=Sum('shards__balance'))
+
     def transactions_count(self, obj):
         return obj.transactions.count()
     transactions_count.short_description = "تعداد تراکنش‌ها"
 
+    def total_balance(self, obj):
+        return obj.total_balance
+    total_balance.short_description = "موجودی کل (با shardها)"
+
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
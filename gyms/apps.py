@@ -7,4 +7,5 @@ class GymsConfig(AppConfig):
     verbose_name = 'باشگاه‌ها'
     
     def ready(self):
+        import gyms.signals
         import gyms.admin
@@ -1,9 +1,11 @@
 from rest_framework.views import APIView
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from drf_spectacular.utils import extend_schema
 from django.db import transaction
 from accounts.models import User
+from fitness.pagination import paginated_response
 from gyms.models import GymOperator
 from .serializers import GymOperatorSerializer, GymOperatorCreateSerializer
 
@@ -43,9 +45,10 @@ class GymOperatorListView(APIView):
             if is_active is not None:
                 operators = operators.filter(is_active=is_active.lower() == 'true')
             
-            serializer = GymOperatorSerializer(operators, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return paginated_response(request, operators, GymOperatorSerializer, view=self)
             
+        except APIException:
+            raise
         except Exception as e:
             return Response(
                 {'error': f'خطا در دریافت لیست متصدی‌ها: {str(e)}'}, 
@@ -1,5 +1,6 @@
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import action
@@ -9,10 +10,12 @@ from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
+from fitness.cache import cache_response
 from gyms.services import promote_gym_owner, resolve_gym_owner
+from packages.models import Package
 
 from ..models import Gym, GymImage
-from ..serializers import GymImageFlexibleSerializer, GymImageSerializer, GymSerializer
+from ..serializers import GymCardSerializer, GymImageFlexibleSerializer, GymImageSerializer, GymSerializer
 
 
 class IsAdminOrGymOwner(permissions.BasePermission):
@@ -42,8 +45,14 @@ class GymListCreateView(generics.ListCreateAPIView):
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
+    def get_serializer_class(self):
+        # لیست از read model کارت باشگاه خوانده می‌شود (یک کوئری برای هر صفحه)
+        if self.request.method == "GET":
+            return GymCardSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related("owner", "card")
         
         # Filter by gender based on packages
         gender = self.request.query_params.get('gender')
@@ -92,6 +101,7 @@ class GymListCreateView(generics.ListCreateAPIView):
         ],
         responses=GymSerializer,
     )
+    @cache_response("gym-list", ("gym", "package", "discount"))
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
@@ -122,7 +132,10 @@ class GymListCreateView(generics.ListCreateAPIView):
 
 @extend_schema(tags=["Gym"])
 class GymDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Gym.objects.all()
+    # پکیج‌ها با تخفیف فعالشان در یک کوئری (برای price و package در GymSerializer)
+    queryset = Gym.objects.prefetch_related(
+        Prefetch('packages', queryset=Package.objects.with_active_discount()),
+    )
     serializer_class = GymSerializer
 
     def get_permissions(self):
@@ -3,9 +3,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from ..models import Gym
-from ..serializers import GymSerializer
-from django.db.models import ExpressionWrapper, FloatField
-from django.db.models.functions import ACos, Cos, Radians, Sin
+from ..serializers import GymCardSerializer, GymSerializer
+from ..services import nearest_gyms
+
+NEAREST_GYMS_DEFAULT_LIMIT = 5
+NEAREST_GYMS_MAX_LIMIT = 50
+NEAREST_GYMS_MAX_RADIUS_KM = 500
 
 
 @extend_schema(tags=['nearest_gym'])
@@ -13,31 +16,50 @@ class NearestGymsView(APIView):
     permission_classes = [permissions.AllowAny]
 
     @extend_schema(
-        request=GymSerializer,
+        request={
+            'type': 'object',
+            'properties': {
+                'latitude': {'type': 'number'},
+                'longitude': {'type': 'number'},
+                'radius_km': {'type': 'number', 'description': f'اختیاری، حداکثر {NEAREST_GYMS_MAX_RADIUS_KM}'},
+                'limit': {'type': 'integer', 'description': f'اختیاری، پیش‌فرض {NEAREST_GYMS_DEFAULT_LIMIT} و حداکثر {NEAREST_GYMS_MAX_LIMIT}'},
+            },
+            'required': ['latitude', 'longitude'],
+        },
         responses={200: GymSerializer(many=True)},
-        description="فقط lat , lon کاربر را ارسال کنید"
+        description="lat , lon کاربر را ارسال کنید؛ radius_km و limit اختیاری هستند"
     )
     def post(self, request, *args, **kwargs):
         try:
             # دریافت مختصات کاربر از بدنه درخواست
             user_lat = float(request.data.get('latitude'))
             user_lon = float(request.data.get('longitude'))
+            if not (-90 <= user_lat <= 90 and -180 <= user_lon <= 180):
+                raise ValueError('coordinates out of range')
+
+            radius_km = request.data.get('radius_km')
+            if radius_km not in (None, ''):
+                radius_km = float(radius_km)
+                if not 0 < radius_km <= NEAREST_GYMS_MAX_RADIUS_KM:
+                    raise ValueError('radius_km out of range')
+            else:
+                radius_km = None
 
-            # محاسبه فاصله با استفاده از فرمول Haversine در SQL
-            # فرمول: 6371 * ACOS(COS(RADIANS(lat1)) * COS(RADIANS(lat2)) * COS(RADIANS(lon2) - RADIANS(lon1)) + SIN(RADIANS(lat1)) * SIN(RADIANS(lat2)))
-            nearest_gyms = Gym.objects.annotate(
-                distance=ExpressionWrapper(
-                    6371 * ACos(
-                        Cos(Radians(user_lat)) * Cos(Radians('latitude')) * 
-                        Cos(Radians('longitude') - Radians(user_lon)) + 
-                        Sin(Radians(user_lat)) * Sin(Radians('latitude'))
-                    ),
-                    output_field=FloatField()
-                )
-            ).filter(latitude__isnull=False, longitude__isnull=False).order_by('distance')[:5]
+            limit = int(request.data.get('limit') or NEAREST_GYMS_DEFAULT_LIMIT)
+            if not 0 < limit <= NEAREST_GYMS_MAX_LIMIT:
+                raise ValueError('limit out of range')
+
+            # کاندیداها با خانه‌های شبکه و bounding box محدود و سپس با Haversine مرتب می‌شوند
+            gyms = nearest_gyms(
+                user_lat,
+                user_lon,
+                radius_km=radius_km,
+                limit=limit,
+                queryset=Gym.objects.select_related('owner', 'card'),
+            )
 
             # سریالایز کردن باشگاه‌ها (فاصله درون Serializer محاسبه می‌شود)
-            serializer = GymSerializer(nearest_gyms, many=True, context={'request': request})
+            serializer = GymCardSerializer(gyms, many=True, context={'request': request})
 
             return Response({'gyms': serializer.data}, status=status.HTTP_200_OK)
 
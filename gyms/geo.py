@@ -0,0 +1,72 @@
+"""
+ابزارهای جغرافیایی برای جستجوی نزدیک‌ترین باشگاه‌ها.
+
+هر باشگاه در یک خانه‌ی شبکه (grid cell) با ضلع GEO_CELL_DEGREES درجه قرار می‌گیرد
+و ستون Gym.geo_cell ایندکس دارد؛ جستجو ابتدا با خانه‌ها و bounding box کاندیداها را
+محدود می‌کند و سپس فاصله‌ی دقیق (Haversine) فقط روی همین کاندیداها محاسبه می‌شود.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371
+
+# حدود ۱۱ کیلومتر در عرض‌های جغرافیایی ایران
+GEO_CELL_DEGREES = 0.1
+_LON_CELLS = int(round(360 / GEO_CELL_DEGREES))
+
+# بیش از این تعداد خانه، فیلتر IN سنگین‌تر از bounding box خالی است
+MAX_CELLS_PER_QUERY = 400
+
+
+def _lat_index(lat):
+    return int(math.floor((float(lat) + 90) / GEO_CELL_DEGREES))
+
+
+def _lon_index(lon):
+    return int(math.floor((float(lon) + 180) / GEO_CELL_DEGREES)) % _LON_CELLS
+
+
+def geo_cell_for(lat, lon):
+    """شناسه‌ی خانه‌ی شبکه برای یک مختصات (None اگر مختصات ناقص باشد)"""
+    if lat is None or lon is None:
+        return None
+    return _lat_index(lat) * _LON_CELLS + _lon_index(lon)
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    (min_lat, max_lat, min_lon, max_lon) برای دایره‌ای به شعاع radius_km.
+    اگر دایره از قطب یا نصف‌النهار ۱۸۰ عبور کند min_lon/max_lon برابر None است.
+    درجه‌ها از همان EARTH_RADIUS_KM فاصله‌ی Haversine به دست می‌آیند و عرض طولی با کسینوس لبه‌ی
+    نزدیک‌تر به قطب حساب می‌شود تا جعبه همیشه کل دایره را بپوشاند.
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), None, None
+
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    lon_delta = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    min_lon, max_lon = lon - lon_delta, lon + lon_delta
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def cells_in_bbox(min_lat, max_lat, min_lon, max_lon):
+    """خانه‌های شبکه‌ی پوشاننده‌ی bounding box؛ None اگر تعدادشان زیاد باشد"""
+    if min_lon is None or max_lon is None:
+        return None
+    lat_range = range(_lat_index(min_lat), _lat_index(max_lat) + 1)
+    lon_range = range(_lon_index(min_lon), _lon_index(max_lon) + 1)
+    if len(lat_range) * len(lon_range) > MAX_CELLS_PER_QUERY:
+        return None
+    return [lat_idx * _LON_CELLS + lon_idx for lat_idx in lat_range for lon_idx in lon_range]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,100 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from gyms.geo import geo_cell_for
+from gyms.models import Gym
+from gyms.services import annotate_distance, nearest_gyms
+
+# محدوده‌ی تقریبی ایران
+LAT_RANGE = (25.0, 39.5)
+LON_RANGE = (44.0, 63.0)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک نزدیک‌ترین باشگاه‌ها: اسکن کامل Haversine در برابر جستجوی grid cell + bounding box. "
+        "باشگاه‌های ساختگی داخل تراکنش ساخته و در پایان rollback می‌شوند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gyms', type=int, default=100_000, help='تعداد باشگاه‌های ساختگی')
+        parser.add_argument('--queries', type=int, default=200, help='تعداد کوئری برای هر روش')
+        parser.add_argument('--limit', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._seed(rng, options['gyms'])
+                points = [
+                    (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+                    for _ in range(options['queries'])
+                ]
+                limit = options['limit']
+
+                def full_scan(lat, lon):
+                    return list(
+                        annotate_distance(Gym.objects.filter(latitude__isnull=False), lat, lon)
+                        .order_by('distance')[:limit]
+                    )
+
+                def prefiltered(lat, lon):
+                    return nearest_gyms(lat, lon, limit=limit)
+
+                for name, query in (('full scan', full_scan), ('grid + bbox', prefiltered)):
+                    self._report(name, self._measure(query, points))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rng, count):
+        owner, _ = User.objects.get_or_create(phone='09000000000', defaults={'full_name': 'benchmark'})
+        batch = []
+        for index in range(count):
+            lat = round(rng.uniform(*LAT_RANGE), 6)
+            lon = round(rng.uniform(*LON_RANGE), 6)
+            batch.append(Gym(
+                owner=owner,
+                name=f'benchmark gym {index}',
+                latitude=lat,
+                longitude=lon,
+                geo_cell=geo_cell_for(lat, lon),
+            ))
+            if len(batch) == 5000:
+                Gym.objects.bulk_create(batch)
+                batch = []
+        Gym.objects.bulk_create(batch)
+        self.stdout.write(f"seeded {count} gyms")
+
+    @staticmethod
+    def _measure(query, points):
+        query(*points[0])  # warm-up
+        samples = []
+        for lat, lon in points:
+            started = time.perf_counter()
+            query(lat, lon)
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def _report(self, name, samples):
+        self.stdout.write(
+            f"{name:<12} p50={statistics.median(samples):8.2f}ms "
+            f"p99={_percentile(samples, 99):8.2f}ms "
+            f"max={max(samples):8.2f}ms (n={len(samples)})"
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from gyms.models import Gym
+from gyms.services import build_gym_card
+
+
+class Command(BaseCommand):
+    help = "بازسازی کارت لیست باشگاه‌ها (GymCard) از روی پکیج‌ها، تصاویر و تخفیف‌ها"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gym', type=int, action='append', dest='gym_ids', help='فقط این باشگاه(ها)')
+
+    def handle(self, *args, **options):
+        gym_ids = options.get('gym_ids') or Gym.objects.values_list('id', flat=True).iterator()
+        count = 0
+        for gym_id in gym_ids:
+            build_gym_card(gym_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"{count} gym card(s) rebuilt"))
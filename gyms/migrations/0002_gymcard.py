@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gyms', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GymCard',
+            fields=[
+                ('gym', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='gyms.gym')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('images', models.JSONField(blank=True, default=list)),
+                ('packages', models.JSONField(blank=True, default=list)),
+                ('discounts', models.JSONField(blank=True, default=list, help_text='Active package discounts with their validity window')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Gym Card',
+                'verbose_name_plural': 'Gym Cards',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+from gyms.geo import geo_cell_for
+
+
+def fill_geo_cell(apps, schema_editor):
+    Gym = apps.get_model('gyms', 'Gym')
+    gyms = Gym.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    for gym in gyms.iterator():
+        gym.geo_cell = geo_cell_for(gym.latitude, gym.longitude)
+        gym.save(update_fields=['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gyms', '0002_gymcard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, help_text='Grid cell derived from latitude/longitude (see gyms/geo.py)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='gym',
+            index=models.Index(fields=['latitude', 'longitude'], name='gym_lat_lon_idx'),
+        ),
+        migrations.RunPython(fill_geo_cell, migrations.RunPython.noop),
+    ]
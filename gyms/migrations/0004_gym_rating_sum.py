@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+
+def fill_rating_sum(apps, schema_editor):
+    # average_rating و comments تا اینجا با aggregate کامل محاسبه شده‌اند
+    Gym = apps.get_model('gyms', 'Gym')
+    Gym.objects.update(rating_sum=Round(F('average_rating') * F('comments')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gyms', '0003_gym_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False, help_text='Sum of counted review ratings (see fitness/ratings.py)'),
+        ),
+        migrations.RunPython(fill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,7 @@ from accounts.models import User
 import os
 from django.utils.text import slugify
 from .file_validators import validate_banner_size, validate_gym_image_size
+from .geo import geo_cell_for
 
 class Gym(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -12,12 +13,14 @@ class Gym(models.Model):
     description = models.TextField(blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Latitude coordinate")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Longitude coordinate")
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False, db_index=True, help_text="Grid cell derived from latitude/longitude (see gyms/geo.py)")
     address = models.CharField(max_length=512, blank=True)
     working_hours = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     average_rating = models.FloatField(default=0.0)
     comments = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0, editable=False, help_text="Sum of counted review ratings (see fitness/ratings.py)")
     banner = models.ImageField(
         upload_to="gyms/banners/",
         null=True,
@@ -30,10 +33,20 @@ class Gym(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Gym"
         verbose_name_plural = "Gyms"
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="gym_lat_lon_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} (owner={self.owner})"
 
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo_cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geo_cell"}
+        super().save(*args, **kwargs)
+
 
 
 
@@ -73,4 +86,23 @@ class GymOperator(models.Model):
         verbose_name_plural = "Gym Operators"
     
     def __str__(self):
-        return f"{self.operator.full_name or self.operator.phone} - {self.gym.name}"
\ No newline at end of file
+        return f"{self.operator.full_name or self.operator.phone} - {self.gym.name}"
+
+class GymCard(models.Model):
+    """
+    Read model لیست باشگاه‌ها: داده‌های مشتق‌شده از پکیج‌ها، تصاویر و تخفیف‌ها
+    که توسط سیگنال‌ها به‌روز نگه داشته می‌شود (gyms/signals.py).
+    """
+    gym = models.OneToOneField(Gym, on_delete=models.CASCADE, primary_key=True, related_name="card")
+    min_price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    images = models.JSONField(default=list, blank=True)
+    packages = models.JSONField(default=list, blank=True)
+    discounts = models.JSONField(default=list, blank=True, help_text="Active package discounts with their validity window")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Gym Card"
+        verbose_name_plural = "Gym Cards"
+
+    def __str__(self):
+        return f"Card for gym {self.gym_id}"
@@ -1,9 +1,14 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
 from rest_framework import serializers
 from .models import GymImage, Gym
 from accounts.serializers import UserDetailSerializer
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from discount.models import *
-from packages.serializers import PackageSerializer
+from discount.pricing import price
+from packages.serializers import GymSimpleSerializer, PackageSerializer
 from django.db import models
 
 class GymImageSerializer(serializers.ModelSerializer):
@@ -129,3 +134,111 @@ class GymSerializer(serializers.ModelSerializer):
                 }
 
         return max_discount
+
+
+class GymCardSerializer(GymSerializer):
+    """
+    حالت کارت GymSerializer: فیلدهای مشتق‌شده از GymCard خوانده می‌شوند.
+    queryset باید select_related('card', 'owner') داشته باشد تا یک صفحه با یک کوئری خوانده شود.
+    اگر کارتی ساخته نشده باشد، به محاسبه‌ی عادی GymSerializer برمی‌گردد.
+    """
+
+    @staticmethod
+    def _card(obj):
+        try:
+            return obj.card
+        except Gym.card.RelatedObjectDoesNotExist:
+            return None
+
+    def _active_discounts(self, card):
+        now = self.context.get('now') or timezone.now()
+        active = []
+        for discount in card.discounts:
+            start_date = parse_datetime(discount['start_date']) if discount['start_date'] else None
+            end_date = parse_datetime(discount['end_date']) if discount['end_date'] else None
+            if start_date and start_date > now:
+                continue
+            if end_date and end_date < now:
+                continue
+            active.append({**discount, 'start_date': start_date, 'end_date': end_date})
+        return active
+
+    def get_price(self, obj):
+        card = self._card(obj)
+        if card is None:
+            return super().get_price(obj)
+        return card.min_price
+
+    def get_images(self, obj):
+        card = self._card(obj)
+        if card is None:
+            return super().get_images(obj)
+        request = self.context.get('request')
+        return [
+            {**image, 'url': request.build_absolute_uri(image['url']) if request else image['url']}
+            for image in card.images
+        ]
+
+    def get_package(self, obj):
+        card = self._card(obj)
+        if card is None:
+            return super().get_package(obj)
+        return self.package_summaries(obj, card)
+
+    def package_summaries(self, obj, card=None):
+        """پکیج‌های باشگاه با همان شکل خروجی PackageSerializer"""
+        card = card or self._card(obj)
+        request = self.context.get('request')
+        gym_data = GymSimpleSerializer(obj).data
+        if obj.banner and hasattr(obj.banner, 'url'):
+            gym_data['banner'] = request.build_absolute_uri(obj.banner.url) if request else obj.banner.url
+        else:
+            gym_data['banner'] = None
+
+        # مثل PackageSerializer.get_discount: جدیدترین تخفیف معتبر هر پکیج
+        package_discounts = {}
+        for discount in self._active_discounts(card):
+            package_discounts.setdefault(discount['package_id'], discount)
+
+        summaries = []
+        for package in card.packages:
+            discount = package_discounts.get(package['id'])
+            price_quote = price(
+                Decimal(package['price']),
+                package['commission_rate'],
+                package_discount=SimpleNamespace(**discount) if discount else None,
+            )
+            package = {
+                **package,
+                'gym': gym_data,
+                'discount': {
+                    'id': discount['id'],
+                    'discount_type': discount['discount_type'],
+                    'value': discount['value'],
+                    'source_type': discount['source_type'],
+                } if discount else None,
+                'final_price': format(price_quote.final, '.2f'),
+            }
+            summaries.append({field: package[field] for field in PackageSerializer.Meta.fields})
+        return summaries
+
+    def get_max_discount(self, obj):
+        card = self._card(obj)
+        if card is None:
+            return super().get_max_discount(obj)
+
+        max_discount = None
+        max_value = 0
+        for discount in self._active_discounts(card):
+            current_value = float(discount['value'])
+            if current_value > max_value:
+                max_value = current_value
+                max_discount = {
+                    'discount_type': discount['discount_type'],
+                    'value': current_value,
+                    'package_id': discount['package_id'],
+                    'package_title': discount['package_title'],
+                    'start_date': discount['start_date'],
+                    'end_date': discount['end_date'],
+                }
+        return max_discount
@@ -1,5 +1,12 @@
+from django.db.models import FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
 from accounts.models import User
+from discount.models import PackageDiscount
 from finance.models import Wallet
+from gyms.geo import EARTH_RADIUS_KM, bounding_box, cells_in_bbox
+from gyms.models import Gym, GymCard, GymImage
+from packages.models import Package
 
 
 def resolve_gym_owner(owner_value):
@@ -37,3 +44,122 @@ def promote_gym_owner(user):
 
     Wallet.objects.get_or_create(owner=user)
     return user
+
+
+def build_gym_card(gym_id):
+    """
+    Rebuild the denormalized listing card of a gym.
+
+    Time-dependent data (discount windows) is stored as-is and resolved at
+    read time, so the card never goes stale when a discount starts or ends.
+    """
+    if not Gym.objects.filter(id=gym_id).exists():
+        GymCard.objects.filter(gym_id=gym_id).delete()
+        return None
+
+    packages = list(Package.objects.filter(gym_id=gym_id).order_by("id"))
+    images = [
+        {
+            "id": img.id,
+            "url": img.image.url,
+            "alt_text": img.alt_text or "",
+            "order": img.order,
+        }
+        for img in GymImage.objects.filter(gym_id=gym_id).order_by("order", "uploaded_at")
+        if img.image
+    ]
+    discounts = [
+        {
+            "id": discount.id,
+            "package_id": discount.package_id,
+            "package_title": discount.package.title,
+            "discount_type": discount.discount_type,
+            "value": str(discount.value),
+            "source_type": discount.source_type,
+            "start_date": discount.start_date.isoformat() if discount.start_date else None,
+            "end_date": discount.end_date.isoformat() if discount.end_date else None,
+        }
+        for discount in PackageDiscount.objects.filter(
+            package__gym_id=gym_id, is_active=True
+        ).select_related("package")
+    ]
+
+    card, _ = GymCard.objects.update_or_create(
+        gym_id=gym_id,
+        defaults={
+            "min_price": min((package.price for package in packages), default=None),
+            "images": images,
+            "packages": [
+                {
+                    "id": package.id,
+                    "group_package": package.group_package_id,
+                    "title": package.title,
+                    "description": package.description,
+                    "gender": package.gender,
+                    "price": format(package.price, ".2f"),
+                    "duration": package.duration,
+                    "commission_rate": package.commission_rate,
+                    "sessions": package.sessions,
+                    "order_homepage": package.order_homepage,
+                    "dedicated": package.dedicated,
+                }
+                for package in packages
+            ],
+            "discounts": discounts,
+        },
+    )
+    return card
+
+
+# شعاع‌های جستجوی پیاپی (کیلومتر) وقتی کاربر radius_km نفرستاده باشد
+NEAREST_SEARCH_RADII_KM = (5, 25, 100, 500)
+
+
+def annotate_distance(queryset, lat, lon):
+    """فاصله‌ی Haversine هر باشگاه تا (lat, lon) به کیلومتر در فیلد distance"""
+    lat_rad = Radians(Value(float(lat), output_field=FloatField()))
+    lon_rad = Radians(Value(float(lon), output_field=FloatField()))
+    half_chord = (
+        Power(Sin((Radians("latitude") - lat_rad) / 2), 2)
+        + Cos(lat_rad) * Cos(Radians("latitude")) * Power(Sin((Radians("longitude") - lon_rad) / 2), 2)
+    )
+    return queryset.annotate(
+        distance=EARTH_RADIUS_KM * 2 * ASin(Sqrt(half_chord), output_field=FloatField())
+    )
+
+
+def _gyms_within(queryset, lat, lon, radius_km, limit):
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat))
+    if min_lon is not None:
+        queryset = queryset.filter(longitude__range=(min_lon, max_lon))
+    cells = cells_in_bbox(min_lat, max_lat, min_lon, max_lon)
+    if cells is not None:
+        queryset = queryset.filter(geo_cell__in=cells)
+    return list(
+        annotate_distance(queryset, lat, lon)
+        .filter(distance__lte=radius_km)
+        .order_by("distance")[:limit]
+    )
+
+
+def nearest_gyms(lat, lon, *, radius_km=None, limit=5, queryset=None):
+    """
+    نزدیک‌ترین باشگاه‌ها به ترتیب فاصله.
+
+    کاندیداها ابتدا با خانه‌های شبکه و bounding box محدود می‌شوند. اگر radius_km
+    داده نشود، شعاع به ترتیب NEAREST_SEARCH_RADII_KM بزرگ می‌شود تا limit باشگاه
+    پیدا شود و در نهایت مثل قبل روی همه‌ی باشگاه‌ها جستجو می‌شود.
+    """
+    if queryset is None:
+        queryset = Gym.objects.all()
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+
+    if radius_km is not None:
+        return _gyms_within(queryset, lat, lon, radius_km, limit)
+
+    for radius in NEAREST_SEARCH_RADII_KM:
+        gyms = _gyms_within(queryset, lat, lon, radius, limit)
+        if len(gyms) >= limit:
+            return gyms
+    return list(annotate_distance(queryset, lat, lon).order_by("distance")[:limit])
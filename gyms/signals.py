@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from fitness.cache import bump_version
+from gyms.models import Gym
+from gyms.services import build_gym_card
+from packages.models import Package
+
+
+def _deleted_with(origin, *models):
+    """آیا حذف به صورت آبشاری از یکی از این مدل‌ها شروع شده است؟"""
+    model = getattr(origin, 'model', None) or type(origin)
+    return model in models
+
+
+@receiver(post_save, sender='gyms.Gym', dispatch_uid='gyms.card_gym_saved')
+def on_gym_saved(sender, instance, created, **kwargs):
+    # کارت فقط به پکیج‌ها، تصاویر و تخفیف‌ها وابسته است
+    if created:
+        build_gym_card(instance.id)
+
+
+@receiver(post_save, sender='gyms.GymImage', dispatch_uid='gyms.card_image_saved')
+def on_gym_image_saved(sender, instance, **kwargs):
+    build_gym_card(instance.gym_id)
+
+
+@receiver(post_delete, sender='gyms.GymImage', dispatch_uid='gyms.card_image_deleted')
+def on_gym_image_deleted(sender, instance, origin=None, **kwargs):
+    # در حذف آبشاری باشگاه، کارت همراه خود باشگاه حذف می‌شود
+    if not _deleted_with(origin, Gym):
+        build_gym_card(instance.gym_id)
+
+
+@receiver(pre_save, sender='packages.Package', dispatch_uid='gyms.card_package_moving')
+def on_package_moving(sender, instance, **kwargs):
+    # اگر پکیج به باشگاه دیگری منتقل شود، کارت باشگاه قبلی هم باید بازسازی شود
+    instance._card_previous_gym_id = None
+    if instance.pk:
+        instance._card_previous_gym_id = (
+            sender.objects.filter(pk=instance.pk).values_list('gym_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender='packages.Package', dispatch_uid='gyms.card_package_saved')
+def on_package_saved(sender, instance, **kwargs):
+    build_gym_card(instance.gym_id)
+    previous_gym_id = getattr(instance, '_card_previous_gym_id', None)
+    if previous_gym_id and previous_gym_id != instance.gym_id:
+        build_gym_card(previous_gym_id)
+
+
+@receiver(post_delete, sender='packages.Package', dispatch_uid='gyms.card_package_deleted')
+def on_package_deleted(sender, instance, origin=None, **kwargs):
+    # در حذف آبشاری باشگاه، کارت همراه خود باشگاه حذف می‌شود
+    if not _deleted_with(origin, Gym):
+        build_gym_card(instance.gym_id)
+
+
+@receiver(post_save, sender='discount.PackageDiscount', dispatch_uid='gyms.card_discount_saved')
+def on_package_discount_saved(sender, instance, **kwargs):
+    build_gym_card(instance.package.gym_id)
+
+
+@receiver(post_delete, sender='discount.PackageDiscount', dispatch_uid='gyms.card_discount_deleted')
+def on_package_discount_deleted(sender, instance, origin=None, **kwargs):
+    # در حذف آبشاری پکیج، کارت در سیگنال حذف پکیج بازسازی می‌شود
+    if _deleted_with(origin, Gym, Package):
+        return
+    build_gym_card(instance.package.gym_id)
+
+
+@receiver([post_save, post_delete], sender='gyms.Gym', dispatch_uid='gyms.catalog_cache_gym')
+@receiver([post_save, post_delete], sender='gyms.GymImage', dispatch_uid='gyms.catalog_cache_gym_image')
+def invalidate_gym_catalog(sender, **kwargs):
+    bump_version('gym')
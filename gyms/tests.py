@@ -1,12 +1,22 @@
+import math
+from decimal import Decimal
+from datetime import timedelta
+
 from django.contrib.admin.sites import AdminSite
-from django.contrib.gis.geos import Point
 from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
 
 from accounts.models import User
+from discount.models import PackageDiscount
 from finance.models import Wallet
 from gyms.admin import GymAdmin
-from gyms.models import Gym
+from gyms.geo import EARTH_RADIUS_KM, bounding_box, haversine_km
+from gyms.models import Gym, GymCard
+from gyms.serializers import GymCardSerializer, GymSerializer
 from gyms.services import promote_gym_owner
+from packages.models import GroupPackage, Package
 
 
 class GymOwnerPromotionTests(TestCase):
@@ -50,3 +60,129 @@ class GymAdminTests(TestCase):
         self.assertEqual(self.customer.role, "owner")
         self.assertTrue(Wallet.objects.filter(owner=self.customer).exists())
         self.assertEqual(Gym.objects.get(id=gym.id).owner_id, self.customer.id)
+
+
+class GymCardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone="09120000011", role="owner")
+        self.group = GroupPackage.objects.create(title="بدنسازی")
+        self.gyms = []
+        for index in range(3):
+            gym = Gym.objects.create(owner=self.owner, name=f"Gym {index}")
+            cheap = Package.objects.create(
+                gym=gym, group_package=self.group, title="Monthly", gender="male",
+                price=Decimal("100000.00") + index, duration=30,
+            )
+            Package.objects.create(
+                gym=gym, group_package=self.group, title="Yearly", gender="female",
+                price=Decimal("900000.00"), duration=365,
+            )
+            PackageDiscount.objects.create(
+                package=cheap, discount_type="percent", value=Decimal("10"), source_type="club",
+            )
+            PackageDiscount.objects.create(
+                package=cheap, discount_type="percent", value=Decimal("50"), source_type="club",
+                start_date=timezone.now() + timedelta(days=5),
+            )
+            self.gyms.append(gym)
+
+    def _full_and_card(self, gym):
+        gym = Gym.objects.select_related("owner", "card").get(pk=gym.pk)
+        return GymSerializer(gym).data, GymCardSerializer(gym).data
+
+    def test_card_output_matches_full_serializer(self):
+        for gym in self.gyms:
+            full, card = self._full_and_card(gym)
+            self.assertEqual(full, card)
+
+    def test_signals_keep_card_current(self):
+        gym = self.gyms[0]
+        package = gym.packages.order_by("price").first()
+        package.price = Decimal("5000.00")
+        package.save()
+        self.assertEqual(GymCard.objects.get(gym=gym).min_price, Decimal("5000.00"))
+
+        PackageDiscount.objects.filter(package=package).delete()
+        full, card = self._full_and_card(gym)
+        self.assertIsNone(card["max_discount"])
+        self.assertEqual(full, card)
+
+        package.delete()
+        self.assertEqual(len(GymCard.objects.get(gym=gym).packages), 1)
+
+        gym.delete()
+        self.assertFalse(GymCard.objects.filter(gym_id=gym.id).exists())
+
+    def test_list_reads_page_in_constant_queries(self):
+        with self.assertNumQueries(2):  # count + page
+            response = self.client.get(reverse("api-v1:gym-list-create"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["results"][0]["max_discount"]["value"], 10.0)
+
+
+
+class NearestGymsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone="09120000021", role="owner")
+        # فاصله‌ها از میدان آزادی تهران (35.6997, 51.3380)
+        self.near = Gym.objects.create(owner=self.owner, name="Near", latitude=35.7000, longitude=51.3400)
+        self.mid = Gym.objects.create(owner=self.owner, name="Mid", latitude=35.7600, longitude=51.4100)
+        self.far = Gym.objects.create(owner=self.owner, name="Isfahan", latitude=32.6546, longitude=51.6680)
+        Gym.objects.create(owner=self.owner, name="No location")
+
+    def _post(self, **payload):
+        return self.client.post(
+            reverse("api-v1:nearest_gyms"),
+            {"latitude": 35.6997, "longitude": 51.3380, **payload},
+            format="json",
+        )
+
+    def test_geo_cell_follows_coordinates(self):
+        cell = self.near.geo_cell
+        self.assertIsNotNone(cell)
+        self.near.latitude = 32.6546
+        self.near.save(update_fields=["latitude"])
+        self.near.refresh_from_db()
+        self.assertNotEqual(self.near.geo_cell, cell)
+
+    def test_without_radius_returns_nearest_like_before(self):
+        response = self._post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([g["name"] for g in response.data["gyms"]], ["Near", "Mid", "Isfahan"])
+        self.assertLess(response.data["gyms"][0]["distance_meters"], 1)
+
+    def test_radius_and_limit(self):
+        response = self._post(radius_km=20)
+        self.assertEqual([g["name"] for g in response.data["gyms"]], ["Near", "Mid"])
+
+        response = self._post(radius_km=20, limit=1)
+        self.assertEqual([g["name"] for g in response.data["gyms"]], ["Near"])
+
+        self.assertEqual(self._post(radius_km=0).status_code, 400)
+        self.assertEqual(self._post(limit=500).status_code, 400)
+
+    def test_bounding_box_covers_radius_boundary(self):
+        def destination(lat, lon, bearing, km):
+            # نقطه‌ای به فاصله‌ی km روی کره‌ی EARTH_RADIUS_KM
+            lat, lon, bearing, d = map(math.radians, (lat, lon, bearing, math.degrees(km / EARTH_RADIUS_KM)))
+            lat2 = math.asin(math.sin(lat) * math.cos(d) + math.cos(lat) * math.sin(d) * math.cos(bearing))
+            lon2 = lon + math.atan2(
+                math.sin(bearing) * math.sin(d) * math.cos(lat), math.cos(d) - math.sin(lat) * math.sin(lat2),
+            )
+            return math.degrees(lat2), math.degrees(lon2)
+
+        for center_lat, radius in ((35.6997, 20), (60.0, 300)):
+            min_lat, max_lat, min_lon, max_lon = bounding_box(center_lat, 51.338, radius)
+            for bearing in range(0, 360, 5):
+                lat, lon = destination(center_lat, 51.338, bearing, radius * 0.9999)
+                self.assertLess(haversine_km(center_lat, 51.338, lat, lon), radius)
+                self.assertTrue(min_lat <= lat <= max_lat and min_lon <= lon <= max_lon, (center_lat, bearing))
+
+        # باشگاه درست داخل شعاع در لبه‌ی شمالی جعبه حذف نمی‌شود
+        lat, lon = destination(35.6997, 51.3380, 0, 19.99)
+        Gym.objects.create(owner=self.owner, name="Edge", latitude=round(lat, 6), longitude=round(lon, 6))
+        response = self._post(radius_km=20, limit=5)
+        self.assertIn("Edge", [g["name"] for g in response.data["gyms"]])
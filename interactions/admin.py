@@ -1,7 +1,17 @@
 from django.contrib import admin
+from fitness.cache import bump_version
+from fitness.ratings import rebuild_ratings
+from gyms.models import Gym
 from .models import Review, Favorite
 
 
+def _rebuild_gym_ratings(queryset):
+    # queryset.update سیگنال نمی‌فرستد؛ امتیاز باشگاه‌های درگیر بازسازی می‌شود
+    gym_ids = list(queryset.order_by().values_list('gym_id', flat=True).distinct())
+    rebuild_ratings(Gym, Review.objects.counted(), target_field='gym', count_field='comments', ids=gym_ids)
+    bump_version('gym')
+
+
 class ReviewReplyInline(admin.TabularInline):
     model = Review
     fk_name = "reply_to"
@@ -45,10 +55,12 @@ class ReviewAdmin(admin.ModelAdmin):
     
     def block_reviews(self, request, queryset):
         queryset.update(blocked=True)
+        _rebuild_gym_ratings(queryset)
     block_reviews.short_description = "مسدود کردن نظرات انتخاب شده"
     
     def unblock_reviews(self, request, queryset):
         queryset.update(blocked=False)
+        _rebuild_gym_ratings(queryset)
     unblock_reviews.short_description = "رفع مسدودیت نظرات انتخاب شده"
     
     def mark_as_reported(self, request, queryset):
@@ -57,6 +69,7 @@ class ReviewAdmin(admin.ModelAdmin):
     
     def mark_as_deleted(self, request, queryset):
         queryset.update(deleted=True)
+        _rebuild_gym_ratings(queryset)
     mark_as_deleted.short_description = "علامت‌گذاری به عنوان حذف شده"
 
 
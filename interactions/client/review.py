@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from ..models import Review
 from ..serializers import ReviewSerializer, AdminReviewSerializer
+from fitness.pagination import paginated_response
 
 
 class IsReviewOwnerOrReadOnly(permissions.BasePermission):
@@ -54,6 +55,13 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def _moderation_list(self, queryset):
+        """لیست‌های مدیریتی با صفحه‌بندی cursor روی id (یا ?export=ndjson)"""
+        return paginated_response(
+            self.request, queryset, self.get_serializer_class(), view=self,
+            context=self.get_serializer_context(),
+        )
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -165,8 +173,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         blocked_reviews = Review.objects.filter(blocked=True).select_related('user', 'gym', 'reply_to')
-        serializer = self.get_serializer(blocked_reviews, many=True)
-        return Response(serializer.data)
+        return self._moderation_list(blocked_reviews)
 
     @extend_schema(
         summary='لیست نظرات کاربران بن‌شده',
@@ -181,8 +188,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         banned_reviews = Review.objects.filter(user__is_banned_from_reviews=True).select_related('user', 'gym', 'reply_to')
-        serializer = self.get_serializer(banned_reviews, many=True)
-        return Response(serializer.data)
+        return self._moderation_list(banned_reviews)
 
     @extend_schema(
         summary='لیست نظرات حذف شده',
@@ -197,8 +203,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         deleted_reviews = Review.objects.filter(deleted=True).select_related('user', 'gym', 'reply_to')
-        serializer = self.get_serializer(deleted_reviews, many=True)
-        return Response(serializer.data)
+        return self._moderation_list(deleted_reviews)
 
     @extend_schema(
         summary='لیست نظرات گزارش شده',
@@ -213,5 +218,4 @@ class ReviewViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         reported_reviews = Review.objects.filter(is_reported=True).select_related('user', 'gym', 'reply_to')
-        serializer = self.get_serializer(reported_reviews, many=True)
-        return Response(serializer.data)
+        return self._moderation_list(reported_reviews)
@@ -0,0 +1,107 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from fitness.moderation import AhoCorasick, SubstringMatcher, normalize_text
+
+# واژه‌های معمولی برای ساختن نظرهای ساختگی
+FILLER_WORDS = (
+    'باشگاه', 'خیلی', 'خوب', 'بود', 'مربی', 'دستگاه‌ها', 'تمیز', 'هستند', 'قیمت',
+    'مناسب', 'رختکن', 'شلوغ', 'برنامه', 'تمرینی', 'عالی', 'پارکینگ', 'ندارد', 'و',
+)
+
+
+PERSIAN_LETTERS = 'ابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی'
+
+
+def legacy_contains_bad_words(value, badwords_path):
+    """پیاده‌سازی قبلی validate_comment: خواندن فایل و حلقه‌ی substring برای هر نظر"""
+    if not os.path.exists(badwords_path):
+        return False
+    with open(badwords_path, 'r', encoding='utf-8') as f:
+        bad_words = json.load(f)
+    text = value.lower().replace("‌", "").replace(" ", "")
+    for word in bad_words:
+        w = word.strip().lower().replace("‌", "").replace(" ", "")
+        if w and w in text:
+            return True
+    return False
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک فیلتر کلمات نامناسب نظرات: پیاده‌سازی قبلی (خواندن فایل + حلقه) "
+        "در برابر automaton آهو-کوراسیک بارگذاری‌شده در حافظه"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=2000, help='تعداد نظرهای ساختگی')
+        parser.add_argument('--words', type=int, default=40, help='تعداد واژه‌ی هر نظر')
+        parser.add_argument('--extra-words', type=int, default=0, help='کلمات ساختگی اضافه برای دیدن اثر بزرگ شدن فهرست')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with open(settings.BADWORDS_PATH, 'r', encoding='utf-8') as f:
+            bad_words = json.load(f)
+        for _ in range(options['extra_words']):
+            bad_words.append(''.join(rng.choice(PERSIAN_LETTERS) for _ in range(rng.randint(5, 8))))
+
+        comments = []
+        for index in range(options['comments']):
+            words = [rng.choice(FILLER_WORDS) for _ in range(options['words'])]
+            # یک نظر از هر ده نظر یک کلمه‌ی نامناسب دارد
+            if bad_words and index % 10 == 0:
+                words.insert(rng.randrange(len(words)), rng.choice(bad_words))
+            comments.append(' '.join(words))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8', delete=False) as f:
+            json.dump(bad_words, f, ensure_ascii=False)
+        try:
+            normalized = {word for word in map(normalize_text, bad_words) if word}
+            substring = SubstringMatcher(normalized)
+            automaton = AhoCorasick(normalized)
+            methods = (
+                ('legacy loop', lambda text: legacy_contains_bad_words(text, f.name)),
+                ('substring', lambda text: substring.find(normalize_text(text)) is not None),
+                ('aho-corasick', lambda text: automaton.find(normalize_text(text)) is not None),
+            )
+            results = {}
+            for name, method in methods:
+                samples, results[name] = self._measure(method, comments)
+                self._report(name, samples)
+        finally:
+            os.unlink(f.name)
+
+        verdicts = list(results.values())
+        mismatches = sum(len(set(row)) > 1 for row in zip(*verdicts))
+        self.stdout.write(f"{len(bad_words)} words, {mismatches} comment(s) with differing verdicts")
+
+    @staticmethod
+    def _measure(method, comments):
+        method(comments[0])  # warm-up
+        samples, verdicts = [], []
+        for text in comments:
+            started = time.perf_counter()
+            verdicts.append(method(text))
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        return samples, verdicts
+
+    def _report(self, name, samples):
+        self.stdout.write(
+            f"{name:<13} p50={statistics.median(samples):8.1f}µs "
+            f"p99={_percentile(samples, 99):8.1f}µs "
+            f"max={max(samples):8.1f}µs (n={len(samples)})"
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from fitness.cache import bump_version
+from fitness.ratings import rebuild_ratings
+from gyms.models import Gym
+from interactions.models import Review
+from trainers.models import Trainer, TrainerReview
+
+
+class Command(BaseCommand):
+    help = "بازسازی امتیاز (rating_sum، تعداد نظرات و میانگین) همه‌ی باشگاه‌ها و مربی‌ها با یک aggregate برای هر کدام"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=['gyms', 'trainers'], help='فقط باشگاه‌ها یا فقط مربی‌ها')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        only = options.get('only')
+        batch_size = options['batch_size']
+
+        if only in (None, 'gyms'):
+            changed = rebuild_ratings(
+                Gym, Review.objects.counted(),
+                target_field='gym', count_field='comments', batch_size=batch_size,
+            )
+            bump_version('gym')
+            self.stdout.write(self.style.SUCCESS(f"{changed} gym rating(s) corrected"))
+
+        if only in (None, 'trainers'):
+            changed = rebuild_ratings(
+                Trainer, TrainerReview.objects.counted(),
+                target_field='trainer', count_field='reviews_count', batch_size=batch_size,
+            )
+            bump_version('trainer')
+            self.stdout.write(self.style.SUCCESS(f"{changed} trainer rating(s) corrected"))
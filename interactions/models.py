@@ -2,6 +2,12 @@ from django.db import models
 from django.utils import timezone
 
 
+class ReviewQuerySet(models.QuerySet):
+    def counted(self):
+        """نظراتی که در امتیاز باشگاه شمرده می‌شوند (نه ریپلای‌ها و نه بلاک/حذف‌شده‌ها)"""
+        return self.filter(reply_to__isnull=True, blocked=False, deleted=False)
+
+
 class Review(models.Model):
     user = models.ForeignKey(
         'accounts.User',
@@ -27,9 +33,16 @@ class Review(models.Model):
         blank=True,
         related_name='replies'
     )
-    
-    
-    
+
+    objects = ReviewQuerySet.as_manager()
+
+    def rating_contribution(self):
+        """(gym_id, rating) اگر این نظر در امتیاز باشگاه شمرده شود، وگرنه None"""
+        if self.reply_to_id is not None or self.blocked or self.deleted:
+            return None
+        return self.gym_id, self.rating
+
+
 class Favorite(models.Model):
     user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name="favorites")
     gym = models.ForeignKey('gyms.Gym', on_delete=models.CASCADE, related_name="favorited_by")
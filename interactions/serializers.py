@@ -2,8 +2,7 @@
 from rest_framework import serializers
 from .models import Review, Favorite
 from gyms.models import Gym
-import json, os
-from django.conf import settings
+from fitness.moderation import contains_bad_words
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -81,24 +80,8 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     def validate_comment(self, value):
         """فیلتر فحش‌ها در متن کامنت"""
-        # مسیر فایل
-        badwords_path = os.path.join(settings.BASE_DIR, 'badwords_fa.json')
-
-        # اگر فایل وجود ندارد، فقط ادامه بده
-        if not os.path.exists(badwords_path):
-            return value
-
-        # بارگذاری کلمات
-        with open(badwords_path, 'r', encoding='utf-8') as f:
-            bad_words = json.load(f)
-
-        text = value.lower().replace("‌", "").replace(" ", "")  # حذف نیم‌فاصله و فاصله
-
-        for word in bad_words:
-            w = word.strip().lower().replace("‌", "").replace(" ", "")
-            if w and w in text:
-                raise serializers.ValidationError("در متن شما کلمات نامناسب وجود دارد.")
-
+        if contains_bad_words(value):
+            raise serializers.ValidationError("در متن شما کلمات نامناسب وجود دارد.")
         return value
 
     def create(self, validated_data):
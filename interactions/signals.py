@@ -1,26 +1,40 @@
 # interactions/signals.py
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from django.db.models import Avg, Count
+
+from fitness.cache import bump_version
+from fitness.ratings import apply_review_change
+from gyms.models import Gym
 from .models import Review
 
-@receiver([post_save, post_delete], sender=Review)
-def update_gym_rating(sender, instance, **kwargs):
-    gym = instance.gym
 
-    # فقط کامنت‌های اصلی (نه ریپلای‌ها) و نه بن‌شده‌ها
-    reviews = Review.objects.filter(
-        gym=gym,
-        reply_to__isnull=True,
-        blocked=False,
-        deleted=False,
-    )
+@receiver(pre_save, sender=Review, dispatch_uid='interactions.review_rating_before')
+def remember_review_rating(sender, instance, **kwargs):
+    # سهم قبلی این نظر در امتیاز باشگاه (با یک کوئری روی کلید اصلی)
+    instance._previous_rating_contribution = None
+    if instance.pk:
+        previous = Review.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_rating_contribution = previous.rating_contribution()
 
-    data = reviews.aggregate(
-        avg_rating=Avg('rating'),
-        total_comments=Count('id')
+
+@receiver(post_save, sender=Review, dispatch_uid='interactions.review_rating_saved')
+def update_gym_rating(sender, instance, **kwargs):
+    # فقط اختلاف حالت قبلی و جدید نظر با F() روی باشگاه اعمال می‌شود
+    changed = apply_review_change(
+        Gym,
+        count_field='comments',
+        old=getattr(instance, '_previous_rating_contribution', None),
+        new=instance.rating_contribution(),
     )
+    instance._previous_rating_contribution = instance.rating_contribution()
+    if changed:
+        bump_version('gym')
+
 
-    gym.average_rating = data['avg_rating'] or 0
-    gym.comments = data['total_comments']
-    gym.save(update_fields=['average_rating', 'comments'])
+@receiver(post_delete, sender=Review, dispatch_uid='interactions.review_rating_deleted')
+def remove_gym_rating(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Gym):
+        return
+    if apply_review_change(Gym, count_field='comments', old=instance.rating_contribution(), new=None):
+        bump_version('gym')
@@ -1,11 +1,18 @@
+import json
+import os
+import tempfile
 from decimal import Decimal
+from io import StringIO
 
-from django.test import TestCase
-from rest_framework.test import APIRequestFactory
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
 
 from accounts.models import User
+from fitness.moderation import AhoCorasick, contains_bad_words, normalize_text
 from finance.models import Purchase
 from gyms.models import Gym
+from interactions.models import Review
 from interactions.serializers import ReviewSerializer
 from packages.models import GroupPackage, Package
 
@@ -26,3 +33,104 @@ class ReviewSerializerTests(TestCase):
         self.assertTrue(serializer.is_valid(), serializer.errors)
         review = serializer.save()
         self.assertTrue(review.buyer)
+
+
+class GymRatingTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(phone='09120000005', role='owner')
+        self.user = User.objects.create_user(phone='09120000006')
+        self.gym = Gym.objects.create(owner=owner, name='Rated Gym', latitude=35.0, longitude=51.0)
+
+    def assertRating(self, rating_sum, comments, average):
+        self.gym.refresh_from_db()
+        self.assertEqual((self.gym.rating_sum, self.gym.comments), (rating_sum, comments))
+        self.assertAlmostEqual(self.gym.average_rating, average)
+
+    def test_rating_follows_review_changes(self):
+        first = Review.objects.create(user=self.user, gym=self.gym, rating=5, comment='a')
+        second = Review.objects.create(user=self.user, gym=self.gym, rating=2, comment='b')
+        Review.objects.create(user=self.user, gym=self.gym, rating=1, comment='reply', reply_to=first)
+        self.assertRating(7, 2, 3.5)
+
+        second.rating = 4
+        second.save()
+        self.assertRating(9, 2, 4.5)
+
+        second.blocked = True
+        second.save()
+        self.assertRating(5, 1, 5.0)
+
+        first.delete()
+        self.assertRating(0, 0, 0.0)
+
+    def test_rebuild_command_fixes_drift(self):
+        Review.objects.create(user=self.user, gym=self.gym, rating=4, comment='a')
+        Review.objects.filter(gym=self.gym).update(rating=2)
+
+        call_command('rebuild_ratings', '--only', 'gyms', stdout=StringIO())
+
+        self.assertRating(2, 1, 2.0)
+
+
+class ReviewModerationListTests(TestCase):
+    def test_reported_reviews_are_cursor_paginated(self):
+        owner = User.objects.create_user(phone='09120000711', role='owner')
+        user = User.objects.create_user(phone='09120000712')
+        admin = User.objects.create_user(phone='09120000713', is_staff=True)
+        gym = Gym.objects.create(owner=owner, name='Moderated Gym', latitude=35.0, longitude=51.0)
+        for index in range(5):
+            Review.objects.create(user=user, gym=gym, rating=3, comment=str(index), is_reported=index != 2)
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        first = client.get('/api/reviews/reported_reviews/', {'page_size': 3})
+        second = client.get(first.data['next'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(
+            [item['comment'] for item in first.data['results'] + second.data['results']],
+            ['4', '3', '1', '0'],
+        )
+        self.assertIsNone(second.data['next'])
+
+class BadWordFilterTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.write_words(['بی‌ادب', 'كثافت'])
+        override = override_settings(BADWORDS_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(os.unlink, self.path)
+
+    def write_words(self, words, mtime=None):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(words, f, ensure_ascii=False)
+        if mtime is not None:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_normalizes_persian_variants(self):
+        self.assertEqual(normalize_text('بی‌ادب  كثافتَ ـــ آقاي'), 'بیادبکثافتاقای')
+        self.assertTrue(contains_bad_words('خیلی بی ادب بود'))
+        self.assertTrue(contains_bad_words('کثافت'))
+        self.assertFalse(contains_bad_words('باشگاه خوبی بود'))
+
+    def test_reloads_when_file_changes(self):
+        self.assertFalse(contains_bad_words('عوضی'))
+        self.write_words(['عوضی'], mtime=os.stat(self.path).st_mtime_ns + 10**9)
+        self.assertTrue(contains_bad_words('عوضی'))
+        self.assertFalse(contains_bad_words('کثافت'))
+
+    def test_automaton_matches_overlapping_words(self):
+        matcher = AhoCorasick(['abcd', 'bc', 'cde'])
+        self.assertEqual(matcher.find('xabcy'), 'bc')
+        self.assertEqual(matcher.find('xxcdex'), 'cde')
+        self.assertIsNone(matcher.find('abdce'))
+
+    def test_serializer_rejects_bad_words(self):
+        request = APIRequestFactory().post('/reviews/')
+        request.user = User.objects.create_user(phone='09120000007')
+        serializer = ReviewSerializer(data={'comment': 'بي ادب'}, context={'request': request}, partial=True)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('comment', serializer.errors)
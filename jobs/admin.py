@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display    = ('task', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter     = ('status', 'task')
+    search_fields   = ('task', 'unique_key')
+    ordering        = ('-created_at',)
+    readonly_fields = ('unique_key', 'created_at', 'finished_at', 'last_error')
@@ -0,0 +1,66 @@
+import multiprocessing
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.queue import DEFAULT_BATCH_SIZE, work, work_in_background
+
+
+class Command(BaseCommand):
+    help = (
+        "اجرای کارهای صف Job و ثبت نوبت کارهای دوره‌ای (PERIODIC_JOBS)؛ چند worker با thread یا "
+        "process جداگانه کارهای متفاوتی برمی‌دارند. بدون --once به صورت دائمی اجرا می‌شود"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='تعداد worker همزمان')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+        parser.add_argument('--once', action='store_true', help='فقط یک بار صف را خالی کن و خارج شو')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help='مکث (ثانیه) وقتی صف خالی است')
+        parser.add_argument('--no-periodic', action='store_true', help='کارهای دوره‌ای را ثبت نکن')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+        work_options = {
+            'batch_size': options['batch_size'],
+            'interval': options['interval'],
+            'once': options['once'],
+            'periodic': not options['no_periodic'],
+        }
+        if options['workers'] == 1 and options['pool'] == 'thread':
+            try:
+                work(**work_options)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        if options['pool'] == 'process':
+            # اتصال‌های باز نباید بین processها مشترک شوند
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            workers = [
+                context.Process(target=work_in_background, kwargs={**work_options, 'stop': stop}, daemon=True)
+                for _ in range(options['workers'])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=work_in_background, kwargs={**work_options, 'stop': stop}, daemon=True)
+                for _ in range(options['workers'])
+            ]
+
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} {options['pool']} workers started")
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(1.0)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,39 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    کار پس‌زمینه: تابع task (مسیر کامل، مثلا notifications.tasks.send_plan_expiry_notifications)
+    با args/kwargs. worker (دستور runworker) کارهای موعدرسیده را با SKIP LOCKED برمی‌دارد.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE    = 'done',    'Done'
+        FAILED  = 'failed',  'Failed'
+
+    task         = models.CharField(max_length=200)
+    args         = models.JSONField(default=list)
+    kwargs       = models.JSONField(default=dict)
+    # کلید یکتای اختیاری؛ ثبت دوباره‌ی همان کار (مثلا نوبت یک کار دوره‌ای) کار تازه نمی‌سازد
+    unique_key   = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    status       = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # زمان اجرا یا تلاش بعدی؛ برای ردیف‌های running مهلت worker فعلی است
+    run_at       = models.DateTimeField(default=timezone.now)
+    last_error   = models.TextField(blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+        ]
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+
+    def __str__(self):
+        return f"[{self.status}] {self.task} #{self.pk}"
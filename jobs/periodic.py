@@ -0,0 +1,74 @@
+"""
+کارهای دوره‌ای (settings.PERIODIC_JOBS).
+
+هر کار یا هر every ثانیه (هم‌تراز با epoch) یا هر روز در ساعت at (به وقت TIME_ZONE) نوبت
+دارد. worker آخرین نوبت گذشته‌ی هر کار را با unique_key به شکل periodic:<name>:<نوبت> در صف
+می‌گذارد؛ پس چند worker همزمان هر نوبت را فقط یک بار ثبت می‌کنند و نوبتی که در زمان خاموش
+بودن workerها گذشته یک بار اجرا می‌شود.
+
+    PERIODIC_JOBS = {
+        'plan-expiry-notifications': {
+            'task': 'notifications.tasks.send_plan_expiry_notifications',
+            'at': '06:00',
+        },
+        'something-frequent': {'task': '...', 'every': 300},
+    }
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+
+@dataclass(frozen=True)
+class PeriodicJob:
+    name: str
+    task: str
+    every: timedelta = None
+    at: time = None
+    kwargs: dict = field(default_factory=dict, compare=False)
+
+    def last_slot(self, now):
+        """آخرین نوبت در زمان now یا قبل از آن"""
+        if self.every is not None:
+            seconds = self.every.total_seconds()
+            return datetime.fromtimestamp(now.timestamp() // seconds * seconds, tz=dt_timezone.utc)
+        slot = timezone.make_aware(datetime.combine(timezone.localtime(now).date(), self.at))
+        return slot if slot <= now else slot - timedelta(days=1)
+
+    def unique_key(self, slot):
+        return f"periodic:{self.name}:{slot.isoformat()}"
+
+
+def periodic_jobs():
+    jobs = []
+    for name, options in getattr(settings, 'PERIODIC_JOBS', {}).items():
+        if ('every' in options) == ('at' in options):
+            raise ImproperlyConfigured(f"PERIODIC_JOBS[{name!r}] needs exactly one of 'every' or 'at'")
+        jobs.append(PeriodicJob(
+            name=name,
+            task=options['task'],
+            every=timedelta(seconds=options['every']) if 'every' in options else None,
+            at=time.fromisoformat(options['at']) if 'at' in options else None,
+            kwargs=options.get('kwargs', {}),
+        ))
+    return jobs
+
+
+def enqueue_periodic(now=None, seen=None):
+    """
+    ثبت آخرین نوبت کارهای دوره‌ای.
+    seen (نام -> نوبت) حافظه‌ی worker است تا هر نوبت فقط یک بار به دیتابیس برسد.
+    """
+    from jobs.queue import enqueue
+
+    now = now or timezone.now()
+    seen = {} if seen is None else seen
+    for job in periodic_jobs():
+        slot = job.last_slot(now)
+        if seen.get(job.name) == slot:
+            continue
+        enqueue(job.task, kwargs=job.kwargs, run_at=slot, unique_key=job.unique_key(slot))
+        seen[job.name] = slot
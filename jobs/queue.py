@@ -0,0 +1,151 @@
+"""
+صف کارهای پس‌زمینه روی همان دیتابیس (بدون broker).
+
+enqueue فقط یک ردیف Job ثبت می‌کند؛ run_due دسته‌ای از کارهای موعدرسیده را با
+SELECT ... FOR UPDATE SKIP LOCKED برمی‌دارد (چند worker همزمان کارهای متفاوتی می‌گیرند)،
+بیرون از تراکنش اجرا می‌کند و در صورت خطا با backoff نمایی دوباره زمان‌بندی می‌کند.
+
+هر کار حداقل یک بار اجرا می‌شود: اگر worker وسط کار از بین برود، بعد از JOB_LEASE کار
+دوباره برداشته می‌شود؛ پس taskها باید تکرارپذیر باشند.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(task, args=None, kwargs=None, run_at=None, unique_key=None, max_attempts=None):
+    """
+    ثبت کار. task مسیر کامل تابع است و args/kwargs باید JSON باشند.
+    اگر کاری با همین unique_key قبلاً ثبت شده باشد همان برگردانده می‌شود.
+    داخل تراکنش فراخواننده اجرا می‌شود، پس با rollback آن کاری هم اجرا نمی‌شود.
+    """
+    fields = {
+        'task': task,
+        'args': list(args or ()),
+        'kwargs': dict(kwargs or {}),
+        'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts or _setting('JOB_MAX_ATTEMPTS', 5),
+    }
+    if unique_key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(unique_key=unique_key, **fields)
+    except IntegrityError:
+        return Job.objects.get(unique_key=unique_key)
+
+
+def retry_delay(attempts):
+    """backoff نمایی: base, 2*base, 4*base, ... حداکثر JOB_RETRY_MAX_DELAY"""
+    base = _setting('JOB_RETRY_BASE_DELAY', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_MAX_DELAY', 3600)))
+
+
+def _claim_due(batch_size, now):
+    due = Job.objects.filter(
+        Q(status=Job.Status.PENDING) | Q(status=Job.Status.RUNNING),
+        run_at__lte=now,
+    ).order_by('run_at', 'id')
+    with transaction.atomic():
+        ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+        # هر برداشت یک تلاش حساب می‌شود، حتی اگر worker قبل از ثبت نتیجه از بین برود
+        Job.objects.filter(id__in=ids).update(
+            status=Job.Status.RUNNING,
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=_setting('JOB_LEASE', 300)),
+        )
+    return list(Job.objects.filter(id__in=ids).order_by('id'))
+
+
+def run_job(job):
+    """اجرای یک کار claim‌شده و ثبت نتیجه؛ True یعنی موفق"""
+    if job.attempts > job.max_attempts:
+        # مهلت worker قبلی در تلاش آخر تمام شده است
+        job.status = Job.Status.FAILED
+        job.last_error = job.last_error or 'lease expired'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'last_error', 'finished_at'])
+        logger.error("Job %s (%s) gave up after %s attempts", job.pk, job.task, job.max_attempts)
+        return False
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception as e:
+        job.last_error = f"{type(e).__name__}: {e}"[:2000]
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+            logger.exception("Job %s (%s) failed permanently", job.pk, job.task)
+        else:
+            job.status = Job.Status.PENDING
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+            logger.warning("Job %s (%s) failed (attempt %s): %s", job.pk, job.task, job.attempts, e)
+        job.save(update_fields=['status', 'run_at', 'last_error', 'finished_at'])
+        return False
+    job.status = Job.Status.DONE
+    job.finished_at = timezone.now()
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'finished_at'])
+    return True
+
+
+def run_due(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """اجرای یک دسته از کارهای موعدرسیده؛ تعداد (موفق، ناموفق) برگردانده می‌شود"""
+    done = failed = 0
+    for job in _claim_due(batch_size, now or timezone.now()):
+        if run_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def work(batch_size=DEFAULT_BATCH_SIZE, interval=1.0, once=False, periodic=True, stop=None):
+    """
+    حلقه‌ی یک worker: ثبت نوبت‌های کارهای دوره‌ای و اجرای کارهای موعدرسیده تا وقتی stop
+    (threading.Event یا multiprocessing.Event) ست شود. با once بعد از خالی شدن صف برمی‌گردد.
+    """
+    from jobs.periodic import enqueue_periodic
+
+    stop = stop or threading.Event()
+    seen = {}
+    while not stop.is_set():
+        try:
+            if periodic:
+                enqueue_periodic(seen=seen)
+            done, failed = run_due(batch_size)
+        except DatabaseError:
+            # مثلا قطع موقت اتصال؛ worker نباید از بین برود
+            logger.exception("Job worker iteration failed")
+            stop.wait(interval)
+            continue
+        if done + failed < batch_size:
+            if once:
+                break
+            stop.wait(interval)
+
+
+def work_in_background(**options):
+    """work برای thread یا process جداگانه"""
+    try:
+        work(**options)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # اتصال دیتابیس هر thread/process متعلق به خودش است
+        connections.close_all()
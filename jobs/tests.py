@@ -0,0 +1,132 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.periodic import PeriodicJob, enqueue_periodic
+from jobs.queue import enqueue, run_due
+
+CALLS = []
+
+
+def record(*args, **kwargs):
+    CALLS.append((args, kwargs))
+
+
+def explode(*args, **kwargs):
+    CALLS.append((args, kwargs))
+    raise RuntimeError('boom')
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_BASE_DELAY=30, JOB_LEASE=300, PERIODIC_JOBS={})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_runs_due_jobs_with_arguments(self):
+        job = enqueue('jobs.tests.record', args=[1, 'a'], kwargs={'flag': True})
+        enqueue('jobs.tests.record', run_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(run_due(), (1, 0))
+        self.assertEqual(CALLS, [((1, 'a'), {'flag': True})])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_enqueue_is_idempotent(self):
+        first = enqueue('jobs.tests.record', unique_key='report:1')
+        second = enqueue('jobs.tests.record', args=[2], unique_key='report:1')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failure_is_retried_with_backoff_then_given_up(self):
+        job = enqueue('jobs.tests.explode')
+        now = timezone.now()
+
+        self.assertEqual(run_due(now=now), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreaterEqual(job.run_at, now + timedelta(seconds=30))
+
+        # قبل از موعد تلاش بعدی برداشته نمی‌شود
+        self.assertEqual(run_due(now=now + timedelta(seconds=10)), (0, 0))
+        for hours in range(1, 3):
+            run_due(now=now + timedelta(hours=hours))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(len(CALLS), 3)
+
+    def test_expired_lease_is_reclaimed(self):
+        job = enqueue('jobs.tests.record')
+        now = timezone.now()
+        # worker اول کار را برداشته و از بین رفته است
+        Job.objects.filter(pk=job.pk).update(status=Job.Status.RUNNING, attempts=1, run_at=now + timedelta(seconds=300))
+
+        self.assertEqual(run_due(now=now + timedelta(seconds=60)), (0, 0))
+        self.assertEqual(run_due(now=now + timedelta(seconds=301)), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 2)
+
+    def test_unknown_task_fails(self):
+        job = enqueue('jobs.tests.missing', max_attempts=1)
+
+        self.assertEqual(run_due(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('ImportError', job.last_error)
+
+
+@override_settings(TIME_ZONE='Asia/Tehran', PERIODIC_JOBS={
+    'daily': {'task': 'jobs.tests.record', 'at': '06:00', 'kwargs': {'source': 'daily'}},
+    'often': {'task': 'jobs.tests.record', 'every': 300},
+})
+class PeriodicJobTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_last_slot(self):
+        now = datetime(2026, 3, 1, 1, 0, tzinfo=dt_timezone.utc)  # 04:30 Tehran
+        daily = PeriodicJob(name='daily', task='x', at=time(6, 0))
+        often = PeriodicJob(name='often', task='x', every=timedelta(minutes=5))
+
+        self.assertEqual(daily.last_slot(now), datetime(2026, 2, 28, 2, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(daily.last_slot(now + timedelta(hours=2)), datetime(2026, 3, 1, 2, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(often.last_slot(now + timedelta(minutes=7)), now + timedelta(minutes=5))
+
+    def test_each_slot_is_enqueued_once(self):
+        now = timezone.now()
+        seen = {}
+        enqueue_periodic(now=now, seen=seen)
+        # worker دیگری با حافظه‌ی خودش
+        enqueue_periodic(now=now)
+        enqueue_periodic(now=now + timedelta(seconds=1), seen=seen)
+        self.assertEqual(Job.objects.count(), 2)
+
+        enqueue_periodic(now=now + timedelta(minutes=5), seen=seen)
+        self.assertEqual(Job.objects.filter(unique_key__startswith='periodic:often:').count(), 2)
+        self.assertEqual(Job.objects.filter(unique_key__startswith='periodic:daily:').count(), 1)
+
+    def test_runworker_once_runs_periodic_jobs(self):
+        call_command('runworker', '--once', stdout=StringIO())
+
+        self.assertEqual(sorted(kwargs.get('source', '') for _, kwargs in CALLS), ['', 'daily'])
+        self.assertFalse(Job.objects.exclude(status=Job.Status.DONE).exists())
+
+    @override_settings(PERIODIC_JOBS={
+        'plan-expiry-notifications': {'task': 'notifications.tasks.send_plan_expiry_notifications', 'at': '06:00'},
+    })
+    def test_plan_expiry_is_scheduled(self):
+        call_command('runworker', '--once', stdout=StringIO())
+
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'notifications.tasks.send_plan_expiry_notifications')
+        self.assertEqual(job.status, Job.Status.DONE)
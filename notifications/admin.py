@@ -1,12 +1,12 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, SmsOutbox
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display    = ('recipient', 'notification_type', 'title', 'is_read', 'created_at')
-    list_filter     = ('notification_type', 'is_read', 'recipient')
+    list_display    = ('recipient', 'audience', 'notification_type', 'title', 'is_read', 'created_at')
+    list_filter     = ('notification_type', 'is_read', 'audience', 'recipient')
     search_fields   = ('recipient__phone', 'title', 'message')
     ordering        = ('-created_at',)
     readonly_fields = ('created_at',)
@@ -14,7 +14,7 @@ class NotificationAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ("اطلاعات اعلان", {
-            "fields": ("recipient", "notification_type", "title", "message", "data")
+            "fields": ("recipient", "audience", "notification_type", "title", "message", "data")
         }),
         ("وضعیت", {
             "fields": ("is_read",)
@@ -23,3 +23,12 @@ class NotificationAdmin(admin.ModelAdmin):
             "fields": ("created_at",)
         }),
     )
+
+
+@admin.register(SmsOutbox)
+class SmsOutboxAdmin(admin.ModelAdmin):
+    list_display    = ('phone', 'body_id', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter     = ('status', 'body_id')
+    search_fields   = ('phone', 'idempotency_key')
+    ordering        = ('-created_at',)
+    readonly_fields = ('idempotency_key', 'created_at', 'sent_at', 'provider_response', 'last_error')
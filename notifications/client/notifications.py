@@ -7,9 +7,12 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from fitness.pagination import AdminCursorPagination
+from notifications.inbox import is_admin, mark_all_read, mark_read, read_markers, unread_count, with_read_state
 from notifications.models import Notification
 from notifications.permissions import IsAdminUser, IsNotificationOwner
 from notifications.serializers import AdminSendNotificationSerializer, NotificationSerializer
+from notifications.utils import bulk_notify
 
 logger = logging.getLogger(__name__)
 
@@ -23,20 +26,30 @@ class NotificationPagination(PageNumberPagination):
 class NotificationListView(generics.ListAPIView):
     """
     GET /notifications/
-    - Admin (role='admin' or is_superuser): returns ALL notifications
+    - Admin (role='admin' or is_superuser): returns ALL notifications, including the
+      admin broadcasts
     - Owner/Customer: returns only own notifications
-    Ordered by -created_at, paginated.
+    is_read of a broadcast is the requesting user's read state.
+    Ordered by -created_at, paginated. The admin listing spans the whole table, so it uses
+    cursor pagination (no COUNT(*) of the table, next/previous links only).
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = NotificationPagination
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            is_admin_listing = self.request is not None and is_admin(self.request.user)
+            self._paginator = AdminCursorPagination() if is_admin_listing else self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         user = self.request.user
         qs = Notification.objects.select_related('recipient')
-        if getattr(user, 'role', None) == 'admin' or user.is_superuser:
-            return qs
-        return qs.filter(recipient=user)
+        if not is_admin(user):
+            return qs.filter(recipient=user)
+        return with_read_state(qs, user, read_markers(user))
 
 
 class MarkNotificationReadView(APIView):
@@ -46,8 +59,8 @@ class MarkNotificationReadView(APIView):
     def patch(self, request, pk):
         notification = get_object_or_404(Notification, pk=pk)
         self.check_object_permissions(request, notification)
-        notification.is_read = True
-        notification.save(update_fields=['is_read'])
+        mark_read(request.user, notification)
+        notification.user_has_read = True
         return Response(NotificationSerializer(notification).data, status=status.HTTP_200_OK)
 
 
@@ -56,10 +69,7 @@ class MarkAllReadView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        Notification.objects.filter(
-            recipient=request.user,
-            is_read=False,
-        ).update(is_read=True)
+        mark_all_read(request.user)
         return Response({"detail": "All notifications marked as read."}, status=status.HTTP_200_OK)
 
 
@@ -68,11 +78,7 @@ class UnreadCountView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        count = Notification.objects.filter(
-            recipient=request.user,
-            is_read=False,
-        ).count()
-        return Response({"unread_count": count}, status=status.HTTP_200_OK)
+        return Response({"unread_count": unread_count(request.user)}, status=status.HTTP_200_OK)
 
 
 class AdminSendNotificationView(APIView):
@@ -83,12 +89,11 @@ class AdminSendNotificationView(APIView):
         serializer = AdminSendNotificationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         recipient = serializer.resolve_recipient()
-        notification = Notification.objects.create(
-            recipient=recipient,
-            notification_type=serializer.validated_data['notification_type'],
-            title=serializer.validated_data['title'],
-            message=serializer.validated_data['message'],
-            is_read=False,
+        notification, = bulk_notify(
+            [recipient],
+            serializer.validated_data['notification_type'],
+            serializer.validated_data['title'],
+            serializer.validated_data['message'],
         )
         return Response(
             NotificationSerializer(notification).data,
@@ -0,0 +1,230 @@
+"""
+صندوق اعلان هر کاربر: اعلان‌های مستقیم (recipient) به اضافه‌ی اعلان‌های همگانی audienceهایی
+که کاربر عضو آن است. وضعیت خواندن اعلان مستقیم در is_read خود ردیف و وضعیت اعلان همگانی در
+NotificationReadMarker همان کاربر است.
+
+تعداد خوانده‌نشده‌ها (unread_count) هر بار شمرده نمی‌شود:
+- اعلان‌های مستقیم در UnreadCounter کاربر نگه داشته و با F() کم و زیاد می‌شوند؛
+- هر دو بخش در کش هستند. کش بخش مستقیم با هر تغییر همان کاربر پاک می‌شود و کلید بخش همگانی
+  شامل نسخه‌ی audience است که با هر broadcast زیاد می‌شود.
+"""
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Max, Q, Value, When
+
+from notifications.models import Notification, NotificationReadMarker, UnreadCounter
+
+_KEY_PREFIX = 'notifications:unread'
+# سقف عمر مقادیر کش‌شده؛ invalidation اصلی با پاک کردن کلید و نسخه‌هاست
+CACHE_TIMEOUT = 300
+
+
+def is_admin(user):
+    return getattr(user, 'role', None) == 'admin' or user.is_superuser
+
+
+def audiences_for(user):
+    return [Notification.Audience.ADMINS] if is_admin(user) else []
+
+
+def read_markers(user):
+    """audience -> NotificationReadMarker (بدون ساختن ردیف؛ نبودن یعنی هیچ اعلانی خوانده نشده)"""
+    audiences = audiences_for(user)
+    if not audiences:
+        return {}
+    markers = NotificationReadMarker.objects.filter(user=user, audience__in=audiences)
+    return {marker.audience: marker for marker in markers}
+
+
+def with_read_state(queryset, user, markers):
+    """
+    annotate کردن user_has_read: برای اعلان مستقیم همان is_read و برای اعلان همگانی بر اساس
+    NotificationReadMarker کاربر.
+    """
+    whens = [When(audience__isnull=True, then='is_read')]
+    for audience, marker in markers.items():
+        read = Q(id__lte=marker.last_read_id)
+        if marker.read_ids:
+            read |= Q(id__in=marker.read_ids)
+        whens.append(When(Q(audience=audience) & read, then=Value(True)))
+    return queryset.annotate(
+        user_has_read=Case(*whens, default=Value(False), output_field=BooleanField()),
+    )
+
+
+def can_access(user, notification):
+    if notification.audience is None:
+        return notification.recipient_id == user.pk
+    return notification.audience in audiences_for(user)
+
+
+# ---------------------------------------------------------------------------
+# شمارنده و کش
+# ---------------------------------------------------------------------------
+
+def _direct_key(user_id):
+    return f'{_KEY_PREFIX}:direct:{user_id}'
+
+
+def _audience_version_key(audience):
+    return f'{_KEY_PREFIX}:version:{audience}'
+
+
+def _audience_key(user_id, audience):
+    version = cache.get(_audience_version_key(audience))
+    if version is None:
+        # نسخه‌ی اولیه بر اساس زمان است تا بعد از evict شدن کلید، مقادیر قدیمی دوباره معتبر نشوند
+        cache.add(_audience_version_key(audience), time.time_ns(), timeout=None)
+        version = cache.get(_audience_version_key(audience))
+    return f'{_KEY_PREFIX}:audience:{audience}:{version}:{user_id}'
+
+
+def _invalidate(keys):
+    # بعد از commit هم پاک می‌شود تا خواندن همزمانِ پیش از commit مقدار قدیمی را در کش نگذارد
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def added_unread(user_ids):
+    """اعلان‌های مستقیم تازه برای user_ids (هر id به ازای یک اعلان)"""
+    by_count = {}
+    for user_id, count in Counter(user_ids).items():
+        by_count.setdefault(count, []).append(user_id)
+    for count, ids in by_count.items():
+        UnreadCounter.objects.filter(user_id__in=ids).update(unread=F('unread') + count)
+    _invalidate([_direct_key(user_id) for user_id in set(user_ids)])
+
+
+def _bump_audience_version(audience):
+    try:
+        cache.incr(_audience_version_key(audience))
+    except ValueError:
+        cache.add(_audience_version_key(audience), time.time_ns(), timeout=None)
+
+
+def broadcast_added(audience):
+    _bump_audience_version(audience)
+    transaction.on_commit(lambda: _bump_audience_version(audience))
+
+
+def _count_unread(user):
+    return Notification.objects.filter(recipient=user, is_read=False).count()
+
+
+def _rebuild_counter(user):
+    """
+    ساختن شمارنده از روی اعلان‌ها. ردیف اول ساخته می‌شود تا added_unread همزمان روی آن اعمال
+    شود؛ بعد زیر قفل همان ردیف شمرده و فقط اختلاف شمارش با مقدار قفل‌شده اضافه می‌شود، پس
+    افزایشی که بین ساختن ردیف و شمارش commit شده یا بعد از آن می‌رسد از دست نمی‌رود.
+    """
+    UnreadCounter.objects.get_or_create(user=user)
+    with transaction.atomic():
+        locked = UnreadCounter.objects.select_for_update().values_list('unread', flat=True).get(user=user)
+        difference = _count_unread(user) - locked
+        counter = UnreadCounter.objects.filter(user=user)
+        if difference:
+            counter.update(unread=F('unread') + difference)
+        return counter.values_list('unread', flat=True).get()
+
+
+def _direct_unread(user):
+    key = _direct_key(user.pk)
+    count = cache.get(key)
+    if count is not None:
+        return count
+    count = UnreadCounter.objects.filter(user=user).values_list('unread', flat=True).first()
+    if count is None:
+        count = _rebuild_counter(user)
+    cache.set(key, count, CACHE_TIMEOUT)
+    return count
+
+
+def _audience_unread(audience, marker):
+    unread = Notification.objects.filter(audience=audience)
+    if marker is not None:
+        unread = unread.filter(id__gt=marker.last_read_id).exclude(id__in=marker.read_ids)
+    return unread.count()
+
+
+def unread_count(user):
+    count = _direct_unread(user)
+    markers = None
+    for audience in audiences_for(user):
+        key = _audience_key(user.pk, audience)
+        cached = cache.get(key)
+        if cached is None:
+            markers = read_markers(user) if markers is None else markers
+            cached = _audience_unread(audience, markers.get(audience))
+            cache.set(key, cached, CACHE_TIMEOUT)
+        count += cached
+    return count
+
+
+# ---------------------------------------------------------------------------
+# خواندن
+# ---------------------------------------------------------------------------
+
+def _compact(marker, audience, read_ids):
+    """
+    اگر اعلان‌های audience درست بعد از last_read_id همه خوانده شده باشند last_read_id تا آخرین
+    آن‌ها جلو می‌رود و از read_ids حذف می‌شوند تا read_ids بی‌حد بزرگ نشود. idهای audience
+    پشت سر هم نیستند (اعلان‌های مستقیم بینشان است)، پس ترتیب از روی خود اعلان‌ها خوانده می‌شود.
+    """
+    following = (
+        Notification.objects
+        .filter(audience=audience, id__gt=marker.last_read_id)
+        .order_by('id')
+        .values_list('id', flat=True)[:len(read_ids)]
+    )
+    for notification_id in following:
+        if notification_id not in read_ids:
+            break
+        marker.last_read_id = notification_id
+    marker.read_ids = sorted(i for i in read_ids if i > marker.last_read_id)
+
+
+def mark_read(user, notification):
+    """خواندن یک اعلان؛ True اگر قبلا خوانده نشده بود"""
+    if notification.audience is None:
+        with transaction.atomic():
+            changed = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+            if changed:
+                UnreadCounter.objects.filter(user=user, unread__gt=0).update(unread=F('unread') - 1)
+        _invalidate([_direct_key(user.pk)])
+        return changed > 0
+    with transaction.atomic():
+        marker, _ = NotificationReadMarker.objects.get_or_create(user=user, audience=notification.audience)
+        marker = NotificationReadMarker.objects.select_for_update().get(pk=marker.pk)
+        if marker.has_read(notification.pk):
+            return False
+        _compact(marker, notification.audience, set(marker.read_ids) | {notification.pk})
+        marker.save(update_fields=['last_read_id', 'read_ids', 'updated_at'])
+    _invalidate([_audience_key(user.pk, notification.audience)])
+    return True
+
+
+def mark_all_read(user):
+    with transaction.atomic():
+        # مثل _rebuild_counter اول قفل شمارنده؛ added_unread یک اعلان تازه تا پایان این تراکنش
+        # منتظر می‌ماند و بعد از آن روی مقدار درست اضافه می‌شود. شمارنده صفر نمی‌شود بلکه
+        # برابر اعلان‌هایی می‌شود که بعد از UPDATE هنوز خوانده نشده‌اند
+        counter = UnreadCounter.objects.select_for_update().filter(user=user)
+        locked = list(counter.values_list('pk', flat=True))
+        Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        if locked:
+            counter.update(unread=_count_unread(user))
+    keys = [_direct_key(user.pk)]
+    for audience in audiences_for(user):
+        latest = Notification.objects.filter(audience=audience).aggregate(latest=Max('id'))['latest']
+        if latest is None:
+            continue
+        with transaction.atomic():
+            marker, _ = NotificationReadMarker.objects.get_or_create(user=user, audience=audience)
+            NotificationReadMarker.objects.filter(pk=marker.pk, last_read_id__lt=latest).update(
+                last_read_id=latest, read_ids=[],
+            )
+        keys.append(_audience_key(user.pk, audience))
+    _invalidate(keys)
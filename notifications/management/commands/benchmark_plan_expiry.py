@@ -0,0 +1,98 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from finance.models import Purchase
+from gyms.models import Gym
+from notifications.tasks import DEFAULT_CHUNK_SIZE, EXPIRY_REMINDERS, send_plan_expiry_notifications
+from packages.models import GroupPackage, Package
+
+BATCH_SIZE = 5000
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک send_plan_expiry_notifications: خریدهای تاییدشده‌ی ساختگی که امروز و ۳ روز دیگر "
+        "منقضی می‌شوند ساخته می‌شوند و زمان هر مرحله‌ی ExpiryReport در اجرای dry-run، اجرای اول و "
+        "اجرای دوباره (بدون اعلان تازه) چاپ می‌شود. همه‌چیز داخل تراکنش ساخته و در پایان rollback می‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purchases', type=int, default=50_000, help='تعداد خریدهای در حال انقضا')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['purchases'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--purchases and --chunk-size must be positive')
+        day = timezone.localdate()
+        try:
+            with transaction.atomic():
+                self._seed(day, options['purchases'])
+                runs = (
+                    ('dry run', {'dry_run': True}),
+                    ('first run', {}),
+                    ('rerun', {}),
+                )
+                for name, kwargs in runs:
+                    report = send_plan_expiry_notifications(date=day, chunk_size=options['chunk_size'], **kwargs)
+                    self._report(name, report)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, day, count):
+        owner, _ = User.objects.get_or_create(phone='09000000000', defaults={'full_name': 'benchmark'})
+        gym = Gym.objects.create(owner=owner, name='benchmark gym', latitude=35.0, longitude=51.0)
+        package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='benchmark'),
+            gym=gym,
+            title='benchmark plan',
+            gender='male',
+            price=100,
+            duration=30,
+        )
+        content_type = ContentType.objects.get_for_model(Package)
+        # نیمی امروز و نیمی ۳ روز دیگر منقضی می‌شوند
+        expire_dates = [
+            timezone.make_aware(datetime.combine(day + timedelta(days=days_left), time(12)))
+            for days_left, _ in EXPIRY_REMINDERS
+        ]
+        for start in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - start)
+            users = User.objects.bulk_create([
+                User(phone=f'0916{start + index:07d}', referral_code=f'BPE{start + index:07d}')
+                for index in range(size)
+            ])
+            # bulk_create از Purchase.save و signalها عبور نمی‌کند؛ فقط ردیف‌هایی که کار روزانه می‌خواند
+            Purchase.objects.bulk_create([
+                Purchase(
+                    user=user,
+                    content_type=content_type,
+                    object_id=package.id,
+                    package=package,
+                    gym=gym,
+                    total_amount=100,
+                    final_amount=100,
+                    payment_status='paid',
+                    verification_status='verified',
+                    expire_date=expire_dates[(start + index) % len(expire_dates)],
+                )
+                for index, user in enumerate(users)
+            ])
+        self.stdout.write(f"seeded {count} expiring purchases")
+
+    def _report(self, name, report):
+        pending = ', '.join(f"d{days_left}={count}" for days_left, count in report.pending.items())
+        timings = ', '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in report.timings.items())
+        self.stdout.write(
+            f"{name:<9} total={report.elapsed * 1000:8.1f}ms created={report.created} "
+            f"pending[{pending}] {timings}"
+        )
@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.tasks import DEFAULT_CHUNK_SIZE, send_plan_expiry_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "ساخت اعلان‌های انقضای پلن (امروز و ۳ روز دیگر) به صورت دسته‌ای؛ اجرای دوباره در همان روز "
+        "اعلان تکراری نمی‌سازد"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help='روز مبنا به شکل YYYY-MM-DD (پیش‌فرض امروز)')
+        parser.add_argument('--dry-run', action='store_true', help='فقط شمارش، بدون ساخت اعلان')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        report = send_plan_expiry_notifications(
+            date=day, dry_run=options['dry_run'], chunk_size=options['chunk_size'],
+        )
+        for days_left, count in report.pending.items():
+            self.stdout.write(f"d{days_left}: {count} purchases to notify")
+        self.stdout.write(
+            ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in report.timings.items())
+        )
+        if report.missing_package:
+            self.stdout.write(self.style.WARNING(f"{report.missing_package} purchases without package"))
+        if report.dry_run:
+            summary = f"dry run, nothing created in {report.elapsed:.2f}s"
+        else:
+            summary = f"{report.created} notifications created in {report.elapsed:.2f}s"
+        self.stdout.write(self.style.SUCCESS(f"{report.date}: {summary}"))
@@ -0,0 +1,132 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:10
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Min, Q
+
+BATCH_SIZE = 1000
+# عنوان یادآوری روز انقضا در notifications.tasks.EXPIRY_REMINDERS؛ بقیه یادآوری ۳ روزه‌اند
+EXPIRES_TODAY_PREFIX = "پلن شما امروز منقضی می‌شود"
+
+
+def _dedup_key(notification_type, title, purchase_id):
+    # همان قالب کلیدهای notifications.signals و notifications.tasks.plan_expiry_dedup_key
+    if notification_type == 'purchase':
+        return f"purchase:purchase:{purchase_id}"
+    if notification_type == 'plan_activated':
+        return f"plan_activated:purchase:{purchase_id}"
+    days_left = 0 if title.startswith(EXPIRES_TODAY_PREFIX) else 3
+    return f"plan_expired:purchase:{purchase_id}:d{days_left}"
+
+
+def _save_markers(Marker, read_by_admin, folded_ids, first_broadcast_id):
+    """
+    وضعیت خواندن نسخه‌های قبلی هر ادمین روی اعلان همگانی جایگزین؛ پیشوند پیوسته‌ی خوانده‌شده
+    در last_read_id و بقیه در read_ids
+    """
+    for admin_id, read in read_by_admin.items():
+        last_read_id = 0
+        for notification_id in folded_ids:
+            # last_read_id نباید اعلان‌های همگانی واقعی را هم خوانده حساب کند
+            if notification_id not in read or notification_id >= first_broadcast_id:
+                break
+            last_read_id = notification_id
+        marker, _ = Marker.objects.get_or_create(user_id=admin_id, audience='admins')
+        marker.last_read_id = max(marker.last_read_id, last_read_id)
+        extra = sorted(i for i in read if i > marker.last_read_id and i not in marker.read_ids)
+        marker.read_ids = [i for i in marker.read_ids if i > marker.last_read_id] + extra
+        marker.save(update_fields=['last_read_id', 'read_ids'])
+
+
+def fill_dedup_key(apps, schema_editor):
+    """
+    اعلان‌های خرید/فعال‌سازی/انقضای قبل از dedup_key کلید نداشتند و signalها با هر save خرید
+    پرداخت‌شده دوباره آن‌ها را می‌فرستادند. کلید از روی notification_type و data.purchase_id
+    پر می‌شود؛ نسخه‌های جداگانه‌ای که برای هر ادمین ساخته شده بود هم به یک اعلان همگانی
+    تبدیل می‌شوند تا broadcast همان کلید را تکرار نکند.
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    Marker = apps.get_model('notifications', 'NotificationReadMarker')
+    UnreadCounter = apps.get_model('notifications', 'UnreadCounter')
+    Purchase = apps.get_model('finance', 'Purchase')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    legacy = (
+        Notification.objects
+        .filter(
+            recipient__isnull=False,
+            dedup_key__isnull=True,
+            notification_type__in=['purchase', 'plan_activated', 'plan_expired'],
+            data__has_key='purchase_id',
+        )
+        .order_by('id')
+        .values_list('id', 'recipient_id', 'notification_type', 'title', 'is_read', 'data')
+    )
+    rows = list(legacy)
+    if not rows:
+        return
+
+    admin_ids = set(User.objects.filter(Q(role='admin') | Q(is_superuser=True)).values_list('id', flat=True))
+    purchase_ids = {data['purchase_id'] for _, _, notification_type, _, _, data in rows if notification_type == 'purchase'}
+    owners = dict(Purchase.objects.filter(pk__in=purchase_ids).values_list('pk', 'owner_user_id'))
+    taken = set(Notification.objects.filter(dedup_key__isnull=False, recipient__isnull=False).values_list('recipient_id', 'dedup_key'))
+    broadcast_keys = set(Notification.objects.filter(dedup_key__isnull=False, audience='admins').values_list('dedup_key', flat=True))
+
+    keys = {}
+    # کلید -> [(id, ادمین، خوانده‌شده؟)] نسخه‌هایی که برای تک‌تک ادمین‌ها ساخته شده بود
+    admin_copies = {}
+    for notification_id, recipient_id, notification_type, title, is_read, data in rows:
+        key = _dedup_key(notification_type, title, data['purchase_id'])
+        # نسخه‌ی صاحب باشگاه اول ساخته می‌شد، پس اولین ردیف صاحب (حتی اگر ادمین باشد) همان است
+        is_owner_copy = owners.get(data['purchase_id']) == recipient_id and (recipient_id, key) not in taken
+        if notification_type == 'purchase' and recipient_id in admin_ids and not is_owner_copy:
+            admin_copies.setdefault(key, []).append((notification_id, recipient_id, is_read))
+            continue
+        if (recipient_id, key) in taken:
+            continue
+        taken.add((recipient_id, key))
+        keys[notification_id] = key
+
+    ids = sorted(keys)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = list(Notification.objects.filter(id__in=ids[start:start + BATCH_SIZE]))
+        for notification in batch:
+            notification.dedup_key = keys[notification.id]
+        Notification.objects.bulk_update(batch, ['dedup_key'])
+
+    if not admin_copies:
+        return
+    first_broadcast_id = Notification.objects.filter(audience='admins').aggregate(first=Min('id'))['first'] or float('inf')
+    folded_ids = []
+    read_by_admin = {}
+    duplicate_ids = []
+    for key, copies in admin_copies.items():
+        if key in broadcast_keys:
+            continue
+        kept_id = copies[0][0]
+        Notification.objects.filter(id=kept_id).update(recipient=None, audience='admins', dedup_key=key, is_read=False)
+        folded_ids.append(kept_id)
+        for notification_id, admin_id, is_read in copies:
+            if is_read:
+                read_by_admin.setdefault(admin_id, set()).add(kept_id)
+            if notification_id != kept_id:
+                duplicate_ids.append(notification_id)
+    for start in range(0, len(duplicate_ids), BATCH_SIZE):
+        Notification.objects.filter(id__in=duplicate_ids[start:start + BATCH_SIZE]).delete()
+
+    _save_markers(Marker, read_by_admin, sorted(folded_ids), first_broadcast_id)
+    # اعلان‌های مستقیم ادمین‌ها کم شده‌اند؛ شمارنده در خواندن بعدی دوباره ساخته می‌شود
+    UnreadCounter.objects.filter(user_id__in=admin_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_unread_counter'),
+        ('finance', '0004_purchase_owner_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_dedup_key, migrations.RunPython.noop),
+    ]
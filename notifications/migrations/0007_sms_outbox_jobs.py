@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def enqueue_unsent(apps, schema_editor):
+    # پیامک‌هایی که send_sms_outbox هنوز نفرستاده بود از این به بعد با runworker ارسال می‌شوند
+    SmsOutbox = apps.get_model('notifications', 'SmsOutbox')
+    Job = apps.get_model('jobs', 'Job')
+    unsent = SmsOutbox.objects.filter(status__in=['pending', 'sending'])
+    unsent.update(status='pending')
+    max_attempts = getattr(settings, 'SMS_MAX_ATTEMPTS', 6)
+    Job.objects.bulk_create(
+        [
+            Job(
+                task='notifications.sms.send_outbox_message',
+                args=[message_id],
+                unique_key=f"sms:{idempotency_key}",
+                max_attempts=max_attempts,
+            )
+            for message_id, idempotency_key in unsent.values_list('id', 'idempotency_key').iterator()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_backfill_dedup_key'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(enqueue_unsent, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='smsoutbox',
+            name='sms_outbox_due_idx',
+        ),
+        migrations.RemoveField(
+            model_name='smsoutbox',
+            name='next_attempt_at',
+        ),
+        migrations.AlterField(
+            model_name='smsoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
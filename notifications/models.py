@@ -12,10 +12,24 @@ class Notification(models.Model):
         TICKET_CREATED    = 'ticket_created',   'Ticket Created'
         WITHDRAW_REQUEST  = 'withdraw_request', 'Withdraw Request'
 
+    class Audience(models.TextChoices):
+        # role='admin' یا is_superuser (notifications.utils.get_all_admins)
+        ADMINS            = 'admins',           'Admins'
+
+    # هر اعلان یا یک گیرنده دارد یا همگانی است و به یک audience می‌رسد؛ وضعیت خواندن اعلان
+    # همگانی برای هر کاربر در NotificationReadMarker است و is_read آن استفاده نمی‌شود
     recipient         = models.ForeignKey(
                             settings.AUTH_USER_MODEL,
                             on_delete=models.CASCADE,
                             related_name='notifications',
+                            null=True,
+                            blank=True,
+                        )
+    audience          = models.CharField(
+                            max_length=20,
+                            choices=Audience.choices,
+                            null=True,
+                            blank=True,
                         )
     notification_type = models.CharField(
                             max_length=30,
@@ -26,6 +40,8 @@ class Notification(models.Model):
     is_read           = models.BooleanField(default=False)
     created_at        = models.DateTimeField(auto_now_add=True)
     data              = models.JSONField(null=True, blank=True, default=None)
+    # کلید رویداد، مثلا plan_expired:purchase:123:d0؛ هر کاربر برای هر رویداد فقط یک اعلان می‌گیرد
+    dedup_key         = models.CharField(max_length=100, null=True, blank=True, default=None)
 
     class Meta:
         ordering = ['-created_at']
@@ -33,9 +49,94 @@ class Notification(models.Model):
             models.Index(fields=['recipient', '-created_at']),
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['notification_type']),
+            models.Index(fields=['audience', 'id'], name='notification_audience_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(recipient__isnull=False, audience__isnull=True)
+                | models.Q(recipient__isnull=True, audience__isnull=False),
+                name='notification_recipient_xor_audience',
+            ),
+            # NULLها با هم برابر نیستند، پس اعلان‌های بدون کلید محدودیتی ندارند
+            models.UniqueConstraint(fields=['recipient', 'dedup_key'], name='notification_recipient_dedup_key'),
+            models.UniqueConstraint(fields=['audience', 'dedup_key'], name='notification_audience_dedup_key'),
         ]
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
 
     def __str__(self):
-        return f"[{self.notification_type}] {self.recipient} — {self.title[:40]}"
+        return f"[{self.notification_type}] {self.recipient or self.audience} — {self.title[:40]}"
+
+
+class NotificationReadMarker(models.Model):
+    """
+    اعلان‌های همگانی خوانده‌شده‌ی یک کاربر: همه‌ی اعلان‌های audience با id <= last_read_id و
+    علاوه بر آن idهای read_ids. «خواندن همه» فقط last_read_id را جلو می‌برد و read_ids را خالی
+    می‌کند، پس هزینه‌ی آن به تعداد اعلان‌ها بستگی ندارد. خواندن تک‌تک اعلان‌ها هم وقتی به
+    last_read_id برسد آن را جلو می‌برد (notifications.inbox._compact).
+    """
+    user              = models.ForeignKey(
+                            settings.AUTH_USER_MODEL,
+                            on_delete=models.CASCADE,
+                            related_name='notification_read_markers',
+                        )
+    audience          = models.CharField(max_length=20, choices=Notification.Audience.choices)
+    last_read_id      = models.BigIntegerField(default=0)
+    read_ids          = models.JSONField(default=list)
+    updated_at        = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'audience'], name='notification_read_marker_user_audience'),
+        ]
+
+    def has_read(self, notification_id):
+        return notification_id <= self.last_read_id or notification_id in self.read_ids
+
+
+class UnreadCounter(models.Model):
+    """
+    تعداد اعلان‌های مستقیم خوانده‌نشده‌ی کاربر (notifications.inbox). نبودن ردیف یعنی مقدار
+    نامعلوم است و در اولین خواندن از روی خود اعلان‌ها شمرده و ذخیره می‌شود.
+    """
+    user              = models.OneToOneField(
+                            settings.AUTH_USER_MODEL,
+                            on_delete=models.CASCADE,
+                            primary_key=True,
+                            related_name='unread_counter',
+                        )
+    unread            = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread}"
+
+
+class SmsOutbox(models.Model):
+    """
+    پیامک‌های خروجی. پیامک داخل همان تراکنشی که آن را لازم دارد ثبت می‌شود و کار ارسال آن
+    (notifications.sms.send_outbox_message) را runworker خارج از درخواست و بدون نگه داشتن قفل‌ها اجرا می‌کند.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT    = 'sent',    'Sent'
+        FAILED  = 'failed',  'Failed'
+
+    # با کلید یکتا، ثبت دوباره‌ی همان پیامک (مثلاً callback تکراری) فقط یک پیامک می‌سازد
+    idempotency_key   = models.CharField(max_length=100, unique=True)
+    phone             = models.CharField(max_length=20)
+    body_id           = models.CharField(max_length=20)
+    args              = models.JSONField(default=list)
+    status            = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts          = models.PositiveSmallIntegerField(default=0)
+    last_error        = models.TextField(blank=True)
+    provider_response = models.JSONField(null=True, blank=True, default=None)
+    created_at        = models.DateTimeField(auto_now_add=True)
+    sent_at           = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'SMS Outbox'
+        verbose_name_plural = 'SMS Outbox'
+
+    def __str__(self):
+        return f"[{self.status}] {self.phone} — {self.idempotency_key}"
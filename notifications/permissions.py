@@ -14,7 +14,8 @@ class IsAdminUser(BasePermission):
 
 
 class IsNotificationOwner(BasePermission):
-    """Object-level permission: only the notification's recipient may act on it."""
+    """Object-level permission: only the notification's recipient (or its audience) may act on it."""
 
     def has_object_permission(self, request, view, obj):
-        return obj.recipient_id == request.user.pk
+        from notifications.inbox import can_access
+        return can_access(request.user, obj)
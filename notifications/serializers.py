@@ -8,6 +8,8 @@ from .utils import to_jalali
 class NotificationSerializer(serializers.ModelSerializer):
     """Read serializer for listing and detail."""
     created_at_jalali = serializers.SerializerMethodField()
+    # برای اعلان همگانی وضعیت خواندن همان کاربر (notifications.inbox.with_read_state)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -17,6 +19,9 @@ class NotificationSerializer(serializers.ModelSerializer):
     def get_created_at_jalali(self, obj):
         return to_jalali(obj.created_at)
 
+    def get_is_read(self, obj):
+        return getattr(obj, 'user_has_read', obj.is_read)
+
 
 class AdminSendNotificationSerializer(serializers.Serializer):
     """Write serializer for POST /admin/send/."""
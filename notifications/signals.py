@@ -3,7 +3,7 @@ import logging
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from notifications.utils import bulk_notify, get_all_admins, format_price
+from notifications.utils import broadcast, bulk_notify, format_price
 
 logger = logging.getLogger(__name__)
 
@@ -21,26 +21,14 @@ def _handle_payment_status(instance, created):
     if instance.payment_status != 'paid':
         return
 
-    # Deduplication: skip if a 'purchase' notification for this purchase already exists.
-    # Since post_save fires after the save, the DB already holds the new value, so we
-    # cannot compare old vs new via a DB read.  Instead we guard by checking whether
-    # a notification row for this purchase was already created.
+    # Deduplication: post_save fires on every save of a paid purchase, so the rows carry
+    # a per-event dedup_key and repeats are dropped by the unique constraint on insert.
     from notifications.models import Notification
-    if Notification.objects.filter(
-        notification_type=Notification.NotificationType.PURCHASE,
-        data__purchase_id=instance.pk,
-    ).exists():
-        return
 
-    # Resolve owner via purchase.package.gym.owner
-    owner = None
-    gym = None
-    try:
-        gym = instance.package.gym
-        owner = gym.owner
-    except Exception:
-        # Incomplete chain — fall back to admin-only notification (Requirement 2.4)
-        pass
+    # Owner (gym owner or trainer user) is denormalized on the purchase;
+    # if it is missing fall back to admin-only notification (Requirement 2.4)
+    gym = instance.gym
+    owner = instance.owner_user
 
     buyer = instance.user
     package = instance.get_package()
@@ -57,22 +45,18 @@ def _handle_payment_status(instance, created):
     message = f"پکیج: {package.title} | مبلغ: {format_price(instance.final_amount)}"
     data = {"purchase_id": instance.pk, "package_id": package.pk}
 
+    dedup_key = f"purchase:purchase:{instance.pk}"
     if owner is not None:
-        bulk_notify(
-            [owner],
-            Notification.NotificationType.PURCHASE,
-            title,
-            message,
-            data,
-        )
+        bulk_notify([owner], Notification.NotificationType.PURCHASE, title, message, data, dedup_key=dedup_key)
 
-    admins = get_all_admins()
-    bulk_notify(
-        admins,
+    # One row for all admins instead of a row per admin
+    broadcast(
+        Notification.Audience.ADMINS,
         Notification.NotificationType.PURCHASE,
         title,
         message,
         data,
+        dedup_key=dedup_key,
     )
 
 
@@ -83,13 +67,9 @@ def _handle_verification_status(instance, created):
     if instance.verification_status != 'verified':
         return
 
-    # Deduplication: skip if a plan_activated notification for this purchase already exists
+    # Deduplication via dedup_key (see _handle_payment_status)
     from notifications.models import Notification
-    if Notification.objects.filter(
-        notification_type=Notification.NotificationType.PLAN_ACTIVATED,
-        data__purchase_id=instance.pk,
-    ).exists():
-        return
+    dedup_key = f"plan_activated:purchase:{instance.pk}"
 
     buyer = instance.user
     package = instance.get_package()
@@ -111,24 +91,22 @@ def _handle_verification_status(instance, created):
     buyer_message = f"پلن '{package.title}' شما فعال شد. تاریخ انقضا: {expire}"
     buyer_data = {"purchase_id": instance.pk}
 
-    bulk_notify([buyer], Notification.NotificationType.PLAN_ACTIVATED, buyer_title, buyer_message, buyer_data)
+    bulk_notify(
+        [buyer], Notification.NotificationType.PLAN_ACTIVATED, buyer_title, buyer_message, buyer_data,
+        dedup_key=dedup_key,
+    )
 
-    # Resolve owner
-    owner = None
-    try:
-        if instance.purchase_type == 'trainer':
-            owner = package.trainer.user if hasattr(package, 'trainer') else None
-        else:
-            owner = package.gym.owner if hasattr(package, 'gym') else None
-    except Exception:
-        pass
+    owner = instance.owner_user
 
     if owner is not None:
         # Notification for owner
         owner_title = f"پلن کاربر {buyer.full_name or buyer.phone} توسط شما فعال شد"
         owner_message = f"پلن '{package.title}' برای {buyer.full_name or buyer.phone} فعال شد."
         owner_data = {"purchase_id": instance.pk}
-        bulk_notify([owner], Notification.NotificationType.PLAN_ACTIVATED, owner_title, owner_message, owner_data)
+        bulk_notify(
+            [owner], Notification.NotificationType.PLAN_ACTIVATED, owner_title, owner_message, owner_data,
+            dedup_key=dedup_key,
+        )
 
 
 # ---------------------------------------------------------------------------
@@ -142,19 +120,12 @@ def on_withdraw_request_post_save(sender, instance, created, **kwargs):
 
     from notifications.models import Notification
 
-    admins = get_all_admins()
-    if not admins.exists():
-        logger.warning(
-            "No admin users found for withdraw_request notification "
-            "(withdraw_request_id=%s)", instance.pk
-        )
-
     owner = instance.user
     title = f"درخواست برداشت از {owner.full_name or owner.phone}"
     message = f"مبلغ درخواست: {format_price(instance.amount)}"
     data = {"withdraw_request_id": instance.pk}
 
-    bulk_notify(admins, Notification.NotificationType.WITHDRAW_REQUEST, title, message, data)
+    broadcast(Notification.Audience.ADMINS, Notification.NotificationType.WITHDRAW_REQUEST, title, message, data)
 
 
 # ---------------------------------------------------------------------------
@@ -188,9 +159,8 @@ def on_ticket_message_post_save(sender, instance, created, **kwargs):
             )
         else:
             # Customer/Owner messaged → notify all admins
-            admins = get_all_admins()
-            bulk_notify(
-                admins,
+            broadcast(
+                Notification.Audience.ADMINS,
                 Notification.NotificationType.TICKET_REPLY,
                 title,
                 message,
@@ -0,0 +1,159 @@
+"""
+ارسال پیامک از طریق صف کارهای پس‌زمینه (jobs).
+
+enqueue_sms یک ردیف SmsOutbox (سابقه و وضعیت پیامک) و یک Job برای ارسال آن ثبت می‌کند؛
+runworker کار را خارج از درخواست با یک session مشترک HTTP به ملی‌پیامک می‌فرستد. برداشت
+همزمان، backoff و تلاش دوباره همان سازوکار jobs.queue است.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from jobs.queue import enqueue
+from notifications.models import SmsOutbox
+
+logger = logging.getLogger(__name__)
+
+OTP_BODY_ID = '487686'
+PURCHASE_BODY_ID = '487687'
+
+SEND_TASK = 'notifications.sms.send_outbox_message'
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_sms(phone, body_id, args, idempotency_key, max_attempts=None, max_age=None):
+    """
+    ثبت پیامک و کار ارسال آن. اگر پیامکی با همین کلید قبلاً ثبت شده باشد همان برگردانده می‌شود.
+    داخل تراکنش فراخواننده اجرا می‌شود، پس با rollback آن پیامکی هم ارسال نمی‌شود.
+    max_attempts (پیش‌فرض SMS_MAX_ATTEMPTS) و max_age (ثانیه) برای پیامک‌هایی مثل OTP است که
+    بعد از مدتی بی‌فایده‌اند؛ پیامکی که قدیمی‌تر از max_age شده دیگر ارسال نمی‌شود.
+    """
+    task_kwargs = {}
+    if max_attempts:
+        task_kwargs['max_attempts'] = max_attempts
+    if max_age:
+        task_kwargs['max_age'] = max_age
+    try:
+        with transaction.atomic():
+            message = SmsOutbox.objects.create(
+                idempotency_key=idempotency_key,
+                phone=phone,
+                body_id=str(body_id),
+                args=[str(arg) for arg in args],
+            )
+            enqueue(
+                SEND_TASK,
+                args=[message.pk],
+                kwargs=task_kwargs,
+                unique_key=f"sms:{idempotency_key}",
+                max_attempts=max_attempts or _setting('SMS_MAX_ATTEMPTS', 6),
+            )
+            return message
+    except IntegrityError:
+        return SmsOutbox.objects.get(idempotency_key=idempotency_key)
+
+
+class SmsProviderError(Exception):
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class MelipayamakClient:
+    """کلاینت ارسال پیامک الگو (shared) با connection pool مشترک"""
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, pool_size=10):
+        self.api_key = api_key if api_key is not None else settings.MELIPAYAMAK_API_KEY
+        self.base_url = (base_url or _setting('MELIPAYAMAK_BASE_URL', 'https://console.melipayamak.com')).rstrip('/')
+        self.timeout = timeout or _setting('SMS_REQUEST_TIMEOUT', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send(self, phone, body_id, args):
+        if not self.api_key:
+            raise SmsProviderError('SMS API key not configured', permanent=True)
+        url = f"{self.base_url}/api/send/shared/{self.api_key}"
+        payload = {'bodyId': int(body_id), 'to': phone, 'args': list(args)}
+        try:
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise SmsProviderError(str(e)) from e
+
+        if response.status_code >= 400:
+            # خطاهای 4xx (به جز 429) با تلاش دوباره درست نمی‌شوند
+            permanent = response.status_code < 500 and response.status_code != 429
+            raise SmsProviderError(f"HTTP {response.status_code}: {response.text[:200]}", permanent=permanent)
+        try:
+            return response.json()
+        except ValueError:
+            return {'raw': response.text[:500]}
+
+    def close(self):
+        self.session.close()
+
+
+def get_sms_client():
+    """کلاینت مشترک process تا connection pool بین کارهای ارسال حفظ شود؛ با تغییر تنظیمات دوباره ساخته می‌شود"""
+    global _client, _client_key
+
+    key = (
+        settings.MELIPAYAMAK_API_KEY,
+        _setting('MELIPAYAMAK_BASE_URL', None),
+        _setting('SMS_REQUEST_TIMEOUT', 10),
+    )
+    with _client_lock:
+        if _client is None or _client_key != key:
+            if _client is not None:
+                _client.close()
+            _client = MelipayamakClient()
+            _client_key = key
+        return _client
+
+
+def send_outbox_message(message_id, max_attempts=None, max_age=None):
+    """
+    task ارسال یک پیامک. خطای موقت دوباره raise می‌شود تا jobs با backoff تلاش کند؛
+    خطای دائمی (مثلا 4xx) پیامک را failed می‌کند و تلاش دوباره ندارد. پیامکی که از max_age
+    گذشته (مثلا OTP منقضی‌شده) بدون ارسال failed می‌شود.
+    """
+    message = SmsOutbox.objects.filter(pk=message_id).first()
+    if message is None or message.status != SmsOutbox.Status.PENDING:
+        return
+    if max_age and timezone.now() - message.created_at > timedelta(seconds=max_age):
+        message.status = SmsOutbox.Status.FAILED
+        message.last_error = f'expired after {max_age}s'
+        message.save(update_fields=['status', 'last_error'])
+        logger.warning("SMS %s to %s expired before it could be sent", message.idempotency_key, message.phone)
+        return
+    client = get_sms_client()
+    message.attempts += 1
+    try:
+        message.provider_response = client.send(message.phone, message.body_id, message.args)
+    except SmsProviderError as e:
+        message.last_error = str(e)
+        if e.permanent or message.attempts >= (max_attempts or _setting('SMS_MAX_ATTEMPTS', 6)):
+            message.status = SmsOutbox.Status.FAILED
+            logger.error("SMS %s to %s failed permanently: %s", message.idempotency_key, message.phone, e)
+        message.save(update_fields=['status', 'attempts', 'last_error'])
+        if e.permanent:
+            return
+        raise
+    message.status = SmsOutbox.Status.SENT
+    message.sent_at = timezone.now()
+    message.last_error = ''
+    message.save(update_fields=['status', 'attempts', 'last_error', 'provider_response', 'sent_at'])
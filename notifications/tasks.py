@@ -1,67 +1,175 @@
 import logging
-from datetime import timedelta
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
+from django.db import transaction
+from django.db.models import CharField, Exists, OuterRef, Value
+from django.db.models.functions import Cast, Concat
 from django.utils import timezone
 
-from notifications.utils import format_price
-
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 1000
+
+# (روزهای مانده تا انقضا، عنوان)
+EXPIRY_REMINDERS = (
+    (0, "پلن شما امروز منقضی می‌شود"),
+    (3, "پلن شما ۳ روز دیگر منقضی می‌شود"),
+)
+
+
+@dataclass
+class ExpiryReport:
+    date: object = None
+    dry_run: bool = False
+    # روزهای مانده -> تعداد خریدهایی که هنوز یادآوری نگرفته‌اند
+    pending: dict = field(default_factory=dict)
+    created: int = 0
+    # خریدهایی که پکیجشان پیدا نشد
+    missing_package: int = 0
+    # مرحله -> ثانیه
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+
+def plan_expiry_dedup_key(purchase_id, days_left):
+    return f"plan_expired:purchase:{purchase_id}:d{days_left}"
+
 
-def send_plan_expiry_notifications():
+def _day_range(day):
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+
+def _expiring_purchases(day, days_left):
+    """خریدهای تاییدشده‌ای که روز day منقضی می‌شوند و این یادآوری را هنوز نگرفته‌اند"""
+    from finance.models import Purchase
+    from notifications.models import Notification
+
+    # anti-join روی unique constraint (recipient, dedup_key)؛ کلید همان plan_expiry_dedup_key است
+    already_sent = Notification.objects.filter(
+        recipient=OuterRef('user_id'),
+        dedup_key=Concat(
+            Value('plan_expired:purchase:'),
+            Cast(OuterRef('pk'), CharField()),
+            Value(f':d{days_left}'),
+            output_field=CharField(),
+        ),
+    )
+    start, end = _day_range(day)
+    return (
+        Purchase.objects
+        .filter(verification_status='verified', expire_date__gte=start, expire_date__lt=end)
+        .filter(~Exists(already_sent))
+        .values_list('pk', 'user_id', 'content_type_id', 'object_id', 'package_id', 'expire_date')
+    )
+
+
+def _package_titles(rows):
+    """
+    عنوان پکیج همه‌ی خریدها با یک query برای هر نوع پکیج؛ مثل Purchase.get_package
+    اول content_object و اگر نبود package.
+    کلید خروجی: ('ct', content_type_id, object_id) یا ('fk', package_id)
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from packages.models import Package
+
+    by_content_type = {}
+    for _, _, content_type_id, object_id, _, _ in rows:
+        if content_type_id and object_id:
+            by_content_type.setdefault(content_type_id, set()).add(object_id)
+
+    titles = {}
+    for content_type_id, object_ids in by_content_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        for pk, title in model._default_manager.filter(pk__in=object_ids).values_list('pk', 'title').iterator():
+            titles[('ct', content_type_id, pk)] = title
+
+    # package فقط برای خریدهایی که content_object ندارند
+    package_ids = {
+        package_id
+        for _, _, content_type_id, object_id, package_id, _ in rows
+        if package_id and ('ct', content_type_id, object_id) not in titles
+    }
+    if package_ids:
+        for pk, title in Package.objects.filter(pk__in=package_ids).values_list('pk', 'title').iterator():
+            titles[('fk', pk)] = title
+    return titles
+
+
+def send_plan_expiry_notifications(date=None, dry_run=False, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Run daily. Creates plan_expired notifications for:
-      1. Purchases expiring TODAY (expire_date__date == today)
-      2. Purchases expiring in 3 DAYS (expire_date__date == today + 3)
-    Deduplicates via (recipient, notification_type='plan_expired', data__purchase_id) check.
+      1. Purchases expiring TODAY
+      2. Purchases expiring in 3 DAYS
+    Set-based: one query per reminder selects the purchases that have not been notified yet
+    (anti-join on dedup_key plan_expired:purchase:<id>:d<days>), package titles are resolved
+    in bulk and rows are inserted in chunks with utils.create_new (ON CONFLICT DO NOTHING), so the
+    number of queries does not grow with the number of purchases.
     Skips purchases with expire_date=None (Requirement 4.5).
+    Returns an ExpiryReport; with dry_run nothing is written.
     """
-    from finance.models import Purchase
+    from notifications.inbox import added_unread
     from notifications.models import Notification
-    from notifications.utils import bulk_notify
-
-    today = timezone.now().date()
-
-    targets = [
-        (today,                      f"پلن شما امروز منقضی می‌شود"),
-        (today + timedelta(days=3),  f"پلن شما ۳ روز دیگر منقضی می‌شود"),
-    ]
-
-    for target_date, title_prefix in targets:
-        purchases = Purchase.objects.filter(
-            expire_date__date=target_date,
-            verification_status='verified',
-        ).select_related('user', 'package').prefetch_related('content_type')
-
-        for purchase in purchases:
-            already_notified = Notification.objects.filter(
-                recipient=purchase.user,
-                notification_type=Notification.NotificationType.PLAN_EXPIRED,
-                data__purchase_id=purchase.pk,
-            ).exists()
-
-            if not already_notified:
-                package = purchase.get_package()
-                if not package:
-                    logger.error(f"Package not found for purchase {purchase.pk}, skipping notification")
+    from notifications.utils import create_new
+
+    today = date or timezone.localdate()
+    report = ExpiryReport(date=today, dry_run=dry_run)
+
+    def timed(stage, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        report.timings[stage] = report.timings.get(stage, 0.0) + time.perf_counter() - started
+        return result
+
+    for days_left, title_prefix in EXPIRY_REMINDERS:
+        rows = timed('select', lambda: list(_expiring_purchases(today + timedelta(days=days_left), days_left)))
+        report.pending[days_left] = len(rows)
+        if dry_run or not rows:
+            continue
+        titles = timed('packages', _package_titles, rows)
+
+        def build():
+            notifications = []
+            for pk, user_id, content_type_id, object_id, package_id, expire_date in rows:
+                title = titles.get(('ct', content_type_id, object_id)) or titles.get(('fk', package_id))
+                if title is None:
+                    logger.error(f"Package not found for purchase {pk}, skipping notification")
+                    report.missing_package += 1
                     continue
-                    
-                title = f"{title_prefix}: {package.title}"
-                message = (
-                    f"تاریخ انقضای پلن '{package.title}': "
-                    f"{purchase.expire_date.strftime('%Y-%m-%d')}"
-                )
-                data = {"purchase_id": purchase.pk}
-                try:
-                    bulk_notify(
-                        [purchase.user],
-                        Notification.NotificationType.PLAN_EXPIRED,
-                        title,
-                        message,
-                        data,
-                    )
-                except Exception as e:
-                    logger.error(
-                        "Failed to create plan_expired notification for purchase %s: %s",
-                        purchase.pk, e,
-                    )
+                notifications.append(Notification(
+                    recipient_id=user_id,
+                    notification_type=Notification.NotificationType.PLAN_EXPIRED,
+                    title=f"{title_prefix}: {title}",
+                    message=f"تاریخ انقضای پلن '{title}': {expire_date.strftime('%Y-%m-%d')}",
+                    data={"purchase_id": pk},
+                    dedup_key=plan_expiry_dedup_key(pk, days_left),
+                ))
+            return notifications
+
+        notifications = timed('build', build)
+
+        def insert():
+            created = 0
+            # ردیفی که اجرای همزمان دیگری با همین کلید ساخته رد می‌شود و در شمارنده حساب نمی‌شود
+            for start in range(0, len(notifications), chunk_size):
+                with transaction.atomic(savepoint=False):
+                    chunk = create_new(notifications[start:start + chunk_size])
+                    if chunk:
+                        added_unread([notification.recipient_id for notification in chunk])
+                created += len(chunk)
+            return created
+
+        report.created += timed('insert', insert)
+
+    logger.info(
+        "plan expiry %s: pending %s, %s notifications in %.2fs",
+        today, report.pending, report.created, report.elapsed,
+    )
+    return report
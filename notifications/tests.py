@@ -0,0 +1,634 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from finance.models import Purchase
+from gyms.models import Gym
+from jobs.models import Job
+from jobs.queue import run_due
+from notifications.inbox import unread_count
+from notifications.models import Notification, NotificationReadMarker, SmsOutbox, UnreadCounter
+from notifications.sms import SEND_TASK, enqueue_sms, get_sms_client
+from notifications.tasks import plan_expiry_dedup_key, send_plan_expiry_notifications
+from notifications.utils import broadcast, bulk_notify
+from packages.models import GroupPackage, Package
+from trainers.models import Trainer, TrainerGroupPackage, TrainerPackage
+
+
+class _StubSmsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.received.append((self.path, json.loads(body)))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        payload = json.dumps({'recId': len(self.server.received), 'status': 'ok'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(MELIPAYAMAK_API_KEY='test-key', SMS_MAX_ATTEMPTS=3, JOB_RETRY_BASE_DELAY=30, PERIODIC_JOBS={})
+class SmsOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubSmsHandler)
+        cls.server.received = []
+        cls.server.statuses = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.received.clear()
+        self.server.statuses.clear()
+        stub = self.settings(MELIPAYAMAK_BASE_URL=f"http://127.0.0.1:{self.server.server_port}")
+        stub.enable()
+        self.addCleanup(stub.disable)
+        self.addCleanup(lambda: get_sms_client().close())
+
+    def _job(self, message):
+        return Job.objects.get(task=SEND_TASK, args=[message.pk])
+
+    def test_request_otp_only_enqueues_sms(self):
+        response = APIClient().post('/api/auth/request-otp/', {'phone': '09120000001'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        message = SmsOutbox.objects.get()
+        self.assertEqual(message.phone, '09120000001')
+        self.assertEqual(message.status, SmsOutbox.Status.PENDING)
+        self.assertEqual(self._job(message).status, Job.Status.PENDING)
+        self.assertEqual(self.server.received, [])
+
+    def test_expired_otp_is_not_sent(self):
+        from accounts.client.login import OTP_SMS_MAX_ATTEMPTS, OTP_TTL_SECONDS, send_sms_otp
+
+        send_sms_otp('09120000001', '123456', otp_id=1)
+        message = SmsOutbox.objects.get()
+        self.assertEqual(self._job(message).max_attempts, OTP_SMS_MAX_ATTEMPTS)
+        SmsOutbox.objects.update(created_at=timezone.now() - timedelta(seconds=OTP_TTL_SECONDS + 1))
+
+        self.assertEqual(run_due(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsOutbox.Status.FAILED)
+        self.assertEqual(message.attempts, 0)
+        self.assertEqual(self.server.received, [])
+
+    def test_worker_sends_pending_messages(self):
+        enqueue_sms('09120000001', '487686', ['123456'], idempotency_key='otp:1')
+        enqueue_sms('09120000002', '487687', ['Gym', 'Pkg', '7', '654321'], idempotency_key='purchase-paid:1')
+
+        call_command('runworker', '--once', stdout=StringIO())
+
+        self.assertEqual(
+            [payload for _, payload in self.server.received],
+            [
+                {'bodyId': 487686, 'to': '09120000001', 'args': ['123456']},
+                {'bodyId': 487687, 'to': '09120000002', 'args': ['Gym', 'Pkg', '7', '654321']},
+            ],
+        )
+        self.assertEqual(self.server.received[0][0], '/api/send/shared/test-key')
+        self.assertFalse(SmsOutbox.objects.exclude(status=SmsOutbox.Status.SENT).exists())
+        self.assertEqual(run_due(), (0, 0))
+
+    def test_enqueue_is_idempotent(self):
+        first = enqueue_sms('09120000001', '487687', ['a'], idempotency_key='purchase-paid:7')
+        second = enqueue_sms('09120000001', '487687', ['a'], idempotency_key='purchase-paid:7')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+        run_due()
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_server_error_is_retried_with_backoff(self):
+        self.server.statuses.extend([500, 500])
+        message = enqueue_sms('09120000001', '487686', ['1'], idempotency_key='otp:2')
+        now = timezone.now()
+
+        self.assertEqual(run_due(now=now), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsOutbox.Status.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('HTTP 500', message.last_error)
+        self.assertGreaterEqual(self._job(message).run_at, now + timedelta(seconds=30))
+
+        # قبل از موعد دوباره ارسال نمی‌شود
+        self.assertEqual(run_due(now=now), (0, 0))
+
+        self.assertEqual(run_due(now=now + timedelta(seconds=31)), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 2)
+        self.assertGreaterEqual(self._job(message).run_at, now + timedelta(seconds=60))
+
+        self.assertEqual(run_due(now=now + timedelta(hours=1)), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsOutbox.Status.SENT)
+        self.assertEqual(message.attempts, 3)
+        self.assertEqual(len(self.server.received), 3)
+
+    def test_client_error_fails_without_retry(self):
+        self.server.statuses.append(400)
+        message = enqueue_sms('09120000001', '487686', ['1'], idempotency_key='otp:3')
+
+        run_due()
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsOutbox.Status.FAILED)
+        self.assertIn('HTTP 400', message.last_error)
+        self.assertEqual(self._job(message).status, Job.Status.DONE)
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.server.statuses.extend([503, 503, 503])
+        message = enqueue_sms('09120000001', '487686', ['1'], idempotency_key='otp:4')
+        now = timezone.now()
+
+        for hours in range(3):
+            run_due(now=now + timedelta(hours=hours))
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsOutbox.Status.FAILED)
+        self.assertEqual(message.attempts, 3)
+        self.assertEqual(self._job(message).status, Job.Status.FAILED)
+
+
+class NotificationDedupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='09120000071', role='owner', full_name='Dedup Owner')
+        self.admin = User.objects.create_user(phone='09120000072', role='admin')
+        self.buyer = User.objects.create_user(phone='09120000073', full_name='Dedup Buyer')
+        gym = Gym.objects.create(owner=self.owner, name='Dedup Gym', latitude=35.0, longitude=51.0)
+        self.package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='Monthly'),
+            gym=gym,
+            title='Dedup',
+            gender='male',
+            price=Decimal('100.00'),
+            duration=30,
+        )
+
+    def _purchase(self, **kwargs):
+        return Purchase.objects.create(
+            user=self.buyer,
+            content_type=ContentType.objects.get_for_model(Package),
+            object_id=self.package.id,
+            package=self.package,
+            total_amount=Decimal('100.00'),
+            final_amount=Decimal('100.00'),
+            **kwargs,
+        )
+
+    def _count(self, notification_type, recipient=None):
+        notifications = Notification.objects.filter(notification_type=notification_type)
+        if recipient is not None:
+            notifications = notifications.filter(recipient=recipient)
+        return notifications.count()
+
+    def test_bulk_notify_skips_existing_dedup_key(self):
+        for _ in range(2):
+            bulk_notify([self.owner, self.admin], Notification.NotificationType.PURCHASE, 't', 'm', dedup_key='k:1')
+        bulk_notify([self.owner], Notification.NotificationType.PURCHASE, 't', 'm', dedup_key='k:2')
+        # بدون کلید هیچ محدودیتی نیست
+        bulk_notify([self.owner], Notification.NotificationType.PURCHASE, 't', 'm')
+        bulk_notify([self.owner], Notification.NotificationType.PURCHASE, 't', 'm')
+
+        self.assertEqual(self._count(Notification.NotificationType.PURCHASE, self.owner), 4)
+        self.assertEqual(self._count(Notification.NotificationType.PURCHASE, self.admin), 1)
+
+    def test_repeated_saves_notify_once(self):
+        purchase = self._purchase()
+        purchase.payment_status = 'paid'
+        purchase.save()
+        purchase.verification_status = 'verified'
+        purchase.verified_at = timezone.now()
+        purchase.save()
+        purchase.save()
+
+        self.assertEqual(self._count(Notification.NotificationType.PURCHASE, self.owner), 1)
+        self.assertEqual(self._count(Notification.NotificationType.PURCHASE, self.admin), 0)
+        self.assertEqual(Notification.objects.filter(audience=Notification.Audience.ADMINS).count(), 1)
+        self.assertEqual(self._count(Notification.NotificationType.PLAN_ACTIVATED, self.buyer), 1)
+        self.assertEqual(self._count(Notification.NotificationType.PLAN_ACTIVATED, self.owner), 1)
+        self.assertEqual(
+            Notification.objects.get(recipient=self.buyer).dedup_key,
+            f'plan_activated:purchase:{purchase.pk}',
+        )
+
+    def test_broadcast_dedup_key(self):
+        for _ in range(2):
+            broadcast(Notification.Audience.ADMINS, Notification.NotificationType.PURCHASE, 't', 'm', dedup_key='k:1')
+        broadcast(Notification.Audience.ADMINS, Notification.NotificationType.PURCHASE, 't', 'm')
+
+        self.assertEqual(Notification.objects.filter(audience=Notification.Audience.ADMINS).count(), 2)
+
+    def test_backfill_migration_keys_legacy_rows(self):
+        from importlib import import_module
+
+        from django.apps import apps
+
+        fill_dedup_key = import_module('notifications.migrations.0006_backfill_dedup_key').fill_dedup_key
+        other_admin = User.objects.create_user(phone='09120000074', role='admin')
+        purchase = self._purchase(verification_status='verified', expire_date=timezone.now())
+        Purchase.objects.filter(pk=purchase.pk).update(payment_status='paid')
+        purchase.refresh_from_db()
+        Notification.objects.all().delete()
+
+        # اعلان‌هایی که کد قبل از dedup_key ساخته بود: یک نسخه برای صاحب و یکی برای هر ادمین
+        legacy = [
+            (self.owner, Notification.NotificationType.PURCHASE, 'خرید جدید', False),
+            (self.admin, Notification.NotificationType.PURCHASE, 'خرید جدید', True),
+            (other_admin, Notification.NotificationType.PURCHASE, 'خرید جدید', False),
+            (self.buyer, Notification.NotificationType.PLAN_ACTIVATED, 'پلن شما فعال شد', False),
+            (self.owner, Notification.NotificationType.PLAN_ACTIVATED, 'پلن کاربر فعال شد', False),
+            (self.buyer, Notification.NotificationType.PLAN_EXPIRED, 'پلن شما امروز منقضی می‌شود: Dedup', False),
+        ]
+        for recipient, notification_type, title, is_read in legacy:
+            Notification.objects.create(
+                recipient=recipient, notification_type=notification_type, title=title, message='m',
+                is_read=is_read, data={'purchase_id': purchase.pk},
+            )
+
+        fill_dedup_key(apps, None)
+
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', 'audience', 'dedup_key')),
+            {
+                (self.owner.pk, None, f'purchase:purchase:{purchase.pk}'),
+                (None, Notification.Audience.ADMINS, f'purchase:purchase:{purchase.pk}'),
+                (self.buyer.pk, None, f'plan_activated:purchase:{purchase.pk}'),
+                (self.owner.pk, None, f'plan_activated:purchase:{purchase.pk}'),
+                (self.buyer.pk, None, f'plan_expired:purchase:{purchase.pk}:d0'),
+            },
+        )
+        # وضعیت خواندن نسخه‌ی هر ادمین روی اعلان همگانی حفظ می‌شود
+        cache.clear()
+        self.assertEqual(unread_count(self.admin), 0)
+        self.assertEqual(unread_count(other_admin), 1)
+
+        # save دوباره‌ی خرید قدیمی و اجرای یادآوری اعلان تکراری نمی‌سازد
+        purchase.save()
+        send_plan_expiry_notifications()
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_expiry_job_sends_each_reminder_once(self):
+        now = timezone.now()
+        soon = self._purchase(verification_status='verified', expire_date=now + timedelta(days=3))
+
+        send_plan_expiry_notifications()
+        send_plan_expiry_notifications()
+        self.assertEqual(
+            list(Notification.objects.filter(notification_type=Notification.NotificationType.PLAN_EXPIRED)
+                 .values_list('dedup_key', flat=True)),
+            [f'plan_expired:purchase:{soon.pk}:d3'],
+        )
+
+        # سه روز بعد یادآوری روز انقضا جداگانه فرستاده می‌شود
+        Purchase.objects.filter(pk=soon.pk).update(expire_date=now)
+        send_plan_expiry_notifications()
+        send_plan_expiry_notifications()
+        self.assertEqual(self._count(Notification.NotificationType.PLAN_EXPIRED, self.buyer), 2)
+
+
+class PlanExpiryJobTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(phone='09120000081', role='owner')
+        gym = Gym.objects.create(owner=owner, name='Expiry Gym', latitude=35.0, longitude=51.0)
+        self.package = Package.objects.create(
+            group_package=GroupPackage.objects.create(title='Monthly'),
+            gym=gym,
+            title='Gym Plan',
+            gender='male',
+            price=Decimal('100.00'),
+            duration=30,
+        )
+        trainer = Trainer.objects.create(user=User.objects.create_user(phone='09120000082'), name='Coach')
+        self.trainer_package = TrainerPackage.objects.create(
+            trainer=trainer,
+            group_package=TrainerGroupPackage.objects.create(title='Coaching'),
+            title='Coach Plan',
+            gender='male',
+            price=Decimal('50.00'),
+            duration=30,
+        )
+        self.day = timezone.localdate()
+        self.now = timezone.now()
+
+    def _expiring(self, count, days_left, package=None, **kwargs):
+        """خرید تاییدشده با bulk_create؛ signalهای خرید اجرا نمی‌شوند"""
+        start = User.objects.count()
+        users = User.objects.bulk_create([
+            User(phone=f'0915{start + index:07d}', referral_code=f'EXP{start + index:05d}')
+            for index in range(count)
+        ])
+        package = package or self.package
+        fields = {
+            'content_type': ContentType.objects.get_for_model(package),
+            'object_id': package.id,
+            'total_amount': Decimal('100.00'),
+            'final_amount': Decimal('100.00'),
+            'payment_status': 'paid',
+            'verification_status': 'verified',
+            'expire_date': self.now + timedelta(days=days_left),
+        }
+        if isinstance(package, Package):
+            fields['package'] = package
+        fields.update(kwargs)
+        return Purchase.objects.bulk_create([Purchase(user=user, **fields) for user in users])
+
+    def test_query_count_does_not_grow_with_purchases(self):
+        self._expiring(1, 0)
+        # select + package + insert + unread counters, then select for the empty d3
+        with self.assertNumQueries(5):
+            first = send_plan_expiry_notifications(date=self.day, chunk_size=50)
+        self._expiring(120, 0)
+        self._expiring(80, 3)
+        # (select + package) x 2, (insert + unread counters) in chunks of 50: 3 + 2
+        with self.assertNumQueries(14):
+            second = send_plan_expiry_notifications(date=self.day, chunk_size=50)
+
+        self.assertEqual(first.created, 1)
+        self.assertEqual(second.pending, {0: 120, 3: 80})
+        self.assertEqual(second.created, 200)
+
+    def test_resolves_trainer_and_gym_package_titles(self):
+        gym_purchase = self._expiring(1, 3)[0]
+        trainer_purchase = self._expiring(1, 3, package=self.trainer_package, purchase_type='trainer')[0]
+        send_plan_expiry_notifications(date=self.day)
+
+        titles = dict(Notification.objects.values_list('dedup_key', 'title'))
+        self.assertEqual(titles, {
+            plan_expiry_dedup_key(gym_purchase.pk, 3): 'پلن شما ۳ روز دیگر منقضی می‌شود: Gym Plan',
+            plan_expiry_dedup_key(trainer_purchase.pk, 3): 'پلن شما ۳ روز دیگر منقضی می‌شود: Coach Plan',
+        })
+
+    def test_skips_unverified_and_other_days(self):
+        self._expiring(1, 0, verification_status='pending')
+        self._expiring(1, 1)
+        self._expiring(1, 0, expire_date=None)
+
+        report = send_plan_expiry_notifications(date=self.day)
+        self.assertEqual(report.pending, {0: 0, 3: 0})
+        self.assertFalse(Notification.objects.exists())
+
+    def test_command_dry_run_and_date(self):
+        self._expiring(3, 3)
+        out = StringIO()
+        call_command('send_plan_expiry_notifications', '--dry-run', stdout=out)
+        self.assertIn('d3: 3 purchases to notify', out.getvalue())
+        self.assertFalse(Notification.objects.exists())
+
+        # سه روز بعد همین خریدها یادآوری روز انقضا را می‌گیرند
+        later = (self.day + timedelta(days=3)).isoformat()
+        call_command('send_plan_expiry_notifications', '--date', later, stdout=StringIO())
+        self.assertEqual(
+            Notification.objects.filter(dedup_key__endswith=':d0').count(), 3,
+        )
+
+
+class BroadcastNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(phone='09120000091', role='admin')
+        self.other_admin = User.objects.create_user(phone='09120000092', role='admin')
+        self.customer = User.objects.create_user(phone='09120000093')
+        self.broadcasts = [
+            Notification.objects.create(
+                audience=Notification.Audience.ADMINS,
+                notification_type=Notification.NotificationType.WITHDRAW_REQUEST,
+                title=f'withdraw {index}',
+                message='m',
+            )
+            for index in range(3)
+        ]
+        self.direct = Notification.objects.create(
+            recipient=self.admin,
+            notification_type=Notification.NotificationType.TICKET_REPLY,
+            title='direct',
+            message='m',
+        )
+
+    def _unread(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/notifications/unread-count/').data['unread_count']
+
+    def test_withdraw_request_is_a_single_row(self):
+        from finance.models import Wallet, WithdrawRequest
+
+        owner = User.objects.create_user(phone='09120000094', role='owner')
+        wallet, _ = Wallet.objects.get_or_create(owner=owner)
+        WithdrawRequest.objects.create(user=owner, wallet=wallet, amount=Decimal('1000.00'))
+
+        notification = Notification.objects.get(notification_type=Notification.NotificationType.WITHDRAW_REQUEST,
+                                                data__withdraw_request_id__isnull=False)
+        self.assertIsNone(notification.recipient_id)
+        self.assertEqual(notification.audience, Notification.Audience.ADMINS)
+
+    def test_read_state_is_per_admin(self):
+        self.assertEqual(self._unread(self.admin), 4)
+        self.assertEqual(self._unread(self.customer), 0)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.patch(f'/api/notifications/{self.broadcasts[1].pk}/read/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_read'])
+
+        self.assertEqual(self._unread(self.admin), 3)
+        self.assertEqual(self._unread(self.other_admin), 3)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/notifications/')
+        read = {row['id']: row['is_read'] for row in response.data['results']}
+        self.assertEqual(read, {
+            self.direct.pk: False,
+            self.broadcasts[0].pk: False,
+            self.broadcasts[1].pk: True,
+            self.broadcasts[2].pk: False,
+        })
+
+    def test_mark_all_read_moves_the_marker(self):
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'/api/notifications/{self.broadcasts[0].pk}/read/')
+        self.client.post('/api/notifications/read-all/')
+
+        marker = NotificationReadMarker.objects.get(user=self.admin)
+        self.assertEqual((marker.last_read_id, marker.read_ids), (self.broadcasts[-1].pk, []))
+        self.assertEqual(self._unread(self.admin), 0)
+
+        broadcast(Notification.Audience.ADMINS, Notification.NotificationType.PURCHASE, 'new', 'm')
+        self.assertEqual(self._unread(self.admin), 1)
+        self.assertEqual(self._unread(self.other_admin), 4)
+
+    def test_reading_in_order_advances_the_marker(self):
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'/api/notifications/{self.broadcasts[2].pk}/read/')
+        marker = NotificationReadMarker.objects.get(user=self.admin)
+        self.assertEqual((marker.last_read_id, marker.read_ids), (0, [self.broadcasts[2].pk]))
+
+        self.client.patch(f'/api/notifications/{self.broadcasts[0].pk}/read/')
+        marker.refresh_from_db()
+        self.assertEqual((marker.last_read_id, marker.read_ids), (self.broadcasts[0].pk, [self.broadcasts[2].pk]))
+
+        self.client.patch(f'/api/notifications/{self.broadcasts[1].pk}/read/')
+        marker.refresh_from_db()
+        self.assertEqual((marker.last_read_id, marker.read_ids), (self.broadcasts[2].pk, []))
+
+        # اعلان مستقیم بین اعلان‌های همگانی جلو رفتن را متوقف نمی‌کند
+        broadcast(Notification.Audience.ADMINS, Notification.NotificationType.PURCHASE, 'new', 'm')
+        latest = Notification.objects.filter(audience=Notification.Audience.ADMINS).latest('id')
+        self.assertGreater(latest.pk, self.direct.pk)
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'/api/notifications/{latest.pk}/read/')
+        marker.refresh_from_db()
+        self.assertEqual((marker.last_read_id, marker.read_ids), (latest.pk, []))
+        self.assertEqual(self._unread(self.admin), 1)
+
+    def test_customer_cannot_read_broadcast(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.patch(f'/api/notifications/{self.broadcasts[0].pk}/read/')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(NotificationReadMarker.objects.exists())
+        self.assertEqual(self.client.get('/api/notifications/').data['count'], 0)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(phone='09120000101')
+        self.admin = User.objects.create_user(phone='09120000102', role='admin')
+
+    def _notify(self, count):
+        return bulk_notify([self.user] * count, Notification.NotificationType.TICKET_REPLY, 't', 'm')
+
+    def test_count_is_served_from_cache(self):
+        self._notify(2)
+        self.assertEqual(unread_count(self.user), 2)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread, 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 2)
+
+        # کش خالی: فقط ردیف شمارنده خوانده می‌شود
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(unread_count(self.user), 2)
+
+    def test_counter_follows_reads_and_inserts(self):
+        first, _ = self._notify(2)
+        unread_count(self.user)
+        self._notify(1)
+        self.assertEqual(unread_count(self.user), 3)
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'/api/notifications/{first.pk}/read/')
+        # خواندن دوباره شمارنده را کم نمی‌کند
+        self.client.patch(f'/api/notifications/{first.pk}/read/')
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread_count'], 2)
+
+        self.client.post('/api/notifications/read-all/')
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['unread_count'], 0)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread, 0)
+
+    def test_dedup_insert_counts_only_new_rows(self):
+        unread_count(self.user)
+        for _ in range(2):
+            created = bulk_notify([self.user, self.admin], Notification.NotificationType.PURCHASE, 't', 'm', dedup_key='k:1')
+        # تکرار چیزی درج نمی‌کند و شمارنده حذف نمی‌شود
+        self.assertEqual(created, [])
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread, 1)
+
+        created = bulk_notify([self.user, self.admin], Notification.NotificationType.PURCHASE, 't', 'm', dedup_key='k:2')
+        self.assertEqual({notification.recipient_id for notification in created}, {self.user.pk, self.admin.pk})
+        self.assertTrue(all(notification.pk for notification in created))
+        self.assertEqual(unread_count(self.user), 2)
+
+    def test_rebuild_does_not_lose_concurrent_insert(self):
+        from unittest.mock import patch
+
+        from notifications import inbox
+
+        self._notify(1)
+        UnreadCounter.objects.all().delete()
+        count = inbox._count_unread
+
+        def count_then_insert(user):
+            # اعلانی که درست بعد از شمارش ثبت می‌شود
+            counted = count(user)
+            self._notify(1)
+            return counted
+
+        with patch.object(inbox, '_count_unread', count_then_insert):
+            inbox._direct_unread(self.user)
+        cache.clear()
+        self.assertEqual(unread_count(self.user), 2)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread, 2)
+
+    def test_mark_all_read_keeps_insert_after_update(self):
+        from unittest.mock import patch
+
+        from notifications import inbox
+
+        self._notify(2)
+        unread_count(self.user)
+        count = inbox._count_unread
+
+        def insert_then_count(user):
+            # اعلانی که بعد از UPDATE اعلان‌ها ولی پیش از نوشتن شمارنده ثبت شده
+            self._notify(1)
+            return count(user)
+
+        with patch.object(inbox, '_count_unread', insert_then_count):
+            inbox.mark_all_read(self.user)
+        cache.clear()
+        self.assertEqual(unread_count(self.user), 1)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).unread, 1)
+
+    def test_admin_send_and_broadcast_update_counts(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertEqual(unread_count(self.admin), 0)
+
+        response = self.client.post('/api/notifications/admin/send/', {
+            'recipient_id': self.user.pk,
+            'title': 't',
+            'message': 'm',
+            'notification_type': Notification.NotificationType.TICKET_REPLY,
+        })
+        self.assertEqual(response.status_code, 201)
+        broadcast(Notification.Audience.ADMINS, Notification.NotificationType.WITHDRAW_REQUEST, 't', 'm')
+
+        self.assertEqual(unread_count(self.user), 1)
+        self.assertEqual(unread_count(self.admin), 1)
+
+    def test_admin_listing_does_not_count_table(self):
+        self._notify(3)
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get('/api/notifications/', {'page_size': 2})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/notifications/').data['count'], 3)
@@ -1,5 +1,6 @@
 import jdatetime
-from django.db import models as db_models
+from django.db import connections, models as db_models, router, transaction
+from django.db.models.constants import OnConflict
 
 
 def format_price(amount):
@@ -33,11 +34,51 @@ def get_all_admins():
     )
 
 
-def bulk_notify(recipients, notification_type, title, message, data=None):
+def create_new(notifications):
+    """
+    Insert notifications that carry a dedup_key, skipping the ones whose (recipient, dedup_key)
+    already exists, and return only the rows that were actually inserted (with pk set).
+    bulk_create(ignore_conflicts=True) cannot tell them apart, so the insert is
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id, recipient_id, dedup_key.
+    """
+    from notifications.models import Notification
+    opts = Notification._meta
+    fields = [f for f in opts.concrete_fields if not f.primary_key]
+    returning = [opts.pk, opts.get_field('recipient'), opts.get_field('dedup_key')]
+    db = router.db_for_write(Notification)
+    batch_size = max(connections[db].ops.bulk_batch_size(fields, notifications), 1)
+    by_key = {(n.recipient_id, n.dedup_key): n for n in notifications}
+    created = []
+    for start in range(0, len(notifications), batch_size):
+        rows = Notification.objects.db_manager(db)._insert(
+            notifications[start:start + batch_size],
+            fields=fields,
+            returning_fields=returning,
+            on_conflict=OnConflict.IGNORE,
+            using=db,
+        )
+        for row in rows:
+            # a single skipped row comes back as None
+            if row is None:
+                continue
+            pk, recipient_id, dedup_key = row
+            notification = by_key[(recipient_id, dedup_key)]
+            notification.pk = pk
+            notification._state.adding = False
+            notification._state.db = db
+            created.append(notification)
+    return created
+
+
+def bulk_notify(recipients, notification_type, title, message, data=None, dedup_key=None):
     """
     Create Notification rows for an iterable of User instances in one query.
     Silently skips if recipients is empty.
+    With dedup_key, recipients who already have a notification with that key are skipped
+    by the (recipient, dedup_key) unique constraint instead of a lookup beforehand.
+    Keeps the recipients' unread counters in sync and returns the new rows.
     """
+    from notifications.inbox import added_unread
     from notifications.models import Notification
     notifications = [
         Notification(
@@ -46,8 +87,39 @@ def bulk_notify(recipients, notification_type, title, message, data=None):
             title=title,
             message=message,
             data=data,
+            dedup_key=dedup_key,
         )
         for user in recipients
     ]
-    if notifications:
-        Notification.objects.bulk_create(notifications)
+    if not notifications:
+        return []
+    # ردیف‌ها و افزایش شمارنده با هم commit می‌شوند تا mark_all_read هیچ‌کدام را جدا نبیند
+    with transaction.atomic(savepoint=False):
+        if dedup_key is None:
+            Notification.objects.bulk_create(notifications)
+        else:
+            notifications = create_new(notifications)
+        if notifications:
+            added_unread([notification.recipient_id for notification in notifications])
+    return notifications
+
+
+def broadcast(audience, notification_type, title, message, data=None, dedup_key=None):
+    """
+    One Notification row for a whole audience (e.g. all admins) instead of a row per user.
+    With dedup_key the row is skipped if the audience already has a notification with that key.
+    """
+    from notifications.inbox import broadcast_added
+    from notifications.models import Notification
+    Notification.objects.bulk_create(
+        [Notification(
+            audience=audience,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            data=data,
+            dedup_key=dedup_key,
+        )],
+        ignore_conflicts=dedup_key is not None,
+    )
+    broadcast_added(audience)
@@ -7,4 +7,5 @@ class PackagesConfig(AppConfig):
     verbose_name = 'پکیج‌ها'
     
     def ready(self):
+        import packages.signals
         import packages.admin
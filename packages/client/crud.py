@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from ..models import Gym, Package, GroupPackage
 from ..serializers import *
 from rest_framework import status, permissions
+from fitness.cache import cache_response
 
 
 @extend_schema(tags=['Group Package'])
@@ -19,6 +20,10 @@ class GroupPackageListCreateView(generics.ListCreateAPIView):
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
+    @cache_response('group-package-list', ('package',))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 @extend_schema(tags=['Group Package'])
 class GroupPackageDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -36,7 +41,8 @@ class GroupPackageDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @extend_schema(tags=['Package'])
 class PackageListCreateView(generics.ListCreateAPIView):
-    queryset = Package.objects.all()
+    # تخفیف فعال و باشگاه هر پکیج در همان کوئری لیست
+    queryset = Package.objects.select_related('gym').with_active_discount()
     serializer_class = PackageSerializer
     
     def get_permissions(self):
@@ -46,10 +52,14 @@ class PackageListCreateView(generics.ListCreateAPIView):
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
+    @cache_response('package-list', ('package', 'gym', 'discount'))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 @extend_schema(tags=['Package'])
 class PackageDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Package.objects.all()
+    queryset = Package.objects.select_related('gym').with_active_discount()
     serializer_class = PackageSerializer
 
     def get_permissions(self):
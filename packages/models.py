@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Now
 from gyms.models import Gym
 
+# فیلدهای PackageDiscount که with_active_discount با پیشوند active_discount_ روی پکیج می‌گذارد
+ACTIVE_DISCOUNT_FIELDS = ('id', 'discount_type', 'value', 'source_type')
+
 class GroupPackage(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -9,6 +14,25 @@ class GroupPackage(models.Model):
         return self.title
 
 
+class PackageQuerySet(models.QuerySet):
+    def with_active_discount(self):
+        """
+        جدیدترین تخفیف معتبر هر پکیج (active_discount_id/discount_type/value/source_type) در همان
+        کوئری پکیج‌ها. discount.pricing و PackageSerializer به جای کوئری جداگانه از این‌ها استفاده
+        می‌کنند؛ زمان با Now() دیتابیس مقایسه می‌شود تا queryset سطح کلاس view‌ها کهنه نشود.
+        """
+        from discount.models import PackageDiscount
+
+        active = PackageDiscount.objects.filter(package=OuterRef('pk'), is_active=True).filter(
+            Q(start_date__isnull=True) | Q(start_date__lte=Now()),
+            Q(end_date__isnull=True) | Q(end_date__gte=Now()),
+        ).order_by('-created_at', '-id')
+        return self.annotate(**{
+            f'active_discount_{field}': Subquery(active.values(field)[:1])
+            for field in ACTIVE_DISCOUNT_FIELDS
+        })
+
+
 class Package(models.Model):
     gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name="packages")
     group_package = models.ForeignKey(GroupPackage, on_delete=models.CASCADE, related_name="packages")
@@ -22,6 +46,8 @@ class Package(models.Model):
     order_homepage = models.IntegerField(default=0, help_text="Order for homepage display (0 = use default sorting)")
     dedicated = models.BooleanField(default=False, help_text="پکیج اختصاصی برای باشگاه")
 
+    objects = PackageQuerySet.as_manager()
+
 
 
     def __str__(self):
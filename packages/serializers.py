@@ -1,7 +1,9 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Package, GroupPackage
 from gyms.models import Gym
 from discount.models import PackageDiscount
+from discount.pricing import quote, quote_many
 
 
 class GymSimpleSerializer(serializers.ModelSerializer):
@@ -17,36 +19,55 @@ class GroupPackageSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description']
 
 
+class PackageListSerializer(serializers.ListSerializer):
+    """
+    قیمت و تخفیف همه‌ی پکیج‌های لیست با یک کوئری (به جای یک کوئری برای هر پکیج)؛
+    برای queryset های with_active_discount بدون هیچ کوئری اضافه
+    """
+
+    def to_representation(self, data):
+        packages = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.price_quotes = {
+            package.pk: price_quote for package, price_quote in zip(packages, quote_many(packages))
+        }
+        return super().to_representation(packages)
+
+
 class PackageSerializer(serializers.ModelSerializer):
     gym = serializers.SerializerMethodField()
     discount = serializers.SerializerMethodField()
+    final_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Package
-        fields = ['id', 'group_package', 'title', 'description', 'gender', 'price', 'duration', 'commission_rate','sessions', 'gym', 'discount', 'order_homepage', 'dedicated']
+        fields = ['id', 'group_package', 'title', 'description', 'gender', 'price', 'duration', 'commission_rate','sessions', 'gym', 'discount', 'final_price', 'order_homepage', 'dedicated']
+        list_serializer_class = PackageListSerializer
 
     def get_gym(self, obj):
-        request = self.context.get('request')
-        gym_data = GymSimpleSerializer(obj.gym).data
-        if obj.gym.banner and hasattr(obj.gym.banner, 'url'):
-            url = obj.gym.banner.url
-            if request:
-                url = request.build_absolute_uri(url)
-            gym_data['banner'] = url
-        else:
-            gym_data['banner'] = None
-        return gym_data
+        # پکیج‌های یک باشگاه در لیست، باشگاه را فقط یک بار سریالایز می‌کنند
+        gyms = self.__dict__.setdefault('_gym_data', {})
+        if obj.gym_id not in gyms:
+            request = self.context.get('request')
+            gym_data = GymSimpleSerializer(obj.gym).data
+            if obj.gym.banner and hasattr(obj.gym.banner, 'url'):
+                url = obj.gym.banner.url
+                if request:
+                    url = request.build_absolute_uri(url)
+                gym_data['banner'] = url
+            else:
+                gym_data['banner'] = None
+            gyms[obj.gym_id] = gym_data
+        return dict(gyms[obj.gym_id])
+
+    def _quote(self, obj):
+        price_quotes = self.__dict__.setdefault('price_quotes', {})
+        if obj.pk not in price_quotes:
+            price_quotes[obj.pk] = quote(obj)
+        return price_quotes[obj.pk]
 
     def get_discount(self, obj):
         """بررسی و بازگرداندن تخفیف فعال روی پکیج"""
-        from django.utils import timezone
-        from django.db.models import Q
-        now = timezone.now()
-        active_discount = obj.discounts.filter(
-            Q(is_active=True) &
-            (Q(start_date__lte=now) | Q(start_date__isnull=True)) &
-            (Q(end_date__gte=now) | Q(end_date__isnull=True))
-        ).first()
+        active_discount = self._quote(obj).package_discount_obj
         if active_discount:
             return {
                 'id': active_discount.id,
@@ -56,3 +77,6 @@ class PackageSerializer(serializers.ModelSerializer):
             }
         return None
 
+    def get_final_price(self, obj):
+        """قیمت بعد از تخفیف پکیج (بدون کد تخفیف)"""
+        return format(self._quote(obj).final, '.2f')
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fitness.cache import bump_version
+
+
+@receiver([post_save, post_delete], sender='packages.Package', dispatch_uid='packages.catalog_cache_package')
+@receiver([post_save, post_delete], sender='packages.GroupPackage', dispatch_uid='packages.catalog_cache_group_package')
+def invalidate_package_catalog(sender, **kwargs):
+    bump_version('package')
@@ -1,3 +1,81 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from discount.models import PackageDiscount
+from gyms.models import Gym
+from packages.models import GroupPackage, Package
+
+
+class PackageEffectivePriceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(phone='09120000301', role='owner')
+        self.group = GroupPackage.objects.create(title='بدنسازی')
+
+    def _create_packages(self, count):
+        for index in range(count):
+            gym = Gym.objects.create(owner=self.owner, name=f'Gym {index}', latitude=35.0, longitude=51.0)
+            package = Package.objects.create(
+                gym=gym, group_package=self.group, title=f'Package {index}', gender='male',
+                price=Decimal('100000.00'), duration=30, commission_rate=0.05,
+            )
+            PackageDiscount.objects.create(package=package, discount_type='percent', value=10, source_type='club')
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/packages/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_with_active_discount_picks_newest_valid_discount(self):
+        gym = Gym.objects.create(owner=self.owner, name='Gym', latitude=35.0, longitude=51.0)
+        package = Package.objects.create(
+            gym=gym, group_package=self.group, title='Gold', gender='male',
+            price=Decimal('100000.00'), duration=30, commission_rate=0.05,
+        )
+        now = timezone.now()
+        PackageDiscount.objects.create(package=package, discount_type='percent', value=5, source_type='club')
+        newest = PackageDiscount.objects.create(package=package, discount_type='amount', value=20000, source_type='club')
+        PackageDiscount.objects.create(
+            package=package, discount_type='percent', value=50, source_type='club', end_date=now - timedelta(days=1),
+        )
+        PackageDiscount.objects.create(
+            package=package, discount_type='percent', value=50, source_type='club', is_active=False,
+        )
+
+        annotated = Package.objects.with_active_discount().get(pk=package.pk)
+
+        self.assertEqual(annotated.active_discount_id, newest.id)
+        self.assertEqual(annotated.active_discount_discount_type, 'amount')
+        self.assertEqual(annotated.active_discount_value, Decimal('20000'))
+
+    def test_package_list_query_count_is_independent_of_size(self):
+        self._create_packages(2)
+        small_queries, small_data = self._count_list_queries()
+        self._create_packages(6)
+        large_queries, large_data = self._count_list_queries()
+
+        self.assertEqual(len(small_data), 2)
+        self.assertEqual(len(large_data), 8)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual({item['final_price'] for item in large_data}, {'90000.00'})
+        self.assertEqual(large_data[0]['discount']['value'], '10.00')
+
+    def test_home_search_query_count_is_independent_of_size(self):
+        self._create_packages(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/admin/home/search/', {'q': 'Package'})
+        self._create_packages(4)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/admin/home/search/', {'q': 'Package'})
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['packages']), 5)
+        self.assertEqual(len(small), len(large))
@@ -0,0 +1,17 @@
+#!/bin/sh
+# Container entrypoint: the web server plus the background job worker (runworker), which sends
+# the queued OTP/purchase SMS and runs PERIODIC_JOBS. Set RUN_WORKER=0 when the worker runs as
+# its own service from the same image (`python manage.py runworker`).
+set -e
+
+if [ "${RUN_WORKER:-1}" = "1" ]; then
+    # restart the worker if it exits so queued SMS are never left unsent
+    (
+        while true; do
+            python manage.py runworker --workers "${JOB_WORKERS:-2}" || true
+            sleep 5
+        done
+    ) &
+fi
+
+exec gunicorn --bind 0.0.0.0:8000 fitness.wsgi:application
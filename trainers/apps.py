@@ -5,3 +5,6 @@ class TrainersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trainers'
     verbose_name = 'Trainers'
+
+    def ready(self):
+        import trainers.signals
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+
+def fill_rating_sum(apps, schema_editor):
+    # average_rating و reviews_count تا اینجا با محاسبه‌ی کامل به‌روز شده‌اند
+    Trainer = apps.get_model('trainers', 'Trainer')
+    Trainer.objects.update(rating_sum=Round(F('average_rating') * F('reviews_count')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainer',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False, help_text='مجموع امتیاز نظرات شمرده‌شده'),
+        ),
+        migrations.RunPython(fill_rating_sum, migrations.RunPython.noop),
+    ]
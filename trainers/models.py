@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import FileExtensionValidator
 from gyms.models import Gym
 from accounts.models import User
+from fitness.ratings import rebuild_ratings
 import os
 
 
@@ -74,6 +75,7 @@ class Trainer(models.Model):
     # امتیاز و نظرات
     average_rating = models.FloatField(default=0.0)
     reviews_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0, editable=False, help_text="مجموع امتیاز نظرات شمرده‌شده")
     
     # ترتیب نمایش در صفحه اصلی
     order_homepage = models.IntegerField(
@@ -95,15 +97,18 @@ class Trainer(models.Model):
         return f"{self.name} ({phone})"
     
     def update_rating(self):
-        """به‌روزرسانی امتیاز میانگین"""
-        reviews = self.reviews.filter(deleted=False, blocked=False)
-        if reviews.exists():
-            self.average_rating = sum(review.rating for review in reviews) / reviews.count()
-            self.reviews_count = reviews.count()
-        else:
-            self.average_rating = 0.0
-            self.reviews_count = 0
-        self.save(update_fields=['average_rating', 'reviews_count'])
+        """
+        بازسازی کامل امتیاز از روی نظرات.
+        تغییرات عادی نظرات به صورت افزایشی در trainers/signals.py اعمال می‌شوند.
+        """
+        rebuild_ratings(
+            Trainer,
+            TrainerReview.objects.counted(),
+            target_field='trainer',
+            count_field='reviews_count',
+            ids=[self.pk],
+        )
+        self.refresh_from_db(fields=['rating_sum', 'reviews_count', 'average_rating'])
 
 
 class TrainerGroupPackage(models.Model):
@@ -177,6 +182,12 @@ class TrainerPackage(models.Model):
 
 
         
+class TrainerReviewQuerySet(models.QuerySet):
+    def counted(self):
+        """نظراتی که در امتیاز مربی شمرده می‌شوند"""
+        return self.filter(deleted=False, blocked=False)
+
+
 class TrainerReview(models.Model):
     """نظرات شاگردان برای مربی"""
     trainer = models.ForeignKey(
@@ -206,6 +217,8 @@ class TrainerReview(models.Model):
         related_name='replies'
     )
     
+    objects = TrainerReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Trainer Review"
@@ -213,7 +226,9 @@ class TrainerReview(models.Model):
     
     def __str__(self):
         return f"Review by {self.user.phone} for {self.trainer.name}"
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.trainer.update_rating()
+
+    def rating_contribution(self):
+        """(trainer_id, rating) اگر این نظر در امتیاز مربی شمرده شود، وگرنه None"""
+        if self.deleted or self.blocked:
+            return None
+        return self.trainer_id, self.rating
@@ -1,7 +1,6 @@
 from rest_framework import serializers
 from .models import Trainer, TrainerGroupPackage, TrainerPackage, TrainerReview
-import json, os
-from django.conf import settings
+from fitness.moderation import contains_bad_words
 
 
 class TrainerSerializer(serializers.ModelSerializer):
@@ -208,21 +207,8 @@ class TrainerReviewSerializer(serializers.ModelSerializer):
     
     def validate_comment(self, value):
         """فیلتر فحش‌ها در متن کامنت"""
-        badwords_path = os.path.join(settings.BASE_DIR, 'badwords_fa.json')
-        
-        if not os.path.exists(badwords_path):
-            return value
-        
-        with open(badwords_path, 'r', encoding='utf-8') as f:
-            bad_words = json.load(f)
-        
-        text = value.lower().replace("‌", "").replace(" ", "")
-        
-        for word in bad_words:
-            w = word.strip().lower().replace("‌", "").replace(" ", "")
-            if w and w in text:
-                raise serializers.ValidationError("در متن شما کلمات نامناسب وجود دارد.")
-        
+        if contains_bad_words(value):
+            raise serializers.ValidationError("در متن شما کلمات نامناسب وجود دارد.")
         return value
 
 
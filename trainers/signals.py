@@ -0,0 +1,45 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from fitness.cache import bump_version
+from fitness.ratings import apply_review_change
+from .models import Trainer
+
+
+@receiver([post_save, post_delete], sender='trainers.Trainer', dispatch_uid='trainers.catalog_cache_trainer')
+@receiver([post_save, post_delete], sender='trainers.TrainerPackage', dispatch_uid='trainers.catalog_cache_trainer_package')
+@receiver([post_save, post_delete], sender='trainers.TrainerGroupPackage', dispatch_uid='trainers.catalog_cache_trainer_group_package')
+@receiver(m2m_changed, sender=Trainer.active_gyms.through, dispatch_uid='trainers.catalog_cache_trainer_gyms')
+def invalidate_trainer_catalog(sender, **kwargs):
+    bump_version('trainer')
+
+
+@receiver(pre_save, sender='trainers.TrainerReview', dispatch_uid='trainers.review_rating_before')
+def remember_trainer_review_rating(sender, instance, **kwargs):
+    # سهم قبلی این نظر در امتیاز مربی (با یک کوئری روی کلید اصلی)
+    instance._previous_rating_contribution = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_rating_contribution = previous.rating_contribution()
+
+
+@receiver(post_save, sender='trainers.TrainerReview', dispatch_uid='trainers.review_rating_saved')
+def update_trainer_rating(sender, instance, **kwargs):
+    changed = apply_review_change(
+        Trainer,
+        count_field='reviews_count',
+        old=getattr(instance, '_previous_rating_contribution', None),
+        new=instance.rating_contribution(),
+    )
+    instance._previous_rating_contribution = instance.rating_contribution()
+    if changed:
+        bump_version('trainer')
+
+
+@receiver(post_delete, sender='trainers.TrainerReview', dispatch_uid='trainers.review_rating_deleted')
+def remove_trainer_rating(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Trainer):
+        return
+    if apply_review_change(Trainer, count_field='reviews_count', old=instance.rating_contribution(), new=None):
+        bump_version('trainer')